@@ -29,14 +29,17 @@
 
 import os
 import uuid
+from functools import reduce
+from operator import or_
 from django.core.cache import cache
-from django.db.models import CharField, Value as V
+from django.db.models import CharField, Q, Value as V
 from django.db.models.functions import Concat
 from lxml import etree
 from pbx.fscmdabslayer import FsCmdAbsLayer
 from .models import Gateway, Bridge, ExtensionUser
 from provision.models import Devices, DeviceLines
 from django.contrib.auth.models import User, Group
+from tenants.models import Profile
 from tenants.pbxsettings import PbxSettings
 
 
@@ -239,60 +242,99 @@ class GatewayFunctions():
 
 
 class ExtRelatedFunctions():
+    # The create_ methods take a list of extensions and use a fixed number of
+    #  queries however long the list is.
 
     def create_user(self, obj, request):
-        ret = 0
-        username = '%s@%s' % (obj.extension, obj.domain_id.name)
-        if not User.objects.filter(username=username).exists():
-            user = User.objects.create_user(username, username, obj.password)
-            if obj.effective_caller_id_name:
-                user.first_name = obj.effective_caller_id_name.replace(' ', '-')
-            else:
-                user.first_name = obj.extension
-            if obj.effective_caller_id_number:
-                user.last_name = obj.effective_caller_id_number
+        return self.create_users([obj], request.user.username)
+
+    def create_users(self, extensions, updated_by, hash_passwords=True):
+        # A user named extension@domain for each extension without one.  With
+        #  hash_passwords=False the users get unusable passwords, hashing the
+        #  extension password is by far the slowest part of creating many users.
+        wanted = {'%s@%s' % (e.extension, e.domain_id.name): e for e in extensions}
+        if not wanted:
+            return 0
+        domains = {e.domain_id.name for e in wanted.values()}
+        existing = set(User.objects.filter(
+            reduce(or_, [Q(username__endswith='@%s' % d) for d in domains])
+            ).values_list('username', flat=True))
+        new = [(username, e) for username, e in wanted.items() if username not in existing]
+        if not new:
+            return 0
+        users = []
+        for username, e in new:
+            user = User(
+                username=username, email=username,
+                first_name=e.effective_caller_id_name.replace(' ', '-') if e.effective_caller_id_name else e.extension,
+                last_name=e.effective_caller_id_number if e.effective_caller_id_number else e.domain_id.name.replace('.', '')
+                )
+            if hash_passwords:
+                user.set_password(e.password)
             else:
-                user.last_name = obj.domain_id.name.replace('.', '')
-            user.save()
-            ret = 1
-            user_group = Group.objects.get(name='user')
-            if user_group:
-                user_group.user_set.add(user)
-            user.profile.domain_id = obj.domain_id
-            user.profile.username = username
-            user.profile.enabled = 'true'
-            user.profile.updated_by = request.user.username
-            user.profile.save()
-            ExtensionUser.objects.create(
-                extension_id = obj,
-                user_uuid = user.profile,
-                updated_by = request.user.username
-            )
-        return ret
+                user.set_unusable_password()
+            users.append(user)
+        User.objects.bulk_create(users, batch_size=1000)
+        profiles = [
+            Profile(
+                user=user, username=user.username, email=user.email, domain_id=e.domain_id,
+                enabled='true', updated_by=updated_by
+                ) for user, (username, e) in zip(users, new)
+            ]
+        Profile.objects.bulk_create(profiles, batch_size=1000)
+        user_group = Group.objects.filter(name='user').first()
+        if user_group:
+            User.groups.through.objects.bulk_create(
+                [User.groups.through(user_id=user.id, group_id=user_group.id) for user in users], batch_size=1000
+                )
+        ExtensionUser.objects.bulk_create([
+            ExtensionUser(extension_id=e, user_uuid=profile, updated_by=updated_by)
+            for profile, (username, e) in zip(profiles, new)
+            ], batch_size=1000)
+        return len(new)
 
     def create_device(self, obj, request):
-        ret = 0
-        user = None
-        mac = ':'.join(str(uuid.uuid4())[24:].upper()[i:i+2] for i in range(0,12,2))
-        if not Devices.objects.filter(domain_id=obj.domain_id_id, label=obj.extension).exists():
-            extuser = obj.extensionuser.filter(default_user='true').first()
-            ret = 1
-            if extuser:
-                user = extuser.user_uuid
-            device = Devices.objects.create(
-                domain_id=obj.domain_id,
-                user_id=user,
+        return self.create_devices([obj], request.user.username)
+
+    def create_devices(self, extensions, updated_by, vendor=None, profile=None, template=None):
+        # A device with one line for each extension that has no device labelled
+        #  with its number, assigned to the extension's default user.
+        domain_ids = {e.domain_id_id for e in extensions}
+        existing = set(Devices.objects.filter(domain_id__in=domain_ids).values_list('domain_id', 'label'))
+        new = [e for e in extensions if (e.domain_id_id, e.extension) not in existing]
+        if not new:
+            return 0
+        ext_ids = {e.id for e in new}
+        users = {
+            eu.extension_id_id: eu.user_uuid for eu in ExtensionUser.objects.select_related('user_uuid').filter(
+                extension_id__domain_id__in=domain_ids, default_user='true'
+                ) if eu.extension_id_id in ext_ids
+            }
+        devices = []
+        lines = []
+        for e in new:
+            mac = ':'.join(str(uuid.uuid4())[24:].upper()[i:i+2] for i in range(0,12,2))
+            device = Devices(
+                domain_id=e.domain_id,
+                user_id=users.get(e.id),
                 mac_address=mac,
-                label=obj.extension,
-                updated_by=request.user.username
+                label=e.extension,
+                vendor=vendor,
+                profile_id=profile,
+                template=template,
+                updated_by=updated_by
             )
-        DeviceLines.objects.create(
+            devices.append(device)
+            lines.append(DeviceLines(
                 device_id=device,
                 line_number=1,
-                server_address=obj.domain_id,
-                display_name=obj.extension,
-                user_id=obj.extension,
-                auth_id=obj.extension,
-                password=obj.password
-        )
-        return ret
+                server_address=e.domain_id.name,
+                display_name=e.extension,
+                user_id=e.extension,
+                auth_id=e.extension,
+                password=e.password,
+                updated_by=updated_by
+            ))
+        Devices.objects.bulk_create(devices, batch_size=1000)
+        DeviceLines.objects.bulk_create(lines, batch_size=1000)
+        return len(new)
@@ -35,7 +35,7 @@ from django.conf import settings
 from django.core.cache import cache
 from django.contrib import messages
 from .models import (
-    Extension, FollowMeDestination, ExtensionUser, Gateway, Bridge,
+    Extension, FollowMeDestination, ExtensionUser, Gateway, Bridge, FeatureSyncChoice,
 )
 from tenants.models import Profile
 from django.forms.widgets import Select
@@ -46,7 +46,7 @@ from pbx.commonfunctions import DomainFilter, DomainUtils
 from musiconhold.musiconholdfunctions import MohSource
 from switch.switchfunctions import SipProfileChoice
 from .accountfunctions import AccountFunctions, GatewayFunctions, ExtRelatedFunctions
-from .extensionfunctions import ExtFeatureSyncFunctions
+from .extensionfunctions import ExtFeatureSyncQueue
 from voicemail.voicemailfunctions import VoicemailFunctions
 
 
@@ -162,24 +162,14 @@ class ExtensionResource(resources.ModelResource):
 
 @admin.action(permissions=['change'], description=_('Create User for selected extensions'))
 def create_user_for_extension(modeladmin, request, queryset):
-    rc = 0
-    extrf = ExtRelatedFunctions()
-    for obj in queryset:
-        r = extrf.create_user(obj, request)
-        if r > 0:
-            rc += r
+    rc = ExtRelatedFunctions().create_users(list(queryset.select_related('domain_id')), request.user.username)
     if rc > 0:
         messages.add_message(request, messages.INFO, _('%s user(s) created.' % rc))
 
 
 @admin.action(permissions=['change'], description=_('Create Device for selected extensions'))
 def create_device_for_extension(modeladmin, request, queryset):
-    rc = 0
-    extrf = ExtRelatedFunctions()
-    for obj in queryset:
-        r = extrf.create_device(obj, request)
-        if r > 0:
-            rc += r
+    rc = ExtRelatedFunctions().create_devices(list(queryset.select_related('domain_id')), request.user.username)
     if rc > 0:
         messages.add_message(request, messages.INFO, _('%s device(s) created.' % rc))
 
@@ -290,18 +280,14 @@ class ExtensionAdmin(ImportExportModelAdmin):
         cache.delete(directory_cache_key)
         if change:
             super().save_model(request, obj, form, change)
-            efsf = ExtFeatureSyncFunctions(obj)
-            efsf.sync_dnd()
-            efsf.es_disconnect()
-            # Uncomment as required below if you have any of the following
-            # feature on/off codes programmed in your phones.
-            # If you exclusively use TCP transport and have no concern about exceeding your MTU
-            # You may also opt for using efsf.sync_all()
+            ExtFeatureSyncQueue().enqueue(obj, FeatureSyncChoice.CDND)
+            # Add as required below if you have any of the following
+            # feature on/off codes programmed in your phones, eg.
+            # FeatureSyncChoice.CDND | FeatureSyncChoice.CFWDIMMEDIATE
             #
-            #efsf.sync_fwd_immediate()
-            #efsf.sync_fwd_busy()
-            #efsf.sync_fwd_no_answer()
-            #efsf.sync_all()
+            #FeatureSyncChoice.CFWDIMMEDIATE
+            #FeatureSyncChoice.CFWDBUSY
+            #FeatureSyncChoice.CFWDNOANSWER
         else:
             obj.domain_id = DomainUtils().domain_from_session(request)
             obj.user_context = request.session['domain_name']
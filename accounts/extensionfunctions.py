@@ -27,8 +27,13 @@
 #
 
 import math
+from functools import reduce
+from operator import or_
 from django.core.cache import cache
-from accounts.models import Extension, FollowMeDestination
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from accounts.models import Extension, FeatureSyncChoice, FeatureSyncQueue, FollowMeDestination
 from switch.models import SwitchVariable
 from django.conf import settings
 from pbx.fscmdabslayer import FsCmdAbsLayer
@@ -39,10 +44,14 @@ from pbx.devicecfgevent import DeviceCfgEvent
 class ExtFeatureSyncFunctions():
     vendor = 'none'
     feature_sync = False
+    es_lost = False
 
-    def __init__(self, obj=None, **kwargs):
+    def __init__(self, obj=None, es=None, **kwargs):
+        # Pass es to share an already connected FsCmdAbsLayer, it is then left
+        #  open by es_disconnect().
         self.__dict__.update(kwargs)
         self.es_connected = False
+        self.es_owned = es is None
         pbxs = PbxSettings()
         if not self.get_extension_object(obj):
             return
@@ -51,23 +60,15 @@ class ExtFeatureSyncFunctions():
         if not self.vendor_sync_status.get('_any_set', False):
             return
         self.sip_user = '%s@%s' % (self.ext.extension, self.ext.user_context)
-        self.es = FsCmdAbsLayer()
-        if not self.es.connect():
-            return
+        if es is None:
+            es = FsCmdAbsLayer()
+            if not es.connect():
+                return
+        self.es = es
         self.es_connected = True
-        if not self.get_sofia_contact():
+        if not self.get_registration():
             return
-        self.es.clear_responses()
-        sspu_detail = self.es.send('api sofia status profile %s user %s' % (self.sip_profile, self.sip_user))
-        self.es.process_events()
-        self.es.get_responses()
-        user_found = False
-        for resp in self.es.responses:
-            if self.parse_sofia_status_profile_user(resp):
-                user_found = True
-        if not user_found:
-            return
-        agent = self.user_info.get('Agent', 'none').lower()
+        agent = self.agent.lower()
         for v, s in self.vendor_sync_status.items():
             if v in agent:
                 self.vendor = v
@@ -75,17 +76,46 @@ class ExtFeatureSyncFunctions():
         self.init_ok = True
 
     def es_disconnect(self):
-        if self.es_connected:
+        if self.es_connected and self.es_owned:
             self.es.disconnect()
 
+    def es_send(self, cmd):
+        self.es.clear_responses()
+        self.es.send(cmd)
+        self.es.process_events()
+        self.es.get_responses()
+        if False in self.es.responses:
+            # The event socket returns False when the connection has gone.
+            self.es_lost = True
+            self.es_connected = False
+            return False
+        return True
+
+    def get_registration(self):
+        # The sofia profile and user agent of the registered phone are cached
+        #  briefly so that a run of edits to one extension asks the switch once.
+        registration_cache_key = 'featuresync:%s' % self.sip_user
+        reg = cache.get(registration_cache_key)
+        if reg is None:
+            reg = ('', '')
+            if self.get_sofia_contact():
+                if not self.es_send('api sofia status profile %s user %s' % (self.sip_profile, self.sip_user)):
+                    return False
+                for resp in self.es.responses:
+                    if self.parse_sofia_status_profile_user(resp):
+                        reg = (self.sip_profile, self.user_info.get('Agent', 'none'))
+            if self.es_lost:
+                return False
+            cache.set(registration_cache_key, reg, settings.PBX_FEATURE_SYNC_REGISTRATION_TIMEOUT)
+        self.sip_profile, self.agent = reg
+        return bool(self.sip_profile)
+
     def get_sofia_contact(self):
         if not self.es_connected:
             return False
         ret = False
-        self.es.clear_responses()
-        self.es.send('api sofia_contact */%s' % self.sip_user)
-        self.es.process_events()
-        self.es.get_responses()
+        if not self.es_send('api sofia_contact */%s' % self.sip_user):
+            return False
         for resp in self.es.responses:
             if resp.endswith('user_not_registered'):
                 continue
@@ -136,10 +166,7 @@ class ExtFeatureSyncFunctions():
             return
         dce = DeviceCfgEvent()
         cmd = dce.buildfeatureevent(self.ext.extension, self.ext.user_context, self.sip_profile, 'DoNotDisturbEvent', DoNotDisturbOn=self.ext.do_not_disturb)
-        self.es.clear_responses()
-        self.es.send(cmd)
-        self.es.process_events()
-        self.es.get_responses()
+        self.es_send(cmd)
 
     def sync_fwd_immediate(self):
         if not self.es_connected:
@@ -151,10 +178,7 @@ class ExtFeatureSyncFunctions():
                 forward_immediate_enabled=self.ext.forward_all_enabled,
                 forward_immediate=(self.ext.forward_all_destination if self.ext.forward_all_destination else '0')
                 )
-        self.es.clear_responses()
-        self.es.send(cmd)
-        self.es.process_events()
-        self.es.get_responses()
+        self.es_send(cmd)
 
     def sync_fwd_busy(self):
         if not self.es_connected:
@@ -166,10 +190,7 @@ class ExtFeatureSyncFunctions():
                 forward_busy_enabled=self.ext.forward_busy_enabled,
                 forward_busy=(self.ext.forward_busy_destination if self.ext.forward_busy_destination else '0')
                 )
-        self.es.clear_responses()
-        self.es.send(cmd)
-        self.es.process_events()
-        self.es.get_responses()
+        self.es_send(cmd)
 
     def sync_fwd_no_answer(self):
         if not self.es_connected:
@@ -182,10 +203,7 @@ class ExtFeatureSyncFunctions():
                 forward_no_answer=(self.ext.forward_no_answer_destination if self.ext.forward_no_answer_destination else '0'),
                 ringCount=math.ceil(self.ext.call_timeout / 6)
                 )
-        self.es.clear_responses()
-        self.es.send(cmd)
-        self.es.process_events()
-        self.es.get_responses()
+        self.es_send(cmd)
 
     def sync_all(self):
         # Warning, if you predominantly use UDP, using this function will almost certainly exceed your MTU.
@@ -204,10 +222,95 @@ class ExtFeatureSyncFunctions():
                 ringCount=math.ceil(self.ext.call_timeout / 6),
                 DoNotDisturbOn=self.ext.do_not_disturb
             )
-        self.es.clear_responses()
-        self.es.send(cmd)
-        self.es.process_events()
-        self.es.get_responses()
+        self.es_send(cmd)
+
+
+class ExtFeatureSyncQueue():
+    # Feature key events for phones are queued here by edits to an extension and
+    #  sent by the featuresync worker (pbx-feature-sync.service).  Edits to one
+    #  extension made before the worker reaches it share a single queue row, the
+    #  events are built from the extension as it is when they are sent.
+
+    def __init__(self, batch_size=100, delay=None, stale=300):
+        self.batch_size = batch_size
+        self.delay = settings.PBX_FEATURE_SYNC_DELAY if delay is None else delay
+        self.stale = stale
+        self.es = None
+
+    def enqueue(self, ext, features):
+        if not settings.PBX_FEATURE_SYNC_USE_QUEUE:
+            self.sync(ext, features)
+            return
+        for i in range(2):
+            if FeatureSyncQueue.objects.filter(extension_id=ext).update(
+                    features=F('features').bitor(features), edits=F('edits') + 1
+                    ):
+                return
+            try:
+                with transaction.atomic():
+                    FeatureSyncQueue.objects.create(extension_id=ext, features=features)
+                return
+            except IntegrityError:
+                # Created by a concurrent edit, update that row instead.
+                continue
+
+    def sync(self, ext, features):
+        efsf = ExtFeatureSyncFunctions(ext, es=self.es)
+        if features & FeatureSyncChoice.CDND:
+            efsf.sync_dnd()
+        if features & FeatureSyncChoice.CFWDIMMEDIATE:
+            efsf.sync_fwd_immediate()
+        if features & FeatureSyncChoice.CFWDBUSY:
+            efsf.sync_fwd_busy()
+        if features & FeatureSyncChoice.CFWDNOANSWER:
+            efsf.sync_fwd_no_answer()
+        efsf.es_disconnect()
+        return not efsf.es_lost
+
+    def connect(self):
+        if self.es is None:
+            es = FsCmdAbsLayer()
+            if not es.connect():
+                return False
+            self.es = es
+        return True
+
+    def claim_batch(self):
+        now = timezone.now()
+        with transaction.atomic():
+            qs = FeatureSyncQueue.objects.select_for_update(skip_locked=True).filter(
+                Q(claimed__isnull=True) | Q(claimed__lt=now - timezone.timedelta(seconds=self.stale)),
+                requested__lte=now - timezone.timedelta(seconds=self.delay)
+                ).order_by('requested')[:self.batch_size]
+            batch = list(qs)
+            if batch:
+                FeatureSyncQueue.objects.filter(id__in=[q.id for q in batch]).update(claimed=now)
+        return batch
+
+    def process_batch(self):
+        batch = self.claim_batch()
+        if not batch:
+            return 0
+        done = []
+        if self.connect():
+            exts = Extension.objects.in_bulk([q.extension_id_id for q in batch])
+            for q in batch:
+                if not self.sync(exts.get(q.extension_id_id), q.features):
+                    self.disconnect()
+                    break
+                done.append(q)
+        if done:
+            # Rows edited again since they were claimed are kept for another pass.
+            FeatureSyncQueue.objects.filter(
+                reduce(or_, [Q(id=q.id, edits=q.edits) for q in done])
+                ).delete()
+        FeatureSyncQueue.objects.filter(id__in=[q.id for q in batch]).update(claimed=None)
+        return len(done)
+
+    def disconnect(self):
+        if self.es is not None:
+            self.es.disconnect()
+            self.es = None
 
 
 class ExtFollowMeFunctions():
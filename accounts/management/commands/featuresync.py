@@ -0,0 +1,57 @@
+#
+#    DjangoPBX
+#
+#    MIT License
+#
+#    Copyright (c) 2016 - 2024 Adrian Fretwell <adrian@djangopbx.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+#
+#    Contributor(s):
+#    Adrian Fretwell <adrian@djangopbx.com>
+#
+
+import time
+from django.utils.translation import gettext_lazy as _
+from django.core.management.base import BaseCommand
+from accounts.extensionfunctions import ExtFeatureSyncQueue
+
+
+class Command(BaseCommand):
+    help = 'Send queued DND and forwarding feature key events to phones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help=_('Process the queue once and exit'))
+        parser.add_argument('--batch', type=int, default=100, help=_('Extensions claimed per batch (default 100)'))
+        parser.add_argument(
+            '--delay', type=float, help=_('Seconds an edit waits for further edits (default PBX_FEATURE_SYNC_DELAY)')
+            )
+        parser.add_argument('--interval', type=float, default=0.5, help=_('Seconds to wait when the queue is empty'))
+
+    def handle(self, *args, **kwargs):
+        fsq = ExtFeatureSyncQueue(kwargs['batch'], kwargs['delay'])
+        try:
+            while True:
+                count = fsq.process_batch()
+                if kwargs['once'] and count < kwargs['batch']:
+                    break
+                if not count:
+                    time.sleep(kwargs['interval'])
+        finally:
+            fsq.disconnect()
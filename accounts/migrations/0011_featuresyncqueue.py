@@ -0,0 +1,31 @@
+# Generated by Django 5.0.1 on 2026-10-19 13:04
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_alter_gateway_auth_username_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeatureSyncQueue',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, verbose_name='Feature Sync Queue')),
+                ('features', models.IntegerField(default=0, verbose_name='Features')),
+                ('edits', models.IntegerField(default=1, verbose_name='Edits')),
+                ('requested', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Requested')),
+                ('claimed', models.DateTimeField(blank=True, null=True, verbose_name='Claimed')),
+                ('extension_id', models.OneToOneField(db_column='extension_uuid', on_delete=django.db.models.deletion.CASCADE, related_name='featuresyncqueue', to='accounts.extension', verbose_name='Extension')),
+            ],
+            options={
+                'verbose_name_plural': 'Feature Sync Queue',
+                'db_table': 'pbx_feature_sync_queue',
+            },
+        ),
+    ]
@@ -29,6 +29,7 @@
 
 from django.db import models
 import uuid
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from pbx.commonchoices import (
     EnabledTrueFalseChoice, EnabledTrueFalseNoneChoice, ConfirmChoice,
@@ -40,6 +41,13 @@ class MissedCallAppChoice(models.TextChoices):
     CEMAIL = 'email',    _('Email')    # noqa: E221
 
 
+class FeatureSyncChoice(models.IntegerChoices):
+    CDND          = 1, _('Do Not Disturb')        # noqa: E221
+    CFWDIMMEDIATE = 2, _('Forward Immediate')     # noqa: E221
+    CFWDBUSY      = 4, _('Forward Busy')          # noqa: E221
+    CFWDNOANSWER  = 8, _('Forward No Answer')     # noqa: E221
+
+
 class RecordChoice(models.TextChoices):
     CDISABLED = '',         _('Disabled')  # noqa: E221
     CALL      = 'all',      _('All')       # noqa: E221
@@ -236,3 +244,19 @@ class Bridge(models.Model):
 
     def __str__(self):
         return str(self.name)
+
+
+class FeatureSyncQueue(models.Model):
+    id           = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False, verbose_name=_('Feature Sync Queue'))                                                   # noqa: E501, E221
+    extension_id = models.OneToOneField('Extension', db_column='extension_uuid', related_name='featuresyncqueue', on_delete=models.CASCADE, verbose_name=_('Extension'))  # noqa: E501, E221
+    features     = models.IntegerField(default=0, verbose_name=_('Features'))                                                                                             # noqa: E501, E221
+    edits        = models.IntegerField(default=1, verbose_name=_('Edits'))                                                                                                # noqa: E501, E221
+    requested    = models.DateTimeField(default=timezone.now, db_index=True, verbose_name=_('Requested'))                                                                 # noqa: E501, E221
+    claimed      = models.DateTimeField(blank=True, null=True, verbose_name=_('Claimed'))                                                                                 # noqa: E501, E221
+
+    class Meta:
+        verbose_name_plural = 'Feature Sync Queue'
+        db_table = 'pbx_feature_sync_queue'
+
+    def __str__(self):
+        return str(self.extension_id_id)
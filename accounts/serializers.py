@@ -28,12 +28,13 @@
 #
 
 from rest_framework import serializers
+from pbx.restpbxhelpers import SparseFieldsMixin
 from .models import (
     Extension, FollowMeDestination, Gateway, Bridge,
 )
 
 
-class ExtensionSerializer(serializers.ModelSerializer):
+class ExtensionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Extension
         fields = [
@@ -96,7 +97,7 @@ class ExtensionSerializer(serializers.ModelSerializer):
                     'created', 'updated', 'synchronised', 'updated_by']
 
 
-class FollowMeDestinationSerializer(serializers.ModelSerializer):
+class FollowMeDestinationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = FollowMeDestination
         read_only_fields = ['created', 'updated', 'synchronised', 'updated_by']
@@ -106,7 +107,7 @@ class FollowMeDestinationSerializer(serializers.ModelSerializer):
                 ]
 
 
-class GatewaySerializer(serializers.ModelSerializer):
+class GatewaySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Gateway
         read_only_fields = ['created', 'updated', 'synchronised', 'updated_by']
@@ -146,7 +147,7 @@ class GatewaySerializer(serializers.ModelSerializer):
                 ]
 
 
-class BridgeSerializer(serializers.ModelSerializer):
+class BridgeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Bridge
         read_only_fields = ['created', 'updated', 'synchronised', 'updated_by']
@@ -27,6 +27,132 @@
 #    Adrian Fretwell <adrian@djangopbx.com>
 #
 
-# from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from tenants.models import Domain, DefaultSetting
+from .models import Extension, FeatureSyncChoice, FeatureSyncQueue
+from .extensionfunctions import ExtFeatureSyncQueue
 
-# Create your tests here.
+
+class FakeEventSocket():
+    # Answers registration lookups for every user as a registered Yealink phone and
+    #  records the feature events sent, on_event() is called with each one.
+    def __init__(self, on_event=None):
+        self.events = []
+        self.lookups = 0
+        self.responses = []
+        self.on_event = on_event
+
+    def connect(self):
+        return True
+
+    def clear_responses(self):
+        self.responses = []
+
+    def send(self, cmd):
+        if cmd.startswith('api sofia_contact'):
+            self.lookups += 1
+            self.responses.append('sofia/internal/sip:%s;fs_nat=yes' % cmd.split('/', 1)[1])
+        elif cmd.startswith('api sofia status'):
+            lines = ['', 'Registrations:', '=' * 60] + ['Key%d: v' % i for i in range(4)]
+            lines += ['Agent: Yealink SIP-T46S 66.86.0.15'] + ['Key%d: v' % i for i in range(4, 12)] + ['=' * 60]
+            self.responses.append('\n'.join(lines))
+        elif cmd.startswith('sendevent'):
+            event = dict(line.split(': ', 1) for line in cmd.splitlines()[1:])
+            self.events.append(event)
+            self.responses.append('+OK')
+            if self.on_event:
+                self.on_event(event)
+
+    def process_events(self):
+        pass
+
+    def get_responses(self):
+        return True
+
+    def disconnect(self):
+        pass
+
+
+class FeatureSyncTestCase(TestCase):
+    edits = 1000
+
+    def setUp(self):
+        cache.clear()
+        DefaultSetting.objects.create(
+            category='provision', subcategory='yealink_feature_key_sync', value_type='boolean', value='1',
+            enabled='true'
+            )
+        self.domain = Domain.objects.create(name='fs.example.com', enabled='true')
+        self.exts = Extension.objects.bulk_create([
+            Extension(domain_id=self.domain, extension=str(2000 + i), user_context=self.domain.name, password='p')
+            for i in range(50)
+            ])
+
+    def toggle_dnd(self, fsq, count):
+        for i in range(count):
+            e = self.exts[i % len(self.exts)]
+            e.do_not_disturb = 'false' if e.do_not_disturb == 'true' else 'true'
+            e.save()
+            fsq.enqueue(e, FeatureSyncChoice.CDND)
+
+    def sent_dnd(self, es):
+        return {e['user']: e['DoNotDisturbOn'] for e in es.events}
+
+    def current_dnd(self, extensions=None):
+        qs = Extension.objects.filter(domain_id=self.domain)
+        if extensions:
+            qs = qs.filter(extension__in=extensions)
+        return dict(qs.values_list('extension', 'do_not_disturb'))
+
+    def test_inline_without_queue(self):
+        fsq = ExtFeatureSyncQueue()
+        fsq.es = FakeEventSocket()
+        self.toggle_dnd(fsq, 100)
+        self.assertEqual(len(fsq.es.events), 100)
+        self.assertEqual(fsq.es.lookups, 50)
+        self.assertEqual(self.sent_dnd(fsq.es), self.current_dnd())
+        self.assertFalse(FeatureSyncQueue.objects.exists())
+
+    @override_settings(PBX_FEATURE_SYNC_USE_QUEUE=True)
+    def test_burst_is_coalesced(self):
+        fsq = ExtFeatureSyncQueue(batch_size=20, delay=0)
+        fsq.es = FakeEventSocket()
+        self.toggle_dnd(fsq, len(self.exts))
+        # Once queued, each further edit is the extension save and one queue update.
+        with self.assertNumQueries(2 * (self.edits - len(self.exts))):
+            self.toggle_dnd(fsq, self.edits - len(self.exts))
+        self.assertEqual(fsq.es.events, [])
+        self.assertEqual(FeatureSyncQueue.objects.count(), 50)
+        self.assertEqual(sum(FeatureSyncQueue.objects.values_list('edits', flat=True)), self.edits)
+
+        processed = 0
+        while True:
+            count = fsq.process_batch()
+            if not count:
+                break
+            processed += count
+        self.assertEqual(processed, 50)
+        self.assertEqual(len(fsq.es.events), 50)
+        self.assertEqual(fsq.es.lookups, 50)
+        self.assertEqual(self.sent_dnd(fsq.es), self.current_dnd())
+        self.assertFalse(FeatureSyncQueue.objects.exists())
+
+    @override_settings(PBX_FEATURE_SYNC_USE_QUEUE=True)
+    def test_edit_while_sending_is_kept(self):
+        fsq = ExtFeatureSyncQueue(delay=0)
+        edited = []
+
+        def edit_again(event):
+            if not edited:
+                edited.append(event['user'])
+                self.toggle_dnd(fsq, 1)
+
+        fsq.es = FakeEventSocket(edit_again)
+        self.toggle_dnd(fsq, 1)
+        self.assertEqual(fsq.process_batch(), 1)
+        self.assertEqual(FeatureSyncQueue.objects.filter(claimed__isnull=True).count(), 1)
+        self.assertEqual(fsq.process_batch(), 1)
+        self.assertEqual(len(fsq.es.events), 2)
+        self.assertEqual(self.sent_dnd(fsq.es), self.current_dnd(edited))
+        self.assertFalse(FeatureSyncQueue.objects.exists())
@@ -48,12 +48,12 @@ from pbx.restpermissions import (
 )
 from tenants.models import Domain
 from .models import (
-    Extension, FollowMeDestination, Gateway, Bridge,
+    Extension, FollowMeDestination, Gateway, Bridge, FeatureSyncChoice,
 )
 from .serializers import (
     ExtensionSerializer, FollowMeDestinationSerializer, GatewaySerializer, BridgeSerializer,
 )
-from .extensionfunctions import ExtFeatureSyncFunctions
+from .extensionfunctions import ExtFeatureSyncQueue
 from voicemail.voicemailfunctions import VoicemailFunctions
 
 
@@ -255,18 +255,14 @@ class CallRoutingEdit(LoginRequiredMixin, UpdateView):
         followme_formset.instance = self.object
         followme_formset.instance.updated_by = self.request.user.username
         followme_formset.save()
-        efsf = ExtFeatureSyncFunctions(self.object)
-        efsf.sync_dnd()
-        efsf.es_disconnect()
-        # Uncomment as required below if you have any of the following
-        # feature on/off codes programmed in your phones.
-        # If you exclusively use TCP transport and have concern about exceeding your MTU
-        # You may also opt for using efsf.sync_all()
+        ExtFeatureSyncQueue().enqueue(self.object, FeatureSyncChoice.CDND)
+        # Add as required below if you have any of the following
+        # feature on/off codes programmed in your phones, eg.
+        # FeatureSyncChoice.CDND | FeatureSyncChoice.CFWDIMMEDIATE
         #
-        #efsf.sync_fwd_immediate()
-        #efsf.sync_fwd_busy()
-        #efsf.sync_fwd_no_answer()
-        #efsf.sync_all()
+        #FeatureSyncChoice.CFWDIMMEDIATE
+        #FeatureSyncChoice.CFWDBUSY
+        #FeatureSyncChoice.CFWDNOANSWER
         return HttpResponseRedirect(self.get_success_url())
 
     def get_form(self, *args, **kwargs):
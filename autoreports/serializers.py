@@ -28,12 +28,13 @@
 #
 
 from rest_framework import serializers
+from pbx.restpbxhelpers import SparseFieldsMixin
 from .models import (
     AutoReports, AutoReportSections
 )
 
 
-class AutoReportsSerializer(serializers.ModelSerializer):
+class AutoReportsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = AutoReports
@@ -46,7 +47,7 @@ class AutoReportsSerializer(serializers.ModelSerializer):
                 ]
 
 
-class AutoReportSectionsSerializer(serializers.ModelSerializer):
+class AutoReportSectionsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = AutoReportSections
@@ -28,12 +28,13 @@
 #
 
 from rest_framework import serializers
+from pbx.restpbxhelpers import SparseFieldsMixin
 from .models import (
     CallBlock
 )
 
 
-class CallBlockSerializer(serializers.ModelSerializer):
+class CallBlockSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = CallBlock
@@ -27,7 +27,6 @@
 #    Adrian Fretwell <adrian@djangopbx.com>
 #
 
-from time import sleep
 from django.contrib import admin
 from django.utils.translation import gettext_lazy as _
 from django.contrib import messages
@@ -36,7 +35,7 @@ from django.http import HttpResponseRedirect
 
 from .models import (
     CallCentreAgents, CallCentreQueues, CallCentreTiers,
-    CallCentreAgentStatusLog, get_agent_contact
+    CallCentreAgentStatusLog
 )
 from dialplans.models import Dialplan
 from tenants.models import Profile
@@ -52,6 +51,7 @@ from pbx.commonfunctions import DomainFilter, DomainUtils
 from pbx.commondestination import CommonDestAction
 from pbx.fscmdabslayer import FsCmdAbsLayer
 from .callcentrefunctions import CcFunctions
+from .callcentresync import CcDeltaSync
 
 
 class CallCentreTiersResource(resources.ModelResource):
@@ -84,63 +84,15 @@ class CallCentreTiersAdmin(ImportExportModelAdmin):
     def save_model(self, request, obj, form, change):
         obj.updated_by = request.user.username
         super().save_model(request, obj, form, change)
-        self.fire_fs_events(obj, change)
+        CcDeltaSync().sync()
 
     def delete_model(self, request, obj):
-        self.fire_fs_events(obj, False, True)
         super().delete_model(request, obj)
+        CcDeltaSync().sync()
 
     def delete_queryset(self, request, queryset):
-        for obj in queryset:
-            self.fire_fs_events(obj, False, True)
         super().delete_queryset(request, queryset)
-
-    def fire_fs_events(self, obj, change, delete=False):
-        ret = True
-        s = 0.0001
-        es = FsCmdAbsLayer()
-        if not es.connect():
-            return False
-
-        if delete:
-            # delete the tier
-            cmd = 'api callcenter_config tier del %s %s' % (str(obj.queue_id.id), str(obj.agent_id.id))
-            es.clear_responses()
-            es.send(cmd)
-            es.process_events()
-            ret = es.get_responses()
-            es.disconnect()
-            return ret
-
-        if not change:
-            # add the tier
-            cmd = 'api callcenter_config tier add %s %s %s %s' % (str(obj.queue_id.id), str(obj.agent_id.id), str(obj.tier_level), str(obj.tier_position))
-            es.clear_responses()
-            es.send(cmd)
-            es.process_events()
-            if not es.get_responses():
-                ret = False
-            sleep(s)
-
-        # tier set level
-        cmd = 'api callcenter_config tier set level %s %s %s' % (str(obj.queue_id.id), str(obj.agent_id.id), str(obj.tier_level))
-        es.clear_responses()
-        es.send(cmd)
-        es.process_events()
-        if not es.get_responses():
-            ret = False
-        sleep(s)
-
-        # tier set position
-        cmd = 'api callcenter_config tier set position %s %s %s' % (str(obj.queue_id.id), str(obj.agent_id.id), str(obj.tier_position))
-        es.clear_responses()
-        es.send(cmd)
-        es.process_events()
-        if not es.get_responses():
-            ret = False
-        es.disconnect()
-        sleep(s)
-        return ret
+        CcDeltaSync().sync()
 
 
 class CallCentreTiersInLine(admin.TabularInline):
@@ -213,110 +165,18 @@ class CallCentreAgentsAdmin(ImportExportModelAdmin):
         if not change:
             obj.domain_id = DomainUtils().domain_from_session(request)
         super().save_model(request, obj, form, change)
-        if self.fire_fs_events(obj, change):
+        ccs = CcDeltaSync()
+        ccs.sync()
+        if ccs.commands_sent:
             self.message_user(request, "Callentre Configuration Updated")
 
     def delete_model(self, request, obj):
-        self.fire_fs_events(obj, False, True)
         super().delete_model(request, obj)
+        CcDeltaSync().sync()
 
     def delete_queryset(self, request, queryset):
-        for obj in queryset:
-            self.fire_fs_events(obj, False, True)
         super().delete_queryset(request, queryset)
-
-    def fire_fs_events(self, obj, change, delete=False):
-        ret = True
-        s = 0.0001
-        es = FsCmdAbsLayer()
-        if not es.connect():
-            return False
-
-        if delete:
-            # delete the agent
-            cmd = 'api callcenter_config agent del %s' % str(obj.id)
-            es.clear_responses()
-            es.send(cmd)
-            es.process_events()
-            ret = es.get_responses()
-            es.disconnect()
-            return ret
-
-        if not change:
-            # add the agent
-            cmd = 'api callcenter_config agent add %s %s' % (str(obj.id), obj.agent_type)
-            es.clear_responses()
-            es.send(cmd)
-            es.process_events()
-            if not es.get_responses():
-                ret = False
-            sleep(s)
-
-        # agent set contact
-        cmd = 'api callcenter_config agent set contact %s %s' % (str(obj.id), get_agent_contact(obj))
-        es.clear_responses()
-        es.send(cmd)
-        es.process_events()
-        if not es.get_responses():
-            ret = False
-        sleep(s)
-
-        # agent set status
-        if obj.status:
-            es.clear_responses()
-            cmd = 'api callcenter_config agent set status %s %s' % (str(obj.id), obj.status)
-            es.send(cmd)
-            es.process_events()
-            if not es.get_responses():
-                ret = False
-            sleep(s)
-
-        # agent set reject delay time
-        cmd = 'api callcenter_config agent set reject_delay_time %s %s' % (str(obj.id), str(obj.reject_delay_time))
-        es.clear_responses()
-        es.send(cmd)
-        es.process_events()
-        if not es.get_responses():
-            ret = False
-        sleep(s)
-
-        # agent set busy delay time
-        cmd = 'api callcenter_config agent set busy_delay_time %s %s' % (str(obj.id), str(obj.busy_delay_time))
-        es.clear_responses()
-        es.send(cmd)
-        es.process_events()
-        if not es.get_responses():
-            ret = False
-        sleep(s)
-
-        # agent set no answer delay time
-        cmd = 'api callcenter_config agent set no_answer_delay_time %s %s' % (str(obj.id), str(obj.no_answer_delay_time))
-        es.clear_responses()
-        es.send(cmd)
-        es.process_events()
-        if not es.get_responses():
-            ret = False
-        sleep(s)
-
-        # agent set max no answer
-        cmd = 'api callcenter_config agent set max_no_answer %s %s' % (str(obj.id), str(obj.max_no_answer))
-        es.clear_responses()
-        es.send(cmd)
-        es.process_events()
-        if not es.get_responses():
-            ret = False
-        sleep(s)
-
-        # agent set wrap up time
-        cmd = 'api callcenter_config agent set wrap_up_time %s %s' % (str(obj.id), str(obj.wrap_up_time))
-        es.clear_responses()
-        es.send(cmd)
-        es.process_events()
-        if not es.get_responses():
-            ret = False
-        es.disconnect()
-        sleep(s)
-        return ret
+        CcDeltaSync().sync()
 
 
 class CallCentreQueuesResource(resources.ModelResource):
@@ -422,13 +282,12 @@ class CallCentreQueuesAdmin(ImportExportModelAdmin):
     def save_formset(self, request, form, formset, change):
         instances = formset.save(commit=False)
         for obj in formset.deleted_objects:
-            self.fire_fs_tier_events(obj, change, delete=True)
             obj.delete()
         for instance in instances:
             instance.updated_by = request.user.username
             instance.save()
-            self.fire_fs_tier_events(instance, change)
         formset.save_m2m()
+        CcDeltaSync().sync()
 
     def save_model(self, request, obj, form, change):
         obj.updated_by = request.user.username
@@ -469,66 +328,17 @@ class CallCentreQueuesAdmin(ImportExportModelAdmin):
     def delete_model(self, request, obj):
         if obj.dialplan_id:
             Dialplan.objects.get(pk=obj.dialplan_id).delete()
-            self.fire_fs_tier_events(obj, True, True)
             self.fire_fs_queue_events(obj, True, True)
         super().delete_model(request, obj)
+        CcDeltaSync().sync()
 
     def delete_queryset(self, request, queryset):
         for obj in queryset:
             if obj.dialplan_id:
                 Dialplan.objects.get(pk=obj.dialplan_id).delete()
-                self.fire_fs_tier_events(obj, True, True)
                 self.fire_fs_queue_events(obj, True, True)
         super().delete_queryset(request, queryset)
-
-    def fire_fs_tier_events(self, obj, change, delete=False):
-        ret = True
-        s = 0.0001
-        es = FsCmdAbsLayer()
-        if not es.connect():
-            return False
-
-        if delete:
-            # delete the tier
-            cmd = 'api callcenter_config tier del %s %s' % (str(obj.queue_id.id), str(obj.agent_id.id))
-            es.clear_responses()
-            es.send(cmd)
-            es.process_events()
-            ret = es.get_responses()
-            es.disconnect()
-            return ret
-
-        # add the tier
-        cmd = 'api callcenter_config tier add %s %s %s %s' % (str(obj.queue_id.id), str(obj.agent_id.id), str(obj.tier_level), str(obj.tier_position))
-        es.clear_responses()
-        es.send(cmd)
-        es.process_events()
-        es.get_responses()
-        for resp in es.responses:
-            if not '-ERR Tier already exist' in resp:
-                if '-ERR' in result:
-                    ret = False
-        sleep(s)
-
-        # tier set level
-        cmd = 'api callcenter_config tier set level %s %s %s' % (str(obj.queue_id.id), str(obj.agent_id.id), str(obj.tier_level))
-        es.clear_responses()
-        es.send(cmd)
-        es.process_events()
-        if not es.get_responses():
-            ret = False
-        sleep(s)
-
-        # tier set position
-        cmd = 'api callcenter_config tier set position %s %s %s' % (str(obj.queue_id.id), str(obj.agent_id.id), str(obj.tier_position))
-        es.clear_responses()
-        es.send(cmd)
-        es.process_events()
-        if not es.get_responses():
-            ret = False
-        sleep(s)
-        es.disconnect()
-        return ret
+        CcDeltaSync().sync()
 
     def fire_fs_queue_events(self, obj, change, delete=False):
         ret = True
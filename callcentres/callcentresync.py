@@ -0,0 +1,149 @@
+#
+#    DjangoPBX
+#
+#    MIT License
+#
+#    Copyright (c) 2016 - 2024 Adrian Fretwell <adrian@djangopbx.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+#
+#    Contributor(s):
+#    Adrian Fretwell <adrian@djangopbx.com>
+#
+
+from pbx.fscmdabslayer import FsCmdAbsLayer
+from .models import CallCentreAgents, CallCentreTiers, CallCentreSyncState, get_agent_contact
+
+
+class CcDeltaSync():
+    # Brings mod_callcenter agents and tiers into line with the database by
+    #  emitting callcenter_config API commands for only the differences between
+    #  the database and the state last applied to the switches.
+    #  The applied state is kept in the database so that deletes survive a restart,
+    #  without it (a new install or --full) every agent and tier is added and set
+    #  again but nothing can be deleted.  Adding an agent or tier the switch already
+    #  has, or deleting one it does not, is not treated as a failure.
+
+    state_name = 'applied'
+    benign_errors = ('already exist', 'not found', 'does not exist')
+    agent_settings = (
+        'contact', 'status', 'reject_delay_time', 'busy_delay_time',
+        'no_answer_delay_time', 'max_no_answer', 'wrap_up_time'
+    )
+
+    def __init__(self, es=None, batch_size=100):
+        self.es = es
+        self.batch_size = batch_size
+        self.commands_sent = 0
+
+    def current_state(self):
+        agents = {}
+        for cca in CallCentreAgents.objects.select_related('domain_id'):
+            agents[str(cca.id)] = {
+                'type': cca.agent_type,
+                'contact': get_agent_contact(cca),
+                'status': cca.status,
+                'reject_delay_time': str(cca.reject_delay_time),
+                'busy_delay_time': str(cca.busy_delay_time),
+                'no_answer_delay_time': str(cca.no_answer_delay_time),
+                'max_no_answer': str(cca.max_no_answer),
+                'wrap_up_time': str(cca.wrap_up_time),
+            }
+        tiers = {}
+        for queue_id, agent_id, level, position in CallCentreTiers.objects.values_list(
+                'queue_id', 'agent_id', 'tier_level', 'tier_position'):
+            tiers['%s %s' % (queue_id, agent_id)] = {'level': str(level), 'position': str(position)}
+        return {'agents': agents, 'tiers': tiers}
+
+    def applied_state(self):
+        return CallCentreSyncState.objects.filter(name=self.state_name).values_list('state', flat=True).first()
+
+    def store(self, state):
+        CallCentreSyncState.objects.update_or_create(name=self.state_name, defaults={'state': state})
+
+    def agent_set(self, agent_id, name, value):
+        if name == 'status':
+            return "api callcenter_config agent set status %s '%s'" % (agent_id, value)
+        return 'api callcenter_config agent set %s %s %s' % (name, agent_id, value)
+
+    def diff(self, old, new):
+        if old is None:
+            old = {'agents': {}, 'tiers': {}}
+            can_delete = False
+        else:
+            can_delete = True
+        cmds = []
+        if can_delete:
+            for tier in sorted(old['tiers'].keys() - new['tiers'].keys()):
+                cmds.append('api callcenter_config tier del %s' % tier)
+            for agent_id in sorted(old['agents'].keys() - new['agents'].keys()):
+                cmds.append('api callcenter_config agent del %s' % agent_id)
+
+        for agent_id, a in new['agents'].items():
+            prev = old['agents'].get(agent_id)
+            if prev is None:
+                cmds.append('api callcenter_config agent add %s %s' % (agent_id, a['type']))
+                prev = {'type': a['type']}
+            elif prev['type'] != a['type']:
+                cmds.append('api callcenter_config agent set type %s %s' % (agent_id, a['type']))
+            for name in self.agent_settings:
+                if a[name] and a[name] != prev.get(name):
+                    cmds.append(self.agent_set(agent_id, name, a[name]))
+
+        for tier, t in new['tiers'].items():
+            prev = old['tiers'].get(tier)
+            if prev is None:
+                cmds.append('api callcenter_config tier add %s %s %s' % (tier, t['level'], t['position']))
+                continue
+            if prev['level'] != t['level']:
+                cmds.append('api callcenter_config tier set level %s %s' % (tier, t['level']))
+            if prev['position'] != t['position']:
+                cmds.append('api callcenter_config tier set position %s %s' % (tier, t['position']))
+        return cmds
+
+    def send(self, cmds):
+        es = self.es if self.es else FsCmdAbsLayer()
+        if not es.connect():
+            return False
+        ok = True
+        for i in range(0, len(cmds), self.batch_size):
+            es.clear_responses()
+            es.send_many(cmds[i:i + self.batch_size])
+            es.get_responses()
+            if self.failed(es.responses):
+                ok = False
+            self.commands_sent += len(cmds[i:i + self.batch_size])
+        es.disconnect()
+        return ok
+
+    def failed(self, responses):
+        for resp in responses:
+            if '-ERR' in resp and not any(e in resp for e in self.benign_errors):
+                return True
+        return False
+
+    def sync(self, full=False, dry_run=False):
+        new = self.current_state()
+        old = None if full else self.applied_state()
+        cmds = self.diff(old, new)
+        if dry_run or not cmds:
+            return cmds
+        if self.send(cmds):
+            self.store(new)
+        return cmds
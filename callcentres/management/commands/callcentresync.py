@@ -0,0 +1,50 @@
+#
+#    DjangoPBX
+#
+#    MIT License
+#
+#    Copyright (c) 2016 - 2024 Adrian Fretwell <adrian@djangopbx.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+#
+#    Contributor(s):
+#    Adrian Fretwell <adrian@djangopbx.com>
+#
+
+from django.core.management.base import BaseCommand
+
+from callcentres.callcentresync import CcDeltaSync
+
+
+class Command(BaseCommand):
+    help = 'Send call centre agent and tier changes to mod_callcenter'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Ignore the applied state and add and set everything')
+        parser.add_argument('--dry-run', action='store_true', help='List the commands without sending them')
+        parser.add_argument('--batch-size', type=int, default=100, help='Commands per send')
+
+    def handle(self, *args, **kwargs):
+        ccs = CcDeltaSync(batch_size=kwargs['batch_size'])
+        cmds = ccs.sync(kwargs['full'], kwargs['dry_run'])
+        if kwargs['dry_run'] or kwargs['verbosity'] > 1:
+            for cmd in cmds:
+                self.stdout.write(cmd)
+        if kwargs['verbosity'] > 0:
+            self.stdout.write('%s commands, %s sent' % (len(cmds), ccs.commands_sent))
@@ -0,0 +1,25 @@
+# Generated by Django 5.0.1 on 2026-10-19 15:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('callcentres', '0004_alter_callcentrequeues_moh_sound'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CallCentreSyncState',
+            fields=[
+                ('name', models.CharField(max_length=32, primary_key=True, serialize=False, verbose_name='Name')),
+                ('state', models.JSONField(default=dict, verbose_name='State')),
+                ('updated', models.DateTimeField(auto_now=True, null=True, blank=True, verbose_name='Updated')),
+            ],
+            options={
+                'verbose_name_plural': 'Call Centre Sync State',
+                'db_table': 'pbx_cc_sync_state',
+            },
+        ),
+    ]
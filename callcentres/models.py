@@ -195,3 +195,16 @@ class CallCentreAgentStatusLog(models.Model):
 
     def __str__(self):
         return str(self.id)
+
+
+class CallCentreSyncState(models.Model):
+    name          = models.CharField(primary_key=True, max_length=32, verbose_name=_('Name'))                                   # noqa: E501, E221
+    state         = models.JSONField(default=dict, verbose_name=_('State'))                                                    # noqa: E501, E221
+    updated       = models.DateTimeField(auto_now=True, blank=True, null=True, verbose_name=_('Updated'))                      # noqa: E501, E221
+
+    class Meta:
+        verbose_name_plural = 'Call Centre Sync State'
+        db_table = 'pbx_cc_sync_state'
+
+    def __str__(self):
+        return self.name
@@ -28,12 +28,13 @@
 #
 
 from rest_framework import serializers
+from pbx.restpbxhelpers import SparseFieldsMixin
 from .models import (
     CallCentreQueues, CallCentreAgents, CallCentreTiers
 )
 
 
-class CallCentreQueuesSerializer(serializers.ModelSerializer):
+class CallCentreQueuesSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     gen_xml = serializers.HyperlinkedIdentityField(view_name='callcentrequeues-generate-xml')
     class Meta:
@@ -71,7 +72,7 @@ class CallCentreQueuesSerializer(serializers.ModelSerializer):
                 ]
 
 
-class CallCentreAgentsSerializer(serializers.ModelSerializer):
+class CallCentreAgentsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = CallCentreAgents
@@ -85,7 +86,7 @@ class CallCentreAgentsSerializer(serializers.ModelSerializer):
                 ]
 
 
-class CallCentreTiersSerializer(serializers.ModelSerializer):
+class CallCentreTiersSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = CallCentreTiers
@@ -27,6 +27,114 @@
 #    Adrian Fretwell <adrian@djangopbx.com>
 #
 
+from django.core.cache import cache
 from django.test import TestCase
+from tenants.models import Domain
+from .models import CallCentreQueues, CallCentreAgents, CallCentreTiers
+from .callcentresync import CcDeltaSync
 
-# Create your tests here.
+
+class FakeSink():
+    # Records the command stream in place of the switches, replies are given by reply().
+    def __init__(self, reply=None):
+        self.stream = []
+        self.batches = 0
+        self.responses = []
+        self.reply = reply if reply else (lambda cmd: '+OK')
+
+    def connect(self):
+        return True
+
+    def clear_responses(self):
+        self.responses = []
+
+    def send_many(self, payloads, host=None, timeout=5):
+        self.stream.extend(payloads)
+        self.responses.extend([self.reply(p) for p in payloads])
+        self.batches += 1
+
+    def get_responses(self):
+        return True
+
+    def disconnect(self):
+        pass
+
+
+class CcDeltaSyncTestCase(TestCase):
+    # agent add and seven settings per agent, one tier add per agent
+    initial_commands = 9
+
+    def setUp(self):
+        cache.clear()
+        self.domain = Domain.objects.create(name='cc.test', enabled='true')
+        self.queues = CallCentreQueues.objects.bulk_create([
+            CallCentreQueues(domain_id=self.domain, name='q%s' % i, extension=str(5000 + i), moh_sound='x')
+            for i in range(5)
+            ])
+        self.agents = CallCentreAgents.objects.bulk_create([
+            CallCentreAgents(
+                domain_id=self.domain, name='a%03d' % i, contact='user/%s' % (100 + i), status='Available'
+                ) for i in range(50)
+            ])
+        CallCentreTiers.objects.bulk_create([
+            CallCentreTiers(queue_id=self.queues[i % 5], agent_id=a) for i, a in enumerate(self.agents)
+            ])
+
+    def sync(self, sink=None, **kwargs):
+        sink = sink if sink else FakeSink()
+        CcDeltaSync(sink, batch_size=20).sync(**kwargs)
+        return sink
+
+    def test_deltas(self):
+        sink = self.sync()
+        self.assertEqual(len(sink.stream), 50 * self.initial_commands)
+        self.assertEqual(sink.batches, 23)
+        self.assertEqual(self.sync().stream, [])
+
+        a = self.agents[7]
+        a.status = 'On Break'
+        a.save()
+        self.assertEqual(self.sync().stream, ["api callcenter_config agent set status %s 'On Break'" % a.id])
+
+        t = CallCentreTiers.objects.get(agent_id=self.agents[3])
+        t.tier_level = 2
+        t.save()
+        self.assertEqual(
+            self.sync().stream, ['api callcenter_config tier set level %s %s 2' % (t.queue_id_id, t.agent_id_id)]
+            )
+
+    def test_delete_after_restart(self):
+        self.sync()
+        # The applied state is held in the database, so a lost cache does not stop deletes.
+        cache.clear()
+        agent_id = self.agents[9].id
+        queue_id = CallCentreTiers.objects.get(agent_id=agent_id).queue_id_id
+        self.agents[9].delete()
+        self.assertEqual(self.sync().stream, [
+            'api callcenter_config tier del %s %s' % (queue_id, agent_id),
+            'api callcenter_config agent del %s' % agent_id,
+            ])
+
+    def test_already_exist_is_success(self):
+        def reply(cmd):
+            if ' add ' in cmd:
+                return '-ERR Agent already exist!'
+            return '+OK'
+        sink = self.sync(FakeSink(reply))
+        self.assertEqual(len(sink.stream), 50 * self.initial_commands)
+        # The state was stored, so nothing is resent.
+        self.assertEqual(self.sync().stream, [])
+
+    def test_failed_send_is_retried(self):
+        def reply(cmd):
+            if 'set contact' in cmd:
+                return '-ERR Invalid Agent!'
+            return '+OK'
+        self.sync(FakeSink(reply))
+        self.assertEqual(len(self.sync().stream), 50 * self.initial_commands)
+        self.assertEqual(self.sync().stream, [])
+
+    def test_full_and_dry_run(self):
+        self.sync()
+        self.assertEqual(len(CcDeltaSync(FakeSink()).sync(full=True, dry_run=True)), 50 * self.initial_commands)
+        self.assertEqual(self.sync().stream, [])
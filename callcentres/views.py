@@ -50,6 +50,7 @@ from django.utils.translation import gettext_lazy as _
 from utilities.clearcache import ClearCache
 from tenants.pbxsettings import PbxSettings
 from .callcentrefunctions import CcFunctions
+from .callcentresync import CcDeltaSync
 
 from pbx.restpermissions import (
     AdminApiAccessPermission
@@ -128,9 +129,15 @@ class CallCentreAgentsViewSet(viewsets.ModelViewSet):
 
     def perform_update(self, serializer):
         serializer.save(updated_by=self.request.user.username)
+        CcDeltaSync().sync()
 
     def perform_create(self, serializer):
         serializer.save(updated_by=self.request.user.username)
+        CcDeltaSync().sync()
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        CcDeltaSync().sync()
 
 
 class CallCentreTiersViewSet(viewsets.ModelViewSet):
@@ -148,9 +155,15 @@ class CallCentreTiersViewSet(viewsets.ModelViewSet):
 
     def perform_update(self, serializer):
         serializer.save(updated_by=self.request.user.username)
+        CcDeltaSync().sync()
 
     def perform_create(self, serializer):
         serializer.save(updated_by=self.request.user.username)
+        CcDeltaSync().sync()
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        CcDeltaSync().sync()
 
 
 class CcQueueListList(Table):
@@ -28,6 +28,7 @@
 #
 
 from django.apps import AppConfig
+from django.db.models.signals import post_save
 from django.utils.translation import gettext_lazy as _
 
 
@@ -42,3 +43,11 @@ class CallflowsConfig(AppConfig):
     pbx_license = 'MIT License'
     pbx_dialplan = True
     pbx_dialplan_category = 'Call flow'
+
+    def ready(self):
+        from . import signals
+        from .models import CallFlows
+        post_save.connect(
+            signals.callflow_saved,
+            sender=CallFlows, weak=False, dispatch_uid="callflows:CallFlows:save"
+            )
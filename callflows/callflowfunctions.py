@@ -38,6 +38,7 @@ class CfFunctions():
     def __init__(self, cf=None, user_name='system'):
         self.cf = cf
         self.user_name = user_name
+        self.dp = None
 
     def add_dialplan(self):
         dp = Dialplan.objects.create(
@@ -93,4 +94,5 @@ class CfFunctions():
         xml = str(etree.tostring(x_root), "utf-8").replace('&lt;', '<').replace('&gt;', '>')
         dp.xml = xml
         dp.save()
+        self.dp = dp
         return dp.id
@@ -0,0 +1,149 @@
+#
+#    DjangoPBX
+#
+#    MIT License
+#
+#    Copyright (c) 2016 - 2024 Adrian Fretwell <adrian@djangopbx.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+#
+#    Contributor(s):
+#    Adrian Fretwell <adrian@djangopbx.com>
+#
+
+import time
+import uuid
+from django.core.cache import cache
+from django.utils import timezone
+from pbx.fscmdabslayer import FsCmdAbsLayer
+from dialplans.models import Dialplan
+from .models import CallFlows
+from .callflowfunctions import CfFunctions
+
+
+class CallFlowState():
+    # Day/night state of call flows.  A toggle holds a per flow lock in the cache so that
+    #  concurrent toggles of the same flow are applied one after another and none is lost,
+    #  the new state is written to the database and the cache while the lock is held.
+    #  Rather than dropping the whole dialplan:<domain> entry, the flow's own extension is
+    #  replaced in the cached context so the rest of it stays warm.
+
+    state_timeout = 86400
+    lock_timeout = 10
+    lock_wait = 5.0
+
+    def state_key(self, cf_id):
+        return 'callflow:status:%s' % cf_id
+
+    def acquire(self, key):
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.lock_wait
+        while not cache.add(key, token, self.lock_timeout):
+            if time.monotonic() > deadline:
+                return None
+            time.sleep(0.005)
+        return token
+
+    def release(self, key, token):
+        if cache.get(key) == token:
+            cache.delete(key)
+
+    def store(self, cf_id, status):
+        cache.set(self.state_key(cf_id), status, self.state_timeout)
+
+    def get_many(self, flows):
+        # flows is a list of (id, status) pairs as read from the database, the cached
+        #  state wins where there is one.
+        cached = cache.get_many([self.state_key(cf_id) for cf_id, status in flows])
+        return {cf_id: cached.get(self.state_key(cf_id), status) for cf_id, status in flows}
+
+    def toggle(self, cf_id, user_name='system'):
+        lock_key = 'callflow:lock:%s' % cf_id
+        token = self.acquire(lock_key)
+        if not token:
+            return None
+        try:
+            try:
+                cf = CallFlows.objects.select_related('domain_id').get(pk=cf_id)
+            except CallFlows.DoesNotExist:
+                return None
+            cf.status = 'false' if cf.status == 'true' else 'true'
+            CallFlows.objects.filter(pk=cf.id).update(status=cf.status, updated=timezone.now(), updated_by=user_name)
+            self.store(cf.id, cf.status)
+            self.update_dialplan(cf, user_name)
+        finally:
+            self.release(lock_key, token)
+        return cf
+
+    def update_dialplan(self, cf, user_name):
+        old_xml = Dialplan.objects.filter(pk=cf.dialplan_id).values_list('xml', flat=True).first()
+        cff = CfFunctions(cf, user_name)
+        dp_id = cff.generate_xml()
+        if dp_id != cf.dialplan_id:
+            CallFlows.objects.filter(pk=cf.id).update(dialplan_id=dp_id)
+            cf.dialplan_id = dp_id
+        if not cf.domain_id:
+            return
+
+        dialplan_cache_key = 'dialplan:%s' % cf.domain_id.name
+        lock_key = 'dialplan:lock:%s' % cf.domain_id.name
+        token = self.acquire(lock_key)
+        try:
+            xml = cache.get(dialplan_cache_key)
+            if not xml:
+                return
+            if token and old_xml and old_xml in xml:
+                cache.set(dialplan_cache_key, xml.replace(old_xml, cff.dp.xml))
+            else:
+                cache.delete(dialplan_cache_key)
+        finally:
+            if token:
+                self.release(lock_key, token)
+
+
+class CallFlowPresence():
+    # Collects call flow presence updates and sends them to the switches as
+    #  luarun callflow_presence.lua commands of up to chunk_size flows each.
+
+    def __init__(self, chunk_size=100):
+        self.chunk_size = chunk_size
+        self.pending = {}
+        self.payloads_sent = 0
+
+    def add(self, cf_id, feature_code, domain_name, status):
+        self.pending['%s@%s' % (feature_code, domain_name)] = (cf_id, status)
+
+    def flush(self, host=None):
+        if not self.pending:
+            return 0
+        items = ['%s:%s:%s' % (cf_id, user_id, status) for user_id, (cf_id, status) in self.pending.items()]
+        payloads = [
+            'api luarun callflow_presence.lua %s' % ' '.join(items[i:i + self.chunk_size])
+            for i in range(0, len(items), self.chunk_size)
+            ]
+        es = FsCmdAbsLayer()
+        if not es.connect():
+            return 0
+        es.clear_responses()
+        es.send_many(payloads, host)
+        es.get_responses()
+        es.disconnect()
+        self.payloads_sent += len(payloads)
+        self.pending = {}
+        return len(payloads)
@@ -0,0 +1,53 @@
+#
+#    DjangoPBX
+#
+#    MIT License
+#
+#    Copyright (c) 2016 - 2024 Adrian Fretwell <adrian@djangopbx.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+#
+#    Contributor(s):
+#    Adrian Fretwell <adrian@djangopbx.com>
+#
+
+from django.core.management.base import BaseCommand
+from django.db.models.functions import Coalesce
+
+from callflows.models import CallFlows
+from callflows.callflowstate import CallFlowState, CallFlowPresence
+
+
+class Command(BaseCommand):
+    help = 'Send call flow presence (BLF) state to the switches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=100, help='Call flows per luarun command')
+
+    def handle(self, *args, **kwargs):
+        flows = list(CallFlows.objects.annotate(
+            domain_name=Coalesce('context', 'domain_id__name')
+            ).values_list('id', 'feature_code', 'domain_name', 'status'))
+        states = CallFlowState().get_many([(f[0], f[3]) for f in flows])
+        cfp = CallFlowPresence(kwargs['chunk_size'])
+        for cf_id, feature_code, domain_name, status in flows:
+            cfp.add(str(cf_id), feature_code, domain_name, states[cf_id])
+        sent = cfp.flush()
+        if kwargs['verbosity'] > 1:
+            self.stdout.write('%s call flows in %s commands' % (len(flows), sent))
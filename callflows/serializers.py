@@ -28,12 +28,13 @@
 #
 
 from rest_framework import serializers
+from pbx.restpbxhelpers import SparseFieldsMixin
 from .models import (
     CallFlows
 )
 
 
-class CallFlowsSerializer(serializers.ModelSerializer):
+class CallFlowsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     gen_xml = serializers.HyperlinkedIdentityField(view_name='callflows-generatexml')
     class Meta:
@@ -27,6 +27,72 @@
 #    Adrian Fretwell <adrian@djangopbx.com>
 #
 
-from django.test import TestCase
+from concurrent.futures import ThreadPoolExecutor
+from django.core.cache import cache
+from django.db import connection
+from django.test import TransactionTestCase
+from tenants.models import Domain
+from xmlhandler.xmlhandlerclasses import DialplanHandler
+from .models import CallFlows
+from .callflowfunctions import CfFunctions
+from .callflowstate import CallFlowState
 
-# Create your tests here.
+
+class CallFlowToggleTestCase(TransactionTestCase):
+    toggles = 1000
+
+    def setUp(self):
+        cache.clear()
+        self.domain = Domain.objects.create(name='cfa.test', enabled='true')
+        self.other_domain = Domain.objects.create(name='cfb.test', enabled='true')
+        # SQLite locks whole tables, so there toggles for a single flow are raced,
+        #  which the per flow lock serialises including all database work.
+        flow_count = 1 if connection.vendor == 'sqlite' else 10
+        self.flows = [self.create_flow(self.domain, i) for i in range(flow_count)]
+        self.create_flow(self.other_domain, 99)
+
+    def create_flow(self, domain, i):
+        cf = CallFlows.objects.create(
+            domain_id=domain, name='cf%s' % i, extension=str(3000 + i), feature_code='*3%02d' % i, status='true',
+            data='transfer:100 XML %s' % domain.name, alternate_data='transfer:200 XML %s' % domain.name,
+            context=domain.name, updated_by='test'
+            )
+        cf.dialplan_id = CfFunctions(cf).generate_xml()
+        cf.save()
+        return cf
+
+    def toggle(self, cf_id):
+        cfs = CallFlowState()
+        cfs.lock_wait = 120.0
+        try:
+            cf = cfs.toggle(cf_id, 'test')
+            return (cf_id, cf.status if cf else None)
+        finally:
+            connection.close()
+
+    def test_concurrent_toggles(self):
+        DialplanHandler().GetDialplan(self.domain.name, None, '')
+        other_xml = DialplanHandler().GetDialplan(self.other_domain.name, None, '')
+        jobs = [self.flows[i % len(self.flows)].id for i in range(self.toggles)]
+        with ThreadPoolExecutor(16) as ex:
+            results = list(ex.map(self.toggle, jobs))
+
+        self.assertNotIn(None, [status for cf_id, status in results])
+        per_flow = self.toggles // len(self.flows)
+        for cf in self.flows:
+            statuses = [status for cf_id, status in results if cf_id == cf.id]
+            # Every toggle saw the state left by the one before, so half of them set each state.
+            self.assertEqual(statuses.count('true'), per_flow // 2)
+            self.assertEqual(statuses.count('false'), per_flow // 2)
+            cf.refresh_from_db()
+            self.assertEqual(cf.status, 'true')
+        self.assertEqual(
+            set(CallFlowState().get_many([(cf.id, None) for cf in self.flows]).values()), {'true'}
+            )
+
+        # The other domain is untouched and this domain's entry was patched rather than dropped.
+        self.assertEqual(cache.get('dialplan:%s' % self.other_domain.name), other_xml)
+        patched = cache.get('dialplan:%s' % self.domain.name)
+        self.assertIsNotNone(patched)
+        cache.delete('dialplan:%s' % self.domain.name)
+        self.assertEqual(DialplanHandler().GetDialplan(self.domain.name, None, ''), patched)
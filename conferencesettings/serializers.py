@@ -28,13 +28,14 @@
 #
 
 from rest_framework import serializers
+from pbx.restpbxhelpers import SparseFieldsMixin
 from .models import (
     ConferenceControls, ConferenceControlDetails, ConferenceProfiles, ConferenceProfileParams,
     ConferenceRoomUser, ConferenceRooms, ConferenceCentres, ConferenceSessions
 )
 
 
-class ConferenceControlsSerializer(serializers.ModelSerializer):
+class ConferenceControlsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = ConferenceControls
@@ -45,7 +46,7 @@ class ConferenceControlsSerializer(serializers.ModelSerializer):
                 ]
 
 
-class ConferenceControlDetailsSerializer(serializers.ModelSerializer):
+class ConferenceControlDetailsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = ConferenceControlDetails
@@ -56,7 +57,7 @@ class ConferenceControlDetailsSerializer(serializers.ModelSerializer):
                 ]
 
 
-class ConferenceProfilesSerializer(serializers.ModelSerializer):
+class ConferenceProfilesSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = ConferenceProfiles
@@ -67,7 +68,7 @@ class ConferenceProfilesSerializer(serializers.ModelSerializer):
                 ]
 
 
-class ConferenceProfileParamsSerializer(serializers.ModelSerializer):
+class ConferenceProfileParamsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = ConferenceProfileParams
@@ -78,7 +79,7 @@ class ConferenceProfileParamsSerializer(serializers.ModelSerializer):
                 ]
 
 
-class ConferenceCentresSerializer(serializers.ModelSerializer):
+class ConferenceCentresSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     gen_xml = serializers.HyperlinkedIdentityField(view_name='conferencecentres-generate-xml')
     class Meta:
@@ -91,7 +92,7 @@ class ConferenceCentresSerializer(serializers.ModelSerializer):
                 ]
 
 
-class ConferenceRoomsSerializer(serializers.ModelSerializer):
+class ConferenceRoomsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = ConferenceRooms
@@ -106,7 +107,7 @@ class ConferenceRoomsSerializer(serializers.ModelSerializer):
                 ]
 
 
-class ConferenceRoomUserSerializer(serializers.ModelSerializer):
+class ConferenceRoomUserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = ConferenceRoomUser
@@ -117,7 +118,7 @@ class ConferenceRoomUserSerializer(serializers.ModelSerializer):
                 ]
 
 
-class ConferenceSessionsSerializer(serializers.ModelSerializer):
+class ConferenceSessionsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = ConferenceSessions
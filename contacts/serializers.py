@@ -28,13 +28,14 @@
 #
 
 from rest_framework import serializers
+from pbx.restpbxhelpers import SparseFieldsMixin
 from .models import (
     Contact, ContactTel, ContactEmail, ContactGeo, ContactUrl, ContactOrg,
     ContactAddress, ContactDate, ContactCategory, ContactGroup
 )
 
 
-class ContactSerializer(serializers.ModelSerializer):
+class ContactSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Contact
@@ -51,7 +52,7 @@ class ContactSerializer(serializers.ModelSerializer):
                 ]
 
 
-class ContactTelSerializer(serializers.ModelSerializer):
+class ContactTelSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = ContactTel
@@ -66,7 +67,7 @@ class ContactTelSerializer(serializers.ModelSerializer):
                 ]
 
 
-class ContactEmailSerializer(serializers.ModelSerializer):
+class ContactEmailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = ContactEmail
@@ -81,7 +82,7 @@ class ContactEmailSerializer(serializers.ModelSerializer):
                 ]
 
 
-class ContactGeoSerializer(serializers.ModelSerializer):
+class ContactGeoSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = ContactGeo
@@ -96,7 +97,7 @@ class ContactGeoSerializer(serializers.ModelSerializer):
                 ]
 
 
-class ContactUrlSerializer(serializers.ModelSerializer):
+class ContactUrlSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = ContactUrl
@@ -111,7 +112,7 @@ class ContactUrlSerializer(serializers.ModelSerializer):
                 ]
 
 
-class ContactOrgSerializer(serializers.ModelSerializer):
+class ContactOrgSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = ContactOrg
@@ -126,7 +127,7 @@ class ContactOrgSerializer(serializers.ModelSerializer):
                 ]
 
 
-class ContactAddressSerializer(serializers.ModelSerializer):
+class ContactAddressSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = ContactAddress
@@ -142,7 +143,7 @@ class ContactAddressSerializer(serializers.ModelSerializer):
                 ]
 
 
-class ContactDateSerializer(serializers.ModelSerializer):
+class ContactDateSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = ContactDate
@@ -157,7 +158,7 @@ class ContactDateSerializer(serializers.ModelSerializer):
                 ]
 
 
-class ContactCategorySerializer(serializers.ModelSerializer):
+class ContactCategorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = ContactCategory
@@ -172,7 +173,7 @@ class ContactCategorySerializer(serializers.ModelSerializer):
                 ]
 
 
-class ContactGroupSerializer(serializers.ModelSerializer):
+class ContactGroupSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = ContactGroup
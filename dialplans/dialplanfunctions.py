@@ -26,20 +26,16 @@
 #    Adrian Fretwell <adrian@djangopbx.com>
 #
 
-import os
 import uuid
 import re
 from django.utils.translation import gettext_lazy as _
 from django.apps import apps
-from django.conf import settings
 from django.db.models import Case, Value, When, Max
-from django.contrib.auth.base_user import BaseUserManager
 from django.db.models import Q
 from lxml import etree
 from io import StringIO
 import dialplans.models
 from tenants.models import Domain
-from tenants.pbxsettings import PbxSettings
 from accounts.models import Extension
 from switch.models import SwitchVariable
 from pbx.commonvalidators import valid_uuid4
@@ -306,22 +302,32 @@ class SwitchDp():
 
         dp = dialplans.models.Dialplan.objects.get(pk=dp_uuid)
 
-        root = etree.Element("extension", name=dp.name)
-        root.set('continue', dp.dp_continue)
-        root.set('uuid', str(dp.id))
-
         if not ddList:
             ddList = dialplans.models.DialplanDetail.objects.filter(dialplan_id=dp.id, enabled='true').order_by(
-                    'group',
-                    Case(
-                     When(tag='condition', then=Value(1)),
-                     When(tag='action', then=Value(2)),
-                     When(tag='anti-action', then=Value(3)),
-                     default=Value(100)
-                    ),
-                    'sequence'
+                    *self.detail_ordering()
                     )
 
+        return self.render_xml(dp, ddList, domain_uuid, domain_name)
+
+    def detail_ordering(self):
+        return (
+            'group',
+            Case(
+             When(tag='condition', then=Value(1)),
+             When(tag='action', then=Value(2)),
+             When(tag='anti-action', then=Value(3)),
+             default=Value(100)
+            ),
+            'sequence'
+            )
+
+    def render_xml(self, dp, ddList, domain_uuid, domain_name):
+        # Builds the extension XML from an ordered detail list without touching the database,
+        #  dp may be a Dialplan or a DialplanStruct.
+        root = etree.Element("extension", name=dp.name)
+        root.set('continue', dp.dp_continue)
+        root.set('uuid', str(dp.id))
+
         last_condition_type = 'default'
         first_action = True
 
@@ -463,29 +469,10 @@ class SwitchDp():
                             ddgroup += 1
 
     def import_xml(self, domain_name, dp_remove=False, domain_uuid=''):
-        pbxsettings = PbxSettings()
-        dp_details = pbxsettings.default_settings('dialplan', 'dialplan_details', 'boolean', False, True)
-        pin_length = pbxsettings.default_settings('security', 'pin_length', 'numeric', 8, True)
-
-        httapi_url = pbxsettings.default_settings('dialplan', 'httapi_url', 'text', 'http://127.0.0.1:8008', True)
-        path_of_xml = settings.BASE_DIR / 'dialplans/resources/switch/conf/dialplans-enabled'
-        ext = ('.xml')
-        i = 0
-        for files in os.listdir(path_of_xml):
-            if files.endswith(ext):
-                i += 1
-                pin = BaseUserManager().make_random_password(pin_length, '1234567890')
-                with open(path_of_xml / files) as f:
-                    xml = f.read()
-
-                xml = xml.replace('{v_context}', domain_name)
-                xml = xml.replace('{v_pin_number}', pin)
-                xml = xml.replace('{v_httapi_url}', httapi_url)
-                self.create_dp_from_xml(xml, dp_remove, dp_details)
-
-            else:
-                continue
-        return i
+        from .dialplanimport import DpBulkImport
+        dpi = DpBulkImport()
+        dpi.import_domains([domain_name], dp_remove)
+        return dpi.stats['files']
 
     def update_xml(self, obj, change=None):
         regex = re.compile('expression=\"(.*)\"', re.MULTILINE)
@@ -766,3 +753,13 @@ class DialplanDetailStruct():
         self.inline       = ddinline  # noqa: E221
         self.group        = ddgroup   # noqa: E221
         self.sequence     = ddorder   # noqa: E221
+
+
+class DialplanStruct():
+
+    def __init__(self, dpid, dpname, dpcontinue, dpcontext, dpcategory):
+        self.id           = dpid        # noqa: E221
+        self.name         = dpname      # noqa: E221
+        self.dp_continue  = dpcontinue  # noqa: E221
+        self.context      = dpcontext   # noqa: E221
+        self.category     = dpcategory  # noqa: E221
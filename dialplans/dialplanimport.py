@@ -0,0 +1,216 @@
+#
+#    DjangoPBX
+#
+#    MIT License
+#
+#    Copyright (c) 2016 - 2024 Adrian Fretwell <adrian@djangopbx.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+#
+#    Contributor(s):
+#    Adrian Fretwell <adrian@djangopbx.com>
+#
+
+import os
+from io import StringIO
+from lxml import etree
+from django.conf import settings
+from django.contrib.auth.base_user import BaseUserManager
+from django.db import transaction
+from django.db.models import Q
+import dialplans.models
+from tenants.models import Domain
+from tenants.pbxsettings import PbxSettings
+from pbx.commonvalidators import valid_uuid4
+from .dialplanfunctions import SwitchDp, DialplanDetailStruct
+
+
+class DpBulkImport():
+    # Imports the default dialplan XML files for one or more domains.  Every file is
+    #  read and parsed up front, domains and existing dialplans are resolved from
+    #  preloaded maps and rows are written with bulk_create in one transaction per
+    #  domain, so the query count does not grow with the number of files.
+    #  With dry_run nothing is written and self.diff lists what would happen.
+
+    default_app_uuid = 'f17e714e-d7a2-4783-947b-8cc3bb2337af'
+
+    def __init__(self, path_of_xml=None):
+        pbxsettings = PbxSettings()
+        self.dp_details = pbxsettings.default_settings('dialplan', 'dialplan_details', 'boolean', False, True)
+        self.pin_length = pbxsettings.default_settings('security', 'pin_length', 'numeric', 8, True)
+        self.httapi_url = pbxsettings.default_settings('dialplan', 'httapi_url', 'text', 'http://127.0.0.1:8008', True)
+        if path_of_xml is None:
+            path_of_xml = settings.BASE_DIR / 'dialplans/resources/switch/conf/dialplans-enabled'
+        self.path_of_xml = path_of_xml
+        self.diff = []
+        self.stats = {'files': 0, 'errors': 0, 'created': 0, 'details': 0, 'skipped': 0, 'removed': 0}
+
+    def load_files(self):
+        templates = []
+        for name in sorted(os.listdir(self.path_of_xml)):
+            if not name.endswith('.xml'):
+                continue
+            try:
+                with open(os.path.join(self.path_of_xml, name)) as f:
+                    templates.append((name, f.read()))
+            except OSError:
+                self.stats['errors'] += 1
+        self.stats['files'] = len(templates) + self.stats['errors']
+        return templates
+
+    def parse(self, xml):
+        parser = etree.XMLParser(remove_comments=True)
+        try:
+            root = etree.parse(StringIO(xml), parser).getroot()
+        except etree.XMLSyntaxError:
+            return None
+        if not len(root):
+            return None
+        extension = root[0]
+        if extension.tag != 'extension':
+            return None
+        attributes = extension.attrib
+        try:
+            dp_order = int(attributes['order'])
+        except (KeyError, ValueError):
+            dp_order = 10
+
+        spec = {
+            'context': root.get('name'),
+            'global': attributes.get('global', 'false'),
+            'app_id': attributes.get('app_uuid', self.default_app_uuid),
+            'enabled': attributes.get('enabled', 'true'),
+            'order': dp_order,
+            'continue': attributes.get('continue', 'true'),
+            'number': attributes.get('number', 'N/A'),
+            'name': attributes.get('name', 'No Name'),
+            'details': [],
+            }
+
+        ddgroup = 0
+        ddorder = 5
+        for extchild in extension:
+            if extchild.tag != 'condition':
+                continue
+            spec['details'].append((
+                'condition', extchild.get('field'), extchild.get('expression'),
+                extchild.get('break') or '', '', ddgroup, ddorder
+                ))
+            ddorder += 5
+            if len(extchild):
+                for actchild in extchild:
+                    spec['details'].append((
+                        actchild.tag, actchild.get('application'), actchild.get('data'),
+                        '', actchild.get('inline') or '', ddgroup, ddorder
+                        ))
+                    ddorder += 5
+                ddgroup += 1
+        return spec
+
+    def build_specs(self, templates, domain_name):
+        specs = []
+        for name, xml in templates:
+            pin = BaseUserManager().make_random_password(self.pin_length, '1234567890')
+            xml = xml.replace('{v_context}', domain_name)
+            xml = xml.replace('{v_pin_number}', pin)
+            xml = xml.replace('{v_httapi_url}', self.httapi_url)
+            spec = self.parse(xml)
+            if spec:
+                specs.append(spec)
+            else:
+                self.stats['errors'] += 1
+        return specs
+
+    def import_domains(self, domain_names, dp_remove=False, dry_run=False):
+        templates = self.load_files()
+        per_domain = [(dn, self.build_specs(templates, dn)) for dn in domain_names]
+
+        contexts = {s['context'] for dn, specs in per_domain for s in specs}
+        app_ids = {s['app_id'] for dn, specs in per_domain for s in specs if valid_uuid4(s['app_id'])}
+        domain_map = {d.name: d for d in Domain.objects.filter(name__in=contexts)}
+
+        if dp_remove:
+            remove_qs = dialplans.models.Dialplan.objects.filter(
+                domain_id__in=domain_map.values(), category='Default', app_id__in=app_ids
+                )
+            if dry_run:
+                removed = set(remove_qs.values_list('domain_id', 'app_id'))
+                self.stats['removed'] = len(removed)
+            else:
+                self.stats['removed'] = remove_qs.delete()[1].get('dialplans.Dialplan', 0)
+                removed = set()
+        else:
+            removed = set()
+
+        existing = set(
+            (str(d) if d else '', str(a)) for d, a in dialplans.models.Dialplan.objects.filter(
+                Q(domain_id__in=domain_map.values()) | Q(domain_id__isnull=True), app_id__in=app_ids
+                ).values_list('domain_id', 'app_id')
+            if (d, a) not in removed
+            )
+        removed = set((str(d), str(a)) for d, a in removed)
+
+        sdp = SwitchDp()
+        for domain_name, specs in per_domain:
+            new_dps = []
+            new_dds = []
+            for s in specs:
+                if s['context'] in ('public', '${domain_name}'):
+                    d = None
+                else:
+                    d = domain_map.get(s['context'])
+                    if not d:
+                        self.stats['skipped'] += 1
+                        continue
+                if s['global'] == 'true':
+                    d = None
+                d_uuid = str(d.id) if d else ''
+                app_id = s['app_id']
+                if not valid_uuid4(app_id) or (d_uuid, app_id) in existing or ('', app_id) in existing:
+                    self.stats['skipped'] += 1
+                    self.diff.append(('skip', domain_name, s['name'], app_id))
+                    continue
+                existing.add((d_uuid, app_id))
+                self.diff.append(('replace' if (d_uuid, app_id) in removed else 'add', domain_name, s['name'], app_id))
+
+                dp = dialplans.models.Dialplan(
+                    domain_id=d, app_id=app_id, name=s['name'], number=s['number'], destination='false',
+                    context=s['context'], category='Default', dp_continue=s['continue'],
+                    sequence=s['order'], enabled=s['enabled'], updated_by='system'
+                    )
+                ddlist = [DialplanDetailStruct(str(dp.id), *dd) for dd in s['details']]
+                dp.xml = sdp.render_xml(dp, ddlist, '', '')
+                new_dps.append(dp)
+                if self.dp_details:
+                    for dd in ddlist:
+                        new_dds.append(dialplans.models.DialplanDetail(
+                            dialplan_id=dp, tag=dd.tag, type=dd.type, data=dd.data, dp_break=dd.dp_break,
+                            inline=dd.inline, group=dd.group, sequence=dd.sequence, enabled='true',
+                            updated_by='system'
+                            ))
+
+            self.stats['created'] += len(new_dps)
+            self.stats['details'] += len(new_dds)
+            if dry_run or not new_dps:
+                continue
+            with transaction.atomic():
+                dialplans.models.Dialplan.objects.bulk_create(new_dps)
+                if new_dds:
+                    dialplans.models.DialplanDetail.objects.bulk_create(new_dds)
+        return self.stats
@@ -0,0 +1,133 @@
+#
+#    DjangoPBX
+#
+#    MIT License
+#
+#    Copyright (c) 2016 - 2024 Adrian Fretwell <adrian@djangopbx.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+#
+#    Contributor(s):
+#    Adrian Fretwell <adrian@djangopbx.com>
+#
+
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from django.db import connections
+from django.utils import timezone
+import dialplans.models
+from utilities.clearcache import ClearCache
+from .dialplanfunctions import SwitchDp, DialplanStruct, DialplanDetailStruct
+
+
+def render_batch(domain_uuid, domain_name, batch):
+    # Runs in a worker process, batch is a list of (DialplanStruct, [DialplanDetailStruct, ...])
+    sdp = SwitchDp()
+    return [(dp.id, sdp.render_xml(dp, details, domain_uuid, domain_name)) for dp, details in batch]
+
+
+class DpRegenerate():
+    # Rebuilds dialplan XML from dialplan details in bulk.  Everything is read in two
+    #  queries, rendering is fanned out to worker processes per domain and only rows
+    #  whose XML has changed are written back.
+
+    def __init__(self, workers=None, batch_size=500, progress=None):
+        self.workers = workers if workers else (os.cpu_count() or 1)
+        self.batch_size = batch_size
+        self.progress = progress
+        self.stats = {'dialplans': 0, 'rendered': 0, 'changed': 0, 'skipped': 0, 'queries': 0, 'elapsed': 0.0}
+
+    def regenerate(self, domain_names=None, category=None, include_global=False):
+        start = time.monotonic()
+        qs = dialplans.models.Dialplan.objects.all()
+        if domain_names:
+            qs = qs.filter(domain_id__name__in=domain_names)
+        elif not include_global:
+            qs = qs.filter(domain_id__isnull=False)
+        if category:
+            qs = qs.filter(category=category)
+
+        dps = {}
+        for row in qs.values(
+                'id', 'name', 'dp_continue', 'context', 'category', 'xml', 'domain_id', 'domain_id__name'):
+            dps[row['id']] = row
+        details = {}
+        for dd in dialplans.models.DialplanDetail.objects.filter(
+                dialplan_id__in=qs.values('id'), enabled='true'
+                ).order_by('dialplan_id', *SwitchDp().detail_ordering()).values_list(
+                'dialplan_id', 'tag', 'type', 'data', 'dp_break', 'inline', 'group', 'sequence'):
+            details.setdefault(dd[0], []).append(DialplanDetailStruct(*dd))
+        self.stats['queries'] = 2
+        self.stats['dialplans'] = len(dps)
+
+        # Dialplans with no enabled details are maintained as XML only, leave them alone.
+        domains = {}
+        for dp_id, row in dps.items():
+            if dp_id not in details:
+                self.stats['skipped'] += 1
+                continue
+            dp = DialplanStruct(dp_id, row['name'], row['dp_continue'], row['context'], row['category'])
+            key = (str(row['domain_id']) if row['domain_id'] else '', row['domain_id__name'] or '')
+            domains.setdefault(key, []).append((dp, details[dp_id]))
+
+        tasks = []
+        for (domain_uuid, domain_name), items in domains.items():
+            for i in range(0, len(items), self.batch_size):
+                tasks.append((domain_uuid, domain_name, items[i:i + self.batch_size]))
+
+        changed = []
+        changed_domains = set()
+        now = timezone.now()
+        for domain_name, results in self.render(tasks):
+            for dp_id, xml in results:
+                self.stats['rendered'] += 1
+                if xml != dps[dp_id]['xml']:
+                    changed.append(dialplans.models.Dialplan(id=dp_id, xml=xml, updated=now))
+                    changed_domains.add(domain_name)
+            if self.progress:
+                self.progress(domain_name, self.stats['rendered'], len(dps) - self.stats['skipped'])
+
+        if changed:
+            dialplans.models.Dialplan.objects.bulk_update(changed, ['xml', 'updated'], batch_size=self.batch_size)
+            self.stats['queries'] += (len(changed) + self.batch_size - 1) // self.batch_size
+            cc = ClearCache()
+            if '' in changed_domains:
+                cc.dialplan()
+            else:
+                for domain_name in changed_domains:
+                    cc.dialplan(domain_name)
+        self.stats['changed'] = len(changed)
+        self.stats['elapsed'] = time.monotonic() - start
+        return self.stats
+
+    def render(self, tasks):
+        if self.workers < 2 or len(tasks) < 2:
+            for domain_uuid, domain_name, batch in tasks:
+                yield (domain_name, render_batch(domain_uuid, domain_name, batch))
+            return
+        # Forked workers must not share the parent's database connections.
+        connections.close_all()
+        with ProcessPoolExecutor(
+                max_workers=min(self.workers, len(tasks)), mp_context=multiprocessing.get_context('fork')
+                ) as executor:
+            futures = {executor.submit(render_batch, *task): task[1] for task in tasks}
+            for f in as_completed(futures):
+                yield (futures[f], f.result())
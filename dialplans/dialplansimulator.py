@@ -0,0 +1,323 @@
+#
+#    DjangoPBX
+#
+#    MIT License
+#
+#    Copyright (c) 2016 - 2024 Adrian Fretwell <adrian@djangopbx.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+#
+#    Contributor(s):
+#    Adrian Fretwell <adrian@djangopbx.com>
+#
+
+import re
+import bisect
+import hashlib
+import regex as re_alt
+from lxml import etree
+from django.utils import timezone
+from xmlhandler.xmlhandlerclasses import DialplanHandler
+
+
+attr_value_re = re.compile(r'="([^"]*)"')
+variable_re = re.compile(r'\$\$?\{([^{}]+)\}')
+capture_re = re.compile(r'\$(\d)')
+literal_re = re.compile(r'^\^(\()?((?:[0-9A-Za-z]|\\[*+#])+)(?(1)\))\$$')
+time_attribs = ('year', 'yday', 'mon', 'mday', 'week', 'mweek', 'wday', 'hour', 'minute', 'minute-of-day', 'time-of-day', 'date-time')  # noqa: E501
+weekdays = {'sun': 1, 'mon': 2, 'tue': 3, 'wed': 4, 'thu': 5, 'fri': 6, 'sat': 7}
+
+# Compiled contexts keyed by a digest of the dialplan XML, so an unchanged context is
+#  only parsed and compiled once per process.
+compiled_contexts = {}
+compiled_contexts_max = 16
+
+
+class DpCondition():
+
+    def __init__(self, x, compile_regex):
+        self.field = x.get('field')
+        self.dp_break = x.get('break', 'on-false')
+        self.expression = x.get('expression')
+        self.regex = None
+        self.error = None
+        if self.field is not None:
+            if self.expression is None:
+                self.expression = '^.*$'
+            if '${' not in self.expression:
+                self.regex, self.error = compile_regex(self.expression)
+        self.times = {k: x.get(k) for k in time_attribs if x.get(k) is not None}
+        self.regex_mode = x.get('regex')
+        self.regexes = []
+        for r in x.iterchildren('regex'):
+            self.regexes.append((r.get('field'), compile_regex(r.get('expression') or '^.*$')[0]))
+        self.actions = [(a.get('application'), a.get('data') or '', a.get('inline') == 'true') for a in x.iterchildren('action')]  # noqa: E501
+        self.anti_actions = [(a.get('application'), a.get('data') or '', a.get('inline') == 'true') for a in x.iterchildren('anti-action')]  # noqa: E501
+
+
+class DpExtension():
+
+    def __init__(self, x, compile_regex):
+        self.name = x.get('name')
+        self.dp_continue = x.get('continue', 'false') == 'true'
+        self.conditions = [DpCondition(c, compile_regex) for c in x.iterchildren('condition')]
+        self.run = None
+        self.literal = None
+        # An extension that can only do something when destination_number equals a fixed
+        #  string, the common case for extensions, can be found by lookup instead of by regex.
+        if self.conditions:
+            c = self.conditions[0]
+            m = literal_re.match(c.expression or '')
+            if (c.field == 'destination_number' and m and c.regex and not c.times and not c.regexes
+                    and not c.anti_actions and c.dp_break in ('on-false', 'always')):
+                self.literal = m.group(2).replace('\\', '')
+
+
+class DpLiteralRun():
+    # A run of consecutive literal extensions, index maps a number to its positions in the run.
+
+    def __init__(self, start):
+        self.start = start
+        self.end = start
+        self.index = {}
+
+
+class DpSimulator():
+    # Routes a number through a context's dialplan in process, following the rules
+    #  mod_dialplan_xml uses: conditions in order, break on-false/on-true/always/never,
+    #  anti-actions when a condition fails, inline set/export/unset applied while hunting
+    #  and hunting stopping at the first matching extension without continue="true".
+
+    def __init__(self, context, hostname=None):
+        self.context = context
+        self.hostname = hostname
+        self.regex_errors = []
+        self.extensions = []
+        self.dynamic = {}
+
+    def load(self, destination_number=''):
+        # The same document DialplanHandler serves to FreeSWITCH, including its cache.
+        xml = DialplanHandler().GetDialplan(self.context, self.hostname, destination_number)
+        key = hashlib.sha1(xml.encode()).hexdigest()
+        compiled = compiled_contexts.get(key)
+        if compiled is None:
+            compiled = self.compile(xml)
+            if len(compiled_contexts) >= compiled_contexts_max:
+                compiled_contexts.pop(next(iter(compiled_contexts)))
+            compiled_contexts[key] = compiled
+        self.extensions, self.regex_errors = compiled
+        return len(self.extensions)
+
+    def compile(self, xml):
+        # FreeSWITCH accepts < and > in attribute values, lxml does not.
+        xml = attr_value_re.sub(lambda m: '="%s"' % m.group(1).replace('<', '&lt;').replace('>', '&gt;'), xml)
+        parser = etree.XMLParser(remove_comments=True, recover=True)
+        root = etree.fromstring(xml.encode(), parser)
+        errors = []
+        regexes = {}
+
+        def compile_regex(expression):
+            if expression not in regexes:
+                try:
+                    regexes[expression] = (re_alt.compile(expression), None)
+                except re_alt.error as e:
+                    errors.append('%s: %s' % (expression, e))
+                    regexes[expression] = (None, str(e))
+            return regexes[expression]
+
+        extensions = []
+        if root is not None:
+            for x in root.iter('extension'):
+                extensions.append(DpExtension(x, compile_regex))
+
+        run = None
+        for i, extension in enumerate(extensions):
+            if extension.literal is None:
+                run = None
+                continue
+            if run is None:
+                run = DpLiteralRun(i)
+            run.index.setdefault(extension.literal, []).append(i)
+            run.end = i + 1
+            extension.run = run
+        return (extensions, errors)
+
+    def expand(self, text, variables):
+        return variable_re.sub(lambda m: str(variables.get(m.group(1), '')), text)
+
+    def field_value(self, field, variables):
+        if '${' in field:
+            return self.expand(field, variables)
+        return str(variables.get(field, ''))
+
+    def match_regex(self, cond, value, variables):
+        regex = cond.regex
+        if regex is None and cond.expression and '${' in cond.expression:
+            expression = self.expand(cond.expression, variables)
+            regex = self.dynamic.get(expression)
+            if regex is None:
+                try:
+                    regex = re_alt.compile(expression)
+                except re_alt.error:
+                    return None
+                self.dynamic[expression] = regex
+        if regex is None:
+            return None
+        return regex.search(value)
+
+    def in_ranges(self, spec, value, names=None):
+        for part in spec.lower().split(','):
+            part = part.strip()
+            if names:
+                for k, v in names.items():
+                    part = part.replace(k, str(v))
+            lo, sep, hi = part.partition('-')
+            try:
+                if sep and int(lo) <= value <= int(hi):
+                    return True
+                if not sep and int(lo) == value:
+                    return True
+            except ValueError:
+                continue
+        return False
+
+    def time_match(self, times, now):
+        # -1 no time attributes, 1 all matched, 0 otherwise
+        if not times:
+            return -1
+        values = {
+            'year': now.year, 'yday': now.timetuple().tm_yday, 'mon': now.month, 'mday': now.day,
+            'week': now.timetuple().tm_yday // 7 + 1, 'mweek': (now.day - 1) // 7 + 1,
+            'wday': now.isoweekday() % 7 + 1, 'hour': now.hour, 'minute': now.minute,
+            'minute-of-day': now.hour * 60 + now.minute + 1,
+            }
+        for k, spec in times.items():
+            if k == 'time-of-day':
+                t = now.strftime('%H:%M:%S')
+                ok = False
+                for part in spec.split(','):
+                    lo, sep, hi = part.strip().partition('-')
+                    lo = lo if len(lo) > 5 else lo + ':00'
+                    hi = hi if len(hi) > 5 else hi + ':00'
+                    if sep and lo <= t <= hi:
+                        ok = True
+                if not ok:
+                    return 0
+            elif k == 'date-time':
+                t = now.strftime('%Y-%m-%d %H:%M:%S')
+                lo, sep, hi = spec.partition('~')
+                if not (sep and lo.strip() <= t <= hi.strip()):
+                    return 0
+            elif not self.in_ranges(spec, values[k], weekdays if k == 'wday' else None):
+                return 0
+        return 1
+
+    def substitute(self, data, m):
+        if not m:
+            return data
+        groups = m.groups()
+        return capture_re.sub(lambda c: (groups[int(c.group(1)) - 1] or '') if 0 < int(c.group(1)) <= len(groups) else '', data)  # noqa: E501
+
+    def run_actions(self, result, extension, actions, m, variables):
+        for application, data, inline in actions:
+            data = self.substitute(data, m)
+            if inline:
+                data = self.expand(data, variables)
+                if application in ('set', 'export'):
+                    name, sep, value = data.partition('=')
+                    if sep:
+                        variables[name] = value
+                elif application == 'unset':
+                    variables.pop(data, None)
+                result['inline'].append({'extension': extension.name, 'application': application, 'data': data})
+            else:
+                result['actions'].append({'extension': extension.name, 'application': application, 'data': data})
+
+    def simulate(self, destination_number, variables=None, now=None, trace=False):
+        if now is None:
+            now = timezone.localtime()
+        chan = {
+            'destination_number': destination_number, 'context': self.context,
+            'caller_id_number': '', 'caller_id_name': '', 'domain_name': self.context,
+            }
+        if variables:
+            chan.update(variables)
+        result = {
+            'context': self.context, 'destination_number': destination_number, 'extension': None,
+            'matched': [], 'actions': [], 'inline': [], 'trace': [],
+            }
+
+        extensions = self.extensions
+        i = 0
+        while i < len(extensions):
+            extension = extensions[i]
+            run = extension.run
+            if run is not None:
+                # Extensions in the run that do not match the number would fail their first
+                #  condition and do nothing, jump to the next one that can match.
+                positions = run.index.get(str(chan.get('destination_number', '')), ())
+                p = bisect.bisect_left(positions, i)
+                if p == len(positions):
+                    i = run.end
+                    continue
+                i = positions[p]
+                extension = extensions[i]
+            i += 1
+            proceed = False
+            for cond in extension.conditions:
+                tm = self.time_match(cond.times, now)
+                m = None
+                if cond.regexes:
+                    hits = [bool(r and r.search(self.field_value(f or '', chan))) for f, r in cond.regexes]
+                    if cond.regex_mode == 'any':
+                        passed = any(hits)
+                    elif cond.regex_mode == 'xor':
+                        passed = hits.count(True) == 1
+                    else:
+                        passed = all(hits)
+                    passed = passed and tm != 0
+                    value = None
+                elif cond.field is not None:
+                    value = self.field_value(cond.field, chan)
+                    m = self.match_regex(cond, value, chan)
+                    passed = m is not None and tm != 0
+                else:
+                    value = None
+                    passed = tm != 0
+                if trace:
+                    result['trace'].append({
+                        'extension': extension.name, 'field': cond.field, 'expression': cond.expression,
+                        'value': value, 'times': cond.times, 'passed': passed
+                        })
+                proceed = passed
+                if passed:
+                    self.run_actions(result, extension, cond.actions, m, chan)
+                    if cond.dp_break in ('on-true', 'always'):
+                        break
+                else:
+                    self.run_actions(result, extension, cond.anti_actions, m, chan)
+                    if cond.dp_break in ('on-false', 'always'):
+                        break
+            if proceed:
+                result['matched'].append(extension.name)
+                if not extension.dp_continue:
+                    result['extension'] = extension.name
+                    break
+        result['variables'] = chan
+        return result
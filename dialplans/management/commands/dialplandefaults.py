@@ -31,7 +31,7 @@ from django.utils.translation import gettext_lazy as _
 from django.core.management.base import BaseCommand
 
 from tenants.pbxsettings import PbxSettings
-from dialplans.dialplanfunctions import SwitchDp
+from dialplans.dialplanimport import DpBulkImport
 
 
 class Command(BaseCommand):
@@ -40,6 +40,7 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument('--domain', help=_('Domain name (--domain domain1.djangopbx.uk)'))
         parser.add_argument('--remove', help=_('Remove existing dialplans (--remove true)'))
+        parser.add_argument('--dry-run', action='store_true', help=_('Show what would be created without writing'))
 
     def handle(self, *args, **kwargs):
         dp_remove = False
@@ -52,9 +53,20 @@ class Command(BaseCommand):
             dp_remove = True
 
         if d:
-            SwitchDp().import_xml(d, dp_remove)
+            domain_names = [d]
         else:
-            domains_dict = PbxSettings().get_domains()
-            for domain in domains_dict:
-                for key in domain:
-                    SwitchDp().import_xml(key, dp_remove)
+            domain_names = [key for domain in PbxSettings().get_domains() for key in domain]
+
+        dpi = DpBulkImport()
+        stats = dpi.import_domains(domain_names, dp_remove, kwargs['dry_run'])
+        if kwargs['dry_run']:
+            for action, domain_name, name, app_id in dpi.diff:
+                if action != 'skip' or kwargs['verbosity'] > 1:
+                    self.stdout.write('%-8s %s %s (%s)' % (action, domain_name, name, app_id))
+        if kwargs['verbosity'] > 0:
+            self.stdout.write(
+                '%sFiles: %s, dialplans: %s, details: %s, skipped: %s, removed: %s, errors: %s' % (
+                    'Dry run. ' if kwargs['dry_run'] else '', stats['files'], stats['created'],
+                    stats['details'], stats['skipped'], stats['removed'], stats['errors']
+                    )
+                )
@@ -0,0 +1,61 @@
+#
+#    DjangoPBX
+#
+#    MIT License
+#
+#    Copyright (c) 2016 - 2024 Adrian Fretwell <adrian@djangopbx.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+#
+#    Contributor(s):
+#    Adrian Fretwell <adrian@djangopbx.com>
+#
+
+from django.utils.translation import gettext_lazy as _
+from django.core.management.base import BaseCommand
+
+from dialplans.dialplanregenerate import DpRegenerate
+
+
+class Command(BaseCommand):
+    help = 'Regenerate dialplan XML from dialplan details'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--domain', action='append', help=_('Domain name, may be repeated (--domain domain1.djangopbx.uk)')
+            )
+        parser.add_argument('--category', help=_('Only dialplans of this category (--category "Inbound route")'))
+        parser.add_argument('--global', action='store_true', dest='include_global', help=_('Include global dialplans'))
+        parser.add_argument('--workers', type=int, default=0, help=_('Worker processes, default one per CPU'))
+
+    def handle(self, *args, **kwargs):
+        verbosity = kwargs['verbosity']
+
+        def progress(domain_name, done, total):
+            if verbosity > 0:
+                self.stdout.write('%s: %s/%s' % (domain_name or 'global', done, total))
+
+        dpr = DpRegenerate(workers=kwargs['workers'], progress=progress)
+        stats = dpr.regenerate(kwargs['domain'], kwargs['category'], kwargs['include_global'])
+        if verbosity > 0:
+            self.stdout.write(
+                'Dialplans: %s, rendered: %s, changed: %s, skipped (no details): %s, %.2fs' % (
+                    stats['dialplans'], stats['rendered'], stats['changed'], stats['skipped'], stats['elapsed']
+                    )
+                )
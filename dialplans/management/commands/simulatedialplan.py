@@ -0,0 +1,101 @@
+#
+#    DjangoPBX
+#
+#    MIT License
+#
+#    Copyright (c) 2016 - 2024 Adrian Fretwell <adrian@djangopbx.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+#
+#    Contributor(s):
+#    Adrian Fretwell <adrian@djangopbx.com>
+#
+
+import time
+from datetime import datetime
+from django.conf import settings
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from django.core.management.base import BaseCommand, CommandError
+
+from dialplans.dialplansimulator import DpSimulator
+
+
+class Command(BaseCommand):
+    help = 'Show which dialplan extension a number would reach, without placing a call'
+
+    def add_arguments(self, parser):
+        parser.add_argument('context', help=_('Dialplan context, usually the domain name or public'))
+        parser.add_argument('number', nargs='+', help=_('Destination number(s)'))
+        parser.add_argument('--hostname', help=_('Switch hostname'))
+        parser.add_argument(
+            '--var', action='append', default=[], help=_('Channel variable (--var caller_id_number=1001)')
+            )
+        parser.add_argument(
+            '--time', help=_('Evaluate time conditions at this local time (--time "2024-12-25 09:30")')
+            )
+        parser.add_argument('--trace', action='store_true', help=_('Show every condition evaluated'))
+        parser.add_argument(
+            '--repeat', type=int, default=1, help=_('Route each number this many times and report the rate')
+            )
+
+    def handle(self, *args, **kwargs):
+        variables = {}
+        for v in kwargs['var']:
+            name, sep, value = v.partition('=')
+            if not sep:
+                raise CommandError('Variables must be given as name=value')
+            variables[name] = value
+        now = None
+        if kwargs['time']:
+            try:
+                now = timezone.make_aware(datetime.strptime(kwargs['time'], '%Y-%m-%d %H:%M'))
+            except ValueError:
+                raise CommandError('Time must be given as YYYY-MM-DD HH:MM')
+
+        sim = DpSimulator(kwargs['context'], kwargs['hostname'])
+        start = time.monotonic()
+        count = sim.load(kwargs['number'][0])
+        self.stdout.write('Loaded %s extensions in %.3fs' % (count, time.monotonic() - start))
+        for e in sim.regex_errors:
+            self.stderr.write('Invalid expression %s' % e)
+        # With a single public context the document served depends on the destination number.
+        per_number = kwargs['context'] == 'public' and settings.PBX_XMLH_CONTEXT_TYPE == 'single'
+
+        start = time.monotonic()
+        for n, number in enumerate(kwargs['number']):
+            if per_number and n > 0:
+                sim.load(number)
+            for i in range(kwargs['repeat']):
+                r = sim.simulate(number, dict(variables), now, kwargs['trace'] and i == 0)
+            self.stdout.write('%s -> %s' % (number, r['extension'] or 'no match'))
+            for t in r['trace']:
+                self.stdout.write('  %-6s %s %s %s = %s' % (
+                    'pass' if t['passed'] else 'fail', t['extension'],
+                    t['field'] if t['field'] is not None else t['times'] or '-',
+                    t['expression'] or '', t['value'] if t['value'] is not None else ''
+                    ))
+            for a in r['inline']:
+                self.stdout.write('  inline %s %s' % (a['application'], a['data']))
+            for a in r['actions']:
+                self.stdout.write('  %s %s  (%s)' % (a['application'], a['data'], a['extension']))
+        elapsed = time.monotonic() - start
+        routed = len(kwargs['number']) * kwargs['repeat']
+        if kwargs['repeat'] > 1 and elapsed > 0:
+            self.stdout.write('Routed %s numbers in %.3fs, %.0f/s' % (routed, elapsed, routed / elapsed))
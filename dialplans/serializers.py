@@ -28,6 +28,7 @@
 #
 
 from rest_framework import serializers
+from pbx.restpbxhelpers import SparseFieldsMixin
 from .models import (
     Dialplan, DialplanDetail,
 )
@@ -43,7 +44,7 @@ STATUS = (
 )
 
 
-class DialplanSerializer(serializers.ModelSerializer):
+class DialplanSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Dialplan
@@ -56,7 +57,7 @@ class DialplanSerializer(serializers.ModelSerializer):
                 ]
 
 
-class DialplanDetailSerializer(serializers.ModelSerializer):
+class DialplanDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = DialplanDetail
@@ -27,6 +27,290 @@
 #    Adrian Fretwell <adrian@djangopbx.com>
 #
 
-# from django.test import TestCase
+import datetime
+import glob
+import math
+import os
+import random
+import re
+import shutil
+import tempfile
+import uuid
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+from tenants.models import Domain
+from .models import Dialplan, DialplanDetail
+from .dialplanfunctions import SwitchDp
+from .dialplanimport import DpBulkImport
+from .dialplanregenerate import DpRegenerate
+from .dialplansimulator import DpSimulator
+from .views import DialplanViewSet
 
-# Create your tests here.
+
+class DpBulkImportTestCase(TestCase):
+
+    def setUp(self):
+        self.templates = []
+        path = os.path.join(settings.BASE_DIR, 'dialplans/resources/switch/conf/dialplans-available')
+        for f in sorted(glob.glob(os.path.join(path, '*.xml'))):
+            with open(f) as fh:
+                self.templates.append(fh.read())
+        self.dirs = []
+
+    def tearDown(self):
+        for d in self.dirs:
+            shutil.rmtree(d)
+
+    def generate(self, count):
+        # Copies of the shipped templates, each with its own app_uuid.
+        path = tempfile.mkdtemp()
+        self.dirs.append(path)
+        for i in range(count):
+            xml = re.sub(r'app_uuid="[^"]*"', 'app_uuid="%s"' % uuid.uuid4(), self.templates[i % len(self.templates)])
+            with open(os.path.join(path, '%04d.xml' % i), 'w') as f:
+                f.write(xml)
+        return path
+
+    def importer(self, path):
+        dpi = DpBulkImport(path)
+        dpi.dp_details = True
+        return dpi
+
+    def insert_batches(self, model, count):
+        # The number of INSERT statements bulk_create needs for count rows on this database.
+        if not count:
+            return 0
+        return math.ceil(count / connection.ops.bulk_batch_size(model._meta.concrete_fields, [model()] * count))
+
+    def inserts(self, stats):
+        return self.insert_batches(Dialplan, stats['created']) + self.insert_batches(DialplanDetail, stats['details'])
+
+    def test_constant_query_count(self):
+        # A small import gives the number of queries apart from the bulk inserts.
+        Domain.objects.create(name='warmup.test', enabled='true')
+        path = self.generate(10)
+        dpi = self.importer(path)
+        with CaptureQueriesContext(connection) as ctx:
+            dpi.import_domains(['warmup.test'], dry_run=True)
+        dry_queries = len(ctx.captured_queries)
+        dpi = self.importer(path)
+        with CaptureQueriesContext(connection) as ctx:
+            stats = dpi.import_domains(['warmup.test'])
+        fixed_queries = len(ctx.captured_queries) - self.inserts(stats)
+
+        for count in (200, 2000):
+            domain = Domain.objects.create(name='import%s.test' % count, enabled='true')
+            path = self.generate(count)
+            dpi = self.importer(path)
+            with self.assertNumQueries(dry_queries):
+                dry = dpi.import_domains([domain.name], dry_run=True)
+            self.assertEqual(dry['files'], count)
+            self.assertEqual(dry['errors'], 0)
+            dp_count = Dialplan.objects.count()
+            dd_count = DialplanDetail.objects.count()
+            dpi = self.importer(path)
+            with self.assertNumQueries(fixed_queries + self.inserts(dry)):
+                stats = dpi.import_domains([domain.name])
+            self.assertEqual(stats['created'], dry['created'])
+            self.assertEqual(Dialplan.objects.count() - dp_count, stats['created'])
+            self.assertEqual(DialplanDetail.objects.count() - dd_count, stats['details'])
+
+
+class DpRegenerateTestCase(TestCase):
+
+    def setUp(self):
+        path = os.path.join(settings.BASE_DIR, 'dialplans/resources/switch/conf/dialplans-available')
+        self.domain = Domain.objects.create(name='regenerate.test', enabled='true')
+        dpi = DpBulkImport(path)
+        dpi.dp_details = True
+        dpi.import_domains([self.domain.name])
+        self.dps = Dialplan.objects.filter(domain_id=self.domain, dialplandetail__enabled='true').distinct()
+        self.assertTrue(self.dps.exists())
+
+    def per_row_xml(self):
+        sdp = SwitchDp()
+        return {dp.id: sdp.generate_xml(dp.id, str(self.domain.id), self.domain.name) for dp in self.dps}
+
+    def test_matches_per_row_path(self):
+        expected = self.per_row_xml()
+        Dialplan.objects.filter(domain_id=self.domain).update(xml='')
+        stats = DpRegenerate(workers=1, batch_size=7).regenerate([self.domain.name])
+        self.assertEqual(stats['rendered'], len(expected))
+        self.assertEqual(stats['changed'], len(expected))
+        self.assertEqual(stats['skipped'], stats['dialplans'] - len(expected))
+        self.assertEqual(dict(Dialplan.objects.filter(id__in=expected.keys()).values_list('id', 'xml')), expected)
+
+    def test_only_changed_rows_written(self):
+        DpRegenerate(workers=1).regenerate([self.domain.name])
+        before = dict(Dialplan.objects.filter(domain_id=self.domain).values_list('id', 'updated'))
+        stats = DpRegenerate(workers=1).regenerate([self.domain.name])
+        self.assertEqual(stats['changed'], 0)
+        self.assertEqual(stats['queries'], 2)
+
+        dd = DialplanDetail.objects.filter(dialplan_id__domain_id=self.domain, tag='action').first()
+        dd.data = 'changed_by_test=true'
+        dd.save()
+        stats = DpRegenerate(workers=1).regenerate([self.domain.name])
+        self.assertEqual(stats['changed'], 1)
+        self.assertEqual(stats['queries'], 3)
+        after = dict(Dialplan.objects.filter(domain_id=self.domain).values_list('id', 'updated'))
+        self.assertEqual([k for k in after if after[k] != before[k]], [dd.dialplan_id_id])
+        self.assertIn('changed_by_test=true', Dialplan.objects.get(id=dd.dialplan_id_id).xml)
+        self.assertEqual(Dialplan.objects.get(id=dd.dialplan_id_id).xml, self.per_row_xml()[dd.dialplan_id_id])
+
+
+class DpSimulatorTestCase(SimpleTestCase):
+    now = datetime.datetime(2026, 10, 19, 10, 30)
+
+    def simulator(self, extensions, linear=False):
+        sim = DpSimulator('test')
+        sim.extensions, sim.regex_errors = sim.compile('<context name="test">%s</context>' % extensions)
+        if linear:
+            for extension in sim.extensions:
+                extension.run = None
+        return sim
+
+    def simulate(self, extensions, number, variables=None):
+        return self.simulator(extensions).simulate(number, variables, now=self.now, trace=True)
+
+    def apps(self, result):
+        return [(a['application'], a['data']) for a in result['actions']]
+
+    def test_continue(self):
+        r = self.simulate(
+            '<extension name="a" continue="true"><condition field="destination_number" expression="^1000$">'
+            '<action application="set" data="a=1"/></condition></extension>'
+            '<extension name="b"><condition field="destination_number" expression="^10\\d+$">'
+            '<action application="bridge" data="user/1000"/></condition></extension>'
+            '<extension name="c"><condition field="destination_number" expression="^1000$">'
+            '<action application="hangup"/></condition></extension>', '1000'
+            )
+        self.assertEqual(r['matched'], ['a', 'b'])
+        self.assertEqual(r['extension'], 'b')
+        self.assertEqual(self.apps(r), [('set', 'a=1'), ('bridge', 'user/1000')])
+
+    def test_break(self):
+        conditions = (
+            '<extension name="x"><condition field="destination_number" expression="^%s$" break="%s">'
+            '<action application="log" data="first"/><anti-action application="log" data="not first"/></condition>'
+            '<condition field="caller_id_number" expression="^200$">'
+            '<action application="log" data="second"/><anti-action application="log" data="not second"/></condition>'
+            '</extension>'
+            )
+        cases = [
+            # first condition passes, break, actions, matched
+            ('1000', 'on-false', [('log', 'first'), ('log', 'second')], True),
+            ('9999', 'on-false', [('log', 'not first')], False),
+            ('1000', 'on-true', [('log', 'first')], True),
+            ('9999', 'on-true', [('log', 'not first'), ('log', 'second')], True),
+            ('1000', 'always', [('log', 'first')], True),
+            ('9999', 'always', [('log', 'not first')], False),
+            ('9999', 'never', [('log', 'not first'), ('log', 'second')], True),
+            ('1000', 'never', [('log', 'first'), ('log', 'second')], True),
+            ]
+        for expression, dp_break, actions, matched in cases:
+            r = self.simulate(conditions % (expression, dp_break), '1000', {'caller_id_number': '200'})
+            self.assertEqual(self.apps(r), actions, (expression, dp_break))
+            self.assertEqual(r['extension'], 'x' if matched else None, (expression, dp_break))
+
+        r = self.simulate(conditions % ('1000', 'never'), '1000', {'caller_id_number': '201'})
+        self.assertEqual(self.apps(r), [('log', 'first'), ('log', 'not second')])
+        self.assertIsNone(r['extension'])
+
+    def test_inline_set_and_unset(self):
+        extensions = (
+            '<extension name="vars" continue="true"><condition field="destination_number" expression="^(\\d+)$">'
+            '<action application="set" data="target=$1" inline="true"/>'
+            '<action application="unset" data="gone" inline="true"/>'
+            '<action application="set" data="later=${target}"/></condition></extension>'
+            '<extension name="uses"><condition field="${target}" expression="^2000$"/>'
+            '<condition field="${gone}" expression="^$"><action application="bridge" data="user/${target}"/>'
+            '</condition></extension>'
+            )
+        r = self.simulate(extensions, '2000', {'gone': 'yes'})
+        self.assertEqual(r['extension'], 'uses')
+        self.assertEqual(r['variables']['target'], '2000')
+        self.assertNotIn('gone', r['variables'])
+        inline = [(i['application'], i['data']) for i in r['inline']]
+        self.assertEqual(inline, [('set', 'target=2000'), ('unset', 'gone')])
+        # Only inline actions are expanded while hunting.
+        self.assertEqual(self.apps(r), [('set', 'later=${target}'), ('bridge', 'user/${target}')])
+        self.assertIsNone(self.simulate(extensions, '2001')['extension'])
+
+    def test_regex_captures(self):
+        r = self.simulate(
+            '<extension name="cap"><condition field="destination_number" expression="^(\\d{2})(\\d+)(x)?$">'
+            '<action application="set" data="area=$1"/><action application="bridge" data="sofia/gw/$2$3$9"/>'
+            '</condition></extension>', '441234'
+            )
+        self.assertEqual(self.apps(r), [('set', 'area=44'), ('bridge', 'sofia/gw/1234')])
+
+    def test_literal_index_matches_linear_scan(self):
+        rnd = random.Random(39)
+        numbers = ['%d' % n for n in range(1000, 1100)]
+        extensions = []
+        for i in range(400):
+            kind = rnd.random()
+            name = 'e%03d' % i
+            number = rnd.choice(numbers)
+            cont = ' continue="true"' if rnd.random() < 0.2 else ''
+            if kind < 0.6:
+                # literal
+                extensions.append(
+                    '<extension name="%s"%s><condition field="destination_number" expression="^%s$">'
+                    '<action application="log" data="%s"/></condition></extension>' % (name, cont, number, name)
+                    )
+            elif kind < 0.75:
+                extensions.append(
+                    '<extension name="%s"%s><condition field="destination_number" expression="^%s\\d$">'
+                    '<action application="set" data="destination_number=%s" inline="true"/></condition>'
+                    '</extension>' % (name, cont, number[:3], rnd.choice(numbers))
+                    )
+            elif kind < 0.9:
+                extensions.append(
+                    '<extension name="%s"%s><condition field="destination_number" expression="^(%s)$" break="never">'
+                    '<anti-action application="log" data="anti %s"/></condition>'
+                    '<condition field="caller_id_number" expression="^1"><action application="log" data="%s"/>'
+                    '</condition></extension>' % (name, cont, number, name, name)
+                    )
+            else:
+                extensions.append(
+                    '<extension name="%s" continue="true"><condition wday="1-7">'
+                    '<action application="log" data="%s"/></condition></extension>' % (name, name)
+                    )
+        xml = ''.join(extensions)
+        indexed = self.simulator(xml)
+        linear = self.simulator(xml, linear=True)
+        self.assertTrue(any(e.run is not None for e in indexed.extensions))
+        matched = 0
+        for number in numbers + ['999', '10000', '']:
+            for variables in ({}, {'caller_id_number': '100'}):
+                r = indexed.simulate(number, dict(variables), now=self.now, trace=False)
+                self.assertEqual(r, linear.simulate(number, dict(variables), now=self.now, trace=False), number)
+                matched += r['extension'] is not None
+        self.assertGreater(matched, 100)
+
+
+class DpSimulateViewTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('simulate', 'simulate@example.com', 'x')
+        self.user.groups.add(Group.objects.get_or_create(name='admin_api')[0])
+        self.view = DialplanViewSet.as_view({'post': 'simulate'})
+
+    def post(self, data):
+        request = APIRequestFactory().post('/api/dialplans/simulate/', data, format='json')
+        force_authenticate(request, self.user)
+        return self.view(request)
+
+    def test_variables_must_be_an_object(self):
+        for variables in ('caller_id_number=200', ['caller_id_number'], 5):
+            response = self.post({'context': 'none.test', 'destination_number': '1000', 'variables': variables})
+            self.assertEqual(response.status_code, 400, variables)
+        response = self.post({'context': 'none.test', 'destination_number': '1000', 'variables': {'a': '1'}})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['variables']['a'], '1')
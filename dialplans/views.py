@@ -64,6 +64,7 @@ from .serializers import (
 
 from .forms import NewIbRouteForm, NewObRouteForm, TimeConditionForm
 from .dialplanfunctions import SwitchDp
+from .dialplansimulator import DpSimulator
 from pbx.commonfunctions import DomainUtils
 from pbx.commondestination import CommonDestAction
 from accounts.accountfunctions import AccountFunctions
@@ -335,6 +336,33 @@ class DialplanViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(updated_by=self.request.user.username)
 
+    @action(detail=False, methods=['get', 'post'])
+    def simulate(self, request):
+        # Route a number through a context without placing a call, POST may include a
+        #  variables object, GET takes extra query parameters as channel variables.
+        data = request.data if request.method == 'POST' else request.query_params
+        context = data.get('context')
+        number = data.get('destination_number')
+        if not context or not number:
+            return Response(
+                {'status': 'err', 'message': 'context and destination_number are required'},
+                status=status.HTTP_400_BAD_REQUEST
+                )
+        if request.method == 'POST':
+            variables = data.get('variables') or {}
+            if not isinstance(variables, dict):
+                return Response(
+                    {'status': 'err', 'message': 'variables must be an object'},
+                    status=status.HTTP_400_BAD_REQUEST
+                    )
+        else:
+            variables = {k: v for k, v in data.items() if k not in ('context', 'destination_number', 'hostname', 'trace')}
+        sim = DpSimulator(context, data.get('hostname'))
+        sim.load(number)
+        r = sim.simulate(number, variables, trace=str(data.get('trace', '')).lower() == 'true')
+        r['regex_errors'] = sim.regex_errors
+        return Response(r)
+
     @action(detail=False)
     def flush_cache_all_dialplans(self, request):
         ClearCache().dialplan()
@@ -27,6 +27,7 @@
 #    Adrian Fretwell <adrian@djangopbx.com>
 #
 
+import ipaddress
 from django.utils.translation import gettext_lazy as _
 from django.utils.http import urlsafe_base64_encode
 from rest_framework import serializers
@@ -85,3 +86,19 @@ class FwCountersSerializer(serializers.Serializer):
     def get_url(self, obj):
         r = '%s&%s&%s' % (obj.get('counter'), obj.get('packets'), obj.get('bytes'))
         return self.context['request'].build_absolute_uri('%s/' % urlsafe_base64_encode(r.encode()))
+
+
+class FwBulkSerializer(serializers.Serializer):
+
+    ip_addresses = serializers.ListField(child=serializers.CharField(max_length=64), allow_empty=False, max_length=100000, label=_('IP Addresses'), help_text=_('Addresses or networks, eg. 192.0.2.1 or 198.51.100.0/24')) # noqa: E501, E221
+
+    def validate_ip_addresses(self, value):
+        invalid = []
+        for ip in value:
+            try:
+                ipaddress.ip_network(ip, strict=False)
+            except ValueError:
+                invalid.append(ip)
+        if invalid:
+            raise serializers.ValidationError(_('Invalid addresses: %s' % ', '.join(invalid[:10])))
+        return value
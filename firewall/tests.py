@@ -26,6 +26,72 @@
 #    Adrian Fretwell <adrian@djangopbx.com>
 #
 
-# from django.test import TestCase
+import json
+from django.core.cache import cache
+from django.test import SimpleTestCase
+from pbx.nftbackend import NftBackend
+from pbx.scripts import nft_helper_daemon
 
-# Create your tests here.
+
+class FakeNftBackend(NftBackend):
+    # Lists the sets given and records the requests instead of running nft.
+    def __init__(self, sets):
+        super().__init__(helper_socket=None)
+        self.sets = sets
+        self.requests = []
+
+    def execute(self, request):
+        self.requests.append(request)
+        if request['cmd'] == 'list':
+            elem = self.sets.get(request['name'], [])
+            return (0, json.dumps({'nftables': [{'set': {'name': request['name'], 'elem': elem}}]}))
+        return (0, '')
+
+
+class NftBackendDeleteTestCase(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_delete_matches_normalised_addresses(self):
+        nft = FakeNftBackend({
+            'ipv4_white_list': ['192.0.2.1', {'prefix': {'addr': '198.51.100.0', 'len': 24}}],
+            'ipv6_white_list': ['2001:db8::1'],
+            })
+        skipped = nft.delete('white', ['192.0.2.1/32', '198.51.100.7/24', '2001:0db8:0:0::1', '192.0.2.9'])
+        self.assertEqual(skipped, ['192.0.2.9'])
+        deletes = {c['delete']['element']['name']: c['delete']['element']['elem'] for c in nft.commands}
+        self.assertEqual(deletes, {
+            'ipv4_white_list': ['192.0.2.1', {'prefix': {'addr': '198.51.100.0', 'len': 24}}],
+            'ipv6_white_list': ['2001:db8::1'],
+            })
+
+    def test_nothing_found(self):
+        nft = FakeNftBackend({})
+        self.assertEqual(nft.delete('block', ['192.0.2.1']), ['192.0.2.1'])
+        self.assertEqual(nft.commands, [])
+
+
+class NftHelperDaemonTestCase(SimpleTestCase):
+
+    def test_set_names(self):
+        self.assertTrue(nft_helper_daemon.valid_set({'family': 'inet', 'table': 'filter', 'name': 'ipv4_white_list'}))
+        self.assertTrue(
+            nft_helper_daemon.valid_set({'family': 'netdev', 'table': 'filter', 'name': 'ipv6_block_list'})
+            )
+        for name in [
+                'x; flush ruleset; list set inet filter ipv4_white_list', 'ipv4_white_list\n', 'ipv4_white_list ',
+                'white_list', 'ipv4_White_list', None, ['ipv4_white_list']]:
+            self.assertFalse(nft_helper_daemon.valid_set({'family': 'inet', 'table': 'filter', 'name': name}), name)
+        self.assertFalse(nft_helper_daemon.valid_set({'family': 'ip', 'table': 'filter', 'name': 'ipv4_white_list'}))
+
+    def test_list_refused(self):
+        request = {
+            'cmd': 'list', 'family': 'inet', 'table': 'filter',
+            'name': 'x; flush ruleset; list set inet filter ipv4_white_list'
+            }
+        self.assertEqual(nft_helper_daemon.handle_request(request), (1, 'Set not permitted'))
+        request = {'cmd': 'apply', 'nftables': [{'flush': {'set': {
+            'family': 'inet', 'table': 'filter', 'name': 'x; flush ruleset; ipv4_white_list'
+            }}}]}
+        self.assertEqual(nft_helper_daemon.handle_request(request), (1, 'Command not permitted'))
@@ -26,7 +26,7 @@
 #    Adrian Fretwell <adrian@djangopbx.com>
 #
 
-import json
+import math
 from django.utils.translation import gettext_lazy as _
 from django.shortcuts import render
 from django.contrib.admin.views.decorators import staff_member_required
@@ -35,15 +35,27 @@ from django.template.defaulttags import register
 from django.contrib import messages
 from .forms import LogViewerForm, IpAddressForm
 from pbx.commonfunctions import shcommand
-from pbx.amqpcmdevent import AmqpCmdEvent
+from pbx.nftbackend import NftBackend
 from django.utils.http import urlsafe_base64_decode
 from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.response import Response
 from rest_framework import permissions
 from pbx.restpermissions import (
     AdminApiAccessPermission
 )
-from .serializers import FwGenericSerializer, FwCountersSerializer
+from .serializers import FwGenericSerializer, FwCountersSerializer, FwBulkSerializer
+
+FW_LIST_PAGE_SIZE = 500
+
+fw_setname_lookup = {
+    'BL': 'block',
+    'WL': 'white',
+    'SCL': 'sip-customer',
+    'SGL': 'sip-gateway',
+    'WBL': 'web-block'
+}
 
 
 @register.filter
@@ -63,10 +75,6 @@ def ip_prefix(ip):
     return ip
 
 
-def _find_objects(ruleset, type):
-    return [o[type] for o in ruleset if type in o]
-
-
 @staff_member_required
 def fwconfigviewer(request):
     form = LogViewerForm()
@@ -78,161 +86,105 @@ def fwconfigviewer(request):
 
 @staff_member_required
 def fwlistcounters(request):
-    nftjdata = shcommand(['/usr/local/bin/fw-list-counters.sh'])
-    data = json.loads(nftjdata)
     return render(
             request, 'firewall/fwlistcounters.html',
-            {'refresher': 'fwlistcounters', 'counters': _find_objects(data['nftables'], 'counter')}
+            {'refresher': 'fwlistcounters', 'counters': NftBackend().counters()}
             )
 
 
-@staff_member_required
-def fwblocklist(request):
-    nftjdata = shcommand(['/usr/local/bin/fw-show-ipv4-block-list.sh'])
-    dataipv4 = json.loads(nftjdata)
-    nftjdata = shcommand(['/usr/local/bin/fw-show-ipv6-block-list.sh'])
-    dataipv6 = json.loads(nftjdata)
-    ipv4 = []
-    if 'elem' in dataipv4['nftables'][1]['set']:
-        ipv4 = dataipv4['nftables'][1]['set']['elem']
-    ipv6 = []
-    if 'elem' in dataipv6['nftables'][1]['set']:
-        ipv6 = dataipv6['nftables'][1]['set']['elem']
+def _fw_list_page(request, fw_list, title, refresher):
+    nft = NftBackend()
+    try:
+        page = int(request.GET.get('page', 1))
+    except ValueError:
+        page = 1
+    ipv4_count, ipv4 = nft.list_page(fw_list, 'ipv4', page, FW_LIST_PAGE_SIZE)
+    ipv6_count, ipv6 = nft.list_page(fw_list, 'ipv6', page, FW_LIST_PAGE_SIZE)
+    pages = max(math.ceil(max(ipv4_count, ipv6_count) / FW_LIST_PAGE_SIZE), 1)
     return render(
             request, 'firewall/fwiplist.html',
-            {'title': 'Block List', 'refresher': 'fwblocklist', 'ipv4': ipv4, 'ipv6': ipv6}
+            {
+                'title': title, 'refresher': refresher, 'ipv4': ipv4, 'ipv6': ipv6,
+                'ipv4_count': ipv4_count, 'ipv6_count': ipv6_count,
+                'page': page, 'pages': pages,
+                'previous_page': page - 1 if page > 1 else None,
+                'next_page': page + 1 if page < pages else None
+            }
             )
 
 
+@staff_member_required
+def fwblocklist(request):
+    return _fw_list_page(request, 'block', 'Block List', 'fwblocklist')
+
+
 @staff_member_required
 def fwwhitelist(request):
-    nftjdata = shcommand(['/usr/local/bin/fw-show-ipv4-white-list.sh'])
-    dataipv4 = json.loads(nftjdata)
-    nftjdata = shcommand(['/usr/local/bin/fw-show-ipv6-white-list.sh'])
-    dataipv6 = json.loads(nftjdata)
-    ipv4 = []
-    if 'elem' in dataipv4['nftables'][1]['set']:
-        ipv4 = dataipv4['nftables'][1]['set']['elem']
-    ipv6 = []
-    if 'elem' in dataipv6['nftables'][1]['set']:
-        ipv6 = dataipv6['nftables'][1]['set']['elem']
-    return render(
-            request, 'firewall/fwiplist.html',
-            {'title': 'White List', 'refresher': 'fwwhitelist', 'ipv4': ipv4, 'ipv6': ipv6}
-            )
+    return _fw_list_page(request, 'white', 'White List', 'fwwhitelist')
 
 
 @staff_member_required
 def fwsipcustomerlist(request):
-    nftjdata = shcommand(['/usr/local/bin/fw-show-ipv4-sip-customer-list.sh'])
-    dataipv4 = json.loads(nftjdata)
-    nftjdata = shcommand(['/usr/local/bin/fw-show-ipv6-sip-customer-list.sh'])
-    dataipv6 = json.loads(nftjdata)
-    ipv4 = []
-    if 'elem' in dataipv4['nftables'][1]['set']:
-        ipv4 = dataipv4['nftables'][1]['set']['elem']
-    ipv6 = []
-    if 'elem' in dataipv6['nftables'][1]['set']:
-        ipv6 = dataipv6['nftables'][1]['set']['elem']
-    return render(
-            request, 'firewall/fwiplist.html',
-            {'title': 'SIP Customer List', 'refresher': 'fwsipcustomerlist', 'ipv4': ipv4, 'ipv6': ipv6}
-            )
+    return _fw_list_page(request, 'sip-customer', 'SIP Customer List', 'fwsipcustomerlist')
 
 
 @staff_member_required
 def fwsipgatewaylist(request):
-    nftjdata = shcommand(['/usr/local/bin/fw-show-ipv4-sip-gateway-list.sh'])
-    dataipv4 = json.loads(nftjdata)
-    nftjdata = shcommand(['/usr/local/bin/fw-show-ipv6-sip-gateway-list.sh'])
-    dataipv6 = json.loads(nftjdata)
-    ipv4 = []
-    if 'elem' in dataipv4['nftables'][1]['set']:
-        ipv4 = dataipv4['nftables'][1]['set']['elem']
-    ipv6 = []
-    if 'elem' in dataipv6['nftables'][1]['set']:
-        ipv6 = dataipv6['nftables'][1]['set']['elem']
-    return render(
-            request, 'firewall/fwiplist.html',
-            {'title': 'SIP Gateway List', 'refresher': 'fwsipgatewaylist', 'ipv4': ipv4, 'ipv6': ipv6}
-            )
+    return _fw_list_page(request, 'sip-gateway', 'SIP Gateway List', 'fwsipgatewaylist')
 
 
 @staff_member_required
 def fwwebblocklist(request):
-    nftjdata = shcommand(['/usr/local/bin/fw-show-ipv4-web-block-list.sh'])
-    dataipv4 = json.loads(nftjdata)
-    nftjdata = shcommand(['/usr/local/bin/fw-show-ipv6-web-block-list.sh'])
-    dataipv6 = json.loads(nftjdata)
-    ipv4 = []
-    if 'elem' in dataipv4['nftables'][1]['set']:
-        ipv4 = dataipv4['nftables'][1]['set']['elem']
-    ipv6 = []
-    if 'elem' in dataipv6['nftables'][1]['set']:
-        ipv6 = dataipv6['nftables'][1]['set']['elem']
-    return render(
-            request, 'firewall/fwiplist.html',
-            {'title': 'Web Block List', 'refresher': 'fwwebblocklist', 'ipv4': ipv4, 'ipv6': ipv6}
-            )
+    return _fw_list_page(request, 'web-block', 'Web Block List', 'fwwebblocklist')
+
+
+def _fw_form_addresses(form):
+    ip_addresses = []
+    if len(form.cleaned_data['ipv4']) > 0:
+        ipaddr = form.cleaned_data['ipv4']
+        if form.cleaned_data['ipv4len'] < 32:
+            ipaddr += '/' + str(form.cleaned_data['ipv4len'])
+        ip_addresses.append(ipaddr)
+    if len(form.cleaned_data['ipv6']) > 0:
+        ipaddr = form.cleaned_data['ipv6']
+        if form.cleaned_data['ipv6len'] < 128:
+            ipaddr += '/' + str(form.cleaned_data['ipv6len'])
+        ip_addresses.append(ipaddr)
+    return ip_addresses
+
+
+def _fw_add_del_ip(request, action):
+    form = IpAddressForm(request.POST)
+    if not form.is_valid():
+        messages.add_message(request, messages.INFO, _('IP Address is invalid'))
+        return
+    fw_list = fw_setname_lookup.get(request.POST['setname'])
+    if not fw_list:
+        messages.add_message(request, messages.INFO, _('Firewall list is invalid'))
+        return
+    ip_addresses = _fw_form_addresses(form)
+    if not ip_addresses:
+        return
+    nft = NftBackend()
+    if action == 'add':
+        nft.add(fw_list, ip_addresses)
+    else:
+        nft.delete(fw_list, ip_addresses, False)
+    nftdata = nft.commit()
+    if len(nftdata) > 0:
+        messages.add_message(request, messages.INFO, _('Error: %s' % nftdata))
+        return
+    if action == 'add':
+        messages.add_message(request, messages.INFO, _('IP Added'))
+    else:
+        messages.add_message(request, messages.INFO, _('IP Deleted'))
+    nft.publish()
 
 
 @staff_member_required
 def fwaddip(request):
-    firewall_event_template = '{\"Event-Name\":\"FIREWALL\", \"Action\":\"add\", \"IP-Type\":\"%s\",\"Fw-List\":\"%s\", \"IP-Address\":\"%s\"}' # noqa: E501
     if request.method == 'POST':
-
-        form = IpAddressForm(request.POST)
-        setname = request.POST['setname']
-        fwlist = 'None'
-        if setname == 'BL':
-            BLform = form
-            fwlist = 'block'
-        if setname == 'WL':
-            WLform = form
-            fwlist = 'white'
-        if setname == 'SCL':
-            SCLform = form
-            fwlist = 'sip-customer'
-        if setname == 'SGL':
-            SGLform = form
-            fwlist = 'sip-gateway'
-        if setname == 'WBL':
-            SGLform = form
-            fwlist = 'web-block'
-
-        if form.is_valid():
-            broker = AmqpCmdEvent()
-            broker.connect()
-            if len(form.cleaned_data['ipv4']) > 0:
-                ipaddr = form.cleaned_data['ipv4']
-                if form.cleaned_data['ipv4len'] < 32:
-                    ipaddr += '/' + str(form.cleaned_data['ipv4len'])
-                nftdata = shcommand(['/usr/local/bin/fw-add-ipv4-%s-list.sh' % fwlist, ipaddr])
-                if len(nftdata) > 0:
-                    messages.add_message(request, messages.INFO, _('Error: %s' % nftdata))
-                else:
-                    messages.add_message(request, messages.INFO, _('IP Added'))
-                routing = 'DjangoPBX.%s.FIREWALL.add.ipv4' % broker.hostname
-                payload = firewall_event_template % ('ipv4', fwlist, ipaddr)
-
-            if len(form.cleaned_data['ipv6']) > 0:
-                ipaddr = form.cleaned_data['ipv6']
-                if form.cleaned_data['ipv6len'] < 128:
-                    ipaddr += '/' + str(form.cleaned_data['ipv6len'])
-                nftdata = shcommand(['/usr/local/bin/fw-add-ipv6-%s-list.sh' % fwlist, ipaddr])
-                if len(nftdata) > 0:
-                    messages.add_message(request, messages.INFO, _('Error: %s' % nftdata))
-                else:
-                    messages.add_message(request, messages.INFO, _('IP Added'))
-                routing = 'DjangoPBX.%s.FIREWALL.add.ipv6' % broker.hostname
-                payload = firewall_event_template % ('ipv6', fwlist, ipaddr)
-            try:
-                broker.adhoc_publish(payload, routing, 'TAP.Firewall')
-            except:
-                pass
-            broker.disconnect()
-        else:
-            messages.add_message(request, messages.INFO, _('IP Address is invalid'))
+        _fw_add_del_ip(request, 'add')
 
     form = IpAddressForm()
     return render(
@@ -243,61 +195,8 @@ def fwaddip(request):
 
 @staff_member_required
 def fwdelip(request):
-    firewall_event_template = '{\"Event-Name\":\"FIREWALL\", \"Action\":\"delete\", \"IP-Type\":\"%s\",\"Fw-List\":\"%s\", \"IP-Address\":\"%s\"}' # noqa: E501
     if request.method == 'POST':
-
-        form = IpAddressForm(request.POST)
-        setname = request.POST['setname']
-        fwlist = 'None'
-        if setname == 'BL':
-            BLform = form
-            fwlist = 'block'
-        if setname == 'WL':
-            WLform = form
-            fwlist = 'white'
-        if setname == 'SCL':
-            SCLform = form
-            fwlist = 'sip-customer'
-        if setname == 'SGL':
-            SGLform = form
-            fwlist = 'sip-gateway'
-        if setname == 'WBL':
-            SGLform = form
-            fwlist = 'web-block'
-
-        if form.is_valid():
-            broker = AmqpCmdEvent()
-            broker.connect()
-            if len(form.cleaned_data['ipv4']) > 0:
-                ipaddr = form.cleaned_data['ipv4']
-                if form.cleaned_data['ipv4len'] < 32:
-                    ipaddr += '/' + str(form.cleaned_data['ipv4len'])
-                nftdata = shcommand(['/usr/local/bin/fw-delete-ipv4-%s-list.sh' % fwlist, ipaddr])
-                if len(nftdata) > 0:
-                    messages.add_message(request, messages.INFO, _('Error: %s' % nftdata))
-                else:
-                    messages.add_message(request, messages.INFO, _('IP Deleted'))
-                routing = 'DjangoPBX.%s.FIREWALL.delete.ipv4' % broker.hostname
-                payload = firewall_event_template % ('ipv4', fwlist, ipaddr)
-
-            if len(form.cleaned_data['ipv6']) > 0:
-                ipaddr = form.cleaned_data['ipv6']
-                if form.cleaned_data['ipv6len'] < 128:
-                    ipaddr += '/' + str(form.cleaned_data['ipv6len'])
-                nftdata = shcommand(['/usr/local/bin/fw-delete-ipv6-%s-list.sh' % fwlist, ipaddr])
-                if len(nftdata) > 0:
-                    messages.add_message(request, messages.INFO, _('Error: %s' % nftdata))
-                else:
-                    messages.add_message(request, messages.INFO, _('IP Deleted'))
-                routing = 'DjangoPBX.%s.FIREWALL.delete.ipv6' % broker.hostname
-                payload = firewall_event_template % ('ipv6', fwlist, ipaddr)
-            try:
-                broker.adhoc_publish(payload, routing, 'TAP.Firewall')
-            except:
-                pass
-            broker.disconnect()
-        else:
-            messages.add_message(request, messages.INFO, _('IP Address is invalid'))
+        _fw_add_del_ip(request, 'delete')
 
     form = IpAddressForm()
     return render(
@@ -311,15 +210,12 @@ class FwCountersView(viewsets.ReadOnlyModelViewSet):
     API endpoint that allows Firewall counters to be viewed.
     """
     serializer_class = FwCountersSerializer
-    shell_command = '/usr/local/bin/fw-list-counters.sh'
 
     def get_queryset(self):
         pass
 
     def list(self, request):
-        nftjdata = shcommand([self.shell_command])
-        data = json.loads(nftjdata)
-        data = _find_objects(data['nftables'], 'counter')
+        data = NftBackend().counters()
         c_count = 0
         c_data = []
         for counter in data:
@@ -341,8 +237,8 @@ class FirewallViewSet(viewsets.ModelViewSet):
     API endpoint that allows Firewall lists to be viewed and updated.
     """
     serializer_class = FwGenericSerializer
-    shell_command = '/usr/local/bin/fw-%s-%s-%s-list.sh'
-    firewall_event_template = '{\"Event-Name\":\"FIREWALL\", \"Action\":\"%s\", \"IP-Type\":\"%s\",\"Fw-List\":\"%s\", \"IP-Address\":\"%s\"}' # noqa: E501
+    fw_list = None
+    ip_type = None
     fw_list_lookup = {
         'ipv4_white_list': 'white',
         'ipv6_white_list': 'white',
@@ -368,41 +264,26 @@ class FirewallViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         pass
 
-    def build_list_shell_command(self):
-        raise NotImplementedError
-
-    def build_generic_shell_command(self, action='add', ip_type='ipv4_addr', fw_list='ipv4_sip_customer_list'):
-        return self.shell_command % (action, self.ip_type_lookup[ip_type], self.fw_list_lookup[fw_list])
-
-    def send_fw_event(self, action, ip_type, fw_list, ip_address):
-        broker = AmqpCmdEvent()
-        broker.connect()
-        routing = 'DjangoPBX.%s.FIREWALL.%s.%s' % (broker.hostname, action, ip_type)
-        payload = self.firewall_event_template % (action, ip_type, fw_list, ip_address)
-        try:
-            broker.adhoc_publish(payload, routing, 'TAP.Firewall')
-        except:
-            pass
-        broker.disconnect()
+    def set_name(self):
+        return NftBackend().set_path(self.fw_list, self.ip_type)[2]
 
     def list(self, request):
-        nftjdata = shcommand([self.build_list_shell_command()])
-        data = json.loads(nftjdata)
-        ip_count = 0
-        ip_data = []
-        ip_type = ''
-        fw_list = ''
-        if 'type' in data['nftables'][1]['set']:
-            ip_type = data['nftables'][1]['set']['type']
-        if 'name' in data['nftables'][1]['set']:
-            fw_list = data['nftables'][1]['set']['name']
-        if 'elem' in data['nftables'][1]['set']:
-            for ip in  data['nftables'][1]['set']['elem']:
-                ipd = {'ip_type': ip_type, 'fw_list': fw_list, 'ip_address': ip}
-                ip_data.append(ipd)
-                ip_count += 1
+        try:
+            page = int(request.query_params.get('page', 1))
+            page_size = int(request.query_params.get('page_size', 0))
+        except ValueError:
+            return Response({'Error': _('Invalid page')}, status=status.HTTP_400_BAD_REQUEST)
+        ip_count, elements = NftBackend().list_page(self.fw_list, self.ip_type, page, page_size)
+        ip_type = '%s_addr' % self.ip_type
+        fw_list = self.set_name()
+        ip_data = [{'ip_type': ip_type, 'fw_list': fw_list, 'ip_address': ip} for ip in elements]
         results = self.serializer_class(ip_data, many=True, context={'request': request}).data
-        return Response({'count': ip_count, 'results': results})
+        response = {'count': ip_count, 'results': results}
+        if page_size > 0:
+            url = request.build_absolute_uri()
+            response['next'] = replace_query_param(url, 'page', page + 1) if page * page_size < ip_count else None
+            response['previous'] = replace_query_param(url, 'page', page - 1) if page > 1 else None
+        return Response(response)
 
     def retrieve(self, request, pk=None):
         if not pk:
@@ -418,10 +299,12 @@ class FirewallViewSet(viewsets.ModelViewSet):
                 ip_address = '%s/%s' % (fwdata['ip_address'], fwdata['suffix'])
             else:
                 ip_address = fwdata['ip_address']
-            nftdata = shcommand([self.build_generic_shell_command('add', fwdata['ip_type'], fwdata['fw_list']), ip_address])
-            self.send_fw_event('add', fwdata['ip_type'], fwdata['fw_list'], ip_address)
+            nft = NftBackend()
+            nft.add(self.fw_list_lookup[fwdata['fw_list']], [ip_address])
+            nftdata = nft.commit()
             if len(nftdata) > 0:
                 return Response({'Error': _(nftdata)}, status=status.HTTP_400_BAD_REQUEST)
+            nft.publish()
             return Response({'added': 'OK', 'ip_address': fwdata['ip_address']}, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -429,88 +312,121 @@ class FirewallViewSet(viewsets.ModelViewSet):
         if not pk:
             return Response({'status': 'err', 'message': 'pk not found'})
         ip_type, fw_list, ip_address = urlsafe_base64_decode(pk).decode().split('&')
-        nftdata = shcommand([self.build_generic_shell_command('delete', ip_type, fw_list), ip_address])
-        self.send_fw_event('delete', ip_type, fw_list, ip_address)
+        nft = NftBackend()
+        nft.delete(self.fw_list_lookup[fw_list], [ip_address], False)
+        nftdata = nft.commit()
         if len(nftdata) > 0:
             return Response({'Error': _(nftdata)}, status=status.HTTP_400_BAD_REQUEST)
+        nft.publish()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def bulk_update(self, request, action):
+        serializer = FwBulkSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        ip_addresses = serializer.validated_data['ip_addresses']
+        wrong_type = [ip for ip in ip_addresses if not NftBackend().ip_type(ip) == self.ip_type]
+        if wrong_type:
+            return Response({'Error': _('Wrong address family: %s' % ', '.join(wrong_type[:10]))}, status=status.HTTP_400_BAD_REQUEST)
+        nft = NftBackend()
+        skipped = []
+        if action == 'add':
+            nft.add(self.fw_list, ip_addresses)
+        else:
+            skipped = nft.delete(self.fw_list, ip_addresses)
+        nftdata = nft.commit()
+        if len(nftdata) > 0:
+            return Response({'Error': _(nftdata)}, status=status.HTTP_400_BAD_REQUEST)
+        nft.publish()
+        count = sum(len(v) for v in nft.pending.values())
+        if skipped:
+            return Response({action: count, 'skipped': skipped})
+        return Response({action: count})
+
+    @action(detail=False, methods=['post'])
+    def bulk_add(self, request):
+        return self.bulk_update(request, 'add')
+
+    @action(detail=False, methods=['post'])
+    def bulk_delete(self, request):
+        return self.bulk_update(request, 'delete')
+
 
 class FwWhiteIpv4View(FirewallViewSet):
     """
     API endpoint that allows Firewall White IPv4 lists to be viewed and updated.
     """
-    def build_list_shell_command(self):
-        return self.shell_command % ('show', 'ipv4', 'white')
+    fw_list = 'white'
+    ip_type = 'ipv4'
 
 
 class FwWhiteIpv6View(FirewallViewSet):
     """
     API endpoint that allows Firewall White IPv6 lists to be viewed and updated.
     """
-    def build_list_shell_command(self):
-        return self.shell_command % ('show', 'ipv6', 'white')
+    fw_list = 'white'
+    ip_type = 'ipv6'
 
 
 class FwSipGatewayIpv4View(FirewallViewSet):
     """
     API endpoint that allows Firewall SIP Gateway IPv4 lists to be viewed and updated.
     """
-    def build_list_shell_command(self):
-        return self.shell_command % ('show', 'ipv4', 'sip-gateway')
+    fw_list = 'sip-gateway'
+    ip_type = 'ipv4'
 
 
 class FwSipGatewayIpv6View(FirewallViewSet):
     """
     API endpoint that allows Firewall SIP Gateway IPv6 lists to be viewed and updated.
     """
-    def build_list_shell_command(self):
-        return self.shell_command % ('show', 'ipv6', 'sip-gateway')
+    fw_list = 'sip-gateway'
+    ip_type = 'ipv6'
 
 
 class FwSipCustomerIpv4View(FirewallViewSet):
     """
     API endpoint that allows Firewall SIP Customer IPv4 lists to be viewed and updated.
     """
-    def build_list_shell_command(self):
-        return self.shell_command % ('show', 'ipv4', 'sip-customer')
+    fw_list = 'sip-customer'
+    ip_type = 'ipv4'
 
 
 class FwSipCustomerIpv6View(FirewallViewSet):
     """
     API endpoint that allows Firewall SIP Customer IPv6 lists to be viewed and updated.
     """
-    def build_list_shell_command(self):
-        return self.shell_command % ('show', 'ipv6', 'sip-customer')
+    fw_list = 'sip-customer'
+    ip_type = 'ipv6'
 
 
 class FwWebBlockIpv4View(FirewallViewSet):
     """
     API endpoint that allows Firewall Web Block IPv4 lists to be viewed and updated.
     """
-    def build_list_shell_command(self):
-        return self.shell_command % ('show', 'ipv4', 'web-block')
+    fw_list = 'web-block'
+    ip_type = 'ipv4'
 
 
 class FwWebBlockIpv6View(FirewallViewSet):
     """
     API endpoint that allows Firewall Web Block IPv6 lists to be viewed and updated.
     """
-    def build_list_shell_command(self):
-        return self.shell_command % ('show', 'ipv6', 'web-block')
+    fw_list = 'web-block'
+    ip_type = 'ipv6'
 
 
 class FwBlockIpv4View(FirewallViewSet):
     """
     API endpoint that allows Firewall Block IPv4 lists to be viewed and updated.
     """
-    def build_list_shell_command(self):
-        return self.shell_command % ('show', 'ipv4', 'block')
+    fw_list = 'block'
+    ip_type = 'ipv4'
 
 
 class FwBlockIpv6View(FirewallViewSet):
     """
     API endpoint that allows Firewall Block IPv6 lists to be viewed and updated.
     """
-    def build_list_shell_command(self):
-        return self.shell_command % ('show', 'ipv6', 'block')
+    fw_list = 'block'
+    ip_type = 'ipv6'
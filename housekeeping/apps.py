@@ -29,6 +29,7 @@
 
 from django.apps import AppConfig
 from django.utils.translation import gettext_lazy as _
+from django.db.models.signals import post_delete
 
 
 class HousekeepingConfig(AppConfig):
@@ -40,3 +41,11 @@ class HousekeepingConfig(AppConfig):
     pbx_subcategory = ''
     pbx_version = '1.0'
     pbx_license = 'MIT License'
+
+    def ready(self):
+        from .replication import replicated_models, record_tombstone
+        for model in replicated_models():
+            post_delete.connect(
+                record_tombstone, sender=model, weak=False,
+                dispatch_uid='housekeeping:tombstone:%s' % model._meta.label_lower
+                )
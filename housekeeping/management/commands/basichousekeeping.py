@@ -35,6 +35,10 @@ from tenants.pbxsettings import PbxSettings
 from django.contrib.admin.models import LogEntry
 from tenants.models import Domain
 from xmlcdr.models import XmlCdr
+from switch.models import EmailQueue, EmailQueueStatusChoice
+from voicemail.models import VoicemailJob, VmJobStatusChoice
+from recordings.resumableupload import purge_upload_sessions
+from housekeeping.models import ReplicationTombstone
 from pbx.sshconnect import SSHConnection
 
 
@@ -58,6 +62,10 @@ class Command(BaseCommand):
         days_keep_cdrs = self.get_hk_default_setting('days_keep_cdrs', 10)
         days_keep_cdr_json = self.get_hk_default_setting('days_keep_cdr_json', 10)
         days_keep_admin_logs = self.get_hk_default_setting('days_keep_admin_logs', 60)
+        days_keep_email_queue = self.get_hk_default_setting('days_keep_email_queue', 7)
+        days_keep_voicemail_jobs = self.get_hk_default_setting('days_keep_voicemail_jobs', 7)
+        days_keep_upload_sessions = self.get_hk_default_setting('days_keep_upload_sessions', 2)
+        days_keep_replication_tombstones = self.get_hk_default_setting('days_keep_replication_tombstones', 30)
 
         # Set json field empty to save db space
         query_time = timezone.now() - timezone.timedelta(days_keep_cdr_json)
@@ -67,6 +75,21 @@ class Command(BaseCommand):
         query_time = timezone.now() - timezone.timedelta(days_keep_admin_logs)
         LogEntry.objects.filter(action_time__lt=query_time).delete()
 
+        # Delete delivered Email Queue messages
+        query_time = timezone.now() - timezone.timedelta(days_keep_email_queue)
+        EmailQueue.objects.filter(status=EmailQueueStatusChoice.CSENT, updated__lt=query_time).delete()
+
+        # Delete completed Voicemail Jobs
+        query_time = timezone.now() - timezone.timedelta(days_keep_voicemail_jobs)
+        VoicemailJob.objects.filter(status=VmJobStatusChoice.CDONE, updated__lt=query_time).delete()
+
+        # Delete abandoned resumable upload sessions
+        purge_upload_sessions(days_keep_upload_sessions)
+
+        # Delete replication tombstones never acknowledged by a peer
+        query_time = timezone.now() - timezone.timedelta(days_keep_replication_tombstones)
+        ReplicationTombstone.objects.filter(deleted__lt=query_time).delete()
+
         qs = Domain.objects.filter(enabled='true')
         for q in qs:
             domain_id = str(q.id)
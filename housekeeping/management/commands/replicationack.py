@@ -0,0 +1,57 @@
+#
+#    DjangoPBX
+#
+#    MIT License
+#
+#    Copyright (c) 2016 - 2024 Adrian Fretwell <adrian@djangopbx.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+#
+#    Contributor(s):
+#    Adrian Fretwell <adrian@djangopbx.com>
+#
+
+import sys
+from django.core.management.base import BaseCommand, CommandError
+
+from housekeeping.replication import ReplicationFunctions
+
+
+class Command(BaseCommand):
+    help = 'Mark rows as synchronised once the replication peer has acknowledged them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('ack', help='Acknowledgement file, - for stdin')
+        parser.add_argument('--database', default='default', help='Database the change log was exported from')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows stamped per query')
+
+    def handle(self, *args, **kwargs):
+        rf = ReplicationFunctions(kwargs['database'], kwargs['batch_size'])
+        try:
+            if kwargs['ack'] == '-':
+                counts = rf.acknowledge(sys.stdin.buffer)
+            else:
+                with open(kwargs['ack'], 'rb') as f:
+                    counts = rf.acknowledge(f)
+        except (ValueError, KeyError, OSError) as e:
+            raise CommandError('Acknowledgement not applied: %s' % e)
+        if kwargs['verbosity'] > 0:
+            self.stderr.write('%s rows synchronised, %s deletions confirmed' % (
+                counts['stamped'], counts['tombstones']
+                ))
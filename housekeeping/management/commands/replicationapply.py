@@ -0,0 +1,68 @@
+#
+#    DjangoPBX
+#
+#    MIT License
+#
+#    Copyright (c) 2016 - 2024 Adrian Fretwell <adrian@djangopbx.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+#
+#    Contributor(s):
+#    Adrian Fretwell <adrian@djangopbx.com>
+#
+
+import sys
+from django.core.management.base import BaseCommand, CommandError
+
+from housekeeping.replication import ReplicationFunctions
+from utilities.clearcache import ClearCache
+
+
+class Command(BaseCommand):
+    help = 'Apply a replication change log and write the acknowledgement for the sending node'
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='Change log file, - for stdin')
+        parser.add_argument('--ack', required=True, help='Acknowledgement file, - for stdout')
+        parser.add_argument('--database', default='default', help='Database to apply to')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows written per query')
+
+    def handle(self, *args, **kwargs):
+        rf = ReplicationFunctions(kwargs['database'], kwargs['batch_size'])
+        try:
+            if kwargs['input'] == '-':
+                ack, counts = rf.apply(sys.stdin.buffer)
+            else:
+                with open(kwargs['input'], 'rb') as f:
+                    ack, counts = rf.apply(f)
+        except (ValueError, KeyError, OSError) as e:
+            raise CommandError('Change log not applied: %s' % e)
+        if counts['applied'] or counts['deleted']:
+            ClearCache().clearall()
+        if kwargs['ack'] == '-':
+            rf.write_ack(sys.stdout.buffer, ack)
+            sys.stdout.flush()
+        else:
+            with open(kwargs['ack'], 'wb') as f:
+                rf.write_ack(f, ack)
+        if kwargs['verbosity'] > 0:
+            self.stderr.write(
+                '%s applied, %s deleted, %s stale, %s skipped' %
+                (counts['applied'], counts['deleted'], counts['stale'], counts['skipped'])
+                )
@@ -0,0 +1,53 @@
+#
+#    DjangoPBX
+#
+#    MIT License
+#
+#    Copyright (c) 2016 - 2024 Adrian Fretwell <adrian@djangopbx.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+#
+#    Contributor(s):
+#    Adrian Fretwell <adrian@djangopbx.com>
+#
+
+import sys
+from django.core.management.base import BaseCommand
+
+from housekeeping.replication import ReplicationFunctions
+
+
+class Command(BaseCommand):
+    help = 'Write rows changed since the replication peer last acknowledged them as a compressed change log'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Change log file, - for stdout')
+        parser.add_argument('--database', default='default', help='Database to export from')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows fetched per query')
+
+    def handle(self, *args, **kwargs):
+        rf = ReplicationFunctions(kwargs['database'], kwargs['batch_size'])
+        if kwargs['output'] == '-':
+            counts = rf.export(sys.stdout.buffer)
+            sys.stdout.flush()
+        else:
+            with open(kwargs['output'], 'wb') as f:
+                counts = rf.export(f)
+        if kwargs['verbosity'] > 0:
+            self.stderr.write('%s upserts, %s deletes exported' % (counts['upserts'], counts['deletes']))
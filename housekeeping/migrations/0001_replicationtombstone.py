@@ -0,0 +1,28 @@
+# Generated by Django 5.0.1 on 2026-10-19 12:42
+
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReplicationTombstone',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('model_label', models.CharField(max_length=128, verbose_name='Model')),
+                ('object_id', models.CharField(max_length=64, verbose_name='Object')),
+                ('deleted', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Deleted')),
+            ],
+            options={
+                'db_table': 'pbx_replication_tombstones',
+            },
+        ),
+    ]
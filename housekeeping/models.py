@@ -27,6 +27,23 @@
 #    Adrian Fretwell <adrian@djangopbx.com>
 #
 
+import uuid
 from django.db import models
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
 
-# Create your models here.
+
+#
+# Deleted rows waiting to be sent to the replication peer
+#
+class ReplicationTombstone(models.Model):
+    id           = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)     # noqa: E501, E221
+    model_label  = models.CharField(max_length=128, verbose_name=_('Model'))                  # noqa: E501, E221
+    object_id    = models.CharField(max_length=64, verbose_name=_('Object'))                   # noqa: E501, E221
+    deleted      = models.DateTimeField(default=timezone.now, db_index=True, verbose_name=_('Deleted'))  # noqa: E501, E221
+
+    class Meta:
+        db_table = 'pbx_replication_tombstones'
+
+    def __str__(self):
+        return '%s %s' % (self.model_label, self.object_id)
@@ -0,0 +1,310 @@
+#
+#    DjangoPBX
+#
+#    MIT License
+#
+#    Copyright (c) 2016 - 2024 Adrian Fretwell <adrian@djangopbx.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+#
+#    Contributor(s):
+#    Adrian Fretwell <adrian@djangopbx.com>
+#
+
+import datetime
+import decimal
+import gzip
+import json
+import threading
+import uuid
+from contextlib import contextmanager
+from django.apps import apps
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import ReplicationTombstone
+
+CHANGE_LOG_FORMAT = 'djangopbx-changes'
+CHANGE_LOG_VERSION = 1
+
+_state = threading.local()
+
+
+def replicated_models():
+    # Models with updated and synchronised columns, parents before children.
+    exclude = {label.lower() for label in settings.PBX_REPLICATION_EXCLUDE}
+    pending = []
+    for model in apps.get_models():
+        names = {f.name for f in model._meta.concrete_fields}
+        if 'updated' in names and 'synchronised' in names and model._meta.label_lower not in exclude:
+            pending.append(model)
+    ordered = []
+    while pending:
+        ready = [
+            m for m in pending
+            if not any(
+                f.related_model in pending for f in m._meta.concrete_fields
+                if f.is_relation and f.related_model is not m
+                )
+            ]
+        if not ready:
+            ready = pending[:1]
+        for m in ready:
+            pending.remove(m)
+        ordered.extend(ready)
+    return ordered
+
+
+def record_tombstone(sender, instance, using, **kwargs):
+    # Nodes without a replication peer never acknowledge tombstones, so none are kept.
+    if not settings.PBX_REPLICATION_ENABLED or getattr(_state, 'applying', False):
+        return
+    ReplicationTombstone.objects.using(using).create(
+        model_label=sender._meta.label_lower, object_id=str(instance.pk)
+        )
+
+
+def encode(o):
+    if isinstance(o, (datetime.datetime, datetime.date, datetime.time)):
+        return o.isoformat()
+    if isinstance(o, (uuid.UUID, decimal.Decimal)):
+        return str(o)
+    raise TypeError('%s is not JSON serializable' % type(o).__name__)
+
+
+def parse_stamp(value):
+    return parse_datetime(value) if value else None
+
+
+class ReplicationFunctions():
+    # Change data capture to a peer node using the updated and synchronised columns.
+    #  export() writes rows updated since the peer last acknowledged them, and pending
+    #  deletions, as an ordered gzip compressed change log.  apply() loads a change log
+    #  on the peer and returns the acknowledgement, acknowledge() stamps synchronised
+    #  on the source rows that the acknowledgement confirms.
+
+    def __init__(self, using='default', batch_size=500):
+        self.using = using
+        self.batch_size = batch_size
+        self.models = replicated_models()
+        self.by_label = {m._meta.label_lower: m for m in self.models}
+        self.local_fields = {name.lower() for name in settings.PBX_REPLICATION_LOCAL_FIELDS}
+
+    def fields(self, model):
+        label = model._meta.label_lower
+        return [
+            f for f in model._meta.concrete_fields
+            if not f.primary_key and '%s.%s' % (label, f.name.lower()) not in self.local_fields
+            ]
+
+    def write(self, out, record):
+        out.write(json.dumps(record, default=encode, separators=(',', ':')))
+        out.write('\n')
+
+    def check_header(self, header):
+        if header.get('format') != CHANGE_LOG_FORMAT or header.get('version') != CHANGE_LOG_VERSION:
+            raise ValueError('Not a version %s change log' % CHANGE_LOG_VERSION)
+
+    def export(self, fileobj):
+        counts = {'upserts': 0, 'deletes': 0}
+        seq = 0
+        with gzip.open(fileobj, 'wt', encoding='utf-8') as out, transaction.atomic(using=self.using):
+            self.write(out, {
+                'format': CHANGE_LOG_FORMAT, 'version': CHANGE_LOG_VERSION,
+                'batch': uuid.uuid4(), 'created': timezone.now()
+                })
+            for model in self.models:
+                label = model._meta.label_lower
+                attnames = [f.attname for f in self.fields(model) if f.name != 'synchronised']
+                qs = model._default_manager.using(self.using).filter(
+                    Q(synchronised__isnull=True) | Q(updated__gt=F('synchronised'))
+                    ).order_by('updated', 'pk').values_list('pk', *attnames)
+                for row in qs.iterator(chunk_size=self.batch_size):
+                    seq += 1
+                    self.write(out, {
+                        'seq': seq, 'op': 'upsert', 'model': label, 'pk': row[0],
+                        'fields': dict(zip(attnames, row[1:]))
+                        })
+                    counts['upserts'] += 1
+            tombstones = ReplicationTombstone.objects.using(self.using).filter(
+                model_label__in=list(self.by_label)
+                ).order_by('deleted', 'id')
+            for t in tombstones.iterator(chunk_size=self.batch_size):
+                seq += 1
+                self.write(out, {
+                    'seq': seq, 'op': 'delete', 'model': t.model_label, 'pk': t.object_id,
+                    'deleted': t.deleted, 'tombstone': t.id
+                    })
+                counts['deletes'] += 1
+        return counts
+
+    def apply(self, fileobj):
+        counts = {'applied': 0, 'deleted': 0, 'stale': 0, 'skipped': 0}
+        with gzip.open(fileobj, 'rt', encoding='utf-8') as src:
+            header = json.loads(src.readline() or '{}')
+            self.check_header(header)
+            ack = {
+                'format': CHANGE_LOG_FORMAT, 'version': CHANGE_LOG_VERSION,
+                'batch': header['batch'], 'upserts': {}, 'deletes': []
+                }
+            with transaction.atomic(using=self.using), self.applying():
+                chunk = []
+                for seq, line in enumerate(src, 1):
+                    record = json.loads(line)
+                    if record['seq'] != seq:
+                        raise ValueError('Change log record %s found where %s was expected' % (record['seq'], seq))
+                    if chunk and (
+                            (record['op'], record['model']) != (chunk[0]['op'], chunk[0]['model'])
+                            or len(chunk) >= self.batch_size):
+                        self.apply_chunk(chunk, ack, counts)
+                        chunk = []
+                    chunk.append(record)
+                if chunk:
+                    self.apply_chunk(chunk, ack, counts)
+        return ack, counts
+
+    def apply_chunk(self, records, ack, counts):
+        label = records[0]['model']
+        model = self.by_label.get(label)
+        if records[0]['op'] == 'delete':
+            ack['deletes'].extend(r['tombstone'] for r in records)
+            if model is None:
+                counts['skipped'] += len(records)
+                return
+            self.apply_deletes(model, records, counts)
+            return
+        ack['upserts'].setdefault(label, []).extend([r['pk'], r['fields'].get('updated')] for r in records)
+        if model is None:
+            counts['skipped'] += len(records)
+            return
+        self.apply_upserts(model, records, counts)
+
+    def apply_upserts(self, model, records, counts):
+        # Last writer wins, a row updated here more recently than the incoming copy is kept.
+        pk_field = model._meta.pk
+        sent = records[0]['fields']
+        fields = [pk_field] + [f for f in self.fields(model) if f.attname in sent or f.name == 'synchronised']
+        mgr = model._default_manager.using(self.using)
+        pks = [pk_field.to_python(r['pk']) for r in records]
+        local = dict(mgr.filter(pk__in=pks).values_list('pk', 'updated'))
+        rows = []
+        for pk, r in zip(pks, records):
+            row = {f.attname: f.to_python(r['fields'].get(f.attname)) for f in fields[1:]}
+            updated = row.get('updated')
+            if local.get(pk) and updated and local[pk] > updated:
+                counts['stale'] += 1
+                continue
+            row[pk_field.attname] = pk
+            row['synchronised'] = updated
+            rows.append(row)
+        if not rows:
+            return
+        self.resolve_references(fields, rows)
+        self.upsert(model, fields, rows)
+        counts['applied'] += len(rows)
+
+    def upsert(self, model, fields, rows):
+        # INSERT ... ON CONFLICT rather than bulk_create(), which prepares every value
+        #  through the model and would stamp auto_now fields with the time here.
+        connection = connections[self.using]
+        qn = connection.ops.quote_name
+        sql = 'INSERT INTO %s (%s) VALUES (%s) ON CONFLICT (%s) DO UPDATE SET %s' % (
+            qn(model._meta.db_table), ', '.join(qn(f.column) for f in fields), ', '.join(['%s'] * len(fields)),
+            qn(model._meta.pk.column), ', '.join('%s = EXCLUDED.%s' % (qn(f.column), qn(f.column)) for f in fields[1:])
+            )
+        params = [[f.get_db_prep_save(row[f.attname], connection) for f in fields] for row in rows]
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, params)
+
+    def resolve_references(self, fields, rows):
+        # Rows of models that are not replicated may not exist here, the reference
+        #  is dropped rather than failing the whole change log.
+        for f in fields:
+            if not f.is_relation or f.related_model in self.models or not f.null:
+                continue
+            wanted = {row[f.attname] for row in rows} - {None}
+            if not wanted:
+                continue
+            target = f.target_field.attname
+            found = set(
+                f.related_model._base_manager.using(self.using).filter(
+                    **{'%s__in' % target: wanted}
+                    ).values_list(target, flat=True)
+                )
+            for row in rows:
+                if row[f.attname] not in found:
+                    row[f.attname] = None
+
+    def apply_deletes(self, model, records, counts):
+        pk_field = model._meta.pk
+        mgr = model._default_manager.using(self.using)
+        deleted = {pk_field.to_python(r['pk']): parse_stamp(r['deleted']) for r in records}
+        doomed = []
+        for pk, updated in mgr.filter(pk__in=deleted).values_list('pk', 'updated'):
+            if updated and updated > deleted[pk]:
+                counts['stale'] += 1
+            else:
+                doomed.append(pk)
+        if doomed:
+            mgr.filter(pk__in=doomed).delete()
+            counts['deleted'] += len(doomed)
+
+    def acknowledge(self, fileobj):
+        # Only rows still holding the acknowledged updated value are stamped, anything
+        #  edited since the export stays pending for the next change log.
+        with gzip.open(fileobj, 'rt', encoding='utf-8') as src:
+            ack = json.load(src)
+        self.check_header(ack)
+        counts = {'stamped': 0, 'tombstones': 0}
+        with transaction.atomic(using=self.using):
+            for label, pairs in ack['upserts'].items():
+                model = self.by_label.get(label)
+                if model is None:
+                    continue
+                pk_field = model._meta.pk
+                mgr = model._default_manager.using(self.using)
+                for i in range(0, len(pairs), self.batch_size):
+                    acked = {
+                        pk_field.to_python(pk): parse_stamp(updated) for pk, updated in pairs[i:i + self.batch_size]
+                        }
+                    current = mgr.select_for_update().filter(pk__in=acked).values_list('pk', 'updated')
+                    done = [pk for pk, updated in current if updated == acked[pk]]
+                    if done:
+                        counts['stamped'] += mgr.filter(pk__in=done).update(synchronised=F('updated'))
+            tombstones = ack['deletes']
+            for i in range(0, len(tombstones), self.batch_size):
+                counts['tombstones'] += ReplicationTombstone.objects.using(self.using).filter(
+                    id__in=tombstones[i:i + self.batch_size]
+                    ).delete()[0]
+        return counts
+
+    def write_ack(self, fileobj, ack):
+        with gzip.open(fileobj, 'wt', encoding='utf-8') as out:
+            self.write(out, ack)
+
+    @contextmanager
+    def applying(self):
+        # Deletions made while applying a change log are not sent back as tombstones.
+        _state.applying = True
+        try:
+            yield
+        finally:
+            _state.applying = False
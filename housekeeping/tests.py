@@ -27,6 +27,146 @@
 #    Adrian Fretwell <adrian@djangopbx.com>
 #
 
-from django.test import TestCase
+import hashlib
+import io
+from django.test import TransactionTestCase, override_settings
+from accounts.models import Extension
+from ringgroups.models import RingGroup, RingGroupDestination
+from tenants.models import Domain
+from voicemail.models import Voicemail
+from .models import ReplicationTombstone
+from .replication import ReplicationFunctions
 
-# Create your tests here.
+# The freeswitch alias is only used as a second, fully migrated test database here.
+PEER = 'freeswitch'
+
+
+@override_settings(PBX_REPLICATION_ENABLED=True)
+class ReplicationConvergenceTestCase(TransactionTestCase):
+    databases = {'default', PEER}
+
+    def setUp(self):
+        d = Domain.objects.create(name='repl.example.com', enabled='true', updated_by='test')
+        for i in range(20):
+            e = Extension.objects.create(
+                domain_id=d, extension=str(200 + i), password='x', user_context=d.name,
+                description='e%d' % i, updated_by='test'
+                )
+            Voicemail.objects.create(extension_id=e, password='1234', updated_by='test')
+        rg = RingGroup.objects.create(domain_id=d, name='sales', extension='600', updated_by='test')
+        for i in range(5):
+            RingGroupDestination.objects.create(ring_group_id=rg, number=str(200 + i), updated_by='test')
+
+    def replicate(self, source, target, apply_twice=False):
+        src = ReplicationFunctions(source, batch_size=7)
+        dst = ReplicationFunctions(target, batch_size=7)
+        log = io.BytesIO()
+        counts = src.export(log)
+        log.seek(0)
+        ack, applied = dst.apply(log)
+        if apply_twice:
+            log.seek(0)
+            self.assertEqual(dst.apply(log)[0], ack)
+        ackfile = io.BytesIO()
+        dst.write_ack(ackfile, ack)
+        ackfile.seek(0)
+        src.acknowledge(ackfile)
+        return counts, applied
+
+    def digest(self, using):
+        rf = ReplicationFunctions(using)
+        h = hashlib.sha1()
+        for m in rf.models:
+            names = [f.attname for f in rf.fields(m) if f.name != 'synchronised']
+            for row in m._default_manager.using(using).order_by('pk').values_list('pk', *names):
+                h.update(repr(row).encode())
+        return h.hexdigest()
+
+    def extensions(self, using):
+        return dict(Extension.objects.using(using).values_list('extension', 'description'))
+
+    def test_initial_copy_is_acknowledged(self):
+        counts, applied = self.replicate('default', PEER)
+        self.assertEqual(counts['deletes'], 0)
+        self.assertEqual(applied['applied'], counts['upserts'])
+        self.assertEqual(self.digest('default'), self.digest(PEER))
+        counts, applied = self.replicate('default', PEER)
+        self.assertEqual(counts, {'upserts': 0, 'deletes': 0})
+
+    def test_interleaved_edits_and_deletes_converge(self):
+        self.replicate('default', PEER)
+
+        # Edits and deletes on both nodes, some rows touched on both sides
+        e = Extension.objects.get(extension='200')
+        e.description = 'edited on A'
+        e.save()
+        Extension.objects.get(extension='201').delete()
+        Voicemail.objects.filter(extension_id__extension='202').delete()
+        e = Extension.objects.using(PEER).get(extension='210')
+        e.description = 'edited on B'
+        e.save()
+        e = Extension.objects.using(PEER).get(extension='211')
+        e.description = 'B first'
+        e.save()
+        Extension.objects.using(PEER).get(extension='212').delete()
+        RingGroupDestination.objects.using(PEER).filter(number='204').delete()
+        e = Extension.objects.get(extension='211')
+        e.description = 'A later wins'
+        e.save()
+
+        self.replicate('default', PEER, apply_twice=True)
+        self.replicate(PEER, 'default', apply_twice=True)
+        self.replicate('default', PEER)
+
+        self.assertEqual(self.digest('default'), self.digest(PEER))
+        exts = self.extensions('default')
+        self.assertEqual(exts, self.extensions(PEER))
+        self.assertEqual(exts['200'], 'edited on A')
+        self.assertEqual(exts['210'], 'edited on B')
+        self.assertEqual(exts['211'], 'A later wins')
+        self.assertNotIn('201', exts)
+        self.assertNotIn('212', exts)
+        self.assertFalse(RingGroupDestination.objects.using('default').filter(number='204').exists())
+
+        # Quiescent, nothing left to send either way and every tombstone acknowledged
+        for using in ('default', PEER):
+            counts = ReplicationFunctions(using).export(io.BytesIO())
+            self.assertEqual(counts, {'upserts': 0, 'deletes': 0})
+            self.assertFalse(ReplicationTombstone.objects.using(using).exists())
+
+    def test_edit_between_export_and_ack_stays_pending(self):
+        self.replicate('default', PEER)
+        e = Extension.objects.get(extension='205')
+        e.description = 'first'
+        e.save()
+        src = ReplicationFunctions('default')
+        log = io.BytesIO()
+        src.export(log)
+        e.description = 'second'
+        e.save()
+        log.seek(0)
+        ack, applied = ReplicationFunctions(PEER).apply(log)
+        ackfile = io.BytesIO()
+        src.write_ack(ackfile, ack)
+        ackfile.seek(0)
+        src.acknowledge(ackfile)
+        self.assertEqual(self.extensions(PEER)['205'], 'first')
+        counts, applied = self.replicate('default', PEER)
+        self.assertEqual(counts['upserts'], 1)
+        self.assertEqual(self.extensions(PEER)['205'], 'second')
+
+
+class ReplicationTombstoneTestCase(TransactionTestCase):
+
+    def test_no_tombstones_without_replication(self):
+        d = Domain.objects.create(name='single.example.com', enabled='true', updated_by='test')
+        Extension.objects.create(domain_id=d, extension='200', password='x', user_context=d.name, updated_by='test')
+        Extension.objects.get(extension='200').delete()
+        self.assertFalse(ReplicationTombstone.objects.exists())
+
+        with self.settings(PBX_REPLICATION_ENABLED=True):
+            Extension.objects.create(
+                domain_id=d, extension='201', password='x', user_context=d.name, updated_by='test'
+                )
+            Extension.objects.get(extension='201').delete()
+        self.assertTrue(ReplicationTombstone.objects.filter(model_label='accounts.extension').exists())
@@ -27,12 +27,10 @@
 #    Adrian Fretwell <adrian@djangopbx.com>
 #
 
-from django.core.cache import cache
 from lxml import etree
 from .httapihandler import HttApiHandler
 from callflows.models import CallFlows
-from callflows.callflowfunctions import CfFunctions
-from pbx.commonevents import PresenceIn
+from callflows.callflowstate import CallFlowState, CallFlowPresence
 
 
 class CallFlowToggleHandler(HttApiHandler):
@@ -60,29 +58,19 @@ class CallFlowToggleHandler(HttApiHandler):
                 pin_number = self.session_json['pin_number']
                 if pin_number == self.qdict.get('pb_input', ''):
                     etree.SubElement(x_work, 'pause', milliseconds='1000')
-                    if q.status == 'true':
-                        etree.SubElement(
-                            x_work, 'playback',
-                            file='ivr/ivr-night_mode.wav'
-                            )
-                        q.status = 'false'
-                    else:
-                        etree.SubElement(
-                            x_work, 'playback',
-                            file='ivr/ivr-day_mode.wav'
-                            )
-                        q.status = 'true'
-                    q.save()
-                    cff = CfFunctions(q, self.handler_name)
-                    cff.generate_xml()
+                    cf = CallFlowState().toggle(q.id, self.handler_name)
+                    if cf:
+                        if cf.status == 'true':
+                            etree.SubElement(x_work, 'playback', file='ivr/ivr-day_mode.wav')
+                        else:
+                            etree.SubElement(x_work, 'playback', file='ivr/ivr-night_mode.wav')
                     etree.SubElement(x_work, 'pause', milliseconds='1000')
                     etree.SubElement(x_work, 'playback', file='voicemail/vm-goodbye.wav')
                     etree.SubElement(x_work, 'hangup')
-                    directory_cache_key = 'dialplan:%s' % self.domain_name
-                    cache.delete(directory_cache_key)
-                    pe = PresenceIn()
-                    pe.send(str(q.id), q.status, q.feature_code, self.domain_name, self.hostname)
-                    pe.disconnect()
+                    if cf:
+                        cfp = CallFlowPresence()
+                        cfp.add(str(cf.id), cf.feature_code, self.domain_name, cf.status)
+                        cfp.flush()
                 else:
                     etree.SubElement(x_work, 'playback', file='phrase:voicemail_fail_auth:#')
                     etree.SubElement(x_work, 'hangup')
@@ -28,9 +28,10 @@
 #
 
 from lxml import etree
+from django.core.cache import cache
 from .httapihandler import HttApiHandler
-from accounts.models import Extension
-from accounts.extensionfunctions import ExtFeatureSyncFunctions
+from accounts.models import Extension, FeatureSyncChoice
+from accounts.extensionfunctions import ExtFeatureSyncQueue
 
 
 class CallFwdHandler(HttApiHandler):
@@ -77,11 +78,8 @@ class CallFwdHandler(HttApiHandler):
             etree.SubElement(x_work, 'pause', milliseconds='250')
             etree.SubElement(x_work, 'playback', file='ivr/ivr-call_forwarding_has_been_cancelled.wav')
         e.save()
-        efsf = ExtFeatureSyncFunctions(extension_uuid, DoNotDisturbOn=e.do_not_disturb)
-        efsf.clear_extension_cache()
-        efsf.sync_fwd_immediate()
-        efsf.sync_dnd()
-        efsf.es_disconnect()
+        cache.delete('directory:%s@%s' % (e.extension, e.user_context))
+        ExtFeatureSyncQueue().enqueue(e, FeatureSyncChoice.CDND | FeatureSyncChoice.CFWDIMMEDIATE)
         etree.SubElement(x_work, 'pause', milliseconds='1000')
         etree.SubElement(x_work, 'hangup')
         etree.indent(x_root)
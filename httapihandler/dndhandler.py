@@ -28,9 +28,10 @@
 #
 
 from lxml import etree
+from django.core.cache import cache
 from .httapihandler import HttApiHandler
-from accounts.models import Extension
-from accounts.extensionfunctions import ExtFeatureSyncFunctions
+from accounts.models import Extension, FeatureSyncChoice
+from accounts.extensionfunctions import ExtFeatureSyncQueue
 
 
 class DndHandler(HttApiHandler):
@@ -73,10 +74,8 @@ class DndHandler(HttApiHandler):
             etree.SubElement(x_work, 'pause', milliseconds='250')
             etree.SubElement(x_work, 'playback', file='ivr/ivr-dnd_cancelled.wav')
         e.save()
-        efsf = ExtFeatureSyncFunctions(extension_uuid, DoNotDisturbOn=e.do_not_disturb)
-        efsf.clear_extension_cache()
-        efsf.sync_dnd()
-        efsf.es_disconnect()
+        cache.delete('directory:%s@%s' % (e.extension, e.user_context))
+        ExtFeatureSyncQueue().enqueue(e, FeatureSyncChoice.CDND)
         etree.SubElement(x_work, 'pause', milliseconds='1000')
         etree.SubElement(x_work, 'hangup')
         etree.indent(x_root)
@@ -28,8 +28,9 @@
 #
 
 from .httapihandler import HttApiHandler
-from switch.models import IpRegister
-from pbx.commonfunctions import shcommand
+from django.utils import timezone
+from switch.models import IpRegister, IpStatusChoice
+from pbx.nftbackend import NftBackend
 
 
 class RegisterHandler(HttApiHandler):
@@ -40,11 +41,11 @@ class RegisterHandler(HttApiHandler):
         ip_address = self.qdict.get('network-ip', '192.168.42.1')
         status = self.qdict.get('status', 'N/A')
         if status.startswith('Registered'):
-            ip, created = IpRegister.objects.update_or_create(address=ip_address, defaults={"status": 1})
-            if created:
-                if ':' in ip.address:
-                    shcommand(["/usr/local/bin/fw-add-ipv6-sip-customer-list.sh", ip.address])
-                else:
-                    shcommand(["/usr/local/bin/fw-add-ipv4-sip-customer-list.sh", ip.address])
+            if not IpRegister.objects.filter(address=ip_address, status__gt=IpStatusChoice.COBS).update(
+                    updated=timezone.now()):
+                IpRegister.objects.update_or_create(address=ip_address, defaults={'status': IpStatusChoice.CCUR})
+                nft = NftBackend()
+                nft.add('sip-customer', [ip_address])
+                nft.commit()
 
         return self.return_data('Ok\n')
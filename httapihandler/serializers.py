@@ -28,12 +28,13 @@
 #
 
 from rest_framework import serializers
+from pbx.restpbxhelpers import SparseFieldsMixin
 from .models import (
     HttApiSession,
 )
 
 
-class HttApiSessionSerializer(serializers.ModelSerializer):
+class HttApiSessionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = HttApiSession
@@ -37,10 +37,11 @@ from django.core.files import File
 from django.utils import timezone
 from tenants.models import Domain
 from voicemail.models import (
-    Voicemail, VoicemailGreeting, VoicemailMessages
+    Voicemail, VoicemailGreeting, VoicemailMessages, VoicemailJob
 )
+from voicemail.voicemailfunctions import VoicemailFunctions
+from voicemail.voicemailjobs import VoicemailJobQueue
 from pbx.hostslookup import HostsLookup
-from pbx.pbxsendsmtp import PbxTemplateMessage
 from pbx.commonevents import MessageWaiting
 from .httapihandler import HttApiHandler
 
@@ -314,39 +315,20 @@ class VoicemailHandler(HttApiHandler):
                         duration = int(f.getnframes() / f.getframerate())
                     except:
                         duration = 0
+            # Store the recording once, destination fan-out, email and MWI are left
+            #  to the voicemailjobs worker if enabled so the caller is not kept waiting.
             rec = self.create_vm_message(self.vm, tmpfile, duration)
-            rf = open(tmpfile, 'rb')
-            djangofile = File(rf)
-            mwi = MessageWaiting()
-            mwi.connect()
             if rec:
-                rec.filename.save(rec.name, djangofile)
-                new_count, saved_count = self.get_message_counts()
-                self.msg_forward_email(rec)
-                if self.vm.local_after_email == 'true':
-                    mwi.send(self.vmuser, self.vmdomain, new_count, saved_count)
+                with open(tmpfile, 'rb') as rf:
+                    rec.filename.save(rec.name, File(rf))
+                job = VoicemailJob(
+                    message_id=rec, language=self.get_language(),
+                    updated_by='%s@%s' % (self.vmuser, self.vmdomain)
+                    )
+                if settings.PBX_VOICEMAIL_USE_QUEUE:
+                    job.save()
                 else:
-                    rec.status = 'deleted'
-                    rec.save()
-            fwd_uuids = []
-            fwd_dstns = self.vm.voicemaildestinations_set.all()
-            if len(fwd_dstns) > 0:
-                for dst in fwd_dstns:
-                    fwd_uuids.append(dst.voicemail_dest)
-                qs = Voicemail.objects.filter(pk__in=fwd_uuids)
-                for q in qs:
-                    djangofile.seek(0)
-                    rec = self.create_vm_message(q, tmpfile, duration)
-                    if rec:
-                        rec.filename.save(rec.name, djangofile)
-                        new_count, saved_count = self.get_message_counts(q)
-                        self.msg_forward_email(rec, q)
-                        if q.local_after_email == 'true':
-                            mwi.send(q.extension_id.extension, self.vmdomain, new_count, saved_count)
-                        else:
-                            rec.status = 'deleted'
-                            rec.save()
-            mwi.disconnect()
+                    VoicemailJobQueue().process_now(job)
 
         option = self.menu('inbound_voicemail')
         if option:
@@ -556,43 +538,7 @@ class VoicemailHandler(HttApiHandler):
             return False
         if not vm:
             vm = self.vm
-        if not vm.mail_to:
-            return False
-        m = PbxTemplateMessage()
-        tp_subject, tp_body, tp_type = m.GetTemplate(
-            vm.extension_id.domain_id_id, '%s-%s' % (
-                            self.session_json.get('variable_default_language', 'en'),
-                            self.session_json.get('variable_default_dialect', 'us')
-                            ),
-            'voicemail', 'default'
-            )
-        if not tp_subject:
-            return False
-        file_to_attach = None
-        if vm.attach_file == 'link':
-            download_link = '%s/portal/voicemail/%s_%s' % (settings.PBX_SERVER_URL, str(vm.id), str(msg.id))
-            #download_link = '%s/portal/voicemail/%s_%s' % ('http://localhost:8080', str(vm.id), str(msg.id)) # Used for debug purposes
-            body_message = 'Donwload Link: <a href=\"%s\">%s</a>' % (download_link, download_link)
-        elif vm.attach_file == 'true':
-            file_to_attach = msg.filename
-            body_message = 'Audio file attached'
-        else:
-            body_message = 'Voicemail details only.  No attachmant or download link specified.'
-
-        msg_caller_id_name = msg.caller_id_name if msg.caller_id_name else ''
-        subject = tp_subject.replace('$', '').format(
-                caller_id_name=msg_caller_id_name, caller_id_number=msg.caller_id_number,
-                message_duration=msg.duration)
-        body = tp_body.replace('$', '').format(
-                caller_id_name=msg_caller_id_name, caller_id_number=msg.caller_id_number,
-                voicemail_name_formatted=vm.mail_to, message_date=msg.created,
-                message_duration=msg.duration, message=body_message
-                )
-        try:
-            out = m.Send(vm.mail_to, subject, body, tp_type, file_to_attach)
-        except:
-            return False
-        return out[0]
+        return VoicemailFunctions().message_email(vm, msg, self.get_language())
 
     def msg_forward(self, vm):
         msg = self.get_vm_message()
@@ -675,9 +621,13 @@ class VoicemailHandler(HttApiHandler):
     def get_message_counts(self, vm=None):
         if not vm:
             vm = self.vm
-        new_count = vm.voicemailmessages_set.filter(status='new').count()
-        saved_count = vm.voicemailmessages_set.filter(status='saved').count()
-        return((new_count, saved_count))
+        return VoicemailFunctions().get_message_counts(vm)
+
+    def get_language(self):
+        return '%s-%s' % (
+            self.session_json.get('variable_default_language', 'en'),
+            self.session_json.get('variable_default_dialect', 'us')
+            )
 
     def create_vm_message(self, voicemail_id, filename, duration):
         try:
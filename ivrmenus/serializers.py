@@ -28,12 +28,13 @@
 #
 
 from rest_framework import serializers
+from pbx.restpbxhelpers import SparseFieldsMixin
 from .models import (
     IvrMenus, IvrMenuOptions,
 )
 
 
-class IvrMenusSerializer(serializers.ModelSerializer):
+class IvrMenusSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     gen_xml = serializers.HyperlinkedIdentityField(view_name='ivrmenus-generate-xml')
     class Meta:
@@ -75,7 +76,7 @@ class IvrMenusSerializer(serializers.ModelSerializer):
                 ]
 
 
-class IvrMenuOptionsSerializer(serializers.ModelSerializer):
+class IvrMenuOptionsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = IvrMenuOptions
@@ -28,12 +28,13 @@
 #
 
 from rest_framework import serializers
+from pbx.restpbxhelpers import SparseFieldsMixin
 from .models import (
     MusicOnHold, MohFile,
 )
 
 
-class MusicOnHoldSerializer(serializers.ModelSerializer):
+class MusicOnHoldSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = MusicOnHold
@@ -45,7 +46,7 @@ class MusicOnHoldSerializer(serializers.ModelSerializer):
                 ]
 
 
-class MohFileSerializer(serializers.ModelSerializer):
+class MohFileSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = MohFile
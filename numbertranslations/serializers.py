@@ -28,12 +28,13 @@
 #
 
 from rest_framework import serializers
+from pbx.restpbxhelpers import SparseFieldsMixin
 from .models import (
     NumberTranslations, NumberTranslationDetails,
 )
 
 
-class NumberTranslationsSerializer(serializers.ModelSerializer):
+class NumberTranslationsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = NumberTranslations
@@ -50,7 +51,7 @@ class NumberTranslationsSerializer(serializers.ModelSerializer):
                 ]
 
 
-class NumberTranslationDetailsSerializer(serializers.ModelSerializer):
+class NumberTranslationDetailsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = NumberTranslationDetails
@@ -167,12 +167,14 @@ class AmqpCmdEvent:
             except:
                 logger.warn('AMQP addhoc publish {}: Unable send message {}.'.format(exchange, routing))
 
-    def process_events(self, timeout=3):
+    def process_events(self, timeout=3, expected=None):
+        # expected is the number of responses to wait for when several commands
+        #  have been published, by default one from each switch.
         if self.connection.is_open and self.channel.is_open:
             t = time.time()
-            while len(self.responses) < self.switchcount:
+            while len(self.responses) < (expected if expected else self.switchcount):
                 self.connection.process_data_events(time_limit=timeout)
-                if self.singlehostrequest:
+                if self.singlehostrequest and not expected:
                     break
                 if (time.time() - t) > timeout:
                     break
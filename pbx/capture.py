@@ -0,0 +1,116 @@
+#
+#    DjangoPBX
+#
+#    MIT License
+#
+#    Copyright (c) 2016 - 2024 Adrian Fretwell <adrian@djangopbx.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+#
+#    Contributor(s):
+#    Adrian Fretwell <adrian@djangopbx.com>
+#
+
+import json
+import os
+import random
+import re
+import threading
+import time
+from django.conf import settings
+from django.http import QueryDict
+
+
+class CaptureMiddleware:
+    # Records requests to the PBX_CAPTURE_PATHS prefixes, with their timing, for
+    #  the replaycapture command.  One JSON line per request is appended to a file
+    #  per process in PBX_CAPTURE_DIR.  Field values whose name matches
+    #  PBX_CAPTURE_REDACT are replaced, in form fields and inside XML or JSON
+    #  bodies such as the CDR.  Place after pbx.metrics.MetricsMiddleware to also
+    #  record the number of database queries.
+
+    redacted = 'REDACTED'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.lock = threading.Lock()
+        self.file = None
+        self.pid = None
+        names = r'[\w.-]*(?:%s)[\w.-]*' % '|'.join(re.escape(r) for r in settings.PBX_CAPTURE_REDACT)
+        self.name_re = re.compile(r'^%s$' % names, re.IGNORECASE)
+        self.xml_re = re.compile(r'(<(%s)>)[^<]*(</\2>)' % names, re.IGNORECASE)
+        self.json_re = re.compile(r'("%s"\s*:\s*)"(?:[^"\\]|\\.)*"' % names, re.IGNORECASE)
+        self.multipart_re = re.compile(r'(name="%s"\r\n(?:[^\r\n]+\r\n)*\r\n)[^\r]*' % names, re.IGNORECASE)
+
+    def __call__(self, request):
+        if not settings.PBX_CAPTURE_DIR or not request.path_info.startswith(tuple(settings.PBX_CAPTURE_PATHS)):
+            return self.get_response(request)
+        if settings.PBX_CAPTURE_SAMPLE < 1 and random.random() >= settings.PBX_CAPTURE_SAMPLE:
+            return self.get_response(request)
+        if int(request.META.get('CONTENT_LENGTH') or 0) > settings.PBX_CAPTURE_MAX_BODY:
+            return self.get_response(request)
+        body = request.body.decode('utf-8', 'replace')
+        start = time.perf_counter()
+        response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+        stats = getattr(request, 'pbx_request_stats', None)
+        self.write({
+            'time': round(time.time(), 3),
+            'method': request.method,
+            'path': request.path_info,
+            'query': self.sanitise(request.META.get('QUERY_STRING', ''), 'application/x-www-form-urlencoded'),
+            'content_type': request.content_type,
+            'body': self.sanitise(body, request.content_type),
+            'status': response.status_code,
+            'elapsed': round(elapsed, 6),
+            'queries': stats.queries if stats else None,
+        })
+        return response
+
+    def sanitise(self, body, content_type):
+        if not body:
+            return body
+        if content_type == 'application/x-www-form-urlencoded':
+            q = QueryDict(body, mutable=True)
+            for k, values in q.lists():
+                if self.name_re.match(k):
+                    q.setlist(k, [self.redacted] * len(values))
+                else:
+                    q.setlist(k, [self.redact_text(v) for v in values])
+            return q.urlencode()
+        return self.redact_text(body)
+
+    def redact_text(self, text):
+        if 'name="' in text:
+            text = self.multipart_re.sub(r'\g<1>%s' % self.redacted, text)
+        if '<' in text:
+            text = self.xml_re.sub(r'\g<1>%s\g<3>' % self.redacted, text)
+        if '"' in text:
+            text = self.json_re.sub(r'\g<1>"%s"' % self.redacted, text)
+        return text
+
+    def write(self, record):
+        line = json.dumps(record) + '\n'
+        with self.lock:
+            if self.pid != os.getpid():
+                os.makedirs(settings.PBX_CAPTURE_DIR, exist_ok=True)
+                self.pid = os.getpid()
+                filename = os.path.join(settings.PBX_CAPTURE_DIR, 'capture-%d.jsonl' % self.pid)
+                self.file = open(filename, 'a', buffering=1)
+            self.file.write(line)
@@ -26,6 +26,7 @@
 #    Adrian Fretwell <adrian@djangopbx.com>
 #
 
+import time
 from pbx.fscmdabslayer import FsCmdAbsLayer
 from .scripts.resources.pbx.fsevent import FsEvent
 
@@ -110,3 +111,44 @@ class MessageWaiting(PbxEvent):
             if len(parts) > 1:
                 return parts[1]
         return False
+
+
+class MwiCoalescer():
+    # Collects message waiting updates for a short window and sends them as one
+    #  luarun mwi_batch.lua command per switch, only the latest counts for each
+    #  mailbox are sent.  The sofia profile lookup is done by the script on the switch.
+    def __init__(self, window=2.0, chunk_size=100):
+        self.window = window
+        self.chunk_size = chunk_size
+        self.pending = {}
+        self.first_added = None
+        self.payloads_sent = 0
+
+    def add(self, user_name, domain_name, new, saved, host=None):
+        if not self.pending:
+            self.first_added = time.monotonic()
+        self.pending.setdefault(host, {})['%s@%s' % (user_name, domain_name)] = (new, saved)
+
+    def due(self):
+        return bool(self.pending) and time.monotonic() - self.first_added >= self.window
+
+    def flush(self):
+        if not self.pending:
+            return 0
+        es = FsCmdAbsLayer()
+        if not es.connect():
+            return 0
+        sent = 0
+        for host, accounts in self.pending.items():
+            items = ['%s:%s:%s' % (account, new, saved) for account, (new, saved) in accounts.items()]
+            for i in range(0, len(items), self.chunk_size):
+                es.clear_responses()
+                es.send('api luarun mwi_batch.lua %s' % ' '.join(items[i:i + self.chunk_size]), host)
+                es.process_events()
+                es.get_responses()
+                sent += 1
+        es.disconnect()
+        self.payloads_sent += sent
+        self.pending = {}
+        self.first_added = None
+        return sent
@@ -27,14 +27,17 @@
 #    Adrian Fretwell <adrian@djangopbx.com>
 #
 
+import time
 from python_ipware import IpWare
 from django.core.cache import cache
 from tenants.pbxsettings import PbxSettings
 from portal.models import Failed_logins
-from .commonfunctions import shcommand
+from .nftbackend import NftBackend
 
 
 class IpFunctions():
+    fail_buckets = 12
+    fail_flush_interval = 10
 
     def __init__(self):
         self.ipw = IpWare()
@@ -86,23 +89,68 @@ class IpFunctions():
         self.update_fail_attempts(ip_address, max_404_attempts, username)
         return
 
+    def get_portal_fail_window(self):
+        cache_key = 'portal:fail_window'
+        fail_window = cache.get(cache_key)
+        if not fail_window:
+            fail_window = self.pbxsettings.default_settings('portal', 'fail_window', 'numeric', 3600, True)
+            cache.set(cache_key, fail_window)
+        return fail_window
+
+    def count_fail_attempt(self, ip_address, window, now=None):
+        # Sliding window counter held in memcached so that it is shared by all workers.
+        #  The window is split into buckets, only the current bucket is incremented.
+        if now is None:
+            now = time.time()
+        bucket_secs = max(window // self.fail_buckets, 1)
+        bucket = int(now) // bucket_secs
+        keys = ['portal:fail:%s:%s' % (ip_address, b) for b in range(bucket - self.fail_buckets + 1, bucket + 1)]
+        cache.add(keys[-1], 0, window + bucket_secs)
+        try:
+            cache.incr(keys[-1])
+        except ValueError:
+            cache.set(keys[-1], 1, window + bucket_secs)
+        return sum(cache.get_many(keys).values())
+
     def update_fail_attempts(self, ip_address, max_fail_attempts, username):
         ignore_addresses = self.get_portal_ignore_fail_address()
         if ip_address in ignore_addresses:
             return
-        ip, created = Failed_logins.objects.update_or_create(address=ip_address)
-        ip.username = username[:250]
-        if not created:
-            i = ip.attempts + 1
-            ip.attempts = i
-            if i > max_fail_attempts:
-                if ':' in ip.address:
-                    shcommand(["/usr/local/bin/fw-add-ipv6-web-block-list.sh", ip.address])
-                else:
-                    shcommand(["/usr/local/bin/fw-add-ipv4-web-block-list.sh", ip.address])
-        ip.save()
+        window = self.get_portal_fail_window()
+        attempts = self.count_fail_attempt(ip_address, window)
+        if attempts <= max_fail_attempts:
+            return
+        # Only the first threshold crossing in a window touches the database.
+        if not cache.add('portal:fail_crossed:%s' % ip_address, 1, window):
+            return
+        # An address that is already blocked stays blocked, blocked is only set on create.
+        Failed_logins.objects.update_or_create(
+            address=ip_address,
+            defaults={'username': username[:250], 'attempts': attempts},
+            create_defaults={'username': username[:250], 'attempts': attempts, 'blocked': 'false'}
+            )
+        self.flush_web_block_list()
         return
 
+    def flush_web_block_list(self, force=False):
+        # Adds all pending Failed_logins addresses to the web block lists in one nftables
+        #  transaction and publishes them on TAP.Firewall.  Unless forced, at most one
+        #  flush is run per flush interval, any remainder is picked up by the
+        #  flushwebblocklist management command.
+        if not force and not cache.add('portal:fail_flush', 1, self.fail_flush_interval):
+            return 0
+        pending = list(Failed_logins.objects.filter(blocked='false').values_list('address', flat=True))
+        if not pending:
+            return 0
+        nft = NftBackend()
+        nft.add('web-block', pending)
+        err = nft.commit()
+        if err:
+            return 0
+        nft.publish()
+        Failed_logins.objects.filter(address__in=pending).update(blocked='true')
+        return len(pending)
+
     def get_client_ip(self, meta):
         ip, trusted_route = self.ipw.get_client_ip(meta)
         if ip:
@@ -82,6 +82,16 @@ class FsCmdAbsLayer:
                 return
             self.broker.publish(payload.removeprefix('api '), host)
 
+    def send_many(self, payloads, host=None, timeout=5):
+        # Sends several api commands without waiting for each reply in turn,
+        #  responses are available through get_responses() as for send().
+        if self.loc_ev_skt:
+            self.responses.extend(self.broker.send_many(payloads, timeout))
+            return
+        for payload in payloads:
+            self.broker.publish(payload.removeprefix('api '), host)
+        self.broker.process_events(timeout, len(payloads) * (1 if host else len(self.freeswitches)))
+
     def process_events(self, timeout=3):
         if self.loc_ev_skt:
             return
@@ -98,10 +108,8 @@ class FsCmdAbsLayer:
             if '-ERR' in resp:
                 self.err_count += 1
             self.responses.append(resp)
-            # Return True if at least one freeswitch did not return an error
-            if self.err_count < len(self.freeswitches):
-                return True
-        return False
+        # Return True if at least one freeswitch replied without an error
+        return bool(self.responses) and self.err_count < len(self.responses)
 
     def clear_responses(self):
         if not self.loc_ev_skt:
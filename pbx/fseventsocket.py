@@ -96,6 +96,42 @@ class EventSocket:
         self.read()
         return self.body
 
+    def send_many(self, cmds, timeout=5):
+        # Pipelines api commands over the connection and returns the response
+        #  bodies in command order, responses are framed using Content-Length.
+        payload = ''.join(['%s\n\n' % cmd for cmd in cmds])
+        bodies = []
+        buf = b''
+        deadline = time.time() + timeout
+        self.sock.settimeout(timeout)
+        try:
+            self.sock.sendall(payload.encode())
+            while len(bodies) < len(cmds):
+                hdr_end = buf.find(b'\n\n')
+                if hdr_end >= 0:
+                    headers = {}
+                    for h in buf[:hdr_end].decode().split('\n'):
+                        if ': ' in h:
+                            k, v = h.split(': ', 1)
+                            headers[k] = v
+                    length = int(headers.get('Content-Length', 0))
+                    if len(buf) >= hdr_end + 2 + length:
+                        if headers.get('Content-Type') == 'api/response':
+                            bodies.append(buf[hdr_end + 2:hdr_end + 2 + length].decode())
+                        buf = buf[hdr_end + 2 + length:]
+                        continue
+                if time.time() > deadline:
+                    break
+                data = self.sock.recv(65536)
+                if not data:
+                    break
+                buf += data
+        except socket.error as err:
+            logger.warning('[Event Socket] Pipelined Send Error: {}'.format(err))
+        finally:
+            self.sock.setblocking(0)
+        return bodies
+
     def read(self):
         total_data = []
         data = None
@@ -0,0 +1,277 @@
+#
+#    DjangoPBX
+#
+#    MIT License
+#
+#    Copyright (c) 2016 - 2024 Adrian Fretwell <adrian@djangopbx.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+#
+#    Contributor(s):
+#    Adrian Fretwell <adrian@djangopbx.com>
+#
+
+import os
+import re
+import hashlib
+import mimetypes
+import tempfile
+import time
+import logging
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.http import (
+    FileResponse, HttpResponse, HttpResponseNotFound, HttpResponseNotModified, StreamingHttpResponse
+)
+from django.utils.http import http_date, parse_http_date_safe
+from pbx.sshconnect import SFTPConnection
+
+logger = logging.getLogger(__name__)
+
+
+class MediaServer():
+    # Serves voicemail messages, greetings and call recordings with HTTP Range
+    #  support so that browser players can seek, plus ETag/Last-Modified
+    #  validation.  Local files can be handed to nginx with X-Accel-Redirect
+    #  (PBX_MEDIA_ACCEL_REDIRECT) and files on remote SFTP hosts are kept in a
+    #  bounded local read-through cache (PBX_MEDIA_CACHE_DIR, PBX_MEDIA_CACHE_SIZE).
+    range_re = re.compile(r'^bytes=(\d*)-(\d*)$')
+    chunk_size = 65536
+
+    def __init__(self, sftp=None, cache_dir=None, cache_size=None, accel_redirect=None):
+        self.sftp = sftp if sftp else SFTPConnection()
+        self.cache_dir = cache_dir if cache_dir is not None else settings.PBX_MEDIA_CACHE_DIR
+        self.cache_size = cache_size if cache_size is not None else settings.PBX_MEDIA_CACHE_SIZE
+        self.accel_redirect = accel_redirect if accel_redirect is not None else settings.PBX_MEDIA_ACCEL_REDIRECT
+
+    def etag(self, size, mtime):
+        return '"%x-%x"' % (int(mtime), size)
+
+    def content_type(self, path):
+        content_type, encoding = mimetypes.guess_type(path)
+        return content_type or 'application/octet-stream'
+
+    def parse_range(self, request, size, etag, mtime):
+        # Returns (start, end) inclusive, None for the whole file or False if not satisfiable.
+        header = request.META.get('HTTP_RANGE', '').strip()
+        if not header:
+            return None
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if if_range and not if_range == etag:
+            if_range_time = parse_http_date_safe(if_range)
+            if not if_range_time or if_range_time < int(mtime):
+                return None
+        m = self.range_re.match(header)
+        if not m:
+            # Multiple ranges are not supported, send the whole file.
+            return None
+        first, last = m.groups()
+        if not first and not last:
+            return None
+        if not first:
+            length = int(last)
+            if length == 0:
+                return False
+            return (max(size - length, 0), size - 1)
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if start >= size or end < start:
+            return False
+        return (start, end)
+
+    def not_modified(self, request, etag, mtime):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            return etag in [t.strip() for t in if_none_match.split(',')] or if_none_match.strip() == '*'
+        if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        return bool(if_modified_since) and int(mtime) <= if_modified_since
+
+    def stream(self, fh, start, length):
+        try:
+            fh.seek(start)
+            while length > 0:
+                data = fh.read(min(self.chunk_size, length))
+                if not data:
+                    break
+                length -= len(data)
+                yield data
+        finally:
+            fh.close()
+
+    def accel_path(self, path):
+        for location, prefix in self.accel_redirect.items():
+            location = location.rstrip('/') + '/'
+            if path.startswith(location):
+                return prefix.rstrip('/') + '/' + path[len(location):]
+        return None
+
+    def response(self, request, opener, size, mtime, path, filename=None, local_path=None):
+        # opener is a callable returning an open binary file handle, it is only
+        #  called if file content has to be sent by Django.
+        etag = self.etag(size, mtime)
+        if self.not_modified(request, etag, mtime):
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
+        content_type = self.content_type(path)
+        if local_path:
+            accel = self.accel_path(local_path)
+            if accel:
+                # nginx handles Range and conditional requests for internal locations.
+                response = HttpResponse(content_type=content_type)
+                response['X-Accel-Redirect'] = accel
+                response['ETag'] = etag
+                response['Last-Modified'] = http_date(mtime)
+                if filename:
+                    response['Content-Disposition'] = 'inline; filename="%s"' % filename
+                return response
+        byte_range = self.parse_range(request, size, etag, mtime)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = 'bytes */%s' % size
+            return response
+        if byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                self.stream(opener(), start, end - start + 1), status=206, content_type=content_type
+                )
+            response['Content-Range'] = 'bytes %s-%s/%s' % (start, end, size)
+            response['Content-Length'] = str(end - start + 1)
+        else:
+            response = FileResponse(opener(), content_type=content_type)
+            response['Content-Length'] = str(size)
+        response['Accept-Ranges'] = 'bytes'
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(mtime)
+        if filename:
+            response['Content-Disposition'] = 'inline; filename="%s"' % filename
+        return response
+
+    def serve_local(self, request, path, filename=None):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return HttpResponseNotFound()
+        return self.response(
+            request, lambda: open(path, 'rb'), st.st_size, st.st_mtime, path,
+            filename, local_path=path
+            )
+
+    def serve_remote(self, request, host, path, filename=None):
+        try:
+            st = self.sftp.sftp(host).stat(self.sftp.sftp_path(path))
+        except (OSError, IOError):
+            return HttpResponseNotFound()
+        except Exception as e:
+            logger.warning('Media server unable to reach {}: {}'.format(host, e))
+            return HttpResponseNotFound()
+        if self.cache_size > 0:
+            cached = self.cache_fetch(host, path, st.st_size, st.st_mtime)
+            if cached:
+                return self.response(
+                    request, lambda: open(cached, 'rb'), st.st_size, st.st_mtime, path,
+                    filename, local_path=cached
+                    )
+        return self.response(
+            request, lambda: self.sftp.open(host, path, 'rb'), st.st_size, st.st_mtime, path, filename
+            )
+
+    def serve_field(self, request, fieldfile, host=None):
+        # Serve the file of a PbxFileField from whichever storage holds it.
+        if not fieldfile:
+            return HttpResponseNotFound()
+        filename = os.path.basename(fieldfile.name)
+        if isinstance(fieldfile.storage, FileSystemStorage):
+            return self.serve_local(request, fieldfile.path, filename)
+        storage = fieldfile.storage
+        if not host:
+            host = storage.filestores[storage.current_filestore]
+        return self.serve_remote(request, host, storage.path(fieldfile.name), filename)
+
+    def serve(self, request, path, host=None, use_local=True, filename=None):
+        if use_local:
+            return self.serve_local(request, path, filename)
+        return self.serve_remote(request, host, path, filename)
+
+    ###############################################################
+    # Read-through cache for files on remote hosts
+    ###############################################################
+    def cache_path(self, host, path):
+        key = hashlib.sha1(('%s:%s' % (host, path)).encode()).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], key + os.path.splitext(path)[1])
+
+    def cache_fetch(self, host, path, size, mtime):
+        # Returns the local path of an up to date copy or None if it could not be cached.
+        if size > self.cache_size:
+            return None
+        cached = self.cache_path(host, path)
+        try:
+            st = os.stat(cached)
+            if st.st_size == size and int(st.st_mtime) == int(mtime):
+                os.utime(cached, (time.time(), mtime))  # atime is used as last access for eviction
+                return cached
+        except OSError:
+            pass
+        tmp = None
+        try:
+            os.makedirs(os.path.dirname(cached), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(cached), suffix='.part')
+            with os.fdopen(fd, 'wb') as fh:
+                self.sftp.gettfo(host, fh, path)
+            os.utime(tmp, (time.time(), mtime))
+            os.replace(tmp, cached)
+        except Exception as e:
+            logger.warning('Media cache unable to fetch {} from {}: {}'.format(path, host, e))
+            if tmp and os.path.exists(tmp):
+                os.remove(tmp)
+            return None
+        self.cache_evict()
+        return cached
+
+    def cache_evict(self):
+        # Removes least recently used files until the cache is within cache_size.
+        entries = []
+        total = 0
+        for root, dirs, files in os.walk(self.cache_dir):
+            for f in files:
+                p = os.path.join(root, f)
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                if f.endswith('.part'):
+                    # Abandoned partial downloads older than an hour.
+                    if st.st_mtime < time.time() - 3600:
+                        os.remove(p)
+                    continue
+                entries.append((st.st_atime, st.st_size, p))
+                total += st.st_size
+        evicted = 0
+        if total <= self.cache_size:
+            return evicted
+        for atime, size, p in sorted(entries):
+            try:
+                os.remove(p)
+            except OSError:
+                continue
+            evicted += 1
+            total -= size
+            if total <= self.cache_size:
+                break
+        return evicted
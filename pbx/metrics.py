@@ -0,0 +1,394 @@
+#
+#    DjangoPBX
+#
+#    MIT License
+#
+#    Copyright (c) 2016 - 2024 Adrian Fretwell <adrian@djangopbx.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+#
+#    Contributor(s):
+#    Adrian Fretwell <adrian@djangopbx.com>
+#
+
+import atexit
+import bisect
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from django.conf import settings
+from django.core.cache.backends import memcached
+from django.db import connection
+from django.http import HttpResponse, HttpResponseNotFound
+from pbx.pbxipaddresscheck import pbx_ip_address_check
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+LAG_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class PbxMetrics():
+    # Counters, gauges and fixed bucket histograms held in the memory of each
+    #  process.  Every process writes its totals to its own file in PBX_METRICS_DIR
+    #  at most once per PBX_METRICS_FLUSH_INTERVAL seconds and collect() adds the
+    #  files up, so the gunicorn workers and the event receiver are reported as one.
+    #  Counters and histograms of processes that have gone are folded into an
+    #  archive file so that totals never go backwards, their gauges are dropped.
+
+    archive_name = 'archive.json'
+
+    def __init__(self):
+        self.definitions = {}
+        self.values = {}
+        self.lock = threading.Lock()
+        self.reset()
+        os.register_at_fork(after_in_child=self.reset)
+        atexit.register(self.flush_at_exit)
+
+    def reset(self):
+        self.values = {}
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+        self.dirty = False
+        self.file_checked = False
+        self.last_flush = time.monotonic()
+
+    def counter(self, name, help):
+        self.definitions[name] = ('counter', help, None)
+
+    def gauge(self, name, help, mode='sum'):
+        # mode is how the values of several processes are combined, sum or max.
+        self.definitions[name] = ('gauge', help, mode)
+
+    def histogram(self, name, help, buckets):
+        self.definitions[name] = ('histogram', help, tuple(buckets))
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+            self.dirty = True
+
+    def set(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.values[key] = value
+            self.dirty = True
+
+    def observe(self, name, value, **labels):
+        # Histograms are held as a count per bucket, the last bucket being +Inf,
+        #  followed by the sum of the observed values.
+        buckets = self.definitions[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            h = self.values.get(key)
+            if h is None:
+                h = self.values[key] = [0] * (len(buckets) + 2)
+            h[bisect.bisect_left(buckets, value)] += 1
+            h[-1] += value
+            self.dirty = True
+
+    def snapshot(self):
+        with self.lock:
+            self.dirty = False
+            return [[name, list(labels), value if not isinstance(value, list) else list(value)]
+                    for (name, labels), value in self.values.items()]
+
+    def path(self, name):
+        return os.path.join(settings.PBX_METRICS_DIR, name)
+
+    def flush_if_due(self):
+        if self.dirty and time.monotonic() - self.last_flush >= settings.PBX_METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush_at_exit(self):
+        if self.dirty:
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        if not settings.PBX_METRICS_DIR:
+            return
+        values = self.snapshot()
+        filename = self.path('%d.json' % self.pid)
+        try:
+            if not self.file_checked:
+                os.makedirs(settings.PBX_METRICS_DIR, exist_ok=True)
+                # Left by an earlier process that had the same pid.
+                if os.path.exists(filename):
+                    with self.archive_lock():
+                        self.archive_files([filename])
+                self.file_checked = True
+            self.write_json(filename, {'pid': self.pid, 'values': values})
+        except OSError as e:
+            logger.warning('Metrics flush failed: {}'.format(e))
+
+    def write_json(self, filename, data):
+        tmp = '%s.%d.tmp' % (filename, self.pid)
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp, filename)
+
+    def read_json(self, filename):
+        try:
+            with open(filename) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def archive_lock(self):
+        return FileLock(self.path('.lock'))
+
+    def archive_files(self, filenames):
+        archive = {}
+        data = self.read_json(self.path(self.archive_name))
+        if data:
+            self.merge(archive, data['values'], False)
+        for filename in filenames:
+            data = self.read_json(filename)
+            if data:
+                self.merge(archive, data['values'], False)
+            os.remove(filename)
+        self.write_json(self.path(self.archive_name), {'pid': None, 'values': [
+            [name, list(labels), value] for (name, labels), value in archive.items()
+            ]})
+
+    def pid_alive(self, pid):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def merge(self, totals, values, live):
+        for name, labels, value in values:
+            definition = self.definitions.get(name)
+            if not definition:
+                continue
+            key = (name, tuple(tuple(label) for label in labels))
+            kind, help, extra = definition
+            if kind == 'gauge':
+                if not live:
+                    continue
+                if extra == 'max':
+                    totals[key] = max(totals.get(key, value), value)
+                else:
+                    totals[key] = totals.get(key, 0) + value
+            elif kind == 'histogram':
+                if len(value) != len(extra) + 2:
+                    continue
+                h = totals.setdefault(key, [0] * len(value))
+                for i, v in enumerate(value):
+                    h[i] += v
+            else:
+                totals[key] = totals.get(key, 0) + value
+
+    def collect(self):
+        self.flush()
+        totals = {}
+        if not settings.PBX_METRICS_DIR:
+            self.merge(totals, self.snapshot(), True)
+            return totals
+        with self.archive_lock():
+            dead = []
+            for filename in os.listdir(settings.PBX_METRICS_DIR):
+                name, ext = os.path.splitext(filename)
+                if ext != '.json' or not name.isdigit():
+                    continue
+                if not self.pid_alive(int(name)):
+                    dead.append(self.path(filename))
+                    continue
+                data = self.read_json(self.path(filename))
+                if data:
+                    self.merge(totals, data['values'], True)
+            if dead:
+                self.archive_files(dead)
+            data = self.read_json(self.path(self.archive_name))
+        if data:
+            self.merge(totals, data['values'], False)
+        return totals
+
+    def render(self):
+        # Prometheus text exposition format 0.0.4
+        totals = self.collect()
+        by_name = {}
+        for (name, labels), value in totals.items():
+            by_name.setdefault(name, []).append((labels, value))
+        lines = []
+        for name, (kind, help, extra) in sorted(self.definitions.items()):
+            lines.append('# HELP %s %s' % (name, help))
+            lines.append('# TYPE %s %s' % (name, kind))
+            for labels, value in sorted(by_name.get(name, [])):
+                if kind != 'histogram':
+                    lines.append('%s%s %s' % (name, self.format_labels(labels), self.format_value(value)))
+                    continue
+                cumulative = 0
+                for le, count in zip(extra + ('+Inf',), value[:-1]):
+                    cumulative += count
+                    bucket = self.format_labels(labels + (('le', str(le)),))
+                    lines.append('%s_bucket%s %s' % (name, bucket, cumulative))
+                lines.append('%s_sum%s %s' % (name, self.format_labels(labels), self.format_value(value[-1])))
+                lines.append('%s_count%s %s' % (name, self.format_labels(labels), cumulative))
+        return '\n'.join(lines) + '\n'
+
+    def format_labels(self, labels):
+        if not labels:
+            return ''
+        return '{%s}' % ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                                 for k, v in labels)
+
+    def format_value(self, value):
+        if isinstance(value, float):
+            return repr(value)
+        return str(value)
+
+
+class FileLock():
+    # Exclusive flock held while metric files are archived.
+
+    def __init__(self, filename):
+        self.filename = filename
+
+    def __enter__(self):
+        self.f = open(self.filename, 'a')
+        fcntl.flock(self.f, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *args):
+        fcntl.flock(self.f, fcntl.LOCK_UN)
+        self.f.close()
+
+
+metrics = PbxMetrics()
+metrics.counter('pbx_requests_total', 'Requests to FreeSWITCH and phone facing handlers by response status.')
+metrics.gauge('pbx_requests_in_progress', 'Requests being handled.')
+metrics.histogram('pbx_request_duration_seconds', 'Time taken to handle a request.', LATENCY_BUCKETS)
+metrics.histogram('pbx_request_queries', 'Database queries run for a request.', QUERY_BUCKETS)
+metrics.counter('pbx_cache_requests_total', 'Cache lookups made while handling a request, by hit or miss.')
+metrics.counter('pbx_events_total', 'Switch events received by the event receiver.')
+metrics.histogram(
+    'pbx_event_lag_seconds', 'Time from the switch raising an event to the event receiver taking it.', LAG_BUCKETS
+    )
+metrics.histogram('pbx_event_duration_seconds', 'Time taken to handle an event.', LATENCY_BUCKETS)
+metrics.histogram('pbx_event_queries', 'Database queries run for an event.', QUERY_BUCKETS)
+metrics.gauge('pbx_event_last_received_seconds', 'Unix time the last event was received.', 'max')
+
+
+class RequestStats():
+    # Per request tallies, the current one is held in a thread local while a
+    #  request or event is handled.
+    current = threading.local()
+
+    def __init__(self):
+        self.queries = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self.current.stats = self
+        self.wrapper = connection.execute_wrapper(self)
+        self.wrapper.__enter__()
+        return self
+
+    def __exit__(self, *args):
+        self.wrapper.__exit__(*args)
+        self.current.stats = None
+
+
+class MetricsCacheMixin:
+    # Counts hits and misses against the request being handled, used through
+    #  the PyMemcacheCache backend below.
+    missing = object()
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, self.missing, version)
+        stats = getattr(RequestStats.current, 'stats', None)
+        if stats is not None:
+            if value is self.missing:
+                stats.cache_misses += 1
+            else:
+                stats.cache_hits += 1
+        return default if value is self.missing else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        values = super().get_many(keys, version)
+        stats = getattr(RequestStats.current, 'stats', None)
+        if stats is not None:
+            stats.cache_hits += len(values)
+            stats.cache_misses += len(keys) - len(values)
+        return values
+
+
+class PyMemcacheCache(MetricsCacheMixin, memcached.PyMemcacheCache):
+    pass
+
+
+class MetricsMiddleware:
+    # Records the latency, database queries and cache hit ratio of requests to
+    #  views in the PBX_METRICS_HANDLERS applications, labelled with the
+    #  application and the URL name.
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        with RequestStats() as stats:
+            request.pbx_request_stats = stats
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+        labels = getattr(request, 'pbx_metrics_labels', None)
+        if labels:
+            metrics.inc('pbx_requests_in_progress', -1, handler=labels['handler'])
+            metrics.inc('pbx_requests_total', status=str(response.status_code), **labels)
+            metrics.observe('pbx_request_duration_seconds', elapsed, **labels)
+            metrics.observe('pbx_request_queries', stats.queries, **labels)
+            if stats.cache_hits:
+                metrics.inc('pbx_cache_requests_total', stats.cache_hits, result='hit', **labels)
+            if stats.cache_misses:
+                metrics.inc('pbx_cache_requests_total', stats.cache_misses, result='miss', **labels)
+            metrics.flush_if_due()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        handler = view_func.__module__.split('.')[0]
+        if handler not in settings.PBX_METRICS_HANDLERS:
+            return None
+        request.pbx_metrics_labels = {'handler': handler, 'section': request.resolver_match.url_name or ''}
+        metrics.inc('pbx_requests_in_progress', handler=handler)
+        return None
+
+
+def metrics_view(request):
+    if not pbx_ip_address_check(request, settings.PBX_METRICS_ALLOWED_ADDRESSES):
+        return HttpResponseNotFound()
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,277 @@
+#
+#    DjangoPBX
+#
+#    MIT License
+#
+#    Copyright (c) 2016 - 2024 Adrian Fretwell <adrian@djangopbx.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+#
+#    Contributor(s):
+#    Adrian Fretwell <adrian@djangopbx.com>
+#
+
+import json
+import socket
+import ipaddress
+import subprocess
+import logging
+import pika
+from django.conf import settings
+from django.core.cache import cache
+from pbx.amqpcmdevent import AmqpCmdEvent
+
+logger = logging.getLogger(__name__)
+
+
+class NftBackend():
+    # Collects firewall set changes and applies them to nftables as a single JSON
+    #  transaction (one nft -j -f) instead of forking a shell script per address.
+    #  If PBX_NFT_HELPER_SOCKET is set, requests are passed to the privileged helper
+    #  daemon (pbx/scripts/nft_helper_daemon.py) over a Unix socket instead of sudo.
+    nft_command = ['/usr/bin/sudo', '/usr/sbin/nft']
+    firewall_event_template = '{\"Event-Name\":\"FIREWALL\", \"Action\":\"%s\", \"IP-Type\":\"%s\",\"Fw-List\":\"%s\", \"IP-Address\":\"%s\"}'  # noqa: E501
+    cache_timeout = 60
+    fw_sets = {
+        'block':        ('netdev', 'filter', '%s_block_list'),         # noqa: E241
+        'white':        ('inet', 'filter', '%s_white_list'),           # noqa: E241
+        'sip-customer': ('inet', 'filter', '%s_sip_customer_list'),    # noqa: E241
+        'sip-gateway':  ('inet', 'filter', '%s_sip_gateway_list'),     # noqa: E241
+        'web-block':    ('inet', 'filter', '%s_web_block_list'),       # noqa: E241
+    }
+
+    def __init__(self, helper_socket=None):
+        self.helper_socket = helper_socket if helper_socket else settings.PBX_NFT_HELPER_SOCKET
+        self.commands = []
+        self.pending = {}
+        self.touched = set()
+
+    def ip_type(self, ip_address):
+        if ':' in ip_address:
+            return 'ipv6'
+        return 'ipv4'
+
+    def set_path(self, fw_list, ip_type):
+        family, table, set_name = self.fw_sets[fw_list]
+        return family, table, set_name % ip_type
+
+    def set_spec(self, fw_list, ip_type):
+        family, table, set_name = self.set_path(fw_list, ip_type)
+        return {'family': family, 'table': table, 'name': set_name}
+
+    def element(self, ip_address):
+        if '/' in ip_address:
+            addr, plen = ip_address.split('/', 1)
+            return {'prefix': {'addr': addr, 'len': int(plen)}}
+        return ip_address
+
+    def element_str(self, elem):
+        # Reverse of element(), nft reports prefixes and ranges as dictionaries.
+        if type(elem) is dict:
+            if 'prefix' in elem:
+                return '%s/%s' % (elem['prefix']['addr'], elem['prefix']['len'])
+            if 'range' in elem:
+                return '%s-%s' % tuple(elem['range'])
+            if 'elem' in elem:
+                return self.element_str(elem['elem']['val'])
+        return str(elem)
+
+    def group(self, ip_addresses):
+        grouped = {}
+        for ip_address in ip_addresses:
+            grouped.setdefault(self.ip_type(ip_address), []).append(ip_address)
+        return grouped
+
+    def queue(self, action, fw_list, ip_addresses):
+        for ip_type, addresses in self.group(ip_addresses).items():
+            spec = self.set_spec(fw_list, ip_type)
+            spec['elem'] = [self.element(a) for a in addresses]
+            self.commands.append({action: {'element': spec}})
+            self.pending.setdefault((action, fw_list, ip_type), []).extend(addresses)
+            self.touched.add((fw_list, ip_type))
+
+    def add(self, fw_list, ip_addresses):
+        self.queue('add', fw_list, ip_addresses)
+
+    def normalise(self, ip_address):
+        # nft lists 192.0.2.1/32 as 192.0.2.1 and IPv6 addresses in compressed form.
+        try:
+            return str(ipaddress.ip_network(ip_address.strip(), strict=False))
+        except ValueError:
+            return ip_address
+
+    def delete(self, fw_list, ip_addresses, existing_only=True):
+        # Deleting an element that is not in the set aborts the whole transaction,
+        #  so by default only addresses present in the live set are deleted, as nft
+        #  lists them.  Returns the addresses skipped because they were not found.
+        if not existing_only:
+            self.queue('delete', fw_list, ip_addresses)
+            return []
+        skipped = []
+        for ip_type, addresses in self.group(ip_addresses).items():
+            live = {self.normalise(e): e for e in self.list_set(fw_list, ip_type, False)}
+            found = []
+            for a in addresses:
+                e = live.get(self.normalise(a))
+                if e is None:
+                    skipped.append(a)
+                elif e not in found:
+                    found.append(e)
+            if found:
+                self.queue('delete', fw_list, found)
+        if skipped:
+            logger.info('nftables %s delete skipped %d addresses not in the set: %s' % (
+                fw_list, len(skipped), ', '.join(skipped[:10])
+                ))
+        return skipped
+
+    def flush(self, fw_list, ip_type):
+        self.commands.append({'flush': {'set': self.set_spec(fw_list, ip_type)}})
+        self.touched.add((fw_list, ip_type))
+
+    def replace(self, fw_list, ip_type, ip_addresses):
+        # Flush and re-populate a set within one transaction.
+        self.flush(fw_list, ip_type)
+        if ip_addresses:
+            self.queue('add', fw_list, ip_addresses)
+
+    def execute(self, request):
+        # Returns a tuple of (return code, output)
+        if self.helper_socket:
+            return self.helper_request(request)
+        if request['cmd'] == 'apply':
+            cmd = self.nft_command + ['-j', '-f', '-']
+            data = json.dumps({'nftables': request['nftables']})
+        elif request['cmd'] == 'list':
+            cmd = self.nft_command + ['-j', 'list', 'set', request['family'], request['table'], request['name']]
+            data = None
+        else:
+            cmd = self.nft_command + ['-j', 'list', 'counters']
+            data = None
+        try:
+            proc = subprocess.run(cmd, input=data, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        except OSError as e:
+            return (1, str(e))
+        return (proc.returncode, proc.stdout)
+
+    def helper_request(self, request):
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+                s.settimeout(30)
+                s.connect(self.helper_socket)
+                s.sendall(json.dumps(request).encode())
+                s.shutdown(socket.SHUT_WR)
+                chunks = []
+                while True:
+                    chunk = s.recv(65536)
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+        except OSError as e:
+            return (1, 'nft helper: %s' % e)
+        try:
+            response = json.loads(b''.join(chunks).decode())
+        except ValueError:
+            return (1, 'nft helper: invalid response')
+        return (response.get('rc', 1), response.get('output', ''))
+
+    def cache_key(self, fw_list, ip_type):
+        return 'firewall:set:%s:%s' % (fw_list, ip_type)
+
+    def list_set(self, fw_list, ip_type, use_cache=True):
+        # Returns the set elements as strings, eg. '192.0.2.1' or '198.51.100.0/24'.
+        key = self.cache_key(fw_list, ip_type)
+        if use_cache:
+            elements = cache.get(key)
+            if elements is not None:
+                return elements
+        request = {'cmd': 'list'}
+        request.update(self.set_spec(fw_list, ip_type))
+        rc, output = self.execute(request)
+        elements = []
+        if rc == 0:
+            try:
+                data = json.loads(output)
+            except ValueError:
+                data = {'nftables': []}
+            for obj in data['nftables']:
+                if 'set' in obj:
+                    elements = [self.element_str(e) for e in obj['set'].get('elem', [])]
+            cache.set(key, elements, self.cache_timeout)
+        else:
+            logger.warning('nftables list %s %s failed: %s' % (fw_list, ip_type, output))
+        return elements
+
+    def list_page(self, fw_list, ip_type, page=1, page_size=0):
+        # Returns (count, elements) for one page of a set, page_size 0 returns all.
+        elements = self.list_set(fw_list, ip_type)
+        if page_size < 1:
+            return (len(elements), elements)
+        start = (max(page, 1) - 1) * page_size
+        return (len(elements), elements[start:start + page_size])
+
+    def counters(self):
+        rc, output = self.execute({'cmd': 'counters'})
+        if not rc == 0:
+            return []
+        try:
+            data = json.loads(output)
+        except ValueError:
+            return []
+        return [o['counter'] for o in data['nftables'] if 'counter' in o]
+
+    def commit(self):
+        # Applies all queued changes as one transaction.
+        #  Returns an empty string on success or the nft error output.
+        if not self.commands:
+            return ''
+        rc, output = self.execute({'cmd': 'apply', 'nftables': self.commands})
+        cache.delete_many([self.cache_key(fw_list, ip_type) for fw_list, ip_type in self.touched])
+        if not rc == 0:
+            logger.warning('nftables transaction failed: %s' % output)
+            return output or 'nft exit code %s' % rc
+        return ''
+
+    def publish(self, broker=None):
+        # Sends one TAP.Firewall event per action, list and address family so that
+        #  remote_event_receiver.py can apply the same change to other hosts.
+        if not self.pending:
+            return
+        disconnect = False
+        if not broker:
+            broker = AmqpCmdEvent()
+            try:
+                connected = broker.connect()
+            except (pika.exceptions.AMQPError, OSError) as e:
+                logger.warning('nftables changes not published, broker connect failed: %s' % e)
+                connected = False
+            if not connected:
+                return
+            disconnect = True
+        for (action, fw_list, ip_type), ip_addresses in self.pending.items():
+            routing = 'DjangoPBX.%s.FIREWALL.%s.%s' % (broker.hostname, action, ip_type)
+            payload = self.firewall_event_template % (action, ip_type, fw_list, ','.join(ip_addresses))
+            broker.adhoc_publish(payload, routing, 'TAP.Firewall')
+        if disconnect:
+            broker.disconnect()
+
+    def clear(self):
+        self.commands = []
+        self.pending = {}
+        self.touched = set()
@@ -1,9 +1,18 @@
 import smtplib
+import time
+import queue
+from concurrent.futures import ThreadPoolExecutor
 
+from email import message_from_bytes
+from email import policy
 from email.message import EmailMessage
 from email.utils import formatdate, make_msgid
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
 from tenants.pbxsettings import PbxSettings
 from switch.emailtemplates import Templates as Tp
+from switch.models import EmailQueue, EmailQueueStatusChoice
 
 
 class PbxTemplateMessage:
@@ -22,9 +31,34 @@ class PbxTemplateMessage:
     def GetTemplate(self, domain_id, lang, cat, subcat):
         return Tp().get_template(domain_id, lang, cat, subcat)
 
-    def Send(self, rps, sub, msg, msg_type, fieldfile=None, att_maintype='audio', att_subtype='wav'):
+    def Send(self, rps, sub, msg, msg_type, fieldfile=None, att_maintype='audio', att_subtype='wav', use_queue=None):
         if not self.ok:
             return (self.ok, ': '.join(self.info))
+        m = self.BuildMessage(rps, sub, msg, msg_type, fieldfile, att_maintype, att_subtype)
+        if not m:
+            return (False, ': '.join(self.info))
+
+        if use_queue is None:
+            use_queue = settings.PBX_SMTP_USE_QUEUE
+        if use_queue:
+            return self.Enqueue(m)
+
+        with smtplib.SMTP(self.cfg['smtp_host'], int(self.cfg['smtp_port'])) as server:
+            try:
+                if not server.starttls()[0] == 220:  # Secure the connection
+                    self.info.append('Warning! connection may not be secure.')
+                server.login(self.cfg['smtp_user_name'], self.cfg['smtp_password'])
+                server.send_message(m)
+                server.quit()
+            except smtplib.SMTPResponseException as e:
+                self.info.append('Error! code- %s Text- %s' % (e.smtp_code, e.smtp_error))
+                self.ok = False
+
+        if self.ok:
+            self.info.append('Email sent OK')
+        return (self.ok, ': '.join(self.info))
+
+    def BuildMessage(self, rps, sub, msg, msg_type, fieldfile=None, att_maintype='audio', att_subtype='wav'):
         try:
             domain = self.cfg['smtp_from'].split('@')[1]
         except:
@@ -38,7 +72,7 @@ class PbxTemplateMessage:
             m['Message-ID'] = make_msgid(domain=domain)
         except (TypeError, ValueError):
             self.info.append('Error with message parameters')
-            return (False, ': '.join(self.info))
+            return None
 
         try:
             if msg_type == 'html':
@@ -48,7 +82,7 @@ class PbxTemplateMessage:
                 m.set_content(msg)
         except (TypeError, ValueError):
             self.info.append('Error with message body')
-            return (False, ': '.join(self.info))
+            return None
         if fieldfile:
             fieldfile.open(mode='rb')
             file_data = fieldfile.read()
@@ -56,18 +90,166 @@ class PbxTemplateMessage:
                 m.add_attachment(file_data, att_maintype, att_subtype, filename=fieldfile.name.split('/')[-1:][0])
             except:
                 pass
+        return m
 
-        with smtplib.SMTP(self.cfg['smtp_host'], int(self.cfg['smtp_port'])) as server:
+    def Enqueue(self, m):
+        EmailQueue.objects.create(
+            recipients=m['To'], subject=str(m['Subject'])[:254], message=m.as_bytes()
+            )
+        self.info.append('Email queued OK')
+        return (True, ': '.join(self.info))
+
+
+class SmtpConnectionPool:
+    # Keeps authenticated SMTP connections open so that consecutive deliveries
+    #  avoid the connect, STARTTLS and login round trips.
+
+    def __init__(self, cfg, max_size=2, max_idle=60):
+        self.cfg = cfg
+        self.max_idle = max_idle
+        self.pool = queue.LifoQueue(max_size)
+
+    def connect(self):
+        server = smtplib.SMTP(self.cfg['smtp_host'], int(self.cfg['smtp_port']), timeout=30)
+        server.starttls()
+        server.login(self.cfg['smtp_user_name'], self.cfg['smtp_password'])
+        return server
+
+    def get(self):
+        while True:
             try:
-                if not server.starttls()[0] == 220:  # Secure the connection
-                    self.info.append('Warning! connection may not be secure.')
-                server.login(self.cfg['smtp_user_name'], self.cfg['smtp_password'])
-                server.send_message(m)
-                server.quit()
-            except smtplib.SMTPResponseException as e:
-                self.info.append('Error! code- %s Text- %s' % (e.smtp_code, e.smtp_error))
-                self.ok = False
+                server, last_used = self.pool.get_nowait()
+            except queue.Empty:
+                return self.connect()
+            if time.monotonic() - last_used > self.max_idle:
+                self.discard(server)
+                continue
+            try:
+                if server.noop()[0] == 250:
+                    return server
+            except smtplib.SMTPException:
+                pass
+            self.discard(server)
 
-        if self.ok:
-            self.info.append('Email sent OK')
-        return (self.ok, ': '.join(self.info))
+    def put(self, server):
+        try:
+            self.pool.put_nowait((server, time.monotonic()))
+        except queue.Full:
+            self.discard(server)
+
+    def discard(self, server):
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            server.close()
+
+    def close_idle(self):
+        kept = []
+        while True:
+            try:
+                server, last_used = self.pool.get_nowait()
+            except queue.Empty:
+                break
+            if time.monotonic() - last_used > self.max_idle:
+                self.discard(server)
+            else:
+                kept.append((server, last_used))
+        for k in kept:
+            self.pool.put_nowait(k)
+
+    def close(self):
+        while True:
+            try:
+                server, last_used = self.pool.get_nowait()
+            except queue.Empty:
+                break
+            self.discard(server)
+
+
+class PbxMailQueue:
+    # Delivers messages placed on the EmailQueue table by PbxTemplateMessage.Send
+
+    def __init__(self, batch_size=50, connections=2, max_attempts=8, backoff=60, max_backoff=3600):
+        self.cfg = PbxSettings().default_email_settings()
+        self.batch_size = batch_size
+        self.connections = connections
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.smtp_pool = SmtpConnectionPool(self.cfg, connections)
+        self.executor = ThreadPoolExecutor(max_workers=connections)
+
+    def claim_batch(self):
+        with transaction.atomic():
+            qs = EmailQueue.objects.select_for_update(skip_locked=True).filter(
+                status=EmailQueueStatusChoice.CQUEUED, next_attempt__lte=timezone.now()
+                ).order_by('next_attempt')[:self.batch_size]
+            batch = list(qs)
+            if batch:
+                EmailQueue.objects.filter(id__in=[q.id for q in batch]).update(
+                    status=EmailQueueStatusChoice.CSENDING, updated=timezone.now()
+                    )
+        return batch
+
+    def deliver(self, q):
+        m = message_from_bytes(bytes(q.message), policy=policy.default)
+        try:
+            server = self.smtp_pool.get()
+        except (smtplib.SMTPException, OSError) as e:
+            return (False, True, 'Connect: %s' % e)
+        try:
+            server.send_message(m)
+        except smtplib.SMTPRecipientsRefused as e:
+            self.smtp_pool.put(server)
+            return (False, False, 'Recipients refused: %s' % ', '.join(e.recipients.keys()))
+        except smtplib.SMTPResponseException as e:
+            self.smtp_pool.put(server)
+            # 5xx responses are permanent, retrying will not help
+            return (False, e.smtp_code < 500, 'Error! code- %s Text- %s' % (e.smtp_code, e.smtp_error))
+        except (smtplib.SMTPException, OSError) as e:
+            self.smtp_pool.discard(server)
+            return (False, True, str(e))
+        self.smtp_pool.put(server)
+        return (True, False, None)
+
+    def deliver_safely(self, q):
+        # A message that can not be parsed or sent for any other reason is retried
+        #  like a transient failure rather than stopping the rest of the batch.
+        try:
+            return self.deliver(q)
+        except Exception as e:
+            return (False, True, 'Unexpected error: %s' % e)
+
+    def process_batch(self):
+        batch = self.claim_batch()
+        if not batch:
+            self.smtp_pool.close_idle()
+            return 0
+        results = self.executor.map(self.deliver_safely, batch)
+        now = timezone.now()
+        for q, (sent, retry, error) in zip(batch, results):
+            q.attempts += 1
+            q.updated = now
+            q.last_error = error[:254] if error else None
+            if sent:
+                q.status = EmailQueueStatusChoice.CSENT
+            elif retry and q.attempts < self.max_attempts:
+                q.status = EmailQueueStatusChoice.CQUEUED
+                q.next_attempt = now + timezone.timedelta(
+                    seconds=min(self.backoff * 2 ** (q.attempts - 1), self.max_backoff)
+                    )
+            else:
+                q.status = EmailQueueStatusChoice.CFAILED
+        EmailQueue.objects.bulk_update(batch, ['status', 'attempts', 'next_attempt', 'last_error', 'updated'])
+        return len(batch)
+
+    def requeue_stale(self, minutes=10):
+        # Messages left in sending state by a worker that died mid batch.
+        stale_time = timezone.now() - timezone.timedelta(minutes=minutes)
+        return EmailQueue.objects.filter(
+            status=EmailQueueStatusChoice.CSENDING, updated__lt=stale_time
+            ).update(status=EmailQueueStatusChoice.CQUEUED)
+
+    def close(self):
+        self.executor.shutdown()
+        self.smtp_pool.close()
@@ -0,0 +1,62 @@
+--
+--    DjangoPBX
+--
+--    MIT License
+--
+--    Copyright (c) 2016 - 2024 Adrian Fretwell <adrian@djangopbx.com>
+--
+--    Permission is hereby granted, free of charge, to any person obtaining a copy
+--    of this software and associated documentation files (the "Software"), to deal
+--    in the Software without restriction, including without limitation the rights
+--    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+--    copies of the Software, and to permit persons to whom the Software is
+--    furnished to do so, subject to the following conditions:
+--
+--    The above copyright notice and this permission notice shall be included in all
+--    copies or substantial portions of the Software.
+--
+--    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+--    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+--    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+--    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+--    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+--    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+--    SOFTWARE.
+--
+--    Contributor(s):
+--    Adrian Fretwell <adrian@djangopbx.com>
+--
+
+-- Sends PRESENCE_IN events for a batch of call flows, used by CallFlowPresence.
+-- arguments: uuid:feature_code@domain:status [uuid:feature_code@domain:status ...]
+--  status true is day mode (terminated), anything else night mode (confirmed).
+
+-- local variables
+    local t = { };
+
+    for i, v in ipairs(argv) do
+        local unique_id, user_id, status = v:match("^([^:]+):(.+):(%a+)$");
+        if unique_id then
+            local event = freeswitch.Event("PRESENCE_IN");
+            event:addHeader("proto", "sip");
+            event:addHeader("event_type", "presence");
+            event:addHeader("alt_event_type", "dialog");
+            event:addHeader("Presence-Call-Direction", "outbound");
+            event:addHeader("from", user_id);
+            event:addHeader("login", user_id);
+            event:addHeader("unique-id", unique_id);
+            event:addHeader("status", "Active (1 waiting)");
+            if status == "true" then
+                event:addHeader("answer-state", "terminated");
+            else
+                event:addHeader("answer-state", "confirmed");
+                event:addHeader("rpid", "unknown");
+                event:addHeader("event_count", "1");
+            end
+            event:fire();
+            t[#t+1] = user_id .. "=" .. status;
+        end
+    end
+
+--log the batch
+    freeswitch.consoleLog("debug", "[callflow_presence] " .. table.concat(t, ', ') .. "\n");
@@ -0,0 +1,63 @@
+--
+--    DjangoPBX
+--
+--    MIT License
+--
+--    Copyright (c) 2016 - 2024 Adrian Fretwell <adrian@djangopbx.com>
+--
+--    Permission is hereby granted, free of charge, to any person obtaining a copy
+--    of this software and associated documentation files (the "Software"), to deal
+--    in the Software without restriction, including without limitation the rights
+--    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+--    copies of the Software, and to permit persons to whom the Software is
+--    furnished to do so, subject to the following conditions:
+--
+--    The above copyright notice and this permission notice shall be included in all
+--    copies or substantial portions of the Software.
+--
+--    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+--    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+--    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+--    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+--    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+--    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+--    SOFTWARE.
+--
+--    Contributor(s):
+--    Adrian Fretwell <adrian@djangopbx.com>
+--
+
+-- Sends message waiting events for a batch of mailboxes, used by MwiCoalescer.
+-- arguments: user@domain:new:saved [user@domain:new:saved ...]
+
+-- prepare the API object
+    local api = freeswitch.API();
+
+-- local variables
+    local t = { };
+
+    for i, v in ipairs(argv) do
+        local account, new, saved = v:match("^(.+):(%d+):(%d+)$");
+        if account then
+            local contact = api:executeString("sofia_contact */" .. account);
+            if contact and not contact:find("^error") then
+                local profile = contact:match("^[^/]+/([^/]+)/");
+                if profile then
+                    local event = freeswitch.Event("message_waiting");
+                    event:addHeader("sofia-profile", profile);
+                    event:addHeader("MWI-Message-Account", "sip:" .. account);
+                    if tonumber(new) > 0 then
+                        event:addHeader("MWI-Messages-Waiting", "yes");
+                    else
+                        event:addHeader("MWI-Messages-Waiting", "no");
+                    end
+                    event:addHeader("MWI-Voice-Message", new .. "/" .. saved .. " (0/0)");
+                    event:fire();
+                    t[#t+1] = account .. "=" .. new .. "/" .. saved;
+                end
+            end
+        end
+    end
+
+--log the batch
+    freeswitch.consoleLog("notice", "[mwi_batch] " .. table.concat(t, ', ') .. "\n");
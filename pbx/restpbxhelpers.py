@@ -27,7 +27,16 @@
 #    Adrian Fretwell <adrian@djangopbx.com>
 #
 
+import base64
+import json
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import connections
+from django.db.models import Q
 from rest_framework import renderers
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class PassthroughRenderer(renderers.BaseRenderer):
@@ -38,3 +47,180 @@ class PassthroughRenderer(renderers.BaseRenderer):
     format = ''
     def render(self, data, accepted_media_type=None, renderer_context=None):
         return data
+
+
+class SparseFieldsMixin:
+    """
+        Serializer mixin limiting the output of GET requests to the fields named
+        in a ?fields=a,b,c query parameter.
+    """
+    fields_query_param = 'fields'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method != 'GET':
+            return
+        wanted = request.query_params.get(self.fields_query_param)
+        if not wanted:
+            return
+        wanted = {f.strip() for f in wanted.split(',')}
+        for name in set(self.fields) - wanted:
+            self.fields.pop(name)
+
+
+class PbxPagination(PageNumberPagination):
+    """
+        Page number pagination with two additions:
+          ?cursor= switches to keyset pagination on the view's existing ordering, with
+            the primary key added as a tie breaker, so deep pages cost the same as
+            the first and no COUNT(*) is run.
+          ?count=false keeps page numbers but skips the COUNT(*), count is returned
+            as null and next is offered whenever a further row exists.
+    """
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.mode = 'page'
+        if self.cursor_query_param in request.query_params:
+            ordering = self.keyset_ordering(queryset)
+            if ordering:
+                self.mode = 'cursor'
+                return self.paginate_keyset(queryset, request, ordering)
+        if request.query_params.get(self.count_query_param, '').lower() in ('false', '0', 'no'):
+            self.mode = 'nocount'
+            return self.paginate_uncounted(queryset, request)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.mode == 'cursor':
+            return Response({'next': self.cursor_link(False), 'previous': self.cursor_link(True), 'results': data})
+        if self.mode == 'nocount':
+            return Response({
+                'count': None, 'next': self.uncounted_link(self.page_number + 1) if self.has_next else None,
+                'previous': self.uncounted_link(self.page_number - 1) if self.page_number > 1 else None,
+                'results': data
+            })
+        return super().get_paginated_response(data)
+
+    def paginate_uncounted(self, queryset, request):
+        page_size = self.get_page_size(request)
+        try:
+            self.page_number = int(request.query_params.get(self.page_query_param, 1))
+        except ValueError:
+            raise NotFound('Invalid page.')
+        if self.page_number < 1:
+            raise NotFound('Invalid page.')
+        offset = (self.page_number - 1) * page_size
+        rows = list(queryset[offset:offset + page_size + 1])
+        self.has_next = len(rows) > page_size
+        return rows[:page_size]
+
+    def uncounted_link(self, page_number):
+        url = self.request.build_absolute_uri()
+        if page_number == 1:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, page_number)
+
+    def keyset_ordering(self, queryset):
+        # [(attname, descending, null), ...] or None when the ordering can not be
+        #  used as a keyset, for example when it follows a relation.
+        opts = queryset.model._meta
+        ordering = []
+        for name in queryset.query.order_by or opts.ordering:
+            if not isinstance(name, str) or name.lstrip('-') == '?':
+                return None
+            try:
+                field = opts.pk if name.lstrip('-') == 'pk' else opts.get_field(name.lstrip('-'))
+            except FieldDoesNotExist:
+                return None
+            if not field.concrete or field.many_to_many:
+                return None
+            ordering.append((field.attname, name.startswith('-'), field.null))
+        if opts.pk.attname not in [o[0] for o in ordering]:
+            ordering.append((opts.pk.attname, False, False))
+        return ordering
+
+    def keyset_segments(self, ordering, values, reverse, nulls_largest):
+        # The rows after values, as filters in the order their rows follow on.  Each
+        #  is an equality prefix and a range on one column so it is an index seek,
+        #  NULLs are placed where the database sorts them.
+        segments = []
+        equal = Q()
+        for (attname, desc, null), value in zip(ordering, values):
+            desc = desc != reverse
+            nulls_last = nulls_largest != desc
+            level = []
+            if value is None:
+                if not nulls_last:
+                    level.append(equal & Q(**{'%s__isnull' % attname: False}))
+                equal &= Q(**{'%s__isnull' % attname: True})
+            else:
+                level.append(equal & Q(**{'%s__%s' % (attname, 'lt' if desc else 'gt'): value}))
+                if null and nulls_last:
+                    level.append(equal & Q(**{'%s__isnull' % attname: True}))
+                equal &= Q(**{attname: value})
+            segments = level + segments
+        return segments
+
+    def paginate_keyset(self, queryset, request, ordering):
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request.query_params[self.cursor_query_param], ordering, queryset.model)
+        reverse = cursor['r'] if cursor else False
+        qs = queryset.order_by(
+            *['%s%s' % ('-' if desc != reverse else '', attname) for attname, desc, null in ordering]
+            )
+        if cursor:
+            nulls_largest = connections[queryset.db].features.nulls_order_largest
+            rows = []
+            for segment in self.keyset_segments(ordering, cursor['v'], reverse, nulls_largest):
+                rows.extend(qs.filter(segment)[:page_size + 1 - len(rows)])
+                if len(rows) > page_size:
+                    break
+        else:
+            rows = list(qs[:page_size + 1])
+        more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+        self.ordering = ordering
+        self.first_row = rows[0] if rows else None
+        self.last_row = rows[-1] if rows else None
+        self.has_next = more if not reverse else cursor is not None
+        self.has_previous = more if reverse else cursor is not None
+        return rows
+
+    def decode_cursor(self, encoded, ordering, model):
+        # Values are converted by their fields so a tampered cursor is a 404, not
+        #  an error from the database.
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            if not isinstance(cursor['v'], list) or len(cursor['v']) != len(ordering):
+                raise ValueError
+            values = []
+            for (attname, desc, null), value in zip(ordering, cursor['v']):
+                if value is not None and not isinstance(value, str):
+                    raise ValueError
+                values.append(None if value is None else model._meta.get_field(attname).to_python(value))
+        except (TypeError, ValueError, KeyError, UnicodeError, ValidationError):
+            raise NotFound('Invalid cursor.')
+        return {'v': values, 'r': bool(cursor.get('r'))}
+
+    def cursor_link(self, previous):
+        if previous:
+            row, wanted = self.first_row, self.has_previous
+        else:
+            row, wanted = self.last_row, self.has_next
+        if row is None or not wanted:
+            return None
+        values = []
+        for attname, desc, null in self.ordering:
+            value = getattr(row, attname)
+            values.append(None if value is None else row._meta.get_field(attname).value_to_string(row))
+        encoded = base64.urlsafe_b64encode(json.dumps({'v': values, 'r': previous}).encode()).decode('ascii')
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, encoded)
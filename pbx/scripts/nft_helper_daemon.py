@@ -0,0 +1,158 @@
+#!/usr/bin/python3
+#
+#    DjangoPBX
+#
+#    MIT License
+#
+#    Copyright (c) 2016 - 2024 Adrian Fretwell <adrian@djangopbx.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+#
+#    Contributor(s):
+#    Adrian Fretwell <adrian@djangopbx.com>
+#
+
+#
+# Small privileged helper that applies firewall set changes for the Django
+# processes.  It runs as root and listens on a Unix socket that is only
+# accessible to the django-pbx group.  Each connection carries one JSON request,
+# terminated by closing the write side of the socket:
+#   {"cmd": "apply", "nftables": [...]}   add/delete element or flush set commands
+#   {"cmd": "list", "family": "inet", "table": "filter", "name": "ipv4_white_list"}
+#   {"cmd": "counters"}
+# The response is {"rc": <int>, "output": "<nft output>"}.
+# If the libnftables Python binding (python3-nftables) is available it is used
+# directly, otherwise nft is run as a subprocess.
+#
+
+import os
+import re
+import sys
+import grp
+import json
+import socket
+import argparse
+import subprocess
+
+allowed_tables = [('inet', 'filter'), ('netdev', 'filter')]
+allowed_actions = ['add', 'delete', 'flush']
+set_name_re = re.compile(r'^ipv[46]_[a-z_]+_list$')
+
+try:
+    import nftables
+    nft = nftables.Nftables()
+    nft.set_json_output(True)
+except ImportError:
+    nft = None
+
+
+def run_nft(args, commands=None):
+    # commands are passed to libnftables as JSON, args are only used for fixed
+    #  commands or when nft is run as a subprocess, which does not use a shell.
+    if nft:
+        if commands is not None:
+            rc, output, error = nft.json_cmd({'nftables': commands})
+            return (rc, error if rc else json.dumps(output))
+        rc, output, error = nft.cmd(' '.join(args))
+        return (rc, error if rc else output)
+    data = None if args else json.dumps({'nftables': commands})
+    proc = subprocess.run(
+        ['/usr/sbin/nft', '-j'] + (args if args else ['-f', '-']), input=data,
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+        )
+    return (proc.returncode, proc.stdout)
+
+
+def valid_set(spec):
+    if not (spec.get('family'), spec.get('table')) in allowed_tables:
+        return False
+    name = spec.get('name')
+    return isinstance(name, str) and set_name_re.fullmatch(name) is not None
+
+
+def valid_commands(commands):
+    for c in commands:
+        if not len(c) == 1:
+            return False
+        action, obj = list(c.items())[0]
+        if action not in allowed_actions:
+            return False
+        if action == 'flush':
+            if not valid_set(obj.get('set', {})):
+                return False
+        elif not valid_set(obj.get('element', {})):
+            return False
+    return True
+
+
+def handle_request(request):
+    cmd = request.get('cmd')
+    if cmd == 'apply':
+        commands = request.get('nftables', [])
+        if not valid_commands(commands):
+            return (1, 'Command not permitted')
+        return run_nft([], commands)
+    if cmd == 'list':
+        if not valid_set(request):
+            return (1, 'Set not permitted')
+        spec = {'family': request['family'], 'table': request['table'], 'name': request['name']}
+        return run_nft(['list', 'set', spec['family'], spec['table'], spec['name']], [{'list': {'set': spec}}])
+    if cmd == 'counters':
+        return run_nft(['list', 'counters'])
+    return (1, 'Unknown command')
+
+
+def serve(path, group):
+    if os.path.exists(path):
+        os.unlink(path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    os.chown(path, 0, grp.getgrnam(group).gr_gid)
+    os.chmod(path, 0o660)
+    server.listen(16)
+    while True:
+        conn, addr = server.accept()
+        with conn:
+            conn.settimeout(30)
+            chunks = []
+            try:
+                while True:
+                    chunk = conn.recv(65536)
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+                request = json.loads(b''.join(chunks).decode())
+                rc, output = handle_request(request)
+            except (OSError, ValueError, AttributeError) as e:
+                rc, output = (1, str(e))
+            try:
+                conn.sendall(json.dumps({'rc': rc, 'output': output}).encode())
+            except OSError:
+                pass
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='DjangoPBX nftables helper daemon')
+    parser.add_argument('--socket', default='/run/djangopbx/nft.sock')
+    parser.add_argument('--group', default='django-pbx')
+    args = parser.parse_args()
+    if not os.geteuid() == 0:
+        sys.exit('nft helper must be run as root')
+    serve(args.socket, args.group)
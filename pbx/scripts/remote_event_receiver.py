@@ -30,21 +30,79 @@
 
 import argparse
 import json
+import subprocess
 from resources.pbx.amqpconnection import AmqpConnection
 from resources.pbx.shellcommand import shcommand
 
 nonstr = 'none'
+nft_command = ['/usr/bin/sudo', '/usr/sbin/nft', '-f', '-']
+nft_batch_size = 1000
+fw_sets = {
+    'block':        'netdev filter %s_block_list',         # noqa: E241
+    'white':        'inet filter %s_white_list',           # noqa: E241
+    'sip-customer': 'inet filter %s_sip_customer_list',    # noqa: E241
+    'sip-gateway':  'inet filter %s_sip_gateway_list',     # noqa: E241
+    'web-block':    'inet filter %s_web_block_list',       # noqa: E241
+}
+
+
+def fw_script(action, iptype, fwlist, ip_addresses):
+    # One nft element statement per batch of addresses, all applied by a single nft -f.
+    set_name = fw_sets[fwlist] % iptype
+    lines = []
+    for i in range(0, len(ip_addresses), nft_batch_size):
+        lines.append('%s element %s { %s }' % (action, set_name, ', '.join(ip_addresses[i:i + nft_batch_size])))
+    return '\n'.join(lines) + '\n'
+
+
+def element_str(elem):
+    if type(elem) is dict:
+        if 'prefix' in elem:
+            return '%s/%s' % (elem['prefix']['addr'], elem['prefix']['len'])
+        if 'range' in elem:
+            return '%s-%s' % tuple(elem['range'])
+        if 'elem' in elem:
+            return element_str(elem['elem']['val'])
+    return str(elem)
+
+
+def fw_set_elements(iptype, fwlist):
+    proc = subprocess.run(nft_command[:2] + ['-j', 'list', 'set'] + (fw_sets[fwlist] % iptype).split(),
+                          stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    if not proc.returncode == 0:
+        return None
+    for o in json.loads(proc.stdout).get('nftables', []):
+        if 'set' in o:
+            return set(element_str(e) for e in o['set'].get('elem', []))
+    return set()
+
 
 def handle_firewall(event):
     action = event.get('Action', 'add')
     if action in ['add', 'delete']:
         iptype = event.get('IP-Type', 'ipv4')
         fwlist = event.get('Fw-List', 'sip-customer')
-        ip_address = event.get('IP-Address', '192.168.42.1')
-        shcommand(['/usr/local/bin/fw-%s-%s-%s-list.sh' % (action, iptype, fwlist), ip_address])
+        # Bulk changes carry a comma separated list of addresses
+        ip_addresses = [a for a in event.get('IP-Address', '192.168.42.1').split(',') if a]
+        if fwlist in fw_sets and len(ip_addresses) > 1:
+            if action == 'delete':
+                # Deleting an address that is not in the set fails the whole transaction.
+                live = fw_set_elements(iptype, fwlist)
+                if live is not None:
+                    ip_addresses = [a for a in ip_addresses if a in live]
+                    if not ip_addresses:
+                        return
+            proc = subprocess.run(nft_command, input=fw_script(action, iptype, fwlist, ip_addresses).encode(),
+                                  stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            if proc.returncode == 0:
+                return
+            # The transaction is all or nothing, fall back to applying addresses one by one.
+        for ip_address in ip_addresses:
+            shcommand(['/usr/local/bin/fw-%s-%s-%s-list.sh' % (action, iptype, fwlist), ip_address])
     if action == 'save':
         shcommand(['/usr/local/bin/fw-save-ruleset.sh'])
 
+
 def on_message(channel, method, properties, body):
     msg = body.decode('utf8')
     event = json.loads(msg)
@@ -52,6 +110,7 @@ def on_message(channel, method, properties, body):
     if event_name == 'FIREWALL':
         handle_firewall(event)
 
+
 def main():
     broker = '127.0.0.1'
     broker_port = 5672
@@ -67,18 +126,19 @@ def main():
         broker_password = args.password
     routing = {'TAP.Firewall': ['*.*.*.*.*']}
     mq = AmqpConnection(broker, broker_port, broker_user, broker_password,
-                            routing, False, '%s_remote_event_queue' % broker)
+                        routing, False, '%s_remote_event_queue' % broker)
     mq.connect()
     mq.setup_exchange('TAP.Firewall')
     mq.setup_queues()
     mq.consume(on_message)
 
+
 if __name__ == '__main__':
     nonstr = 'none'
-    parser=argparse.ArgumentParser(description='AMQP Remote Event Listener')
+    parser = argparse.ArgumentParser(description='AMQP Remote Event Listener')
     parser.add_argument('--host')
     parser.add_argument('--port', type=int)
     parser.add_argument('--user')
     parser.add_argument('--password')
-    args=parser.parse_args()
+    args = parser.parse_args()
     main()
@@ -0,0 +1,118 @@
+#
+#    DjangoPBX
+#
+#    MIT License
+#
+#    Copyright (c) 2016 - 2024 Adrian Fretwell <adrian@djangopbx.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+#
+#    Contributor(s):
+#    Adrian Fretwell <adrian@djangopbx.com>
+#
+
+import hashlib
+import time
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDbStore
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+
+
+class SessionStore(CachedDbStore):
+    # Cache first session store, used with SESSION_ENGINE = 'pbx.sessionstore'.
+    #  Sessions are read from the cache and only fall back to the database on a miss.
+    #  Every save refreshes the cache, but a session whose data has not changed is only
+    #  written back to the database once per PBX_SESSION_DB_SYNC_INTERVAL seconds to
+    #  move its expiry date on.  With SESSION_SAVE_EVERY_REQUEST this removes the
+    #  session SELECT and UPDATE from most page views.
+    #  Cache errors are ignored so sessions keep working from the database when
+    #  memcached is down.
+
+    cache_key_prefix = 'pbx.sessionstore'
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self.db_synced = None
+
+    @property
+    def sync_key(self):
+        return '%s:synced' % self.cache_key
+
+    def cache_set(self, key, value, timeout):
+        try:
+            self._cache.set(key, value, timeout)
+        except Exception:
+            pass
+
+    def cache_delete(self, key):
+        try:
+            self._cache.delete(key)
+        except Exception:
+            pass
+
+    def exists(self, session_key):
+        try:
+            if session_key and (self.cache_key_prefix + session_key) in self._cache:
+                return True
+        except Exception:
+            pass
+        return DBStore.exists(self, session_key)
+
+    def load(self):
+        try:
+            cached = self._cache.get_many([self.cache_key, self.sync_key])
+        except Exception:
+            cached = {}
+        data = cached.get(self.cache_key)
+        if data is not None:
+            self.db_synced = cached.get(self.sync_key)
+            return data
+
+        s = self._get_session_from_db()
+        if not s:
+            return {}
+        data = self.decode(s.session_data)
+        self.cache_set(self.cache_key, data, self.get_expiry_age(expiry=s.expire_date))
+        return data
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        data = self._get_session(no_load=must_create)
+        digest = hashlib.sha1(self.serializer().dumps(data)).hexdigest()
+        now = time.time()
+        if (not must_create and self.db_synced and self.db_synced[0] == digest
+                and now - self.db_synced[1] < settings.PBX_SESSION_DB_SYNC_INTERVAL):
+            self.cache_set(self.cache_key, data, self.get_expiry_age())
+            return
+        # Skip CachedDbStore.save, its cache write is not guarded.
+        DBStore.save(self, must_create)
+        self.cache_set(self.cache_key, self._session, self.get_expiry_age())
+        self.db_synced = (digest, now)
+        self.cache_set(self.sync_key, self.db_synced, self.get_expiry_age())
+
+    def delete(self, session_key=None):
+        DBStore.delete(self, session_key)
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        self.cache_delete(self.cache_key_prefix + session_key)
+        self.cache_delete('%s%s:synced' % (self.cache_key_prefix, session_key))
+        self.db_synced = None
@@ -113,6 +113,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Request latency, query and cache metrics for the PBX_METRICS_HANDLERS applications.
+    'pbx.metrics.MetricsMiddleware',
+    # Uncomment below to record requests from FreeSWITCH for the replaycapture command, see PBX_CAPTURE_DIR.
+    # 'pbx.capture.CaptureMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     # Uncomment below to allow language selection based on data from the request. It customises content for each user.
@@ -126,7 +130,8 @@ MIDDLEWARE = [
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+        # Django's PyMemcacheCache with cache hits and misses counted for the metrics view.
+        'BACKEND': 'pbx.metrics.PyMemcacheCache',
         'LOCATION': '127.0.0.1:11211',
         'TIMEOUT': 300,
         'KEY_PREFIX': 'pbx',
@@ -292,14 +297,16 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
         # 'rest_framework.permissions.DjangoModelPermissions',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'pbx.restpbxhelpers.PbxPagination',
     'PAGE_SIZE': 10,
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
 
 }
 
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+SESSION_ENGINE = 'pbx.sessionstore'
 SESSION_SAVE_EVERY_REQUEST = True
+# An unchanged session is written back to the database at most this often, in seconds.
+PBX_SESSION_DB_SYNC_INTERVAL = 300
 # Uncomment for production
 # SESSION_COOKIE_AGE = 3600
 # SESSION_EXPIRE_AT_BROWSER_CLOSE = True
@@ -364,13 +371,32 @@ PBX_SOUND_DIRS = ['ascii', 'base256', 'conference', 'currency', 'digits', 'direc
 PBX_SOUND_LIST_DIR = '8000'
 #  Choose voicemail subsystem
 PBX_USE_MOD_VOICEMAIL = False
+# Leave voicemail forwarding, email and MWI to the voicemailjobs worker
+#  (pbx-voicemail-jobs.service) rather than completing them inline.  Only set True
+#  once the service is enabled.
+PBX_VOICEMAIL_USE_QUEUE = False
 # hTTP link for this server
 PBX_SERVER_URL = 'https://myserver.com'
 
+# Media serving (voicemail and recording downloads)
+# Map local directories to nginx internal locations to offload file delivery, eg.
+#  {'/home/django-pbx/media': '/protected-media/'} with a matching 'internal' location.
+PBX_MEDIA_ACCEL_REDIRECT = {}
+# Local read-through cache for media held on remote (SFTP) hosts, size in bytes, 0 disables.
+PBX_MEDIA_CACHE_DIR = '/home/django-pbx/media_cache'
+PBX_MEDIA_CACHE_SIZE = 512 * 1024 * 1024
+# Part files for resumable recording uploads (PUT with Content-Range), and how long
+#  a request may hold a session before another may take it over, in seconds.
+PBX_UPLOAD_SESSION_DIR = '/home/django-pbx/upload_sessions'
+PBX_UPLOAD_SESSION_LEASE = 300
+
 # XML Handler Settings
 PBX_XMLH_ALLOWED_ADDRESSES = ['127.0.0.1/32', '::1/128']
 PBX_XMLH_CONTEXT_TYPE = 'multiple'
 PBX_XMLH_NUMBER_AS_PRESENCE_ID = False
+# Rendered sofia.conf gateway and profile fragments are keyed by a digest of their
+#  rows so can be kept much longer than the assembled document, in seconds.
+PBX_XMLH_SOFIA_FRAGMENT_TIMEOUT = 86400
 
 # CDR Handler settings
 PBX_CDRH_ALLOWED_ADDRESSES = ['127.0.0.1/32', '::1/128']
@@ -386,3 +412,58 @@ PBX_HTTAPI_ALLOWED_ADDRESSES = ['127.0.0.1/32', '::1/128']
 PBX_HTTAPI_SWITCH_RECORDINGS = '/var/lib/freeswitch/recordings'
 PBX_HTTAPI_HANGUP_HANDLER = True
 PBX_HTTAPI_SHOW_ADMIN = False
+
+# Firewall settings
+# Path to the Unix socket of the nftables helper daemon (pbx-nft-helper.service).
+#  If None, nft is run through sudo.
+PBX_NFT_HELPER_SOCKET = None
+
+# Outbound Email settings
+# Queue messages for delivery by the emailqueue worker (pbx-email-queue.service)
+#  rather than sending inline.  Only set True once the service is enabled, queued
+#  messages are not sent without it.
+PBX_SMTP_USE_QUEUE = False
+
+# Phone feature key synchronisation settings
+# Queue DND and forwarding events for the featuresync worker (pbx-feature-sync.service)
+#  rather than sending them while the edit is saved.  Only set True once the service
+#  is enabled, queued events are not sent to phones without it.
+PBX_FEATURE_SYNC_USE_QUEUE = False
+# Seconds an edit waits in the queue so that further edits to the same extension
+#  are sent with it.
+PBX_FEATURE_SYNC_DELAY = 1
+# Seconds the sofia profile and user agent of a registered phone are cached.
+PBX_FEATURE_SYNC_REGISTRATION_TIMEOUT = 30
+
+# Replication settings
+# Record deletions as tombstones for the replication peer.
+#  Only set True on nodes that export change logs, tombstones are kept until a peer acknowledges them.
+PBX_REPLICATION_ENABLED = False
+# Models with a synchronised column that are not copied to the replication peer,
+#  node local state and call records.
+PBX_REPLICATION_EXCLUDE = [
+    'tenants.Profile', 'portal.Failed_logins', 'switch.IpRegister', 'xmlcdr.XmlCdr', 'xmlcdr.CallTimeline',
+    'voicemail.VoicemailMessages', 'conferencesettings.ConferenceSessions', 'callcentres.CallCentreAgentStatusLog'
+]
+# Columns that are neither sent nor overwritten, they refer to auto numbered profile ids.
+PBX_REPLICATION_LOCAL_FIELDS = ['provision.Devices.user_id', 'contacts.Contact.user_id']
+
+# Metrics settings
+# Each process writes its metrics here to be added up by the /metrics/ view
+#  (Prometheus text format).  None keeps metrics in the process that serves the view only.
+PBX_METRICS_DIR = '/home/django-pbx/metrics'
+# Seconds between writes of the metrics of a busy process.
+PBX_METRICS_FLUSH_INTERVAL = 5
+# Applications whose views are timed, labelled by application and URL name.
+PBX_METRICS_HANDLERS = ['xmlhandler', 'httapihandler', 'xmlcdr', 'provision']
+PBX_METRICS_ALLOWED_ADDRESSES = ['127.0.0.1/32', '::1/128']
+
+# Request capture settings, used with pbx.capture.CaptureMiddleware
+# Captured requests are appended to capture-<pid>.jsonl files here, None disables capture.
+PBX_CAPTURE_DIR = '/home/django-pbx/capture'
+PBX_CAPTURE_PATHS = ['/xmlhandler/', '/httapihandler/', '/xmlcdr/']
+# Fraction of requests captured, and the largest body captured, in bytes.
+PBX_CAPTURE_SAMPLE = 1.0
+PBX_CAPTURE_MAX_BODY = 1024 * 1024
+# Values of fields whose names contain any of these are replaced.
+PBX_CAPTURE_REDACT = ['password', 'secret', 'token', 'sip_auth_response', 'sip_auth_nonce', 'sip_auth_cnonce', 'api_key']
@@ -45,6 +45,7 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import include, path
 from django.utils.translation import gettext_lazy as _
+from pbx.metrics import metrics_view
 
 # This overrides names in site headers and titles
 # , not required if custom admin templates are being used
@@ -152,6 +153,7 @@ urlpatterns = [
     path('callcentres/', include('callcentres.urls')),
     path('recordings/', include('recordings.urls')),
     path('autoreports/', include('autoreports.urls')),
+    path('metrics/', metrics_view, name='metrics'),
 #    path('fsterminal/', include('fsterminal.urls')),
 
     # Wire up our API using automatic URL routing.
@@ -28,12 +28,13 @@
 #
 
 from rest_framework import serializers
+from pbx.restpbxhelpers import SparseFieldsMixin
 from .models import (
     Phrases, PhraseDetails,
 )
 
 
-class PhrasesSerializer(serializers.ModelSerializer):
+class PhrasesSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Phrases
@@ -52,7 +53,7 @@ class PhrasesSerializer(serializers.ModelSerializer):
                 ]
 
 
-class PhraseDetailsSerializer(serializers.ModelSerializer):
+class PhraseDetailsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = PhraseDetails
@@ -28,11 +28,12 @@
 #
 
 from django.contrib import admin
+from django.contrib import messages
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 from import_export.admin import ImportExportModelAdmin, ExportActionModelAdmin
 from import_export import resources
-from pbx.commonfunctions import shcommand
+from pbx.nftbackend import NftBackend
 
 from .models import (
     Menu, MenuItem, MenuItemGroup, Failed_logins,
@@ -194,38 +195,41 @@ class Failed_loginsAdmin(ImportExportModelAdmin):
     readonly_fields = ['created', 'updated', 'synchronised', 'updated_by']
     search_fields = ['address']
     fieldsets = [
-        (None,  {'fields': ['address', 'username', 'attempts']}),
+        (None,  {'fields': ['address', 'username', 'attempts', 'blocked']}),
         ('update Info.',   {'fields': ['created', 'updated', 'synchronised', 'updated_by'], 'classes': ['collapse']}),
     ]
-    list_display = ('address', 'username', 'attempts', 'created', 'updated')
+    list_display = ('address', 'username', 'attempts', 'blocked', 'created', 'updated')
+    list_filter = ('blocked', )
     ordering = [
         'address'
     ]
 
+    def fw_update(self, action, ip_addresses):
+        nft = NftBackend()
+        if action == 'add':
+            nft.add('web-block', ip_addresses)
+        else:
+            nft.delete('web-block', ip_addresses)
+        return nft.commit()
+
     def save_model(self, request, obj, form, change):
         obj.updated_by = request.user.username
         if change:
             messages.add_message(request, messages.WARNING, _('A changed IP will not be added to Firewall automatically'))
         else:
-            if ':' in obj.address:
-                shcommand(["/usr/local/bin/fw-add-ipv6-web-block-list.sh", obj.address])
+            err = self.fw_update('add', [obj.address])
+            if err:
+                self.message_user(request, _('Unable to add %s to Firewall: %s' % (obj.address, err)), messages.ERROR)
             else:
-                shcommand(["/usr/local/bin/fw-add-ipv4-web-block-list.sh", obj.address])
+                obj.blocked = 'true'
         super().save_model(request, obj, form, change)
 
     def delete_model(self, request, obj):
-        if ':' in obj.address:
-            shcommand(["/usr/local/bin/fw-delete-ipv6-web-block-list.sh", obj.address])
-        else:
-            shcommand(["/usr/local/bin/fw-delete-ipv4-web-block-list.sh", obj.address])
+        self.fw_update('delete', [obj.address])
         super().delete_model(request, obj)
 
     def delete_queryset(self, request, queryset):
-        for obj in queryset:
-            if ':' in obj.address:
-                shcommand(["/usr/local/bin/fw-delete-ipv6-web-block-list.sh", obj.address])
-            else:
-                shcommand(["/usr/local/bin/fw-delete-ipv4-web-block-list.sh", obj.address])
+        self.fw_update('delete', [obj.address for obj in queryset])
         super().delete_queryset(request, queryset)
 
 
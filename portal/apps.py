@@ -29,6 +29,7 @@
 from django.apps import AppConfig
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth.signals import user_login_failed
+from django.db.models.signals import post_save, post_delete
 
 
 class PortalConfig(AppConfig):
@@ -42,5 +43,13 @@ class PortalConfig(AppConfig):
     pbx_license = 'MIT License'
 
     def ready(self):
-        from .signals import failed_user_login
+        from .signals import failed_user_login, menu_saved, menu_item_saved, menu_item_group_saved
+        from .models import Menu, MenuItem, MenuItemGroup
         user_login_failed.connect(failed_user_login)
+        for signal, action in ((post_save, 'save'), (post_delete, 'delete')):
+            signal.connect(menu_saved, sender=Menu, weak=False, dispatch_uid='portal:Menu:%s' % action)
+            signal.connect(menu_item_saved, sender=MenuItem, weak=False, dispatch_uid='portal:MenuItem:%s' % action)
+            signal.connect(
+                menu_item_group_saved,
+                sender=MenuItemGroup, weak=False, dispatch_uid='portal:MenuItemGroup:%s' % action
+                )
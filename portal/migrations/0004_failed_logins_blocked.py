@@ -0,0 +1,25 @@
+# Generated by Django 5.0.1 on 2026-10-19 11:49
+
+from django.db import migrations, models
+
+
+def mark_existing_blocked(apps, schema_editor):
+    # Rows created before this migration were handled by the per address shell scripts.
+    MyModel = apps.get_model("portal", "Failed_logins")
+    MyModel.objects.all().update(blocked='true')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0003_alter_failed_logins_attempts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='failed_logins',
+            name='blocked',
+            field=models.CharField(choices=[('false', 'False'), ('true', 'True')], default='false', max_length=8, verbose_name='Blocked'),
+        ),
+        migrations.RunPython(mark_existing_blocked, reverse_code=migrations.RunPython.noop),
+    ]
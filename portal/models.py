@@ -111,6 +111,7 @@ class Failed_logins(models.Model):
     address      = models.GenericIPAddressField(protocol='both', unpack_ipv4=False, unique=True, verbose_name=_('IP Address'))  # noqa: E501, E221
     username     = models.CharField(max_length=254, blank=True, null=True, verbose_name=_('User ID'))                           # noqa: E501, E221
     attempts     = models.DecimalField(max_digits=4, decimal_places=0, default=1, verbose_name=_('Attempts'))                   # noqa: E501, E221
+    blocked      = models.CharField(max_length=8, choices=EnabledTrueFalseChoice.choices, default=EnabledTrueFalseChoice.CFALSE, verbose_name=_('Blocked'))  # noqa: E501, E221
     created      = models.DateTimeField(auto_now_add=True, blank=True, null=True, verbose_name=_('Created'))                    # noqa: E501, E221
     updated      = models.DateTimeField(auto_now=True, blank=True, null=True, verbose_name=_('Updated'))                        # noqa: E501, E221
     synchronised = models.DateTimeField(blank=True, null=True, verbose_name=_('Synchronised'))                                  # noqa: E501, E221
@@ -0,0 +1,92 @@
+#
+#    DjangoPBX
+#
+#    MIT License
+#
+#    Copyright (c) 2016 - 2024 Adrian Fretwell <adrian@djangopbx.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+#
+#    Contributor(s):
+#    Adrian Fretwell <adrian@djangopbx.com>
+#
+
+import hashlib
+import uuid
+from django.core.cache import cache
+from .models import MenuItem, MenuItemGroup
+from .serializers import MenuItemNavSerializer
+
+
+class PortalMenu():
+    # Builds the portal navigation menu and sub menu for a menu and a set of user groups.
+    #  Built trees are cached per (menu, sorted group set) under a per menu version
+    #  token.  Menu, menu item and menu item group edits replace the token so trees
+    #  built before the edit are never read again and simply expire.
+
+    timeout = 86400
+
+    def __init__(self, menu_id):
+        self.menu_id = str(menu_id)
+        self.version_key = 'portal:menu:version:%s' % self.menu_id
+
+    def version(self):
+        v = cache.get(self.version_key)
+        if v is None:
+            v = uuid.uuid4().hex
+            if not cache.add(self.version_key, v, None):
+                v = cache.get(self.version_key, v)
+        return v
+
+    def invalidate(self):
+        cache.set(self.version_key, uuid.uuid4().hex, None)
+
+    def tree_key(self, groups):
+        if groups is None:
+            group_digest = 'all'
+        else:
+            group_digest = hashlib.sha1(','.join(sorted(set(groups))).encode()).hexdigest()
+        return 'portal:menu:%s:%s:%s' % (self.menu_id, self.version(), group_digest)
+
+    def get(self, groups=None):
+        # groups of None means every item, as shown to a superuser
+        key = self.tree_key(groups)
+        tree = cache.get(key)
+        if tree is None:
+            tree = self.build(groups)
+            cache.set(key, tree, self.timeout)
+        return tree
+
+    def build(self, groups=None):
+        items = MenuItem.objects.select_related('parent_id').filter(menu_id=self.menu_id)
+        if groups is not None:
+            items = items.filter(
+                id__in=MenuItemGroup.objects.filter(name__in=groups).values('menu_item_id')
+                )
+        menu_list = []
+        submenu_list = []
+        for item in items.order_by('sequence'):
+            if item.parent_id_id is None:
+                menu_list.append(item)
+            else:
+                submenu_list.append(item)
+        return (
+            [dict(i) for i in MenuItemNavSerializer(menu_list, many=True).data],
+            [dict(i) for i in MenuItemNavSerializer(submenu_list, many=True).data]
+        )
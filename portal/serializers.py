@@ -28,12 +28,13 @@
 #
 
 from rest_framework import serializers
+from pbx.restpbxhelpers import SparseFieldsMixin
 from .models import (
     Menu, MenuItem, MenuItemGroup
 )
 
 
-class MenuSerializer(serializers.ModelSerializer):
+class MenuSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Menu
@@ -41,14 +42,14 @@ class MenuSerializer(serializers.ModelSerializer):
         fields = ['url', 'id', 'name', 'description', 'created', 'updated', 'synchronised', 'updated_by']
 
 
-class MenuNavSerializer(serializers.ModelSerializer):
+class MenuNavSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Menu
         fields = ['name']
 
 
-class MenuItemSerializer(serializers.ModelSerializer):
+class MenuItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = MenuItem
@@ -59,14 +60,14 @@ class MenuItemSerializer(serializers.ModelSerializer):
                 ]
 
 
-class MenuItemNavSerializer(serializers.ModelSerializer):
+class MenuItemNavSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = MenuItem
         fields = ['id_str', 'parent_id_str', 'title', 'link', 'icon']
 
 
-class MenuItemGroupSerializer(serializers.ModelSerializer):
+class MenuItemGroupSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = MenuItemGroup
@@ -28,6 +28,8 @@
 #
 
 from pbx.commonipfunctions import IpFunctions
+from .models import MenuItem
+from .portalmenu import PortalMenu
 
 def failed_user_login(sender, credentials, request, **kwargs):
     meta = request.META
@@ -35,3 +37,17 @@ def failed_user_login(sender, credentials, request, **kwargs):
     ip = ipf.get_client_ip(meta)
     if ip:
         ipf.update_web_fail_ip(ip, credentials['username'])
+
+
+def menu_saved(sender, instance, **kwargs):
+    PortalMenu(instance.id).invalidate()
+
+
+def menu_item_saved(sender, instance, **kwargs):
+    PortalMenu(instance.menu_id_id).invalidate()
+
+
+def menu_item_group_saved(sender, instance, **kwargs):
+    menu_id = MenuItem.objects.filter(pk=instance.menu_item_id_id).values_list('menu_id', flat=True).first()
+    if menu_id:
+        PortalMenu(menu_id).invalidate()
@@ -26,6 +26,213 @@
 #    Adrian Fretwell <adrian@djangopbx.com>
 #
 
-# from django.test import TestCase
+import os
+import shutil
+import tempfile
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, RequestFactory
+from django.utils.http import http_date
+from pbx.commonipfunctions import IpFunctions
+from pbx.mediaserver import MediaServer
+from .models import Failed_logins
 
-# Create your tests here.
+
+class FakeSFTP():
+    # Stands in for pbx.sshconnect.SFTPConnection, "remote" files are read from
+    #  a local directory and each download is counted.
+    def __init__(self, root):
+        self.root = root
+        self.downloads = 0
+
+    def sftp(self, host):
+        return self
+
+    def sftp_path(self, name):
+        return os.path.join(self.root, name)
+
+    def stat(self, path):
+        return os.stat(path)
+
+    def open(self, host, name, mode='rb'):
+        return open(self.sftp_path(name), mode)
+
+    def gettfo(self, host, fh, name):
+        self.downloads += 1
+        with open(self.sftp_path(name), 'rb') as src:
+            shutil.copyfileobj(src, fh)
+
+
+class MediaServerTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.remote_dir = os.path.join(self.tmp, 'remote')
+        self.cache_dir = os.path.join(self.tmp, 'cache')
+        os.makedirs(self.remote_dir)
+        self.data = bytes(range(256)) * 4
+        self.path = os.path.join(self.tmp, 'msg_test.wav')
+        with open(self.path, 'wb') as fh:
+            fh.write(self.data)
+        for name in ['a.wav', 'b.wav', 'c.wav']:
+            with open(os.path.join(self.remote_dir, name), 'wb') as fh:
+                fh.write(self.data)
+        self.sftp = FakeSFTP(self.remote_dir)
+        self.ms = MediaServer(self.sftp, cache_dir=self.cache_dir, cache_size=len(self.data) * 2, accel_redirect={})
+        self.rf = RequestFactory()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def get(self, **headers):
+        response = self.ms.serve_local(self.rf.get('/media', **headers), self.path)
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        response.close()
+        return response, content
+
+    def test_range(self):
+        response, content = self.get(HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(content, self.data[10:20])
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/%s' % len(self.data))
+        self.assertEqual(response['Content-Length'], '10')
+
+    def test_open_and_suffix_ranges(self):
+        response, content = self.get(HTTP_RANGE='bytes=1000-')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(content, self.data[1000:])
+        response, content = self.get(HTTP_RANGE='bytes=-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(content, self.data[-5:])
+
+    def test_range_not_satisfiable(self):
+        response, content = self.get(HTTP_RANGE='bytes=%s-' % len(self.data))
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */%s' % len(self.data))
+        response, content = self.get(HTTP_RANGE='bytes=-0')
+        self.assertEqual(response.status_code, 416)
+
+    def test_if_range(self):
+        response, content = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(content, self.data)
+        etag = response['ETag']
+        mtime = os.stat(self.path).st_mtime
+        response, content = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(content, self.data[:10])
+        response, content = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(content, self.data)
+        response, content = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=http_date(mtime - 3600))
+        self.assertEqual(response.status_code, 200)
+        response, content = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=http_date(mtime + 1))
+        self.assertEqual(response.status_code, 206)
+
+    def test_not_modified(self):
+        response, content = self.get()
+        response, content = self.get(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_remote_range_from_cache(self):
+        response = self.ms.serve_remote(self.rf.get('/media', HTTP_RANGE='bytes=5-9'), 'host1', 'a.wav')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.data[5:10])
+        response.close()
+        response = self.ms.serve_remote(self.rf.get('/media'), 'host1', 'a.wav')
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+        response.close()
+        self.assertEqual(self.sftp.downloads, 1)
+
+    def test_cache_eviction(self):
+        cached = {}
+        for i, name in enumerate(['a.wav', 'b.wav']):
+            cached[name] = self.ms.cache_fetch('host1', name, len(self.data), 0)
+            os.utime(cached[name], (1000 + i, 0))
+        # a.wav is used again so b.wav becomes the least recently used entry
+        self.assertEqual(self.ms.cache_fetch('host1', 'a.wav', len(self.data), 0), cached['a.wav'])
+        self.assertEqual(self.sftp.downloads, 2)
+        cached['c.wav'] = self.ms.cache_fetch('host1', 'c.wav', len(self.data), 0)
+        self.assertEqual(self.sftp.downloads, 3)
+        self.assertTrue(os.path.exists(cached['a.wav']))
+        self.assertFalse(os.path.exists(cached['b.wav']))
+        self.assertTrue(os.path.exists(cached['c.wav']))
+        # Abandoned partial downloads are removed, files larger than the cache are not cached.
+        part = os.path.join(self.cache_dir, 'old.part')
+        with open(part, 'wb') as fh:
+            fh.write(b'x')
+        os.utime(part, (0, 0))
+        self.ms.cache_evict()
+        self.assertFalse(os.path.exists(part))
+        self.assertIsNone(self.ms.cache_fetch('host1', 'a.wav', len(self.data) * 3, 0))
+
+
+class FakeIpFunctions(IpFunctions):
+    # Counts block list flushes instead of running nftables, the window and
+    #  threshold are fixed and time is set by the test.
+    fail_window = 120
+
+    def __init__(self):
+        super().__init__()
+        self.now = 1200000.0
+        self.flushes = 0
+
+    def get_portal_ignore_fail_address(self):
+        return ['192.0.2.99']
+
+    def get_portal_fail_window(self):
+        return self.fail_window
+
+    def count_fail_attempt(self, ip_address, window, now=None):
+        return super().count_fail_attempt(ip_address, window, self.now if now is None else now)
+
+    def flush_web_block_list(self, force=False):
+        self.flushes += 1
+        return 0
+
+
+class FailAttemptsTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.ipf = FakeIpFunctions()
+
+    def test_sliding_window(self):
+        # 120 second window in 12 buckets of 10 seconds.
+        for i in range(5):
+            self.assertEqual(self.ipf.count_fail_attempt('192.0.2.1', 120, self.ipf.now + i * 20), i + 1)
+        # Another address has its own count.
+        self.assertEqual(self.ipf.count_fail_attempt('192.0.2.2', 120, self.ipf.now), 1)
+        # At +120s the attempt made at +0s has slid out of the window, at +150s the one at +20s.
+        self.assertEqual(self.ipf.count_fail_attempt('192.0.2.1', 120, self.ipf.now + 120), 5)
+        self.assertEqual(self.ipf.count_fail_attempt('192.0.2.1', 120, self.ipf.now + 150), 5)
+        # Long after the last attempt the count starts again.
+        self.assertEqual(self.ipf.count_fail_attempt('192.0.2.1', 120, self.ipf.now + 1000), 1)
+
+    def test_only_threshold_crossings_persisted(self):
+        for i in range(3):
+            self.ipf.update_fail_attempts('192.0.2.1', 3, 'alice')
+        self.assertFalse(Failed_logins.objects.exists())
+        with self.assertNumQueries(0):
+            self.ipf.update_fail_attempts('192.0.2.99', 3, 'alice')
+        self.ipf.update_fail_attempts('192.0.2.1', 3, 'alice')
+        fl = Failed_logins.objects.get()
+        self.assertEqual((fl.address, fl.username, fl.attempts, fl.blocked), ('192.0.2.1', 'alice', 4, 'false'))
+        self.assertEqual(self.ipf.flushes, 1)
+        # Further attempts in the same window do not touch the database.
+        with self.assertNumQueries(0):
+            for i in range(10):
+                self.ipf.update_fail_attempts('192.0.2.1', 3, 'alice')
+        self.assertEqual(self.ipf.flushes, 1)
+
+    def test_blocked_not_reset(self):
+        for i in range(4):
+            self.ipf.update_fail_attempts('192.0.2.1', 3, 'alice')
+        Failed_logins.objects.update(blocked='true')
+        # The next crossing, in a later window, updates the row but leaves it blocked.
+        self.ipf.now += 1000
+        cache.delete('portal:fail_crossed:192.0.2.1')
+        for i in range(5):
+            self.ipf.update_fail_attempts('192.0.2.1', 3, 'bob')
+        fl = Failed_logins.objects.get()
+        self.assertEqual((fl.username, fl.attempts, fl.blocked), ('bob', 4, 'true'))
+        self.assertEqual(self.ipf.flushes, 2)
@@ -37,7 +37,7 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.utils.translation import gettext_lazy as _
 from django.utils.http import url_has_allowed_host_and_scheme
 from django.http import (
-    HttpResponse, HttpResponseRedirect, HttpResponseNotFound, FileResponse
+    HttpResponse, HttpResponseRedirect, HttpResponseNotFound
     )
 from django.contrib import messages
 import django_tables2 as tables
@@ -68,13 +68,15 @@ from tenants.pbxsettings import (
     PbxSettings,
 )
 from .serializers import (
-    MenuSerializer, MenuItemSerializer, MenuItemNavSerializer, MenuItemGroupSerializer,
+    MenuSerializer, MenuItemSerializer, MenuItemGroupSerializer,
 )
+from .portalmenu import PortalMenu
 
 from accounts.accountfunctions import AccountFunctions
 from switch.switchsounds import SwitchSounds
 from pbx.fscmdabslayer import FsCmdAbsLayer
 from pbx.fileabslayer import FileAbsLayer
+from pbx.mediaserver import MediaServer
 from pbx.commonipfunctions import IpFunctions
 
 @login_required
@@ -118,7 +120,7 @@ def index(request):
         messages.add_message(request, messages.INFO, local_message)
         if request.user.profile.domain_id:
             pbx_user_uuid = str(request.user.profile.user_uuid)
-            pbx_domain_menu = request.user.profile.domain_id.menu_id
+            pbx_domain_menu = request.user.profile.domain_id.menu_id_id
             if ureload:
                 pbx_domain_name = request.user.profile.domain_id.name
                 pbx_domain_uuid = str(request.user.profile.domain_id.id)
@@ -142,35 +144,15 @@ def index(request):
             request.session['user_uuid'] = 'ffffffff-aaaa-489c-aa00-1234567890ab'
             request.session['extension_list'] = 'None,None'
             request.session['extension_list_uuid'] = 'ffffffff-aaaa-489c-aa00-1234567890ab,'
-            try:
-                pbx_domain_menu = Menu.objects.get(name='Default')
-            except Menu.DoesNotExist:
-                pbx_domain_menu = None
+            pbx_domain_menu = Menu.objects.filter(name='Default').values_list('id', flat=True).first()
 
         if pbx_domain_menu:
             if request.user.is_superuser:
-                menuList = MenuItem.objects.filter(menu_id=pbx_domain_menu.id,
-                                            parent_id__isnull=True).order_by('sequence')
-                submenuList = MenuItem.objects.filter(menu_id=pbx_domain_menu.id,
-                                            parent_id__isnull=False).order_by('sequence')
+                groupList = None
             else:
                 groupList = list(request.user.groups.values_list('name', flat=True))
-                menuitemList = MenuItemGroup.objects.values_list(
-                    'menu_item_id', flat=True
-                    ).filter(name__in=groupList, menu_item_id__menu_id=pbx_domain_menu.id)
-                menuList = MenuItem.objects.filter(
-                    menu_id=pbx_domain_menu.id, parent_id__isnull=True, id__in=menuitemList
-                    ).order_by('sequence')
-                submenuList = MenuItem.objects.filter(
-                    menu_id=pbx_domain_menu.id, parent_id__isnull=False, id__in=menuitemList
-                    ).order_by('sequence')
-
-            mainmenu = MenuItemNavSerializer(menuList, many=True)
-            menudata = mainmenu.data
+            menudata, submenudata = PortalMenu(pbx_domain_menu).get(groupList)
             request.session['portalmenu'] = menudata
-
-            submenu = MenuItemNavSerializer(submenuList, many=True)
-            submenudata = submenu.data
             request.session['portalsubmenu'] = submenudata
         else:
             no_menu_links = ['/admin/','/portal/pbxlogout/']
@@ -221,11 +203,7 @@ def servefsmedia(request, fs, fdir, fdom, fullpath, mtype=1):
             return HttpResponseNotFound()
     fal = FileAbsLayer()
     file_location = '%s/%s' % (settings.MEDIA_ROOT, fullpath)
-    try:
-        f = fal.open(file_location, 'rb', media_location)
-    except FileNotFoundError:
-        return HttpResponseNotFound()
-    return FileResponse(f)
+    return MediaServer(fal.sftp).serve(request, file_location, media_location, fal.use_local(media_location))
 
 @login_required
 def servefsmediavoicemail(request, fs, fdir, fpro, fdom, fext, fpath, fullpath):
@@ -384,7 +362,7 @@ class VoicemailDownload(View):
             msg = VoicemailMessages.objects.get(pk=msgid, voicemail_id_id=vmid)
         except VoicemailMessages.DoesNotExist:
             return HttpResponseNotFound()
-        return FileResponse(msg.filename)
+        return MediaServer().serve_field(request, msg.filename)
 
 
 class TmpRecordingDownload(View):
@@ -403,7 +381,7 @@ class TmpRecordingDownload(View):
         except HttApiSession.DoesNotExist:
             return HttpResponseNotFound()
         filename = '/tmp/%s' % fileid
-        return FileResponse(open(filename, 'rb'))
+        return MediaServer(accel_redirect={}).serve_local(request, filename)
 
 
 @login_required
@@ -28,13 +28,14 @@
 #
 
 from rest_framework import serializers
+from pbx.restpbxhelpers import SparseFieldsMixin
 from .models import (
     DeviceVendors, DeviceVendorFunctions, DeviceVendorFunctionGroups, DeviceProfiles,
     DeviceProfileSettings, DeviceProfileKeys, Devices, DeviceLines, DeviceKeys, DeviceSettings
 )
 
 
-class DeviceVendorsSerializer(serializers.ModelSerializer):
+class DeviceVendorsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = DeviceVendors
@@ -49,7 +50,7 @@ class DeviceVendorsSerializer(serializers.ModelSerializer):
                 ]
 
 
-class DeviceVendorFunctionsSerializer(serializers.ModelSerializer):
+class DeviceVendorFunctionsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = DeviceVendorFunctions
@@ -64,7 +65,7 @@ class DeviceVendorFunctionsSerializer(serializers.ModelSerializer):
                 ]
 
 
-class DeviceVendorFunctionGroupsSerializer(serializers.ModelSerializer):
+class DeviceVendorFunctionGroupsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = DeviceVendorFunctionGroups
@@ -79,7 +80,7 @@ class DeviceVendorFunctionGroupsSerializer(serializers.ModelSerializer):
                 ]
 
 
-class DeviceProfilesSerializer(serializers.ModelSerializer):
+class DeviceProfilesSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = DeviceProfiles
@@ -94,7 +95,7 @@ class DeviceProfilesSerializer(serializers.ModelSerializer):
                 ]
 
 
-class DeviceProfileSettingsSerializer(serializers.ModelSerializer):
+class DeviceProfileSettingsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = DeviceProfileSettings
@@ -109,7 +110,7 @@ class DeviceProfileSettingsSerializer(serializers.ModelSerializer):
                 ]
 
 
-class DeviceProfileKeysSerializer(serializers.ModelSerializer):
+class DeviceProfileKeysSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = DeviceProfileKeys
@@ -125,7 +126,7 @@ class DeviceProfileKeysSerializer(serializers.ModelSerializer):
                 ]
 
 
-class DevicesSerializer(serializers.ModelSerializer):
+class DevicesSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Devices
@@ -142,7 +143,7 @@ class DevicesSerializer(serializers.ModelSerializer):
                 ]
 
 
-class DeviceLinesSerializer(serializers.ModelSerializer):
+class DeviceLinesSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = DeviceLines
@@ -162,7 +163,7 @@ class DeviceLinesSerializer(serializers.ModelSerializer):
                 ]
 
 
-class DeviceKeysSerializer(serializers.ModelSerializer):
+class DeviceKeysSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = DeviceKeys
@@ -178,7 +179,7 @@ class DeviceKeysSerializer(serializers.ModelSerializer):
                 ]
 
 
-class DeviceSettingsSerializer(serializers.ModelSerializer):
+class DeviceSettingsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = DeviceSettings
@@ -0,0 +1,39 @@
+# Generated by Django 5.0.1 on 2026-10-19 12:08
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recordings', '0005_alter_callrecording_filestore_and_more'),
+        ('tenants', '0008_remove_portal_name_null'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, verbose_name='Upload Session')),
+                ('kind', models.CharField(choices=[('recording', 'Recording'), ('call_recording', 'Call Recording')], default='recording', max_length=16, verbose_name='Kind')),
+                ('target', models.CharField(max_length=254, unique=True, verbose_name='Target')),
+                ('name', models.CharField(max_length=64, verbose_name='Name')),
+                ('year', models.CharField(blank=True, max_length=8, null=True, verbose_name='Year')),
+                ('month', models.CharField(blank=True, max_length=8, null=True, verbose_name='Month')),
+                ('day', models.CharField(blank=True, max_length=8, null=True, verbose_name='Day')),
+                ('total_size', models.BigIntegerField(default=0, verbose_name='Total Size')),
+                ('received', models.BigIntegerField(default=0, verbose_name='Received')),
+                ('sha256', models.CharField(blank=True, max_length=64, null=True, verbose_name='SHA-256')),
+                ('locked_until', models.DateTimeField(blank=True, null=True, verbose_name='Locked until')),
+                ('created', models.DateTimeField(auto_now_add=True, null=True, verbose_name='Created')),
+                ('updated', models.DateTimeField(auto_now=True, null=True, verbose_name='Updated')),
+                ('domain_id', models.ForeignKey(db_column='domain_uuid', on_delete=django.db.models.deletion.CASCADE, to='tenants.domain', verbose_name='Domain')),
+            ],
+            options={
+                'verbose_name_plural': 'Upload Sessions',
+                'db_table': 'pbx_upload_sessions',
+            },
+        ),
+    ]
@@ -40,17 +40,27 @@ def user_directory_path(instance, filename):
     # file will be uploaded to MEDIA_ROOT/fs/recordings/<domain name>/<filename>
     return 'fs/recordings/{0}/{1}'.format(instance.domain_id.name, filename)
 
+
 def call_recording_directory_path(instance, filename):
     # file will be uploaded to MEDIA_ROOT/fs/recordings/<domain name>/<filename>
-    return 'fs/recordings/{0}/archive/{1}/{2}/{3}/{4}'.format(instance.domain_id.name,
-                    instance.year, instance.month, instance.day, filename)
+    return 'fs/recordings/{0}/archive/{1}/{2}/{3}/{4}'.format(
+        instance.domain_id.name, instance.year, instance.month, instance.day, filename
+        )
+
 
 def select_storage():
-    return storages['default'] if settings.PBX_USE_LOCAL_FILE_STORAGE else storages[settings.PBX_REMOTE_FILE_STORAGE_TYPE] # noqa: E501
+    return storages['default'] if settings.PBX_USE_LOCAL_FILE_STORAGE else storages[settings.PBX_REMOTE_FILE_STORAGE_TYPE]  # noqa: E501
+
 
 def default_filestore():
     return settings.PBX_FILESTORES[settings.PBX_DEFAULT_FILESTORE]
 
+
+class UploadKindChoice(models.TextChoices):
+    CRECORDING     = 'recording',      _('Recording')       # noqa: E221
+    CCALLRECORDING = 'call_recording', _('Call Recording')  # noqa: E221
+
+
 class Recording(models.Model):
     id           = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False, verbose_name=_('Recording'))                                      # noqa: E501, E221
     domain_id    = models.ForeignKey('tenants.Domain', db_column='domain_uuid', on_delete=models.CASCADE, blank=True, null=True, verbose_name=_('Domain'))  # noqa: E501, E221
@@ -103,3 +113,27 @@ class CallRecording(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class UploadSession(models.Model):
+    id           = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False, verbose_name=_('Upload Session'))                                 # noqa: E501, E221
+    domain_id    = models.ForeignKey('tenants.Domain', db_column='domain_uuid', on_delete=models.CASCADE, verbose_name=_('Domain'))                          # noqa: E501, E221
+    kind         = models.CharField(max_length=16, choices=UploadKindChoice.choices, default=UploadKindChoice.CRECORDING, verbose_name=_('Kind'))          # noqa: E501, E221
+    target       = models.CharField(max_length=254, unique=True, verbose_name=_('Target'))                                                                  # noqa: E501, E221
+    name         = models.CharField(max_length=64, verbose_name=_('Name'))                                                                                  # noqa: E501, E221
+    year         = models.CharField(max_length=8, blank=True, null=True, verbose_name=_('Year'))                                                            # noqa: E501, E221
+    month        = models.CharField(max_length=8, blank=True, null=True, verbose_name=_('Month'))                                                           # noqa: E501, E221
+    day          = models.CharField(max_length=8, blank=True, null=True, verbose_name=_('Day'))                                                             # noqa: E501, E221
+    total_size   = models.BigIntegerField(default=0, verbose_name=_('Total Size'))                                                                          # noqa: E501, E221
+    received     = models.BigIntegerField(default=0, verbose_name=_('Received'))                                                                            # noqa: E501, E221
+    sha256       = models.CharField(max_length=64, blank=True, null=True, verbose_name=_('SHA-256'))                                                        # noqa: E501, E221
+    locked_until = models.DateTimeField(blank=True, null=True, verbose_name=_('Locked until'))                                                              # noqa: E501, E221
+    created      = models.DateTimeField(auto_now_add=True, blank=True, null=True, verbose_name=_('Created'))                                                # noqa: E501, E221
+    updated      = models.DateTimeField(auto_now=True, blank=True, null=True, verbose_name=_('Updated'))                                                    # noqa: E501, E221
+
+    class Meta:
+        verbose_name_plural = 'Upload Sessions'
+        db_table = 'pbx_upload_sessions'
+
+    def __str__(self):
+        return self.target
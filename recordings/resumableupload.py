@@ -0,0 +1,268 @@
+#
+#    DjangoPBX
+#
+#    MIT License
+#
+#    Copyright (c) 2016 - 2024 Adrian Fretwell <adrian@djangopbx.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+#
+#    Contributor(s):
+#    Adrian Fretwell <adrian@djangopbx.com>
+#
+
+import os
+import re
+import time
+import base64
+import binascii
+import hashlib
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Q
+from django.http import HttpResponse
+from django.utils import timezone
+
+from .models import Recording, CallRecording, UploadSession, UploadKindChoice
+
+
+# Running digests for sessions part way through an upload, keyed by session id.
+#  A chunk landing on a different worker process falls back to hashing the part
+#  file once at completion.
+running_digests = {}
+running_digests_max = 256
+
+
+class ResumableUpload:
+    # PUT uploads with optional Content-Range resume, backed by an UploadSession row
+    #  and a local part file.  The SHA-256 of the body is calculated as it streams in
+    #  and checked against any X-Content-SHA256 or Content-Digest header before the
+    #  Recording or CallRecording row is created.
+
+    content_range_re = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+    status_range_re = re.compile(r'^bytes \*/(\d+)$')
+    chunk_size = 64 * 1024
+
+    def __init__(self, request, domain, kind, name, year=None, month=None, day=None):
+        self.request = request
+        self.domain = domain
+        self.kind = kind
+        self.name = name
+        self.year = year
+        self.month = month
+        self.day = day
+        self.target = request.path[:254]
+        self.upload_dir = settings.PBX_UPLOAD_SESSION_DIR
+        self.lease = timezone.timedelta(seconds=settings.PBX_UPLOAD_SESSION_LEASE)
+
+    def handle(self):
+        content_range = self.request.headers.get('Content-Range')
+        if self.request.method == 'HEAD' or (content_range and self.status_range_re.match(content_range)):
+            return self.status()
+        try:
+            length = int(self.request.headers.get('Content-Length', 0) or 0)
+        except ValueError:
+            return HttpResponse(status=400)
+
+        if content_range:
+            m = self.content_range_re.match(content_range)
+            if not m:
+                return HttpResponse(status=400)
+            start, end, total = (int(x) for x in m.groups())
+            if end < start or end >= total or end - start + 1 != length:
+                return HttpResponse(status=400)
+        else:
+            if length == 0:
+                return HttpResponse(status=400)
+            start, end, total = 0, length - 1, length
+
+        expected = self.expected_digest()
+        if expected is False:
+            return HttpResponse('Invalid digest header', status=400)
+
+        session, created = UploadSession.objects.get_or_create(
+            target=self.target, defaults={
+                'domain_id': self.domain, 'kind': self.kind, 'name': self.name,
+                'year': self.year, 'month': self.month, 'day': self.day, 'total_size': total
+                }
+            )
+        if not self.claim(session, start, total):
+            session.refresh_from_db()
+            return self.range_response(session, 409)
+
+        try:
+            received, digest = self.receive(session, start, length)
+        except Exception:
+            self.release(session, None, expected)
+            raise
+
+        if received < total:
+            self.release(session, received, expected)
+            if digest:
+                if len(running_digests) >= running_digests_max:
+                    running_digests.pop(next(iter(running_digests)))
+                running_digests[session.id] = (received, digest)
+            session.received = received
+            return self.range_response(session)
+
+        return self.finalise(session, start, digest, expected or session.sha256)
+
+    def status(self):
+        session = UploadSession.objects.filter(target=self.target).first()
+        return self.range_response(session)
+
+    def range_response(self, session, status=308):
+        # 308 Resume Incomplete, the Range header tells the client where to carry on.
+        r = HttpResponse(status=status)
+        if session and session.received > 0:
+            r['Range'] = 'bytes=0-%s' % (session.received - 1)
+        return r
+
+    def expected_digest(self):
+        # Returns a hex digest, None if the client did not send one, or False if it was unreadable.
+        h = self.request.headers.get('X-Content-SHA256')
+        if h:
+            h = h.strip().lower()
+            return h if re.match(r'^[0-9a-f]{64}$', h) else False
+        for item in self.request.headers.get('Content-Digest', '').split(','):
+            k, sep, v = item.strip().partition('=')
+            if sep and k.strip().lower() == 'sha-256':
+                try:
+                    return base64.b64decode(v.strip().strip(':'), validate=True).hex()
+                except (binascii.Error, ValueError):
+                    return False
+        return None
+
+    def part_path(self, session):
+        return os.path.join(self.upload_dir, '%s.part' % session.id)
+
+    def claim(self, session, start, total):
+        # A conditional update so that only one request can write to a session at a time.
+        #  A chunk must start where the last one finished, a PUT from byte zero restarts it.
+        now = timezone.now()
+        qs = UploadSession.objects.filter(id=session.id).filter(
+            Q(locked_until__isnull=True) | Q(locked_until__lt=now)
+            )
+        if start == 0:
+            running_digests.pop(session.id, None)
+            return qs.update(
+                received=0, total_size=total, sha256=None, locked_until=now + self.lease, updated=now
+                ) == 1
+        return qs.filter(received=start, total_size=total).update(locked_until=now + self.lease, updated=now) == 1
+
+    def release(self, session, received, expected):
+        fields = {'locked_until': None, 'updated': timezone.now()}
+        if received is not None:
+            fields['received'] = received
+        if expected:
+            fields['sha256'] = expected
+        UploadSession.objects.filter(id=session.id).update(**fields)
+
+    def receive(self, session, start, length):
+        os.makedirs(self.upload_dir, exist_ok=True)
+        path = self.part_path(session)
+        if start == 0:
+            digest = hashlib.sha256()
+        else:
+            offset, digest = running_digests.pop(session.id, (None, None))
+            if offset != start:
+                digest = None
+        received = start
+        renew = time.monotonic() + self.lease.total_seconds() / 2
+        with open(path, 'r+b' if start else 'wb') as f:
+            f.seek(start)
+            f.truncate()
+            remaining = length
+            try:
+                while remaining > 0:
+                    chunk = self.request.read(min(self.chunk_size, remaining))
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    if digest:
+                        digest.update(chunk)
+                    received += len(chunk)
+                    remaining -= len(chunk)
+                    if time.monotonic() > renew:
+                        UploadSession.objects.filter(id=session.id).update(locked_until=timezone.now() + self.lease)
+                        renew = time.monotonic() + self.lease.total_seconds() / 2
+            except OSError:
+                # Client went away part way through, keep what has arrived.
+                pass
+            f.flush()
+            os.fsync(f.fileno())
+        return (received, digest)
+
+    def file_digest(self, path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest
+
+    def finalise(self, session, start, digest, expected):
+        path = self.part_path(session)
+        if not digest:
+            digest = self.file_digest(path)
+        actual = digest.hexdigest()
+        if expected and expected != actual:
+            UploadSession.objects.filter(id=session.id).delete()
+            os.remove(path)
+            return HttpResponse('SHA-256 mismatch', status=400)
+
+        try:
+            with transaction.atomic():
+                rec = self.create_recording()
+                with open(path, 'rb') as f:
+                    rec.filename.save(self.name, File(f))
+                UploadSession.objects.filter(id=session.id).delete()
+        except Exception:
+            # Leave the session where it was before this chunk so the client can send it again.
+            self.release(session, start, expected)
+            raise
+        os.remove(path)
+        r = HttpResponse('')
+        r['X-Content-SHA256'] = actual
+        return r
+
+    def create_recording(self):
+        if self.kind == UploadKindChoice.CCALLRECORDING:
+            return CallRecording.objects.create(
+                name=self.name, domain_id=self.domain, year=self.year, month=self.month, day=self.day,
+                updated_by='Call Record Import PUT'
+                )
+        return Recording.objects.create(name=self.name, domain_id=self.domain, updated_by='Recording Import PUT')
+
+
+def purge_upload_sessions(days):
+    # Remove abandoned sessions and their part files.
+    query_time = timezone.now() - timezone.timedelta(days)
+    qs = UploadSession.objects.filter(updated__lt=query_time).filter(
+        Q(locked_until__isnull=True) | Q(locked_until__lt=timezone.now())
+        )
+    count = 0
+    for session_id in qs.values_list('id', flat=True):
+        try:
+            os.remove(os.path.join(settings.PBX_UPLOAD_SESSION_DIR, '%s.part' % session_id))
+        except FileNotFoundError:
+            pass
+        count += 1
+    qs.delete()
+    return count
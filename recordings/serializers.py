@@ -28,12 +28,13 @@
 #
 
 from rest_framework import serializers
+from pbx.restpbxhelpers import SparseFieldsMixin
 from .models import (
     Recording, CallRecording
 )
 
 
-class RecordingSerializer(serializers.ModelSerializer):
+class RecordingSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Recording
@@ -44,7 +45,7 @@ class RecordingSerializer(serializers.ModelSerializer):
                 ]
 
 
-class CallRecordingSerializer(serializers.ModelSerializer):
+class CallRecordingSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = CallRecording
@@ -27,6 +27,176 @@
 #    Adrian Fretwell <adrian@djangopbx.com>
 #
 
-# from django.test import TestCase
+import base64
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, RequestFactory, override_settings, skipUnlessDBFeature
+from django.utils import timezone
+from tenants.models import Domain
+from .models import Recording, CallRecording, UploadSession
+from . import resumableupload
+from . import views
 
-# Create your tests here.
+
+class BrokenStream():
+    # A request body that fails with a connection error after limit bytes.
+    def __init__(self, data, limit):
+        self.data = io.BytesIO(data)
+        self.limit = limit
+
+    def read(self, size=-1):
+        if self.data.tell() >= self.limit:
+            raise OSError('Connection reset by peer')
+        return self.data.read(min(size, self.limit - self.data.tell()))
+
+
+class UploadTestMixin():
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.media_root, PBX_USE_LOCAL_FILE_STORAGE=True,
+            PBX_UPLOAD_SESSION_DIR=os.path.join(self.media_root, 'upload_sessions')
+            )
+        self.settings_override.enable()
+        cache.clear()
+        resumableupload.running_digests.clear()
+        self.domain = Domain.objects.create(name='upload.test', enabled='true')
+        self.rf = RequestFactory()
+        self.data = os.urandom(300 * 1024 + 17)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def put(self, name, body, content_range=None, stream=None, **headers):
+        if content_range:
+            headers['HTTP_CONTENT_RANGE'] = content_range
+        request = self.rf.put('/recordings/recimport/upload.test/%s' % name, body, content_type='audio/wav', **headers)
+        if stream:
+            request._stream = stream
+        return views.rec_import(request, 'upload.test', name)
+
+    def put_call(self, name, body, **headers):
+        request = self.rf.put(
+            '/recordings/callrecimport/upload.test/archive/2024/10/19/%s' % name, body,
+            content_type='audio/wav', **headers
+            )
+        return views.call_rec_import(request, 'upload.test', '2024', '10', '19', name)
+
+    def stored_digest(self, rec):
+        with open(rec.filename.path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+
+class ResumableUploadTestCase(UploadTestMixin, TestCase):
+
+    def test_single_put(self):
+        sha = hashlib.sha256(self.data).hexdigest()
+        r = self.put('one.wav', self.data, HTTP_X_CONTENT_SHA256=sha)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r['X-Content-SHA256'], sha)
+        self.assertEqual(self.stored_digest(Recording.objects.get(name='one.wav')), sha)
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_digest_mismatch(self):
+        r = self.put('bad.wav', self.data, HTTP_X_CONTENT_SHA256='0' * 64)
+        self.assertEqual(r.status_code, 400)
+        self.assertFalse(Recording.objects.filter(name='bad.wav').exists())
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'upload_sessions')), [])
+        wrong = 'sha-256=:%s:' % base64.b64encode(hashlib.sha256(b'other').digest()).decode()
+        r = self.put('bad.wav', self.data, HTTP_CONTENT_DIGEST=wrong)
+        self.assertEqual(r.status_code, 400)
+        r = self.put('bad.wav', self.data, HTTP_X_CONTENT_SHA256='not-a-digest')
+        self.assertEqual(r.status_code, 400)
+        self.assertFalse(Recording.objects.filter(name='bad.wav').exists())
+
+    def test_interrupted_upload(self):
+        n = len(self.data)
+        half = 200 * 1024
+        cut = 70000
+        r = self.put(
+            'big.wav', self.data[:half], 'bytes 0-%s/%s' % (half - 1, n), stream=BrokenStream(self.data[:half], cut)
+            )
+        self.assertEqual(r.status_code, 308)
+        self.assertEqual(r['Range'], 'bytes=0-%s' % (cut - 1))
+        r = views.rec_import(self.rf.head('/recordings/recimport/upload.test/big.wav'), 'upload.test', 'big.wav')
+        self.assertEqual(r.status_code, 308)
+        self.assertEqual(r['Range'], 'bytes=0-%s' % (cut - 1))
+        # A chunk that does not start where the last one finished is refused.
+        r = self.put('big.wav', self.data[half:], 'bytes %s-%s/%s' % (half, n - 1, n))
+        self.assertEqual(r.status_code, 409)
+        self.assertEqual(r['Range'], 'bytes=0-%s' % (cut - 1))
+        # Resume from the reported offset, the running digest is lost as if on another worker.
+        resumableupload.running_digests.clear()
+        r = self.put('big.wav', self.data[cut:half], 'bytes %s-%s/%s' % (cut, half - 1, n))
+        self.assertEqual(r.status_code, 308)
+        sha = hashlib.sha256(self.data).hexdigest()
+        digest = 'sha-256=:%s:' % base64.b64encode(hashlib.sha256(self.data).digest()).decode()
+        r = self.put('big.wav', self.data[half:], 'bytes %s-%s/%s' % (half, n - 1, n), HTTP_CONTENT_DIGEST=digest)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r['X-Content-SHA256'], sha)
+        self.assertEqual(self.stored_digest(Recording.objects.get(name='big.wav')), sha)
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_concurrent_chunk_refused(self):
+        r = self.put('c.wav', self.data[:100], 'bytes 0-99/200')
+        self.assertEqual(r.status_code, 308)
+        # Another request holds the session lease.
+        UploadSession.objects.update(locked_until=timezone.now() + timezone.timedelta(seconds=60))
+        r = self.put('c.wav', self.data[100:200], 'bytes 100-199/200')
+        self.assertEqual(r.status_code, 409)
+        UploadSession.objects.update(locked_until=None)
+        r = self.put('c.wav', self.data[100:200], 'bytes 100-199/200')
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(Recording.objects.filter(name='c.wav').count(), 1)
+
+    def test_interleaved_uploads(self):
+        # Several uploads in progress at once, chunks arriving in turn.
+        n = len(self.data)
+        bounds = [0, 100000, 200000, n]
+        for start, end in zip(bounds, bounds[1:]):
+            for i in range(4):
+                r = self.put('i%s.wav' % i, self.data[start:end], 'bytes %s-%s/%s' % (start, end - 1, n))
+                self.assertEqual(r.status_code, 200 if end == n else 308)
+        for i in range(4):
+            self.assertEqual(
+                self.stored_digest(Recording.objects.get(name='i%s.wav' % i)), hashlib.sha256(self.data).hexdigest()
+                )
+        self.assertFalse(UploadSession.objects.exists())
+
+
+# Concurrent writers need a server database, an in-memory SQLite test database locks whole tables.
+@skipUnlessDBFeature('has_select_for_update_skip_locked')
+class ParallelUploadTestCase(UploadTestMixin, TransactionTestCase):
+
+    def test_parallel_uploads(self):
+        results = {}
+
+        def upload(i):
+            body = self.data[i * 1000:]
+            try:
+                r = self.put_call('p%s.wav' % i, body, HTTP_X_CONTENT_SHA256=hashlib.sha256(body).hexdigest())
+                results[i] = (r.status_code, r.get('X-Content-SHA256'))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=upload, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for i in range(8):
+            self.assertEqual(results[i], (200, hashlib.sha256(self.data[i * 1000:]).hexdigest()))
+            self.assertEqual(
+                self.stored_digest(CallRecording.objects.get(name='p%s.wav' % i)),
+                hashlib.sha256(self.data[i * 1000:]).hexdigest()
+                )
+        self.assertFalse(UploadSession.objects.exists())
@@ -36,14 +36,14 @@ from django.core.cache import cache
 from tenants.pbxsettings import PbxSettings
 from pbx.commonfunctions import DomainUtils
 from pbx.pbxipaddresscheck import pbx_ip_address_check, loopback_default
-from pbx.putuploadhandler import putuploadhandler
 
 from pbx.restpermissions import (
     AdminApiAccessPermission
 )
 from .models import (
-    Recording, CallRecording
+    Recording, CallRecording, UploadKindChoice
 )
+from .resumableupload import ResumableUpload
 from .serializers import (
     RecordingSerializer, CallRecordingSerializer
 )
@@ -119,11 +119,10 @@ def rec_import(request, domain, recfile):
     except Domain.DoesNotExist:
         return HttpResponseNotFound()
 
-    if request.method == "PUT": # FreeSWITCH mod_http_cache PUT request
-        if not putuploadhandler(request):
-            return HttpResponse(status=400)
+    if request.method == "PUT" or request.method == "HEAD":  # FreeSWITCH mod_http_cache or resumable PUT request
+        return ResumableUpload(request, d, UploadKindChoice.CRECORDING, recfile).handle()
 
-    if request.method == "POST" or request.method == "PUT": # Multipart form data with file field POST request
+    if request.method == "POST":  # Multipart form data with file field POST request
         rec = Recording.objects.create(name=recfile,
                 domain_id=d, updated_by='Recording Import %s' % request.method)
         rec.filename.save(recfile, request.FILES[recfile])
@@ -138,11 +137,10 @@ def call_rec_import(request, domain, year, month, day, recfile):
     except Domain.DoesNotExist:
         return HttpResponseNotFound()
 
-    if request.method == "PUT": # FreeSWITCH mod_http_cache PUT request
-        if not putuploadhandler(request):
-            return HttpResponse(status=400)
+    if request.method == "PUT" or request.method == "HEAD":  # FreeSWITCH mod_http_cache or resumable PUT request
+        return ResumableUpload(request, d, UploadKindChoice.CCALLRECORDING, recfile, year, month, day).handle()
 
-    if request.method == "POST" or request.method == "PUT": # Multipart form data with file field POST request
+    if request.method == "POST":  # Multipart form data with file field POST request
         rec = CallRecording.objects.create(name=recfile,
                 domain_id=d, year=year, month=month, day=day,
                 updated_by='Call Record Import %s' % request.method)
@@ -28,12 +28,13 @@
 #
 
 from rest_framework import serializers
+from pbx.restpbxhelpers import SparseFieldsMixin
 from .models import (
     RingGroup, RingGroupDestination, RingGroupUser,
 )
 
 
-class RingGroupSerializer(serializers.ModelSerializer):
+class RingGroupSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     gen_xml = serializers.HyperlinkedIdentityField(view_name='ringgroup-generate-xml')
     class Meta:
@@ -73,7 +74,7 @@ class RingGroupSerializer(serializers.ModelSerializer):
                 ]
 
 
-class RingGroupDestinationSerializer(serializers.ModelSerializer):
+class RingGroupDestinationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = RingGroupDestination
@@ -92,7 +93,7 @@ class RingGroupDestinationSerializer(serializers.ModelSerializer):
                 ]
 
 
-class RingGroupUserSerializer(serializers.ModelSerializer):
+class RingGroupUserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = RingGroupUser
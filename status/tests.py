@@ -26,6 +26,180 @@
 #    Adrian Fretwell <adrian@djangopbx.com>
 #
 
-# from django.test import TestCase
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, RequestFactory, override_settings
+from django.urls import ResolverMatch
+from pbx.metrics import PbxMetrics, MetricsCacheMixin, MetricsMiddleware, metrics, metrics_view
 
-# Create your tests here.
+
+class TestMetrics(PbxMetrics):
+
+    def flush_at_exit(self):
+        # The settings overrides have gone by the time the process exits.
+        pass
+
+
+class DictCache():
+    # Like memcached, get_many is a single lookup rather than a get per key.
+    def __init__(self, values):
+        self.values = values
+
+    def get(self, key, default=None, version=None):
+        return self.values.get(key, default)
+
+    def get_many(self, keys, version=None):
+        return {k: self.values[k] for k in keys if k in self.values}
+
+
+class MetricsDictCache(MetricsCacheMixin, DictCache):
+    pass
+
+
+class PbxMetricsTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        override = override_settings(PBX_METRICS_DIR=self.tmp, PBX_METRICS_FLUSH_INTERVAL=0)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.m = self.registry()
+
+    def registry(self):
+        m = TestMetrics()
+        m.counter('c_total', 'A counter.')
+        m.gauge('g_sum', 'A summed gauge.')
+        m.gauge('g_max', 'A max gauge.', 'max')
+        m.histogram('h_seconds', 'A histogram.', (0.1, 1))
+        return m
+
+    def dead_pid(self):
+        proc = subprocess.Popen([sys.executable, '-c', 'pass'])
+        proc.wait()
+        return proc.pid
+
+    def write_process(self, pid, values):
+        with open(os.path.join(self.tmp, '%d.json' % pid), 'w') as f:
+            json.dump({'pid': pid, 'values': values}, f)
+
+    def test_merge_and_archive(self):
+        self.m.inc('c_total', 2, code='200')
+        self.m.set('g_sum', 3)
+        self.m.set('g_max', 10)
+        self.m.observe('h_seconds', 0.5)
+        # Another live process, the parent of this one, and one that has gone.
+        self.write_process(os.getppid(), [
+            ['c_total', [['code', '200']], 5], ['g_sum', [], 4], ['g_max', [], 7], ['h_seconds', [], [1, 0, 0, 0.05]],
+            ['unknown_total', [], 99],
+            ])
+        dead = self.dead_pid()
+        self.write_process(dead, [
+            ['c_total', [['code', '200']], 10], ['c_total', [['code', '500']], 1], ['g_sum', [], 100],
+            ['h_seconds', [], [0, 0, 2, 8.0]], ['h_seconds', [['bad', 'buckets']], [1, 2]],
+            ])
+        expected = {
+            ('c_total', (('code', '200'),)): 17,
+            ('c_total', (('code', '500'),)): 1,
+            ('g_sum', ()): 7,
+            ('g_max', ()): 10,
+            ('h_seconds', ()): [1, 1, 2, 8.55],
+            }
+        self.assertEqual(self.m.collect(), expected)
+        # The dead process was archived, without its gauge.
+        self.assertFalse(os.path.exists(os.path.join(self.tmp, '%d.json' % dead)))
+        with open(os.path.join(self.tmp, 'archive.json')) as f:
+            archived = {(n, tuple(tuple(la) for la in labels)): v for n, labels, v in json.load(f)['values']}
+        self.assertEqual(archived, {
+            ('c_total', (('code', '200'),)): 10, ('c_total', (('code', '500'),)): 1, ('h_seconds', ()): [0, 0, 2, 8.0],
+            })
+        self.assertEqual(self.m.collect(), expected)
+
+        # A process with the pid of an archived one folds the old file into the archive first.
+        self.write_process(self.m.pid, [['c_total', [['code', '200']], 1000]])
+        m = self.registry()
+        m.inc('c_total', code='200')
+        self.assertEqual(m.collect()[('c_total', (('code', '200'),))], 1000 + 1 + 5 + 10)
+
+    def test_without_directory(self):
+        with override_settings(PBX_METRICS_DIR=None):
+            self.m.inc('c_total')
+            self.m.set('g_max', 2)
+            self.assertEqual(self.m.collect(), {('c_total', ()): 1, ('g_max', ()): 2})
+        self.assertEqual(os.listdir(self.tmp), [])
+
+    def test_render(self):
+        for v in (0.05, 0.1, 0.5, 5):
+            self.m.observe('h_seconds', v, handler='xml"handler')
+        self.m.inc('c_total')
+        lines = self.m.render().splitlines()
+        self.assertEqual(lines[lines.index('# TYPE h_seconds histogram') + 1:], [
+            'h_seconds_bucket{handler="xml\\"handler",le="0.1"} 2',
+            'h_seconds_bucket{handler="xml\\"handler",le="1"} 3',
+            'h_seconds_bucket{handler="xml\\"handler",le="+Inf"} 4',
+            'h_seconds_sum{handler="xml\\"handler"} 5.65',
+            'h_seconds_count{handler="xml\\"handler"} 4',
+            ])
+        self.assertIn('# HELP c_total A counter.', lines)
+        self.assertIn('c_total 1', lines)
+        self.assertIn('# TYPE g_max gauge', lines)
+
+
+class MetricsMiddlewareTestCase(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        override = override_settings(
+            PBX_METRICS_DIR=self.tmp, PBX_METRICS_FLUSH_INTERVAL=0, PBX_METRICS_HANDLERS=['xmlhandler']
+            )
+        override.enable()
+        self.addCleanup(override.disable)
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        self.cache = MetricsDictCache({'present': 1})
+        self.rf = RequestFactory()
+
+    def get(self, module, url_name, remote_addr='127.0.0.1'):
+        def view(request):
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            self.cache.get('present')
+            self.cache.get_many(['present', 'absent', 'absent2'])
+            return view.response
+        view.__module__ = module
+        # The metrics view answers 200 or 404 depending on the client address.
+        view.response = metrics_view(self.rf.get('/metrics/', REMOTE_ADDR=remote_addr))
+
+        def get_response(request):
+            mw.process_view(request, view, (), {})
+            return view(request)
+        mw = MetricsMiddleware(get_response)
+        request = self.rf.get('/')
+        request.resolver_match = ResolverMatch(view, (), {}, url_name=url_name)
+        return mw(request)
+
+    def test_labels(self):
+        self.get('xmlhandler.views', 'dialplan')
+        self.get('xmlhandler.views', 'dialplan', '192.0.2.1')
+        self.get('tenants.views', 'index')
+        totals = metrics.collect()
+        labels = (('handler', 'xmlhandler'), ('section', 'dialplan'))
+        self.assertEqual(totals[('pbx_requests_total', labels + (('status', '200'),))], 1)
+        self.assertEqual(totals[('pbx_requests_total', labels + (('status', '404'),))], 1)
+        self.assertEqual(totals[('pbx_requests_in_progress', (('handler', 'xmlhandler'),))], 0)
+        cache_labels = (('handler', 'xmlhandler'), ('result', 'hit'), ('section', 'dialplan'))
+        self.assertEqual(totals[('pbx_cache_requests_total', cache_labels)], 4)
+        cache_labels = (('handler', 'xmlhandler'), ('result', 'miss'), ('section', 'dialplan'))
+        self.assertEqual(totals[('pbx_cache_requests_total', cache_labels)], 4)
+        self.assertEqual(sum(totals[('pbx_request_duration_seconds', labels)][:-1]), 2)
+        # One query per request, in the le="1" bucket.
+        self.assertEqual(totals[('pbx_request_queries', labels)][1], 2)
+        # Nothing is recorded for applications outside PBX_METRICS_HANDLERS.
+        self.assertFalse([k for k in totals if ('handler', 'tenants') in k[1]])
+        self.assertIn('pbx_requests_total{handler="xmlhandler",section="dialplan",status="200"} 1', metrics.render())
@@ -29,19 +29,20 @@
 
 from django.contrib import admin
 from django.conf import settings
+from django.utils import timezone
 
 from django.utils.translation import gettext_lazy as _
 from django.contrib import messages
 from .models import (
     SipProfile, SipProfileSetting, SipProfileDomain, SwitchVariable,
     AccessControl, AccessControlNode, EmailTemplate, Modules, IpRegister,
+    EmailQueue, EmailQueueStatusChoice,
 )
 from import_export.admin import ImportExportModelAdmin
 from import_export import resources
 from switch.switchfunctions import SwitchFunctions
 from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
-from pbx.commonfunctions import shcommand
-from pbx.amqpcmdevent import AmqpCmdEvent
+from pbx.nftbackend import NftBackend
 from .ipregisterfunctions import IpRegisterFunctions
 
 
@@ -428,7 +429,6 @@ class IpRegisterAdmin(ImportExportModelAdmin):
     ]
 
     actions = [reinstate_sip_customer_list]
-    firewall_event_template = '{\"Event-Name\":\"FIREWALL\", \"Action\":\"%s\", \"IP-Type\":\"%s\",\"Fw-List\":\"sip-customer\", \"IP-Address\":\"%s\"}' # noqa: E501
 
     # This is a workaround to allow the admin action to be run without selecting any objects.
     # super checks for a valid UUID, so we pass a meaningless one because it is not actually used.
@@ -439,19 +439,14 @@ class IpRegisterAdmin(ImportExportModelAdmin):
             request._set_post(post)
         return super(IpRegisterAdmin, self).changelist_view(request, extra_context)
 
-    def connect_broker(self):
-        broker = AmqpCmdEvent()
-        broker.connect()
-        return broker
-
-    def fw_update(self, broker, action, ip_address):
-        ip_type = 'ipv4'
-        if ':' in ip_address:
-            ip_type = 'ipv6'
-        shcommand(['/usr/local/bin/fw-%s-%s-sip-customer-list.sh' % (action, ip_type), ip_address])
-        routing = 'DjangoPBX.%s.FIREWALL.%s.%s' % (broker.hostname, action, ip_type)
-        payload = self.firewall_event_template % (action, ip_type, ip_address)
-        broker.adhoc_publish(payload, routing, 'TAP.Firewall')
+    def fw_update(self, action, ip_addresses):
+        nft = NftBackend()
+        if action == 'add':
+            nft.add('sip-customer', ip_addresses)
+        else:
+            nft.delete('sip-customer', ip_addresses)
+        nft.commit()
+        nft.publish()
         return
 
     def save_model(self, request, obj, form, change):
@@ -459,31 +454,51 @@ class IpRegisterAdmin(ImportExportModelAdmin):
         if change:
             messages.add_message(request, messages.WARNING, _('A changed IP will not be added to Firewall automatically'))
         else:
-            broker = self.connect_broker()
-            self.fw_update(broker, 'add', obj.address)
-            broker.disconnect()
+            self.fw_update('add', [obj.address])
         super().save_model(request, obj, form, change)
 
     def delete_model(self, request, obj):
-        broker = self.connect_broker()
-        self.fw_update(broker, 'delete', obj.address)
-        broker.disconnect()
+        self.fw_update('delete', [obj.address])
         super().delete_model(request, obj)
 
     def delete_queryset(self, request, queryset):
-        broker = self.connect_broker()
-        for obj in queryset:
-            self.fw_update(broker, 'delete', obj.address)
-        broker.disconnect()
+        self.fw_update('delete', [obj.address for obj in queryset])
         super().delete_queryset(request, queryset)
 
 
+@admin.action(permissions=['change'], description='Retry delivery of selected messages')
+def retry_email_queue(modeladmin, request, queryset):
+    queryset.exclude(status=EmailQueueStatusChoice.CSENT).update(
+        status=EmailQueueStatusChoice.CQUEUED, attempts=0, next_attempt=timezone.now()
+        )
+
+
+class EmailQueueAdmin(admin.ModelAdmin):
+    readonly_fields = ['recipients', 'subject', 'attempts', 'next_attempt', 'last_error', 'created', 'updated', 'updated_by']
+    search_fields = ['recipients', 'subject']
+    fieldsets = [
+        (None,  {'fields': ['recipients', 'subject', 'status', 'attempts', 'next_attempt', 'last_error']}),
+        ('update Info.',   {'fields': ['created', 'updated', 'updated_by'], 'classes': ['collapse']}),
+    ]
+    list_display = ('recipients', 'subject', 'status', 'attempts', 'next_attempt', 'created')
+    list_filter = ('status', )
+    ordering = [
+        '-created'
+    ]
+
+    actions = [retry_email_queue]
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 admin.site.register(SipProfile, SipProfileAdmin)
 admin.site.register(SwitchVariable, SwitchVariableAdmin)
 admin.site.register(AccessControl, AccessControlAdmin)
 admin.site.register(EmailTemplate, EmailTemplateAdmin)
 admin.site.register(Modules, ModulesAdmin)
 admin.site.register(IpRegister, IpRegisterAdmin)
+admin.site.register(EmailQueue, EmailQueueAdmin)
 if settings.PBX_ADMIN_SHOW_ALL:
     admin.site.register(SipProfileSetting, SipProfileSettingAdmin)
     admin.site.register(SipProfileDomain, SipProfileDomainAdmin)
@@ -26,33 +26,69 @@
 #    Adrian Fretwell <adrian@djangopbx.com>
 #
 
+import time
 from django.utils import timezone
-from .models import IpRegister
-from pbx.commonfunctions import shcommand
+from .models import IpRegister, IpStatusChoice
+from pbx.nftbackend import NftBackend
 
 
 class IpRegisterFunctions():
 
-    def process_data(self, qs, cmd):
-        i = 0
-        ips = []
-        for q in qs:
-            i += 1
-            if i > 99:
-                shcommand([cmd, ','.join(ips)])
-                ips.clear()
-            ips.append(q.address)
-        shcommand([cmd, ','.join(ips)])
+    fw_list = 'sip-customer'
+
+    def registered_addresses(self, nft):
+        # Current and permanent addresses from the IP Register grouped by address family.
+        addresses = {'ipv4': set(), 'ipv6': set()}
+        for address in IpRegister.objects.filter(status__gt=IpStatusChoice.COBS).values_list('address', flat=True):
+            addresses[nft.ip_type(address)].add(address)
+        return addresses
+
+    def obsolete_addresses(self):
+        return set(IpRegister.objects.filter(status=IpStatusChoice.COBS).values_list('address', flat=True))
+
+    def sync_fw_sip_customer_list(self, nft=None):
+        # Compares the IP Register with the live SIP customer sets and applies only
+        #  the differences, for both address families, as one nftables transaction.
+        #  Only addresses the IP Register marks as obsolete are deleted, entries added
+        #  by other means (fwaddip, the firewall API) are left alone.
+        #  Returns a dictionary of counts and the commit result.
+        if not nft:
+            nft = NftBackend()
+        start = time.monotonic()
+        stats = {'registered': 0, 'live': 0, 'added': 0, 'deleted': 0}
+        obsolete = self.obsolete_addresses()
+        for ip_type, wanted in self.registered_addresses(nft).items():
+            live = set(nft.list_set(self.fw_list, ip_type, False))
+            to_add = sorted(wanted - live)
+            to_delete = sorted((live & obsolete) - wanted)
+            if to_add:
+                nft.add(self.fw_list, to_add)
+            if to_delete:
+                nft.delete(self.fw_list, to_delete, existing_only=False)
+            stats['registered'] += len(wanted)
+            stats['live'] += len(live)
+            stats['added'] += len(to_add)
+            stats['deleted'] += len(to_delete)
+        stats['error'] = nft.commit()
+        stats['elapsed'] = time.monotonic() - start
+        return stats
 
     def reinstate_fw_sip_customer_list(self):
-        qs = IpRegister.objects.raw('select id, address from pbx_ip_register where status=1 and family(address)=4 order by address')
-        if qs:
-            self.process_data(qs, '/usr/local/bin/fw-add-ipv4-sip-customer-list.sh')
-        qs = IpRegister.objects.raw('select id, address from pbx_ip_register where status=1 and family(address)=6 order by address')
-        if qs:
-            self.process_data(qs, '/usr/local/bin/fw-add-ipv6-sip-customer-list.sh')
-
-    def obsolete_old_ip_addresses(self):
-        time_24_hours_ago = timezone.now() - timezone.timedelta(1)
-        IpRegister.objects.filter(status=1, updated__lte=time_24_hours_ago).update(status=0)
+        return self.sync_fw_sip_customer_list()
 
+    def obsolete_old_ip_addresses(self, nft=None):
+        # Marks addresses not seen for 24 hours as obsolete in one UPDATE and removes
+        #  them from the live sets, other cluster members are told via TAP.Firewall.
+        start = time.monotonic()
+        time_24_hours_ago = timezone.now() - timezone.timedelta(1)
+        obsoleted = IpRegister.objects.filter(
+            status=IpStatusChoice.CCUR, updated__lte=time_24_hours_ago
+            ).update(status=IpStatusChoice.COBS)
+        if not nft:
+            nft = NftBackend()
+        stats = self.sync_fw_sip_customer_list(nft)
+        if not stats['error']:
+            nft.publish()
+        stats['obsoleted'] = obsoleted
+        stats['elapsed'] = time.monotonic() - start
+        return stats
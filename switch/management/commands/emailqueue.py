@@ -0,0 +1,59 @@
+#
+#    DjangoPBX
+#
+#    MIT License
+#
+#    Copyright (c) 2016 - 2024 Adrian Fretwell <adrian@djangopbx.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+#
+#    Contributor(s):
+#    Adrian Fretwell <adrian@djangopbx.com>
+#
+
+import time
+from django.utils.translation import gettext_lazy as _
+from django.core.management.base import BaseCommand
+from pbx.pbxsendsmtp import PbxMailQueue
+
+
+class Command(BaseCommand):
+    help = 'Deliver messages from the outbound Email Queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help=_('Process the queue once and exit'))
+        parser.add_argument('--batch', type=int, default=50, help=_('Messages claimed per batch (default 50)'))
+        parser.add_argument('--connections', type=int, default=2, help=_('Pooled SMTP connections (default 2)'))
+        parser.add_argument('--interval', type=float, default=2.0, help=_('Seconds to wait when the queue is empty'))
+
+    def handle(self, *args, **kwargs):
+        mq = PbxMailQueue(kwargs['batch'], kwargs['connections'])
+        if not mq.cfg:
+            self.stderr.write('No email configuration found in Default Settings')
+            return
+        mq.requeue_stale()
+        try:
+            while True:
+                count = mq.process_batch()
+                if kwargs['once'] and count < kwargs['batch']:
+                    break
+                if not count:
+                    time.sleep(kwargs['interval'])
+        finally:
+            mq.close()
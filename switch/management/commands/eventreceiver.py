@@ -28,17 +28,21 @@
 #
 
 import os
+import time
 import logging
 import json
 from pika import BasicProperties as PikaBasicProperties
+from pika.exceptions import AMQPError
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
+from django.utils import timezone
 from django.core.management.base import BaseCommand
-from switch.models import IpRegister
+from switch.models import IpRegister, IpStatusChoice
 from tenants.models import DefaultSetting, Domain
 from xmlcdr.models import XmlCdr, CallTimeline
 from voicemail.models import Voicemail, VoicemailGreeting
-from pbx.commonfunctions import shcommand
+from pbx.metrics import metrics, RequestStats
+from pbx.nftbackend import NftBackend
 from pbx.scripts.resources.pbx.amqpconnection import AmqpConnection
 from pbx.sshconnect import SFTPConnection
 from .cdrhandlermixin import CdrHandlerMixin
@@ -60,6 +64,8 @@ class Command(BaseCommand, CdrHandlerMixin):
     vm_greetings_path = 'fs/voicemail'
     updated_by = 'Event Receiver'
     domains = {}
+    seen_ip_refresh = 3600
+    seen_ip_max = 50000
 
     def str2int(self, tmpstr):
         if not tmpstr:
@@ -115,6 +121,8 @@ class Command(BaseCommand, CdrHandlerMixin):
         return direction
 
     def on_message(self, channel, method, properties, body):
+        received = time.time()
+        start = time.perf_counter()
         msg = body.decode('utf8')
         if self.debug:
             if logger is not None:
@@ -122,6 +130,19 @@ class Command(BaseCommand, CdrHandlerMixin):
         event = json.loads(msg)
         event_name = event.get('Event-Name', self.nonstr)
         event_subclass = event.get('Event-Subclass', self.nonstr)
+        with RequestStats() as stats:
+            self.dispatch_event(channel, event, event_name)
+        event_label = event_subclass if event_name == 'CUSTOM' else event_name
+        metrics.inc('pbx_events_total', event=event_label)
+        metrics.observe('pbx_event_duration_seconds', time.perf_counter() - start, event=event_label)
+        metrics.observe('pbx_event_queries', stats.queries, event=event_label)
+        event_time = self.str2int(event.get('Event-Date-Timestamp'))
+        if event_time:
+            metrics.observe('pbx_event_lag_seconds', max(received - event_time / 1000000, 0), event=event_label)
+        metrics.set('pbx_event_last_received_seconds', received)
+        metrics.flush_if_due()
+
+    def dispatch_event(self, channel, event, event_name):
         if event_name == 'CHANNEL_HANGUP_COMPLETE':
             self.handle_hup_complete(event)
         elif event_name == 'CHANNEL_CREATE':
@@ -162,6 +183,7 @@ class Command(BaseCommand, CdrHandlerMixin):
 
     def handle(self, *args, **kwargs):
         self.pid = os.getpid()
+        self.seen_ips = {}
         mb = {self.mb_key_host: '127.0.0.1', self.mb_key_port: 5672,
             self.mb_key_pass: 'djangopbx-insecure',
             self.mb_key_user: 'guest', self.mb_key_adhoc: False}
@@ -187,7 +209,6 @@ class Command(BaseCommand, CdrHandlerMixin):
         self.call_recordings_path = settings.PBX_CDRH_RECORDINGS
         self.switch_recordings_path = settings.PBX_CDRH_SWITCH_RECORDINGS
 
-        self.firewall_event_template = '{\"Event-Name\":\"FIREWALL\", \"Action\":\"add\", \"IP-Type\":\"%s\",\"Fw-List\":\"sip-customer\", \"IP-Address\":\"%s\"}' # noqa: E501
         self.mq = AmqpConnection(mb[self.mb_key_host], mb[self.mb_key_port],
                                     mb[self.mb_key_user], mb[self.mb_key_pass])
         self.sftp = SFTPConnection()
@@ -276,21 +297,38 @@ class Command(BaseCommand, CdrHandlerMixin):
             ip_address = event.get('network-ip')
             if not ip_address:
                 return
-            ip, created = IpRegister.objects.update_or_create(address=ip_address, defaults={"status": 1})
-            if created:
-                ip_type = 'ipv4'
-                if ':' in ip.address:
-                    ip_type = 'ipv6'
-                shcommand(['/usr/local/bin/fw-add-%s-sip-customer-list.sh' % ip_type, ip.address])
-                if self.message_broker_adhoc_publish:
-                    firewall_routing = 'DjangoPBX.%s.FIREWALL.add.%s' % (self.mq.hostname, ip_type)
-                    payload = self.firewall_event_template % (ip_type, ip.address)
-                    try:
-                        channel.basic_publish('TAP.Firewall', firewall_routing, payload.encode(),
-                            properties=PikaBasicProperties(delivery_mode=2), # Delivery Mode 2 for persistent
-                            )
-                    except:
-                        logger.warn('EVENT Register {}: Unable send TAP.Firewall message {}.'.format(ip.address, firewall_routing))
+            # Re-registrations from a known address only touch the database once
+            #  per seen_ip_refresh so that the updated time stays well inside the
+            #  24 hour obsolete window without a write per REGISTER.
+            now = time.monotonic()
+            if now - self.seen_ips.get(ip_address, -self.seen_ip_refresh) < self.seen_ip_refresh:
+                return
+            if len(self.seen_ips) >= self.seen_ip_max:
+                self.seen_ips = {k: v for k, v in self.seen_ips.items() if now - v < self.seen_ip_refresh}
+            self.seen_ips[ip_address] = now
+            if IpRegister.objects.filter(address=ip_address, status__gt=IpStatusChoice.COBS).update(
+                    updated=timezone.now()):
+                return
+            # New or previously obsoleted address
+            IpRegister.objects.update_or_create(address=ip_address, defaults={'status': IpStatusChoice.CCUR})
+            nft = NftBackend()
+            nft.add('sip-customer', [ip_address])
+            error = nft.commit()
+            if error:
+                logger.warning('EVENT Register {}: Unable to add to firewall {}.'.format(ip_address, error))
+                del self.seen_ips[ip_address]
+            if self.message_broker_adhoc_publish:
+                ip_type = nft.ip_type(ip_address)
+                firewall_routing = 'DjangoPBX.%s.FIREWALL.add.%s' % (self.mq.hostname, ip_type)
+                payload = nft.firewall_event_template % ('add', ip_type, 'sip-customer', ip_address)
+                try:
+                    channel.basic_publish(
+                        'TAP.Firewall', firewall_routing, payload.encode(),
+                        properties=PikaBasicProperties(delivery_mode=2),  # Delivery Mode 2 for persistent
+                        )
+                except (AMQPError, OSError) as e:
+                    logger.warning('EVENT Register {}: Unable send TAP.Firewall message {}: {}'.format(
+                        ip_address, firewall_routing, e))
 
     def handle_hup_complete(self, event):
         call_direction = self.get_direction(event)
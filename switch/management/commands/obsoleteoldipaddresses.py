@@ -35,4 +35,12 @@ class Command(BaseCommand):
     help = 'Obsolete old IP addresses from IP Register'
 
     def handle(self, *args, **kwargs):
-        IpRegisterFunctions().obsolete_old_ip_addresses()
+        stats = IpRegisterFunctions().obsolete_old_ip_addresses()
+        self.stdout.write('Obsoleted %s IP Register rows' % stats['obsoleted'])
+        self.stdout.write(
+            'SIP customer list: %s registered, %s live, %s added, %s deleted in %.3fs' % (
+                stats['registered'], stats['live'], stats['added'], stats['deleted'], stats['elapsed']
+                )
+            )
+        if stats['error']:
+            self.stderr.write('nftables transaction failed: %s' % stats['error'])
@@ -35,4 +35,11 @@ class Command(BaseCommand):
     help = 'Reinstate Firewall SIP Customer List'
 
     def handle(self, *args, **kwargs):
-        IpRegisterFunctions().reinstate_fw_sip_customer_list()
+        stats = IpRegisterFunctions().reinstate_fw_sip_customer_list()
+        self.stdout.write(
+            'SIP customer list: %s registered, %s live, %s added, %s deleted in %.3fs' % (
+                stats['registered'], stats['live'], stats['added'], stats['deleted'], stats['elapsed']
+                )
+            )
+        if stats['error']:
+            self.stderr.write('nftables transaction failed: %s' % stats['error'])
@@ -0,0 +1,316 @@
+#
+#    DjangoPBX
+#
+#    MIT License
+#
+#    Copyright (c) 2016 - 2024 Adrian Fretwell <adrian@djangopbx.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+#
+#    Contributor(s):
+#    Adrian Fretwell <adrian@djangopbx.com>
+#
+
+import glob
+import http.client
+import json
+import math
+import os
+import queue
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+from django.apps import apps
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.http import QueryDict
+from django.test import Client
+from django.test.utils import override_settings, setup_databases, teardown_databases
+from django.urls import Resolver404, resolve
+from django.utils.translation import gettext_lazy as _
+from pbx.metrics import RequestStats
+from tenants.provisioning import TenantProvisioner
+
+
+class Command(BaseCommand):
+    help = 'Replay requests recorded by pbx.capture.CaptureMiddleware and report latency per endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'captures', nargs='*', help=_('Capture files or directories (default the synthetic loadtest capture)')
+            )
+        parser.add_argument('--url', help=_('Base URL of a live server, eg. http://127.0.0.1:8008'))
+        parser.add_argument(
+            '--concurrency', type=int, default=4, help=_('Requests in flight at once (default 4)')
+            )
+        parser.add_argument('--repeat', type=int, default=1, help=_('Times the capture is replayed (default 1)'))
+        parser.add_argument('--limit', type=int, help=_('Replay only the first LIMIT requests of the capture'))
+        parser.add_argument('--path', help=_('Replay only requests whose path starts with PATH'))
+        parser.add_argument('--seed', help=_('Tenant specification to provision before replaying'))
+        parser.add_argument(
+            '--test-db', action='store_true',
+            help=_(
+                'Replay in process against a new test database holding the default settings and the synthetic tenant'
+                )
+            )
+
+    def handle(self, *args, **kwargs):
+        fixtures = os.path.join(apps.get_app_config('switch').path, 'fixtures', 'loadtest')
+        captures = kwargs['captures'] or [os.path.join(fixtures, 'capture.jsonl')]
+        if kwargs['test_db'] and kwargs['url']:
+            raise CommandError('--test-db replays in process, it can not be used with --url')
+        if not kwargs['test_db'] and not kwargs['url']:
+            # Replayed requests import CDRs and change data, they are never run in process
+            #  against the configured database.
+            raise CommandError('Give --test-db to replay in process or --url to replay against a server')
+        records = self.load(captures, kwargs['path'], kwargs['limit'])
+        if not records:
+            raise CommandError('No requests to replay')
+        seed = kwargs['seed']
+        if kwargs['test_db']:
+            seed = seed or os.path.join(fixtures, 'tenant.json')
+            old_config = setup_databases(max(kwargs['verbosity'] - 1, 0), False, aliases={'default'})
+            try:
+                with override_settings(
+                        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                        PBX_METRICS_DIR=None, PBX_CAPTURE_DIR=None
+                        ):
+                    tenants = apps.get_app_config('tenants').path
+                    call_command(
+                        'loaddata', os.path.join(tenants, 'fixtures', 'defaultsetting.json'),
+                        os.path.join(tenants, 'fixtures', 'group.json'), verbosity=0
+                        )
+                    self.run(records, seed, kwargs)
+            finally:
+                teardown_databases(old_config, 0)
+            return
+        self.run(records, seed, kwargs)
+
+    def run(self, records, seed, kwargs):
+        if seed:
+            with open(seed) as f:
+                plan = TenantProvisioner(json.load(f), 'replaycapture').apply()
+            if kwargs['verbosity'] > 1:
+                self.stdout.write('Seeded %s: %s' % (plan['domain'], plan))
+        if kwargs['url']:
+            before = self.scrape_queries(kwargs['url'])
+            results, wall = self.replay(records * kwargs['repeat'], kwargs['concurrency'], kwargs['url'])
+            after = self.scrape_queries(kwargs['url'])
+            if before is not None and after is not None:
+                for endpoint, (total, count) in after.items():
+                    b = before.get(endpoint, (0, 0))
+                    if count > b[1]:
+                        for r in results:
+                            if r['endpoint'] == endpoint:
+                                r['queries'] = (total - b[0]) / (count - b[1])
+        else:
+            with override_settings(ALLOWED_HOSTS=['testserver']):
+                results, wall = self.replay(records * kwargs['repeat'], kwargs['concurrency'], None)
+        self.report(results, wall, records)
+
+    def load(self, captures, path, limit):
+        filenames = []
+        for c in captures:
+            filenames += sorted(glob.glob(os.path.join(c, '*.jsonl'))) if os.path.isdir(c) else [c]
+        records = []
+        for filename in filenames:
+            with open(filename) as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    record = json.loads(line)
+                    if path and not record['path'].startswith(path):
+                        continue
+                    record['endpoint'] = self.endpoint(record['path'])
+                    records.append(record)
+        records.sort(key=lambda r: r.get('time', 0))
+        return records[:limit] if limit else records
+
+    def endpoint(self, path):
+        # Labelled as in the metrics view, application and URL name.
+        try:
+            match = resolve(path)
+        except Resolver404:
+            return path
+        return '%s:%s' % (match.func.__module__.split('.')[0], match.url_name)
+
+    def session_key(self, record):
+        if record.get('content_type') != 'application/x-www-form-urlencoded':
+            return None
+        return QueryDict(record.get('body', '')).get('session_id')
+
+    def replay(self, records, concurrency, url):
+        # Requests of one httapi session go to the same worker so they stay in order.
+        concurrency = max(concurrency, 1)
+        queues = [queue.SimpleQueue() for i in range(concurrency)]
+        for i, record in enumerate(records):
+            key = self.session_key(record)
+            queues[hash(key) % concurrency if key else i % concurrency].put(record)
+        results = []
+        lock = threading.Lock()
+
+        def worker(q):
+            sender = LiveSender(url) if url else ClientSender()
+            mine = []
+            try:
+                while True:
+                    try:
+                        record = q.get_nowait()
+                    except queue.Empty:
+                        break
+                    mine.append(sender.send(record))
+            finally:
+                sender.close()
+            with lock:
+                results.extend(mine)
+
+        threads = [threading.Thread(target=worker, args=(q,)) for q in queues]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results, time.perf_counter() - start
+
+    def scrape_queries(self, url):
+        # Query counts of a live server are the change in its pbx_request_queries
+        #  histogram over the run, None if /metrics/ can not be read.
+        try:
+            status, body = LiveSender(url).request('GET', '/metrics/', '', None, {})
+        except (OSError, http.client.HTTPException):
+            return None
+        if status != 200:
+            return None
+        totals = {}
+        line_re = re.compile(r'^pbx_request_queries_(sum|count)\{handler="([^"]*)",section="([^"]*)"\} (\S+)$')
+        for line in body.decode().splitlines():
+            m = line_re.match(line)
+            if m:
+                endpoint = '%s:%s' % (m.group(2), m.group(3))
+                total, count = totals.get(endpoint, (0, 0))
+                if m.group(1) == 'sum':
+                    totals[endpoint] = (float(m.group(4)), count)
+                else:
+                    totals[endpoint] = (total, float(m.group(4)))
+        return totals
+
+    def percentile(self, values, p):
+        return values[min(len(values) - 1, max(int(math.ceil(p / 100 * len(values))) - 1, 0))]
+
+    def report(self, results, wall, records):
+        captured = {}
+        for r in records:
+            if r.get('elapsed') is not None:
+                captured.setdefault(r['endpoint'], []).append(r['elapsed'])
+        by_endpoint = {}
+        for r in results:
+            by_endpoint.setdefault(r['endpoint'], []).append(r)
+        fmt = '%-34s %7s %6s %8s %8s %8s %8s %8s %9s'
+        self.stdout.write(
+            fmt % ('endpoint', 'count', 'errors', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'queries', 'capt p50')
+            )
+        rows = sorted(by_endpoint.items()) + [('total', results)]
+        for endpoint, rs in rows:
+            elapsed = sorted(r['elapsed'] for r in rs)
+            queries = [r['queries'] for r in rs if r['queries'] is not None]
+            capt = sorted(captured.get(endpoint, [])) if endpoint != 'total' else sorted(sum(captured.values(), []))
+            self.stdout.write(fmt % (
+                endpoint, len(rs), sum(1 for r in rs if r['error']), '%.1f' % (len(rs) / wall),
+                '%.1f' % (self.percentile(elapsed, 50) * 1000), '%.1f' % (self.percentile(elapsed, 95) * 1000),
+                '%.1f' % (self.percentile(elapsed, 99) * 1000),
+                '%.1f' % (sum(queries) / len(queries)) if queries else '-',
+                '%.1f' % (self.percentile(capt, 50) * 1000) if capt else '-'
+                ))
+        self.stdout.write('%d requests in %.2f s, %.1f req/s' % (len(results), wall, len(results) / wall))
+
+
+class ClientSender():
+    # In process through the Django test client, queries are counted directly.
+
+    def __init__(self):
+        self.client = Client(REMOTE_ADDR='127.0.0.1')
+
+    def send(self, record):
+        path = '%s?%s' % (record['path'], record['query']) if record.get('query') else record['path']
+        error = None
+        start = time.perf_counter()
+        with RequestStats() as stats:
+            try:
+                response = self.client.generic(
+                    record['method'], path, (record.get('body') or '').encode(),
+                    record.get('content_type') or 'application/octet-stream'
+                    )
+                if response.status_code >= 400:
+                    error = response.status_code
+            except Exception as e:
+                error = repr(e)
+        return {
+            'endpoint': record['endpoint'], 'elapsed': time.perf_counter() - start, 'queries': stats.queries,
+            'error': error
+            }
+
+    def close(self):
+        connections.close_all()
+
+
+class LiveSender():
+    # Over HTTP with one kept alive connection per worker.
+
+    def __init__(self, url):
+        u = urlsplit(url)
+        self.https = u.scheme == 'https'
+        self.netloc = u.netloc
+        self.prefix = u.path.rstrip('/')
+        self.conn = None
+
+    def request(self, method, path, query, body, headers):
+        if self.conn is None:
+            connection = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            self.conn = connection(self.netloc, timeout=30)
+        try:
+            self.conn.request(method, self.prefix + path + ('?%s' % query if query else ''), body, headers)
+            response = self.conn.getresponse()
+            return response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            self.close()
+            raise
+
+    def send(self, record):
+        headers = {'Content-Type': record['content_type']} if record.get('content_type') else {}
+        error = None
+        start = time.perf_counter()
+        try:
+            status, body = self.request(
+                record['method'], record['path'], record.get('query'), (record.get('body') or '').encode(), headers
+                )
+            if status >= 400:
+                error = status
+        except (OSError, http.client.HTTPException) as e:
+            error = repr(e)
+        return {
+            'endpoint': record['endpoint'], 'elapsed': time.perf_counter() - start, 'queries': None, 'error': error
+            }
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
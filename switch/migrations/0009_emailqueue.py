@@ -0,0 +1,35 @@
+# Generated by Django 5.0.1 on 2026-10-19 11:45
+
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('switch', '0008_alter_switchvariable_category'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailQueue',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, verbose_name='Email Queue')),
+                ('recipients', models.TextField(verbose_name='Recipients')),
+                ('subject', models.CharField(blank=True, max_length=254, null=True, verbose_name='Subject')),
+                ('message', models.BinaryField(verbose_name='Message')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed')], db_index=True, default='queued', max_length=8, verbose_name='Status')),
+                ('attempts', models.IntegerField(default=0, verbose_name='Attempts')),
+                ('next_attempt', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Next Attempt')),
+                ('last_error', models.CharField(blank=True, max_length=254, null=True, verbose_name='Last Error')),
+                ('created', models.DateTimeField(auto_now_add=True, null=True, verbose_name='Created')),
+                ('updated', models.DateTimeField(auto_now=True, null=True, verbose_name='Updated')),
+                ('updated_by', models.CharField(default='system', max_length=64, verbose_name='Updated by')),
+            ],
+            options={
+                'verbose_name_plural': 'Email Queue',
+                'db_table': 'pbx_email_queue',
+            },
+        ),
+    ]
@@ -29,6 +29,7 @@
 
 from django.db import models
 import uuid
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from pbx.commonchoices import (
     EnabledTrueFalseChoice,
@@ -69,6 +70,13 @@ class EmailTemplateTypeChoice(models.TextChoices):
     CTEXT = 'text', 'Text'      # noqa: E221
 
 
+class EmailQueueStatusChoice(models.TextChoices):
+    CQUEUED  = 'queued',  _('Queued')   # noqa: E221
+    CSENDING = 'sending', _('Sending')  # noqa: E221
+    CSENT    = 'sent',    _('Sent')     # noqa: E221
+    CFAILED  = 'failed',  _('Failed')   # noqa: E221
+
+
 class SwitchModuleCategoryChoice(models.TextChoices):
     C1 = 'Streams / Files', _('Streams / Files')                                          # noqa: E221
     C2 = 'File Format Interfaces', _('File Format Interfaces')                            # noqa: E221
@@ -264,3 +272,24 @@ class IpRegister(models.Model):
 
     def __str__(self):
         return self.address
+
+
+class EmailQueue(models.Model):
+    id           = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False, verbose_name=_('Email Queue'))                                                    # noqa: E501, E221
+    recipients   = models.TextField(verbose_name=_('Recipients'))                                                                                                          # noqa: E501, E221
+    subject      = models.CharField(max_length=254, blank=True, null=True, verbose_name=_('Subject'))                                                                      # noqa: E501, E221
+    message      = models.BinaryField(verbose_name=_('Message'))                                                                                                           # noqa: E501, E221
+    status       = models.CharField(max_length=8, choices=EmailQueueStatusChoice.choices, default=EmailQueueStatusChoice.CQUEUED, db_index=True, verbose_name=_('Status'))  # noqa: E501, E221
+    attempts     = models.IntegerField(default=0, verbose_name=_('Attempts'))                                                                                              # noqa: E501, E221
+    next_attempt = models.DateTimeField(default=timezone.now, db_index=True, verbose_name=_('Next Attempt'))                                                                  # noqa: E501, E221
+    last_error   = models.CharField(max_length=254, blank=True, null=True, verbose_name=_('Last Error'))                                                                    # noqa: E501, E221
+    created      = models.DateTimeField(auto_now_add=True, blank=True, null=True, verbose_name=_('Created'))                                                               # noqa: E501, E221
+    updated      = models.DateTimeField(auto_now=True, blank=True, null=True, verbose_name=_('Updated'))                                                                   # noqa: E501, E221
+    updated_by   = models.CharField(max_length=64, default='system', verbose_name=_('Updated by'))                                                                         # noqa: E501, E221
+
+    class Meta:
+        verbose_name_plural = 'Email Queue'
+        db_table = 'pbx_email_queue'
+
+    def __str__(self):
+        return f"{self.recipients}->{self.subject}"
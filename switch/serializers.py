@@ -29,13 +29,14 @@
 
 from django.utils.http import urlsafe_base64_encode
 from rest_framework import serializers
+from pbx.restpbxhelpers import SparseFieldsMixin
 from .models import (
     SipProfileDomain, SipProfileSetting, SipProfile, SwitchVariable, AccessControl,
     AccessControlNode, EmailTemplate, Modules
 )
 
 
-class SipProfileDomainSerializer(serializers.ModelSerializer):
+class SipProfileDomainSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = SipProfileDomain
@@ -46,7 +47,7 @@ class SipProfileDomainSerializer(serializers.ModelSerializer):
                 ]
 
 
-class SipProfileSettingSerializer(serializers.ModelSerializer):
+class SipProfileSettingSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = SipProfileSetting
@@ -57,7 +58,7 @@ class SipProfileSettingSerializer(serializers.ModelSerializer):
                 ]
 
 
-class SipProfileSerializer(serializers.ModelSerializer):
+class SipProfileSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = SipProfile
@@ -68,7 +69,7 @@ class SipProfileSerializer(serializers.ModelSerializer):
                 ]
 
 
-class SwitchVariableSerializer(serializers.ModelSerializer):
+class SwitchVariableSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = SwitchVariable
@@ -80,7 +81,7 @@ class SwitchVariableSerializer(serializers.ModelSerializer):
                 ]
 
 
-class AccessControlSerializer(serializers.ModelSerializer):
+class AccessControlSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = AccessControl
@@ -91,7 +92,7 @@ class AccessControlSerializer(serializers.ModelSerializer):
                 ]
 
 
-class AccessControlNodeSerializer(serializers.ModelSerializer):
+class AccessControlNodeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = AccessControlNode
@@ -102,7 +103,7 @@ class AccessControlNodeSerializer(serializers.ModelSerializer):
                 ]
 
 
-class EmailTemplateSerializer(serializers.ModelSerializer):
+class EmailTemplateSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = EmailTemplate
@@ -114,7 +115,7 @@ class EmailTemplateSerializer(serializers.ModelSerializer):
                 ]
 
 
-class ModulesSerializer(serializers.ModelSerializer):
+class ModulesSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Modules
@@ -27,6 +27,238 @@
 #    Adrian Fretwell <adrian@djangopbx.com>
 #
 
-# from django.test import TestCase
+import json
+import smtplib
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from pbx.nftbackend import NftBackend
+from pbx.pbxsendsmtp import PbxTemplateMessage, PbxMailQueue, SmtpConnectionPool
+from tenants.models import DefaultSetting
+from tenants.settingsresolver import SettingsResolver
+from .ipregisterfunctions import IpRegisterFunctions
+from .models import EmailQueue, EmailQueueStatusChoice, IpRegister, IpStatusChoice
 
-# Create your tests here.
+
+class ReplayCaptureTestCase(SimpleTestCase):
+
+    def test_refuses_configured_database(self):
+        with self.assertRaisesMessage(CommandError, '--test-db'):
+            call_command('replaycapture')
+        with self.assertRaisesMessage(CommandError, '--test-db'):
+            call_command('replaycapture', '--seed', 'tenant.json')
+
+    def test_test_db_is_in_process_only(self):
+        with self.assertRaisesMessage(CommandError, 'can not be used with --url'):
+            call_command('replaycapture', '--test-db', '--url', 'http://127.0.0.1:8008')
+
+
+class FakeSmtp:
+    # Stands in for smtplib.SMTP, failing each recipient in fail with the given
+    #  (code, message) response.
+
+    def __init__(self, fail=None):
+        self.fail = fail if fail else {}
+        self.sent = []
+        self.closed = False
+
+    def noop(self):
+        if self.closed:
+            raise smtplib.SMTPServerDisconnected('closed')
+        return (250, b'OK')
+
+    def send_message(self, m):
+        response = self.fail.get(m['To'])
+        if response:
+            raise smtplib.SMTPResponseException(*response)
+        self.sent.append(m['To'])
+
+    def quit(self):
+        self.closed = True
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSmtpPool(SmtpConnectionPool):
+
+    def __init__(self, cfg, max_size=2, max_idle=60, fail=None):
+        super().__init__(cfg, max_size, max_idle)
+        self.fail = fail
+        self.connections = []
+
+    def connect(self):
+        server = FakeSmtp(self.fail)
+        self.connections.append(server)
+        return server
+
+
+class EmailQueueTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        SettingsResolver().clear_local()
+        for subcat, value in (
+                ('smtp_from', 'pbx@example.com'), ('smtp_host', '127.0.0.1'), ('smtp_port', '25'),
+                ('smtp_user_name', 'pbx'), ('smtp_password', 'secret')):
+            DefaultSetting.objects.create(category='email', subcategory=subcat, value_type='text', value=value)
+
+    def enqueue(self, rps):
+        return PbxTemplateMessage().Send(rps, 'Subject %s' % rps, 'Body', 'text', use_queue=True)
+
+    def mail_queue(self, fail=None, **kwargs):
+        mq = PbxMailQueue(connections=1, **kwargs)
+        mq.smtp_pool = FakeSmtpPool(mq.cfg, 1, fail=fail)
+        self.addCleanup(mq.close)
+        return mq
+
+    def make_due(self):
+        EmailQueue.objects.update(next_attempt=timezone.now())
+
+    def test_enqueue(self):
+        self.assertEqual(self.enqueue('a@example.com'), (True, '[SMTP Sender]: Email queued OK'))
+        q = EmailQueue.objects.get()
+        self.assertEqual(q.recipients, 'a@example.com')
+        self.assertEqual(q.subject, 'Subject a@example.com')
+        self.assertEqual(q.status, EmailQueueStatusChoice.CQUEUED)
+        self.assertIn(b'From: pbx@example.com', bytes(q.message))
+
+    def test_connection_reuse(self):
+        for i in range(5):
+            self.enqueue('u%s@example.com' % i)
+        mq = self.mail_queue()
+        self.assertEqual(mq.process_batch(), 5)
+        self.assertEqual(len(mq.smtp_pool.connections), 1)
+        self.assertEqual(len(mq.smtp_pool.connections[0].sent), 5)
+        self.assertEqual(EmailQueue.objects.filter(status=EmailQueueStatusChoice.CSENT).count(), 5)
+        self.assertEqual(mq.process_batch(), 0)
+
+        # A connection that has gone away is discarded and replaced.
+        mq.smtp_pool.connections[0].closed = True
+        self.enqueue('u5@example.com')
+        self.assertEqual(mq.process_batch(), 1)
+        self.assertEqual(len(mq.smtp_pool.connections), 2)
+
+        # As is one that has been idle too long.
+        mq.smtp_pool.max_idle = -1
+        self.enqueue('u6@example.com')
+        self.assertEqual(mq.process_batch(), 1)
+        self.assertEqual(len(mq.smtp_pool.connections), 3)
+        self.assertTrue(mq.smtp_pool.connections[1].closed)
+
+    def test_retry_backoff(self):
+        self.enqueue('busy@example.com')
+        mq = self.mail_queue(
+            fail={'busy@example.com': (451, b'Try later')}, max_attempts=4, backoff=60, max_backoff=150
+            )
+        delays = []
+        for attempt in range(1, 5):
+            before = timezone.now()
+            self.assertEqual(mq.process_batch(), 1)
+            q = EmailQueue.objects.get()
+            self.assertEqual(q.attempts, attempt)
+            self.assertEqual(q.last_error, "Error! code- 451 Text- b'Try later'")
+            if q.status == EmailQueueStatusChoice.CQUEUED:
+                delays.append(round((q.next_attempt - before).total_seconds()))
+                # Not due yet, so the next batch does not claim it.
+                self.assertEqual(mq.process_batch(), 0)
+                self.make_due()
+        self.assertEqual(delays, [60, 120, 150])
+        self.assertEqual(q.status, EmailQueueStatusChoice.CFAILED)
+
+    def test_permanent_failure(self):
+        self.enqueue('gone@example.com')
+        self.enqueue('ok@example.com')
+        mq = self.mail_queue(fail={'gone@example.com': (550, b'No such user')})
+        self.assertEqual(mq.process_batch(), 2)
+        gone = EmailQueue.objects.get(recipients='gone@example.com')
+        self.assertEqual((gone.status, gone.attempts), (EmailQueueStatusChoice.CFAILED, 1))
+        self.assertEqual(EmailQueue.objects.get(recipients='ok@example.com').status, EmailQueueStatusChoice.CSENT)
+        # The connection survives a rejected message.
+        self.assertEqual(len(mq.smtp_pool.connections), 1)
+
+    def test_requeue_stale(self):
+        self.enqueue('a@example.com')
+        EmailQueue.objects.update(
+            status=EmailQueueStatusChoice.CSENDING, updated=timezone.now() - timezone.timedelta(minutes=30)
+            )
+        self.assertEqual(self.mail_queue().requeue_stale(), 1)
+        self.assertEqual(EmailQueue.objects.get().status, EmailQueueStatusChoice.CQUEUED)
+
+
+class FakeNftBackend(NftBackend):
+    # Serves the live sets from a dictionary and applies transactions to it
+    #  instead of running nft, publishing is recorded rather than sent.
+    def __init__(self, sets):
+        super().__init__(helper_socket=None)
+        self.sets = sets
+        self.applied = []
+        self.published = []
+
+    def execute(self, request):
+        if request['cmd'] == 'list':
+            elem = self.sets.get(request['name'], [])
+            return (0, json.dumps({'nftables': [{'set': {'name': request['name'], 'elem': elem}}]}))
+        self.applied.append(request['nftables'])
+        for command in request['nftables']:
+            for action, obj in command.items():
+                live = self.sets.setdefault(obj['element']['name'], [])
+                for e in obj['element']['elem']:
+                    if action == 'add' and e not in live:
+                        live.append(e)
+                    elif action == 'delete':
+                        live.remove(e)
+        return (0, '')
+
+    def publish(self, broker=None):
+        self.published.append(dict(self.pending))
+
+
+class IpRegisterSyncTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        for address, status in (
+                ('192.0.2.1', IpStatusChoice.CCUR), ('192.0.2.2', IpStatusChoice.CPERM),
+                ('192.0.2.3', IpStatusChoice.COBS), ('2001:db8::1', IpStatusChoice.CCUR),
+                ('2001:db8::2', IpStatusChoice.COBS)):
+            IpRegister.objects.create(address=address, status=status)
+        self.irf = IpRegisterFunctions()
+
+    def test_sync_applies_differences(self):
+        nft = FakeNftBackend({
+            # 192.0.2.3 is obsolete, 203.0.113.9 was added by other means and is kept.
+            'ipv4_sip_customer_list': ['192.0.2.1', '192.0.2.3', '203.0.113.9'],
+            'ipv6_sip_customer_list': ['2001:db8::2'],
+            })
+        stats = self.irf.sync_fw_sip_customer_list(nft)
+        self.assertEqual(
+            {k: stats[k] for k in ('registered', 'live', 'added', 'deleted', 'error')},
+            {'registered': 3, 'live': 4, 'added': 2, 'deleted': 2, 'error': ''}
+            )
+        self.assertEqual(len(nft.applied), 1)
+        self.assertEqual(sorted(nft.sets['ipv4_sip_customer_list']), ['192.0.2.1', '192.0.2.2', '203.0.113.9'])
+        self.assertEqual(nft.sets['ipv6_sip_customer_list'], ['2001:db8::1'])
+
+        # In step, nothing to apply.
+        nft = FakeNftBackend(nft.sets)
+        stats = self.irf.sync_fw_sip_customer_list(nft)
+        self.assertEqual((stats['added'], stats['deleted']), (0, 0))
+        self.assertEqual(nft.applied, [])
+
+    def test_obsolete_old_addresses(self):
+        IpRegister.objects.filter(address__in=['192.0.2.1', '192.0.2.2']).update(
+            updated=timezone.now() - timezone.timedelta(days=2)
+            )
+        nft = FakeNftBackend({
+            'ipv4_sip_customer_list': ['192.0.2.1', '192.0.2.2'],
+            'ipv6_sip_customer_list': ['2001:db8::1'],
+            })
+        stats = self.irf.obsolete_old_ip_addresses(nft)
+        # Permanent addresses are never obsoleted.
+        self.assertEqual((stats['obsoleted'], stats['added'], stats['deleted']), (1, 0, 1))
+        self.assertEqual(IpRegister.objects.get(address='192.0.2.1').status, IpStatusChoice.COBS)
+        self.assertEqual(nft.sets['ipv4_sip_customer_list'], ['192.0.2.2'])
+        self.assertEqual(nft.published, [{('delete', 'sip-customer', 'ipv4'): ['192.0.2.1']}])
@@ -35,6 +35,7 @@ from .models import (
     Profile, ProfileSetting, Domain, DomainSetting, DefaultSetting,
 )
 from .forms import CopySettingsToDomainForm
+from .provisioning import copy_default_settings
 from import_export.admin import (
     ExportActionModelAdmin, ImportExportModelAdmin,
     ImportExportMixin, ExportMixin
@@ -343,28 +344,12 @@ def copy_settings_to_domain(modeladmin, request, queryset):
     opts = modeladmin.model._meta
     app_label = opts.app_label
     if 'apply' in request.POST:
-        c = 0
         if not request.POST['domain']:
             return None
         d = Domain.objects.get(pk=request.POST['domain'])
         dss = request.POST.getlist('_selected_action')
         qs = DefaultSetting.objects.filter(id__in=dss)
-        for q in qs:
-            if DomainSetting.objects.filter(domain_id=d.id, category=q.category,
-                subcategory=q.subcategory, enabled='true').exists():
-                continue
-            c += 1
-            DomainSetting.objects.create(
-                domain_id = d,
-                category=q.category,
-                subcategory=q.subcategory,
-                value_type=q.value_type,
-                value=q.value,
-                sequence=q.sequence,
-                enabled='true',
-                description=q.description,
-                updated_by=request.user.username
-            )
+        c = copy_default_settings(d, qs, request.user.username)
         modeladmin.message_user(
             request,
             _('Successfully copied %s settings' % str(c)),
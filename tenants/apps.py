@@ -28,7 +28,7 @@
 #
 
 from django.apps import AppConfig
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.utils.translation import gettext_lazy as _
 
 
@@ -49,3 +49,17 @@ class TenantsConfig(AppConfig):
             signals.create_or_edit_user_profile,
             sender=User, weak=False, dispatch_uid="tenants:auth_User"
             )
+        from .models import DefaultSetting, DomainSetting, ProfileSetting
+        for sig in (post_save, post_delete):
+            sig.connect(
+                signals.invalidate_default_settings,
+                sender=DefaultSetting, weak=False, dispatch_uid="tenants:DefaultSetting"
+                )
+            sig.connect(
+                signals.invalidate_domain_settings,
+                sender=DomainSetting, weak=False, dispatch_uid="tenants:DomainSetting"
+                )
+            sig.connect(
+                signals.invalidate_user_settings,
+                sender=ProfileSetting, weak=False, dispatch_uid="tenants:ProfileSetting"
+                )
@@ -0,0 +1,56 @@
+#
+#    DjangoPBX
+#
+#    MIT License
+#
+#    Copyright (c) 2016 - 2024 Adrian Fretwell <adrian@djangopbx.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+#
+#    Contributor(s):
+#    Adrian Fretwell <adrian@djangopbx.com>
+#
+
+import json
+from django.core.management.base import BaseCommand, CommandError
+
+from tenants.provisioning import TenantProvisioner
+
+
+class Command(BaseCommand):
+    help = 'Create a domain with its extensions, users, devices, voicemail and settings from a JSON spec'
+
+    def add_arguments(self, parser):
+        parser.add_argument('spec', help='JSON specification file')
+        parser.add_argument('--dry-run', action='store_true', help='Show what would be created without creating it')
+        parser.add_argument('--no-warm', action='store_true', help='Do not warm the directory cache afterwards')
+        parser.add_argument('--updated-by', default='system', help='Value for the updated by fields')
+
+    def handle(self, *args, **kwargs):
+        try:
+            with open(kwargs['spec']) as f:
+                tp = TenantProvisioner(json.load(f), kwargs['updated_by'])
+        except (OSError, ValueError) as e:
+            raise CommandError('Spec not loaded: %s' % e)
+        if kwargs['dry_run']:
+            result = tp.plan()
+        else:
+            result = tp.apply(not kwargs['no_warm'])
+        for k, v in result.items():
+            self.stdout.write('%-20s %s' % (k, v))
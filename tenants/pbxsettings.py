@@ -29,7 +29,8 @@
 
 import uuid
 from django.db.models import Q
-from .models import DefaultSetting, DomainSetting, ProfileSetting, Domain
+from .models import Domain
+from .settingsresolver import SettingsResolver
 from accounts.models import ExtensionUser
 
 #
@@ -42,61 +43,33 @@ class PbxSettings():
     provision_str = 'provision'
     setting_string_types = ['text', 'code', 'name', 'var', 'dir']
 
+    def __init__(self):
+        self.resolver = SettingsResolver()
+
+    def scope_dict(self, s_dict, scope, ident, category, value_type=None):
+        for cat, subcat, vtype, value in self.resolver.rows(scope, ident, category):
+            if value_type and not vtype == value_type:
+                continue
+            s_dict[subcat] = value
+        return s_dict
+
     def default_brand_settings(self):
-        branding = {}
-        dsl = DefaultSetting.objects.filter(
-                category='brand',
-                value_type=self.text_str,
-                enabled=self.true_str).order_by(self.sequence_str)
-        for ds in dsl:
-            branding[ds.subcategory] = ds.value
-        return branding
+        return self.scope_dict({}, 'default', None, 'brand', self.text_str)
 
     def domain_brand_settings(self, bs_dict, domain):
-        dsl = DomainSetting.objects.filter(
-                domain_id=domain,
-                category='brand',
-                value_type=self.text_str,
-                enabled=self.true_str).order_by(self.sequence_str)
-        for ds in dsl:
-            bs_dict[ds.subcategory] = ds.value
-        return bs_dict
+        return self.scope_dict(bs_dict, 'domain', domain, 'brand', self.text_str)
 
     def default_email_settings(self):
-        email_cfg = {}
-        dsl = DefaultSetting.objects.filter(
-                category='email',
-                value_type=self.text_str,
-                enabled=self.true_str).order_by(self.sequence_str)
-        for ds in dsl:
-            email_cfg[ds.subcategory] = ds.value
-        return email_cfg
+        return self.scope_dict({}, 'default', None, 'email', self.text_str)
 
     def default_provision_settings(self, ps_dict):
-        dsl = DefaultSetting.objects.filter(
-                category=self.provision_str,
-                enabled=self.true_str).order_by(self.sequence_str)
-        for ds in dsl:
-            ps_dict[ds.subcategory] = ds.value
-        return ps_dict
+        return self.scope_dict(ps_dict, 'default', None, self.provision_str)
 
     def domain_provision_settings(self, ps_dict, domain):
-        dsl = DomainSetting.objects.filter(
-                domain_id=domain,
-                category=self.provision_str,
-                enabled=self.true_str).order_by(self.sequence_str)
-        for ds in dsl:
-            ps_dict[ds.subcategory] = ds.value
-        return ps_dict
+        return self.scope_dict(ps_dict, 'domain', getattr(domain, 'pk', domain), self.provision_str)
 
     def user_provision_settings(self, ps_dict, user):
-        psl = ProfileSetting.objects.filter(
-                user_id=user,
-                category=self.provision_str,
-                enabled=self.true_str).order_by(self.sequence_str)
-        for ps in psl:
-            ps_dict[ps.subcategory] = ps.value
-        return ps_dict
+        return self.scope_dict(ps_dict, 'user', getattr(user, 'user_uuid', user), self.provision_str)
 
     def feature_sync_vendor_settings(self, user_obj, domain_obj):
         # Tests to see if any vendor synchronisation is enabled
@@ -106,112 +79,66 @@ class PbxSettings():
         any_set_str = '_any_set'
         sync_enabled = ['1', 'Yes']
         fsvs[any_set_str] = False
-        dsl = DefaultSetting.objects.filter(
-                category=self.provision_str,
-                enabled=self.true_str, subcategory__iendswith=feature_key_str).order_by(self.sequence_str)
-        for ds in dsl:
-            vendor_key = ds.subcategory.split('_', 1)[0]
-            if ds.value in sync_enabled:
-                fsvs[vendor_key] = True
-                fsvs[any_set_str] = True
-            else:
-                fsvs[vendor_key] = False
+        scopes = [('default', None)]
         if isinstance(domain_obj, Domain):
-            dsl = DomainSetting.objects.filter(
-                domain_id = domain_obj,
-                category=self.provision_str,
-                enabled=self.true_str, subcategory__iendswith=feature_key_str).order_by(self.sequence_str)
-            for ds in dsl:
-                vendor_key = ds.subcategory.split('_', 1)[0]
-                if ds.value in sync_enabled:
-                    fsvs[vendor_key] = True
-                    fsvs[any_set_str] = True
-                else:
-                    fsvs[vendor_key] = False
-        if isinstance(user_obj, ExtensionUser):
-            dsl = ProfileSetting.objects.filter(
-                user_id = user_obj.user_uuid,
-                category=self.provision_str,
-                enabled=self.true_str, subcategory__iendswith=feature_key_str).order_by(self.sequence_str)
-            for ds in dsl:
-                vendor_key = ds.subcategory.split('_', 1)[0]
-                if ds.value in sync_enabled:
+            scopes.append(('domain', domain_obj.id))
+        if isinstance(user_obj, ExtensionUser) and user_obj.user_uuid_id:
+            scopes.append(('user', user_obj.user_uuid_id))
+        for scope, ident in scopes:
+            for cat, subcat, vtype, value in self.resolver.rows(scope, ident, self.provision_str):
+                if not subcat.lower().endswith(feature_key_str):
+                    continue
+                vendor_key = subcat.split('_', 1)[0]
+                if value in sync_enabled:
                     fsvs[vendor_key] = True
                     fsvs[any_set_str] = True
                 else:
                     fsvs[vendor_key] = False
         return fsvs
 
-    def process_setting_type(self, qs, settingtype):
+    def process_setting_type(self, values, settingtype):
         if settingtype in self.setting_string_types:
-            value = qs[0].value
+            value = values[0]
         elif settingtype == 'numeric':
             try:
-                value = int(qs[0].value)
-            except ValueError:
+                value = int(values[0])
+            except (TypeError, ValueError):
                 value = 0
         elif settingtype == 'boolean':
-            value = (True if qs[0].value == 'true' else False)
+            value = (True if values[0] == 'true' else False)
         elif settingtype == 'array':
-            value = []
-            for q in qs:
-                value.append(qs[0].value)
+            value = list(values)
         return value
 
-    def default_settings_wild(self, cat, subcat, settingtype='text', defaultsetting='', usedefault=False):
-        settingList = DefaultSetting.objects.filter(
-                category=cat,
-                subcategory__istartswith=subcat,
-                value_type=settingtype,
-                enabled=self.true_str).order_by(self.sequence_str)
-        if not qs:
+    def scope_settings(self, scope, ident, cat, subcat, settingtype, defaultsetting, usedefault):
+        values = self.resolver.values(scope, ident, cat, subcat, settingtype)
+        if not values:
             if usedefault:
                 return defaultsetting
             else:
                 return False
-        return self.process_setting_type(qs, settingtype)
+        return self.process_setting_type(values, settingtype)
 
-    def default_settings(self, cat, subcat, settingtype='text', defaultsetting='', usedefault=False):
-        qs = DefaultSetting.objects.filter(
-                category=cat,
-                subcategory=subcat,
-                value_type=settingtype,
-                enabled=self.true_str).order_by(self.sequence_str)
-        if not qs:
+    def default_settings_wild(self, cat, subcat, settingtype='text', defaultsetting='', usedefault=False):
+        values = [
+            value for c, sc, vtype, value in self.resolver.rows('default', None, cat)
+            if vtype == settingtype and sc.lower().startswith(subcat.lower())
+            ]
+        if not values:
             if usedefault:
                 return defaultsetting
             else:
                 return False
-        return self.process_setting_type(qs, settingtype)
+        return self.process_setting_type(values, settingtype)
 
-    def domain_settings(self, uuidstr, cat, subcat, settingtype='text', defaultsetting='', usedefault=False):
-        qs = DomainSetting.objects.filter(
-                domain_id=uuid.UUID(uuidstr),
-                category=cat,
-                subcategory=subcat,
-                value_type=settingtype,
-                enabled=self.true_str).order_by(self.sequence_str)
-        if not qs:
-            if usedefault:
-                return defaultsetting
-            else:
-                return False
-        return self.process_setting_type(qs, settingtype)
+    def default_settings(self, cat, subcat, settingtype='text', defaultsetting='', usedefault=False):
+        return self.scope_settings('default', None, cat, subcat, settingtype, defaultsetting, usedefault)
 
+    def domain_settings(self, uuidstr, cat, subcat, settingtype='text', defaultsetting='', usedefault=False):
+        return self.scope_settings('domain', uuid.UUID(str(uuidstr)), cat, subcat, settingtype, defaultsetting, usedefault)
 
     def user_settings(self, uuidstr, cat, subcat, settingtype='text', defaultsetting='', usedefault=False):
-        qs = ProfileSetting.objects.filter(
-                user_id=uuid.UUID(uuidstr),
-                category=cat,
-                subcategory=subcat,
-                value_type=settingtype,
-                enabled=self.true_str).order_by(self.sequence_str)
-        if not qs:
-            if usedefault:
-                return defaultsetting
-            else:
-                return False
-        return self.process_setting_type(qs, settingtype)
+        return self.scope_settings('user', uuid.UUID(str(uuidstr)), cat, subcat, settingtype, defaultsetting, usedefault)
 
     def settings(
             self, useruuidstr, domainuuidstr, cat, subcat,
@@ -236,6 +163,27 @@ class PbxSettings():
         setg = self.default_settings(cat, subcat, settingtype, defaultsetting, usedefault)
         return setg
 
+    def get_many(self, keys, useruuidstr=None, domainuuidstr=None):
+        # Resolve several settings in one pass with the same user -> domain -> default
+        #  precedence as settings().  keys is an iterable of
+        #  (category, subcategory, settingtype, defaultsetting) tuples, the result is a
+        #  dict keyed by (category, subcategory).  Unset settings return defaultsetting.
+        scopes = []
+        if useruuidstr:
+            scopes.append(('user', uuid.UUID(str(useruuidstr))))
+        if domainuuidstr:
+            scopes.append(('domain', uuid.UUID(str(domainuuidstr))))
+        scopes.append(('default', None))
+        last = len(scopes) - 1
+        result = {}
+        for cat, subcat, settingtype, defaultsetting in keys:
+            for i, (scope, ident) in enumerate(scopes):
+                setg = self.scope_settings(scope, ident, cat, subcat, settingtype, defaultsetting, i == last)
+                if setg:
+                    break
+            result[(cat, subcat)] = setg
+        return result
+
     def get_domains(self):
         qs_dict = [{i.name: str(i.id)} for i in Domain.objects.filter(enabled=self.true_str)]
         if qs_dict is not None:
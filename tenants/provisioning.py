@@ -0,0 +1,265 @@
+#
+#    DjangoPBX
+#
+#    MIT License
+#
+#    Copyright (c) 2016 - 2024 Adrian Fretwell <adrian@djangopbx.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+#
+#    Contributor(s):
+#    Adrian Fretwell <adrian@djangopbx.com>
+#
+
+from functools import reduce
+from operator import or_
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
+from django.utils.crypto import get_random_string
+from .models import Domain, DomainSetting, DefaultSetting
+from .settingsresolver import SettingsResolver
+from portal.models import Menu
+from accounts.models import Extension
+from accounts.accountfunctions import ExtRelatedFunctions
+from voicemail.voicemailfunctions import VoicemailFunctions
+from provision.models import Devices, DeviceVendors, DeviceProfiles
+from dialplans.dialplanfunctions import SwitchDp
+from xmlhandler.xmlhandlerclasses import DirectoryHandler
+from utilities.clearcache import ClearCache
+
+
+def copy_default_settings(domain, defaults, updated_by):
+    # Copies default settings to a domain, skipping any category and subcategory
+    #  the domain already has enabled, with one query and one insert.
+    seen = set(
+        DomainSetting.objects.filter(domain_id=domain, enabled='true').values_list('category', 'subcategory')
+        )
+    new = []
+    for q in defaults:
+        if (q.category, q.subcategory) in seen:
+            continue
+        seen.add((q.category, q.subcategory))
+        new.append(DomainSetting(
+            domain_id=domain,
+            category=q.category,
+            subcategory=q.subcategory,
+            value_type=q.value_type,
+            value=q.value,
+            sequence=q.sequence,
+            enabled='true',
+            description=q.description,
+            updated_by=updated_by
+        ))
+    DomainSetting.objects.bulk_create(new)
+    invalidate_domain_settings(domain.id)
+    return len(new)
+
+
+def invalidate_domain_settings(domain_id):
+    # Cleared after commit, a read before then would cache the old settings again.
+    transaction.on_commit(lambda: SettingsResolver().invalidate('domain', domain_id))
+
+
+class TenantProvisioner():
+    # Builds a tenant from a declarative specification such as:
+    #
+    # {"domain": {"name": "acme.example.com", "description": "Acme Ltd"},
+    #  "settings": {"copy": ["provision", "domain/language"],
+    #               "values": [{"category": "domain", "subcategory": "time_zone",
+    #                           "value_type": "name", "value": "Europe/London"}]},
+    #  "extensions": [{"start": 1000, "count": 200,
+    #                  "fields": {"effective_caller_id_name": "Acme {extension}", "call_group": "sales"},
+    #                  "voicemail": {"enabled": "true", "password": "{extension}",
+    #                                "mail_to": "{extension}@acme.example.com"},
+    #                  "user": true, "device": {"vendor": "yealink", "template": "yealink/t4x"}}]}
+    #
+    # String values may use {extension} and {domain}.  Extension passwords are random
+    #  unless given.  "user": {"password": "extension"} gives users the extension
+    #  password, otherwise they have unusable passwords until reset.  Existing
+    #  extensions, users, devices and settings are left alone so a spec can be
+    #  applied again after it has been extended.
+    #
+    # plan() reports what apply() would create without writing anything.  apply()
+    #  creates everything with bulk inserts in one transaction and then warms the
+    #  directory cache for the new extensions.
+
+    def __init__(self, spec, updated_by='system'):
+        self.spec = spec
+        self.updated_by = updated_by
+        self.domain_name = self.spec.get('domain', {}).get('name')
+        if not self.domain_name:
+            raise ValueError('The spec has no domain name')
+        self.blocks = self.spec.get('extensions', [])
+        for block in self.blocks:
+            count = block.get('count', 1)
+            if not isinstance(block.get('start'), int) or not isinstance(count, int) or count < 1:
+                raise ValueError('Extension blocks need an integer start and a positive count')
+
+    def expand(self, values, extension):
+        return {
+            k: v.format(extension=extension, domain=self.domain_name) if isinstance(v, str) else v
+            for k, v in values.items()
+            }
+
+    def numbers(self):
+        # Extension number to block, the first block naming a number wins.
+        numbers = {}
+        for block in self.blocks:
+            for n in range(block['start'], block['start'] + block.get('count', 1)):
+                numbers.setdefault(str(n), block)
+        return numbers
+
+    def default_settings(self):
+        wanted = []
+        for name in self.spec.get('settings', {}).get('copy', []):
+            category, sep, subcategory = name.partition('/')
+            wanted.append(Q(category=category, subcategory=subcategory) if sep else Q(category=category))
+        if not wanted:
+            return []
+        qs = DefaultSetting.objects.filter(reduce(or_, wanted), enabled='true')
+        return list(qs.order_by('category', 'subcategory', 'sequence'))
+
+    def plan(self):
+        domain = Domain.objects.filter(name=self.domain_name).first()
+        numbers = self.numbers()
+        existing, labels, seen = set(), set(), set()
+        if domain:
+            existing = set(Extension.objects.filter(domain_id=domain).values_list('extension', flat=True))
+            labels = set(Devices.objects.filter(domain_id=domain).values_list('label', flat=True))
+            seen = set(
+                DomainSetting.objects.filter(domain_id=domain, enabled='true').values_list('category', 'subcategory')
+                )
+        new = [n for n in numbers if n not in existing]
+        users = set(
+            User.objects.filter(username__endswith='@%s' % self.domain_name).values_list('username', flat=True)
+            )
+        settings = 0
+        values = [DomainSetting(**v) for v in self.spec.get('settings', {}).get('values', [])]
+        for q in self.default_settings() + values:
+            if (q.category, q.subcategory) not in seen:
+                seen.add((q.category, q.subcategory))
+                settings += 1
+        return {
+            'domain': self.domain_name,
+            'domain_exists': domain is not None,
+            'dialplans': domain is None,
+            'settings': settings,
+            'extensions': len(new),
+            'extensions_existing': len(numbers) - len(new),
+            'voicemail': sum(1 for n in new if numbers[n].get('voicemail', True)),
+            'users': sum(1 for n in new if numbers[n].get('user') and '%s@%s' % (n, self.domain_name) not in users),
+            'devices': sum(1 for n in new if numbers[n].get('device') and n not in labels),
+            }
+
+    def apply(self, warm=True):
+        plan = self.plan()
+        with transaction.atomic():
+            domain = self.create_domain()
+            plan['settings'] = self.create_settings(domain)
+            extensions = self.create_extensions(domain)
+            plan['voicemail'] = plan['users'] = plan['devices'] = 0
+            extrf = ExtRelatedFunctions()
+            for block in self.blocks:
+                members = [e for e, b in extensions if b is block]
+                if not members:
+                    continue
+                vm = block.get('voicemail', True)
+                if vm:
+                    expand = (lambda e, vm=vm: self.expand(vm, e.extension)) if isinstance(vm, dict) else None
+                    plan['voicemail'] += VoicemailFunctions().create_vm_records(members, self.updated_by, expand)
+                user = block.get('user')
+                if user:
+                    hash_passwords = isinstance(user, dict) and user.get('password') == 'extension'
+                    plan['users'] += extrf.create_users(members, self.updated_by, hash_passwords)
+                device = block.get('device')
+                if device:
+                    device = device if isinstance(device, dict) else {}
+                    vendor = None
+                    if device.get('vendor'):
+                        vendor = DeviceVendors.objects.filter(name=device['vendor']).first()
+                    profile = DeviceProfiles.objects.filter(
+                        Q(domain_id=domain) | Q(domain_id__isnull=True), name=device['profile']
+                        ).first() if device.get('profile') else None
+                    plan['devices'] += extrf.create_devices(
+                        members, self.updated_by, vendor, profile, device.get('template')
+                        )
+        plan['warmed'] = self.warm(domain, [e for e, b in extensions]) if warm else 0
+        return plan
+
+    def create_domain(self):
+        domain = Domain.objects.filter(name=self.domain_name).first()
+        if domain:
+            return domain
+        d = self.spec['domain']
+        domain = Domain(
+            name=self.domain_name,
+            menu_id=Menu.objects.filter(name=d.get('menu', 'Default')).first(),
+            portal_name=d.get('portal_name', 'portal-%s' % self.domain_name),
+            description=d.get('description'),
+            enabled='true',
+            updated_by=self.updated_by
+            )
+        if d.get('home_switch'):
+            domain.home_switch = d['home_switch']
+        domain.save()
+        SwitchDp().import_xml(domain.name, False, domain.id)  # Create dialplans
+        return domain
+
+    def create_settings(self, domain):
+        c = copy_default_settings(domain, self.default_settings(), self.updated_by)
+        seen = set(
+            DomainSetting.objects.filter(domain_id=domain, enabled='true').values_list('category', 'subcategory')
+            )
+        new = []
+        for v in self.spec.get('settings', {}).get('values', []):
+            if (v['category'], v['subcategory']) in seen:
+                continue
+            seen.add((v['category'], v['subcategory']))
+            new.append(DomainSetting(domain_id=domain, enabled='true', updated_by=self.updated_by, **v))
+        DomainSetting.objects.bulk_create(new)
+        invalidate_domain_settings(domain.id)
+        return c + len(new)
+
+    def create_extensions(self, domain):
+        existing = set(Extension.objects.filter(domain_id=domain).values_list('extension', flat=True))
+        extensions = []
+        for n, block in self.numbers().items():
+            if n in existing:
+                continue
+            fields = self.expand(block.get('fields', {}), n)
+            fields.setdefault('user_context', domain.name)
+            password = block.get('password')
+            extensions.append((Extension(
+                domain_id=domain,
+                extension=n,
+                password=password.format(extension=n, domain=domain.name) if password else get_random_string(12),
+                updated_by=self.updated_by,
+                **fields
+                ), block))
+        Extension.objects.bulk_create([e for e, b in extensions], batch_size=1000)
+        return extensions
+
+    def warm(self, domain, extensions):
+        cc = ClearCache()
+        cc.directory(domain.name)
+        cc.dialplan(domain.name)
+        dh = DirectoryHandler()
+        dh.GetGroupCall(domain.name)
+        return dh.WarmDirectory(domain.name, extensions)
@@ -30,12 +30,13 @@
 from django.contrib.auth.models import User, Group
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
+from pbx.restpbxhelpers import SparseFieldsMixin
 from .models import (
     Domain, Profile, DefaultSetting, DomainSetting, ProfileSetting
 )
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = User
@@ -43,14 +44,14 @@ class UserSerializer(serializers.ModelSerializer):
         depth = 1
 
 
-class GroupSerializer(serializers.ModelSerializer):
+class GroupSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Group
         fields = ['id', 'url', 'name']
 
 
-class DomainSerializer(serializers.ModelSerializer):
+class DomainSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Domain
@@ -59,7 +60,7 @@ class DomainSerializer(serializers.ModelSerializer):
                     'description', 'created', 'updated', 'synchronised', 'updated_by']
 
 
-class ProfileSerializer(serializers.ModelSerializer):
+class ProfileSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Profile
@@ -70,7 +71,7 @@ class ProfileSerializer(serializers.ModelSerializer):
                 ]
 
 
-class DefaultSettingSerializer(serializers.ModelSerializer):
+class DefaultSettingSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = DefaultSetting
@@ -82,7 +83,7 @@ class DefaultSettingSerializer(serializers.ModelSerializer):
                 ]
 
 
-class DomainSettingSerializer(serializers.ModelSerializer):
+class DomainSettingSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = DomainSetting
@@ -94,7 +95,7 @@ class DomainSettingSerializer(serializers.ModelSerializer):
                 ]
 
 
-class ProfileSettingSerializer(serializers.ModelSerializer):
+class ProfileSettingSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = ProfileSetting
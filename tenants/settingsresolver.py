@@ -0,0 +1,131 @@
+#
+#    DjangoPBX
+#
+#    MIT License
+#
+#    Copyright (c) 2016 - 2024 Adrian Fretwell <adrian@djangopbx.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+#
+#    Contributor(s):
+#    Adrian Fretwell <adrian@djangopbx.com>
+#
+
+import time
+import threading
+from django.core.cache import cache
+from .models import DefaultSetting, DomainSetting, ProfileSetting
+
+
+class SettingsResolver():
+    # Each settings scope (default, one domain or one user) is loaded with a single
+    #  query, held in a per process cache and in memcached, and the user -> domain ->
+    #  default cascade is resolved in memory.  Saving or deleting a setting invalidates
+    #  the affected scope through the signal handlers in tenants/signals.py.
+    true_str = 'true'
+    key_prefix = 'pbxsettings'
+    local_ttl = 10
+    cache_timeout = 3600
+    _local = {}
+    _lock = threading.Lock()
+
+    def scope_key(self, scope, ident=None):
+        if ident is None:
+            return '%s:%s' % (self.key_prefix, scope)
+        return '%s:%s:%s' % (self.key_prefix, scope, str(ident))
+
+    def load_rows(self, scope, ident):
+        if scope == 'default':
+            qs = DefaultSetting.objects.filter(enabled=self.true_str)
+        elif scope == 'domain':
+            qs = DomainSetting.objects.filter(domain_id=ident, enabled=self.true_str)
+        else:
+            qs = ProfileSetting.objects.filter(user_id__user_uuid=ident, enabled=self.true_str)
+        return list(qs.order_by('sequence').values_list('category', 'subcategory', 'value_type', 'value'))
+
+    def build_index(self, rows):
+        index = {}
+        for cat, subcat, vtype, value in rows:
+            index.setdefault((cat, subcat, vtype), []).append(value)
+        return index
+
+    def scope(self, scope, ident=None):
+        key = self.scope_key(scope, ident)
+        now = time.monotonic()
+        entry = self._local.get(key)
+        if entry and entry[0] > now:
+            return entry[1], entry[2]
+        rows = cache.get(key)
+        if rows is None:
+            rows = self.load_rows(scope, ident)
+            cache.set(key, rows, self.cache_timeout)
+        index = self.build_index(rows)
+        with self._lock:
+            self._local[key] = (now + self.local_ttl, rows, index)
+        return rows, index
+
+    def rows(self, scope, ident=None, category=None):
+        rows = self.scope(scope, ident)[0]
+        if category is None:
+            return rows
+        return [r for r in rows if r[0] == category]
+
+    def values(self, scope, ident, cat, subcat, settingtype):
+        return self.scope(scope, ident)[1].get((cat, subcat, settingtype), [])
+
+    def cascade(self, user, domain):
+        scopes = []
+        if user:
+            scopes.append(('user', user))
+        if domain:
+            scopes.append(('domain', domain))
+        scopes.append(('default', None))
+        return scopes
+
+    def get(self, cat, subcat, settingtype='text', user=None, domain=None):
+        for scope, ident in self.cascade(user, domain):
+            vals = self.values(scope, ident, cat, subcat, settingtype)
+            if vals:
+                return vals
+        return []
+
+    def get_many(self, keys, user=None, domain=None):
+        # keys is an iterable of (category, subcategory, value_type) tuples.
+        #  Returns a dict of value lists keyed by the same tuples, missing settings
+        #  are returned as an empty list.
+        indexes = [self.scope(scope, ident)[1] for scope, ident in self.cascade(user, domain)]
+        result = {}
+        for key in keys:
+            result[key] = []
+            for index in indexes:
+                vals = index.get(tuple(key))
+                if vals:
+                    result[key] = vals
+                    break
+        return result
+
+    def invalidate(self, scope, ident=None):
+        key = self.scope_key(scope, ident)
+        with self._lock:
+            self._local.pop(key, None)
+        cache.delete(key)
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
@@ -28,6 +28,7 @@
 #
 
 from .models import Profile, Domain
+from .settingsresolver import SettingsResolver
 from django.contrib.auth.models import Group
 
 def create_or_edit_user_profile(sender, instance, created, **kwargs):
@@ -61,3 +62,17 @@ def create_or_edit_user_profile(sender, instance, created, **kwargs):
         instance.profile.user_enabled = 'false'
 
     instance.profile.save()
+
+
+def invalidate_default_settings(sender, instance, **kwargs):
+    SettingsResolver().invalidate('default')
+
+
+def invalidate_domain_settings(sender, instance, **kwargs):
+    SettingsResolver().invalidate('domain', instance.domain_id_id)
+
+
+def invalidate_user_settings(sender, instance, **kwargs):
+    user_uuid = Profile.objects.filter(pk=instance.user_id_id).values_list('user_uuid', flat=True).first()
+    if user_uuid:
+        SettingsResolver().invalidate('user', user_uuid)
@@ -27,6 +27,136 @@
 #    Adrian Fretwell <adrian@djangopbx.com>
 #
 
-# from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from .models import Domain, DefaultSetting, DomainSetting, ProfileSetting
+from .pbxsettings import PbxSettings
+from .provisioning import copy_default_settings
+from .settingsresolver import SettingsResolver
 
-# Create your tests here.
+
+class CopyDefaultSettingsTestCase(TestCase):
+
+    def setUp(self):
+        self.domain = Domain.objects.create(name='copy.example.com', enabled='true', updated_by='test')
+        DefaultSetting.objects.create(
+            category='domain', subcategory='language', value_type='code', value='en-gb',
+            enabled='true', updated_by='test'
+            )
+        self.sr = SettingsResolver()
+        self.key = self.sr.scope_key('domain', self.domain.id)
+
+    def test_invalidated_after_commit(self):
+        self.assertEqual(self.sr.get('domain', 'language', 'code', domain=self.domain.id), ['en-gb'])
+        self.assertEqual(self.sr.rows('domain', self.domain.id), [])
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.assertEqual(copy_default_settings(self.domain, DefaultSetting.objects.all(), 'test'), 1)
+            self.assertEqual(cache.get(self.key), [])
+        self.assertEqual(len(callbacks), 1)
+        self.assertIsNone(cache.get(self.key))
+        self.assertEqual(self.sr.rows('domain', self.domain.id), [('domain', 'language', 'code', 'en-gb')])
+
+
+class PbxSettingsTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        SettingsResolver().clear_local()
+        self.domain = Domain.objects.create(name='settings.example.com', enabled='true')
+        self.user = User.objects.create_user('settings@settings.example.com', 'u@settings.example.com', 'x')
+        self.profile = self.user.profile
+        for subcat, value in (('language', 'en-us'), ('time_zone', 'UTC'), ('theme', 'default')):
+            DefaultSetting.objects.create(category='domain', subcategory=subcat, value_type='code', value=value)
+        self.domain_tz = DomainSetting.objects.create(
+            domain_id=self.domain, category='domain', subcategory='time_zone', value_type='code', value='Europe/London'
+            )
+        DomainSetting.objects.create(
+            domain_id=self.domain, category='domain', subcategory='language', value_type='code', value='en-gb'
+            )
+        self.user_tz = ProfileSetting.objects.create(
+            user_id=self.profile, category='domain', subcategory='time_zone', value_type='code', value='Europe/Paris'
+            )
+        self.pbxs = PbxSettings()
+
+    def setting(self, subcat, **kwargs):
+        return self.pbxs.settings(self.profile.user_uuid, self.domain.id, 'domain', subcat, 'code', **kwargs)
+
+    def test_cascade(self):
+        self.assertEqual(self.setting('time_zone'), 'Europe/Paris')
+        self.assertEqual(self.setting('language'), 'en-gb')
+        self.assertEqual(self.setting('theme'), 'default')
+        self.assertFalse(self.setting('missing'))
+        self.assertEqual(self.setting('missing', defaultsetting='x', usedefault=True), 'x')
+        self.assertEqual(self.pbxs.dd_settings(self.domain.id, 'domain', 'time_zone', 'code'), 'Europe/London')
+        self.assertEqual(self.pbxs.default_settings('domain', 'time_zone', 'code'), 'UTC')
+        # Settings of another value type are not matched.
+        self.assertFalse(self.pbxs.default_settings('domain', 'time_zone', 'text'))
+
+    def test_cached_after_first_lookup(self):
+        # theme falls through to the default scope, loading all three scopes.
+        self.setting('theme')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.setting('time_zone'), 'Europe/Paris')
+            self.assertEqual(self.setting('theme'), 'default')
+        SettingsResolver().clear_local()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.setting('language'), 'en-gb')
+
+    def test_signal_invalidation(self):
+        self.assertEqual(self.setting('time_zone'), 'Europe/Paris')
+        self.user_tz.delete()
+        self.assertEqual(self.setting('time_zone'), 'Europe/London')
+        self.domain_tz.enabled = 'false'
+        self.domain_tz.save()
+        self.assertEqual(self.setting('time_zone'), 'UTC')
+        d = DefaultSetting.objects.get(subcategory='time_zone')
+        d.value = 'America/New_York'
+        d.save()
+        self.assertIsNone(cache.get(SettingsResolver().scope_key('default')))
+        self.assertEqual(self.setting('time_zone'), 'America/New_York')
+
+    def test_numeric_boolean_and_array(self):
+        for seq, value in ((30, 'c'), (10, 'a'), (20, 'b')):
+            DefaultSetting.objects.create(
+                category='test', subcategory='list', value_type='array', value=value, sequence=seq
+                )
+        DefaultSetting.objects.create(category='test', subcategory='count', value_type='numeric', value='12')
+        DefaultSetting.objects.create(category='test', subcategory='bad', value_type='numeric', value='x')
+        DefaultSetting.objects.create(category='test', subcategory='flag', value_type='boolean', value='true')
+        DomainSetting.objects.create(
+            domain_id=self.domain, category='test', subcategory='list', value_type='array', value='domain'
+            )
+        self.assertEqual(self.pbxs.default_settings('test', 'list', 'array'), ['a', 'b', 'c'])
+        self.assertEqual(self.pbxs.dd_settings(self.domain.id, 'test', 'list', 'array'), ['domain'])
+        self.assertEqual(self.pbxs.default_settings('test', 'count', 'numeric'), 12)
+        self.assertEqual(self.pbxs.default_settings('test', 'bad', 'numeric'), 0)
+        self.assertIs(self.pbxs.default_settings('test', 'flag', 'boolean'), True)
+
+    def test_get_many(self):
+        keys = [
+            ('domain', 'time_zone', 'code', 'none'), ('domain', 'language', 'code', 'none'),
+            ('domain', 'theme', 'code', 'none'), ('domain', 'missing', 'code', 'none'),
+            ]
+        result = self.pbxs.get_many(keys, self.profile.user_uuid, self.domain.id)
+        self.assertEqual(result, {
+            ('domain', 'time_zone'): 'Europe/Paris', ('domain', 'language'): 'en-gb',
+            ('domain', 'theme'): 'default', ('domain', 'missing'): 'none',
+            })
+        for cat, subcat, vtype, default in keys:
+            self.assertEqual(
+                result[(cat, subcat)],
+                self.setting(subcat, defaultsetting=default, usedefault=True)
+                )
+        self.assertEqual(self.pbxs.get_many(keys[:1], domainuuidstr=self.domain.id), {
+            ('domain', 'time_zone'): 'Europe/London'
+            })
+        self.assertEqual(self.pbxs.get_many(keys[:1]), {('domain', 'time_zone'): 'UTC'})
+
+    def test_default_settings_wild(self):
+        DefaultSetting.objects.create(category='provision', subcategory='Yealink_Key_1', value_type='text', value='1')
+        DefaultSetting.objects.create(category='provision', subcategory='yealink_key_2', value_type='text', value='2')
+        DefaultSetting.objects.create(category='provision', subcategory='polycom_key_1', value_type='text', value='3')
+        self.assertEqual(self.pbxs.default_settings_wild('provision', 'yealink_key', 'text'), '1')
+        self.assertEqual(self.pbxs.default_settings_wild('provision', 'YEALINK', 'array'), False)
+        self.assertEqual(self.pbxs.default_settings_wild('provision', 'cisco', 'text', 'none', True), 'none')
@@ -88,7 +88,7 @@ class ClearCache():
             'configuration:sofia.conf',
             'configuration:local_stream.conf',
             'configuration:translate.conf',
-            'configuration:callcentre.conf'
+            'configuration:callcentre.conf',
             'configuration:conference.conf'
         ]
         cache.delete_many(del_list)
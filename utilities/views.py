@@ -134,6 +134,6 @@ class TestEmailView(View):
             body    = form.cleaned_data['email_body']    # noqa: E221
 
             m = PbxTemplateMessage()
-            out = m.Send(to, subject, body, 'Text')
+            out = m.Send(to, subject, body, 'Text', use_queue=False)
         return render(request, self.template_name, {'form': form, 'refresher': 'testemail', 'result': out})
 
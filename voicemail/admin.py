@@ -29,6 +29,7 @@
 
 from django.contrib import admin
 from django.conf import settings
+from django.utils import timezone
 from django.forms import ModelForm
 from django.forms.widgets import TextInput, NumberInput, Select
 from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
@@ -40,7 +41,7 @@ from pbx.commonwidgets import PlayerAdminFileFieldWidget, ListTextWidget
 from .filters import VoicemailDomainFilter
 from .models import (
     Voicemail, VoicemailGreeting, VoicemailOptions, VoicemailMessages,
-    VoicemailDestinations
+    VoicemailDestinations, VoicemailJob, VmJobStatusChoice
 )
 from.voicemailfunctions import VoicemailFunctions
 
@@ -214,6 +215,11 @@ class VoicemailAdmin(ImportExportModelAdmin):
         instances = formset.save(commit=False)
         for obj in formset.deleted_objects:
             if type(obj) is VoicemailGreeting or type(obj) is VoicemailMessages:
+                # Forwarded messages share the stored file of the original.
+                if type(obj) is VoicemailMessages and VoicemailMessages.objects.filter(
+                        filename=obj.filename.name).exclude(pk=obj.pk).exists():
+                    obj.delete()
+                    continue
                 if not settings.PBX_FREESWITCH_LOCAL:
                     fal.delete('/home/django-pbx/media/%s' % obj.filename.name, request.session['home_switch'])
                 obj.filename.delete(save=False)
@@ -247,4 +253,30 @@ class VoicemailAdmin(ImportExportModelAdmin):
         return super(VoicemailAdmin, self).changelist_view(request, extra_context)
 
 
+@admin.action(permissions=['change'], description='Retry selected voicemail jobs')
+def retry_voicemail_jobs(modeladmin, request, queryset):
+    queryset.exclude(status=VmJobStatusChoice.CDONE).update(
+        status=VmJobStatusChoice.CQUEUED, attempts=0, next_attempt=timezone.now()
+        )
+
+
+class VoicemailJobAdmin(admin.ModelAdmin):
+    readonly_fields = ['message_id', 'language', 'attempts', 'next_attempt', 'last_error', 'created', 'updated', 'updated_by']
+    fieldsets = [
+        (None,  {'fields': ['message_id', 'language', 'status', 'attempts', 'next_attempt', 'last_error']}),
+        ('update Info.',   {'fields': ['created', 'updated', 'updated_by'], 'classes': ['collapse']}),
+    ]
+    list_display = ('message_id', 'status', 'attempts', 'next_attempt', 'created')
+    list_filter = ('status', )
+    ordering = [
+        '-created'
+    ]
+
+    actions = [retry_voicemail_jobs]
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 admin.site.register(Voicemail, VoicemailAdmin)
+admin.site.register(VoicemailJob, VoicemailJobAdmin)
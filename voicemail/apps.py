@@ -28,6 +28,7 @@
 #
 
 from django.apps import AppConfig
+from django.db.models.signals import post_save, post_delete
 from django.utils.translation import gettext_lazy as _
 
 
@@ -40,3 +41,15 @@ class VoicemailConfig(AppConfig):
     pbx_subcategory = ''
     pbx_version = '1.0'
     pbx_license = 'MIT License'
+
+    def ready(self):
+        from . import signals
+        from .models import VoicemailMessages
+        post_save.connect(
+            signals.message_saved,
+            sender=VoicemailMessages, weak=False, dispatch_uid="voicemail:VoicemailMessages:save"
+            )
+        post_delete.connect(
+            signals.message_deleted,
+            sender=VoicemailMessages, weak=False, dispatch_uid="voicemail:VoicemailMessages:delete"
+            )
@@ -0,0 +1,35 @@
+# Generated by Django 5.0.1 on 2026-10-19 11:55
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voicemail', '0006_alter_voicemailmessages_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VoicemailJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, verbose_name='Voicemail Job')),
+                ('language', models.CharField(default='en-us', max_length=16, verbose_name='Language')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('processing', 'Processing'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='queued', max_length=16, verbose_name='Status')),
+                ('attempts', models.IntegerField(default=0, verbose_name='Attempts')),
+                ('next_attempt', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Next Attempt')),
+                ('last_error', models.CharField(blank=True, max_length=254, null=True, verbose_name='Last Error')),
+                ('created', models.DateTimeField(auto_now_add=True, null=True, verbose_name='Created')),
+                ('updated', models.DateTimeField(auto_now=True, null=True, verbose_name='Updated')),
+                ('updated_by', models.CharField(default='system', max_length=64, verbose_name='Updated by')),
+                ('message_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='voicemail.voicemailmessages', verbose_name='Message')),
+            ],
+            options={
+                'verbose_name_plural': 'Voicemail Jobs',
+                'db_table': 'pbx_voicemail_jobs',
+            },
+        ),
+    ]
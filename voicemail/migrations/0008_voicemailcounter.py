@@ -0,0 +1,43 @@
+# Generated by Django 5.0.1 on 2026-10-19 11:56
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def populate_counters(apps, schema_editor):
+    Voicemail = apps.get_model("voicemail", "Voicemail")
+    VoicemailCounter = apps.get_model("voicemail", "VoicemailCounter")
+    qs = Voicemail.objects.annotate(
+        new_count=Count('voicemailmessages', filter=Q(voicemailmessages__status='new')),
+        saved_count=Count('voicemailmessages', filter=Q(voicemailmessages__status='saved'))
+        )
+    VoicemailCounter.objects.bulk_create([
+        VoicemailCounter(voicemail_id=q, new_count=q.new_count, saved_count=q.saved_count) for q in qs
+        ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voicemail', '0007_voicemailjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VoicemailCounter',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, verbose_name='Voicemail Counter')),
+                ('new_count', models.IntegerField(default=0, verbose_name='New')),
+                ('saved_count', models.IntegerField(default=0, verbose_name='Saved')),
+                ('updated', models.DateTimeField(auto_now=True, null=True, verbose_name='Updated')),
+                ('voicemail_id', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='voicemail.voicemail', verbose_name='Voicemail')),
+            ],
+            options={
+                'verbose_name_plural': 'Voicemail Counters',
+                'db_table': 'pbx_voicemail_counters',
+            },
+        ),
+        migrations.RunPython(populate_counters, reverse_code=migrations.RunPython.noop),
+    ]
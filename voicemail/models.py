@@ -32,6 +32,7 @@ from django.conf import settings
 from django.core.files.storage import storages
 from django.utils.translation import gettext_lazy as _
 from django.db import models
+from django.utils import timezone
 from django.core.validators import MinValueValidator
 from pbx.commonwidgets import PbxFileField
 from pbx.commonchoices import EnabledTrueFalseChoice
@@ -57,6 +58,13 @@ class VmAttachFileChoice(models.TextChoices):
     CLINK  = 'link',  _('Download link')         # noqa: E221
 
 
+class VmJobStatusChoice(models.TextChoices):
+    CQUEUED     = 'queued',     _('Queued')      # noqa: E221
+    CPROCESSING = 'processing', _('Processing')  # noqa: E221
+    CDONE       = 'done',       _('Done')        # noqa: E221
+    CFAILED     = 'failed',     _('Failed')      # noqa: E221
+
+
 class Voicemail(models.Model):
     id                    = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False, verbose_name=_('Voicemail'))                                                      # noqa: E501, E221
     extension_id          = models.ForeignKey('accounts.Extension', related_name='voicemail', on_delete=models.CASCADE, blank=True, null=True, verbose_name=_('Extension'))          # noqa: E501, E221
@@ -131,6 +139,13 @@ class VoicemailMessages(models.Model):
             ("can_play_message", "can_play_message")
             )
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored status so that signals can adjust the mailbox counters.
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+
     def __str__(self):
         return self.name
 
@@ -166,3 +181,38 @@ class VoicemailDestinations(models.Model):
     class Meta:
         verbose_name_plural = 'Voicemail Destinations'
         db_table = 'pbx_voicemail_destinations'
+
+
+class VoicemailJob(models.Model):
+    id           = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False, verbose_name=_('Voicemail Job'))                                           # noqa: E501, E221
+    message_id   = models.ForeignKey('VoicemailMessages', on_delete=models.CASCADE, verbose_name=_('Message'))                                                     # noqa: E501, E221
+    language     = models.CharField(max_length=16, default='en-us', verbose_name=_('Language'))                                                                    # noqa: E501, E221
+    status       = models.CharField(max_length=16, choices=VmJobStatusChoice.choices, default=VmJobStatusChoice.CQUEUED, db_index=True, verbose_name=_('Status'))  # noqa: E501, E221
+    attempts     = models.IntegerField(default=0, verbose_name=_('Attempts'))                                                                                      # noqa: E501, E221
+    next_attempt = models.DateTimeField(default=timezone.now, db_index=True, verbose_name=_('Next Attempt'))                                                          # noqa: E501, E221
+    last_error   = models.CharField(max_length=254, blank=True, null=True, verbose_name=_('Last Error'))                                                            # noqa: E501, E221
+    created      = models.DateTimeField(auto_now_add=True, blank=True, null=True, verbose_name=_('Created'))                                                       # noqa: E501, E221
+    updated      = models.DateTimeField(auto_now=True, blank=True, null=True, verbose_name=_('Updated'))                                                           # noqa: E501, E221
+    updated_by   = models.CharField(max_length=64, default='system', verbose_name=_('Updated by'))                                                                 # noqa: E501, E221
+
+    class Meta:
+        verbose_name_plural = 'Voicemail Jobs'
+        db_table = 'pbx_voicemail_jobs'
+
+    def __str__(self):
+        return str(self.message_id)
+
+
+class VoicemailCounter(models.Model):
+    id           = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False, verbose_name=_('Voicemail Counter'))  # noqa: E501, E221
+    voicemail_id = models.OneToOneField('Voicemail', on_delete=models.CASCADE, verbose_name=_('Voicemail'))                     # noqa: E501, E221
+    new_count    = models.IntegerField(default=0, verbose_name=_('New'))                                                        # noqa: E501, E221
+    saved_count  = models.IntegerField(default=0, verbose_name=_('Saved'))                                                      # noqa: E501, E221
+    updated      = models.DateTimeField(auto_now=True, blank=True, null=True, verbose_name=_('Updated'))                        # noqa: E501, E221
+
+    class Meta:
+        verbose_name_plural = 'Voicemail Counters'
+        db_table = 'pbx_voicemail_counters'
+
+    def __str__(self):
+        return str(self.voicemail_id)
@@ -28,13 +28,14 @@
 #
 
 from rest_framework import serializers
+from pbx.restpbxhelpers import SparseFieldsMixin
 from .models import (
     Voicemail, VoicemailGreeting, VoicemailMessages, VoicemailOptions,
     VoicemailDestinations
 )
 
 
-class VoicemailSerializer(serializers.ModelSerializer):
+class VoicemailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Voicemail
@@ -46,7 +47,7 @@ class VoicemailSerializer(serializers.ModelSerializer):
                 ]
 
 
-class VoicemailGreetingSerializer(serializers.ModelSerializer):
+class VoicemailGreetingSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = VoicemailGreeting
@@ -57,7 +58,7 @@ class VoicemailGreetingSerializer(serializers.ModelSerializer):
                 ]
 
 
-class VoicemailMessagesSerializer(serializers.ModelSerializer):
+class VoicemailMessagesSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = VoicemailMessages
@@ -70,7 +71,7 @@ class VoicemailMessagesSerializer(serializers.ModelSerializer):
                 ]
 
 
-class VoicemailOptionsSerializer(serializers.ModelSerializer):
+class VoicemailOptionsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = VoicemailOptions
@@ -82,7 +83,7 @@ class VoicemailOptionsSerializer(serializers.ModelSerializer):
                 ]
 
 
-class VoicemailDestinationsSerializer(serializers.ModelSerializer):
+class VoicemailDestinationsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = VoicemailDestinations
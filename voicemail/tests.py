@@ -27,6 +27,301 @@
 #    Adrian Fretwell <adrian@djangopbx.com>
 #
 
-# from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from tenants.models import Domain
+from accounts.models import Extension
+from pbx.fscmdabslayer import FsCmdAbsLayer
+from pbx.commonevents import MwiCoalescer
+from .models import Voicemail, VoicemailCounter, VoicemailGreeting, VoicemailMessages
+from .vmcounters import VoicemailCounters
+from .voicemailfunctions import VoicemailFunctions
 
-# Create your tests here.
+
+class LocalCommand():
+    # Stands in for SFTPConnection.command(), runs the listing on this host.
+    def command(self, host, cmd):
+        out = subprocess.run(cmd, shell=True, stdout=subprocess.PIPE).stdout
+        return (None, io.BytesIO(out), None)
+
+
+class SyncGreetingsTestCase(TestCase):
+    mailboxes = 5000
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        cache.clear()
+        self.domain = Domain.objects.create(name='greetings.test', enabled='true', home_switch='fs1')
+        exts = Extension.objects.bulk_create([
+            Extension(domain_id=self.domain, extension=str(10000 + i), password='x', updated_by='test')
+            for i in range(self.mailboxes)
+            ])
+        Voicemail.objects.bulk_create([Voicemail(extension_id=e, updated_by='test') for e in exts])
+        self.base = os.path.join(self.media_root, VoicemailFunctions.voicemail_path, self.domain.name)
+        for i in range(self.mailboxes):
+            path = os.path.join(self.base, str(10000 + i))
+            os.makedirs(path)
+            for g in (1, 2):
+                self.write(path, 'greeting_%s.wav' % g)
+            if i % 10 == 0:
+                self.write(path, 'msg_1.wav')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def write(self, path, name):
+        with open(os.path.join(path, name), 'wb') as fh:
+            fh.write(b'x')
+
+    def sync(self, sftp=None):
+        vf = VoicemailFunctions()
+        vf.sftp = sftp
+        with CaptureQueriesContext(connection) as ctx:
+            stats = vf.sync_greetings(self.domain.id)
+        stats['queries'] = len(ctx.captured_queries)
+        return stats
+
+    @override_settings(PBX_FREESWITCH_LOCAL=True)
+    def test_sync_local(self):
+        stats = self.sync()
+        self.assertEqual(stats['files'], self.mailboxes * 2 + self.mailboxes // 10)
+        self.assertEqual(stats['added'], self.mailboxes * 2)
+        self.assertEqual(stats['round_trips'], 0)
+        # Bulk inserts only, the query count must not follow the number of mailboxes.
+        self.assertLess(stats['queries'], self.mailboxes // 20, stats)
+
+        stats = self.sync()
+        self.assertTrue(stats['unchanged'])
+        self.assertEqual(stats['queries'], 2, stats)
+
+        for i in range(0, self.mailboxes, 100):
+            os.remove(os.path.join(self.base, str(10000 + i), 'greeting_2.wav'))
+        for i in range(0, self.mailboxes, 250):
+            self.write(os.path.join(self.base, str(10000 + i)), 'greeting_3.wav')
+        stats = self.sync()
+        self.assertEqual(stats['removed'], self.mailboxes // 100)
+        self.assertEqual(stats['added'], self.mailboxes // 250)
+        self.assertLess(stats['queries'], self.mailboxes // 20, stats)
+        self.assertEqual(
+            VoicemailGreeting.objects.count(),
+            self.mailboxes * 2 - self.mailboxes // 100 + self.mailboxes // 250
+            )
+
+    @override_settings(PBX_FREESWITCH_LOCAL=False)
+    def test_sync_remote(self):
+        stats = self.sync(LocalCommand())
+        self.assertEqual(stats['round_trips'], 1)
+        self.assertEqual(stats['added'], self.mailboxes * 2)
+        self.assertLess(stats['queries'], self.mailboxes // 20, stats)
+        stats = self.sync(LocalCommand())
+        self.assertEqual(stats['round_trips'], 1)
+        self.assertTrue(stats['unchanged'])
+
+
+class FakeEventSocketServer():
+    # Minimal FreeSWITCH event socket, answers each api command after delay seconds
+    #  with the command echoed back.  Commands received are kept in received.
+    def __init__(self, delay=0.002):
+        self.delay = delay
+        self.received = []
+        self.server = socket.socket()
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(4)
+        self.address = self.server.getsockname()
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        while True:
+            try:
+                conn, addr = self.server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+
+    def handle(self, conn):
+        with conn:
+            conn.sendall(b'Content-Type: auth/request\n\n')
+            buf = b''
+            while True:
+                try:
+                    data = conn.recv(65536)
+                except OSError:
+                    return
+                if not data:
+                    return
+                buf += data
+                while b'\n\n' in buf:
+                    cmd, buf = buf.split(b'\n\n', 1)
+                    if cmd.startswith(b'auth'):
+                        conn.sendall(b'Content-Type: command/reply\nReply-Text: +OK accepted\n\n')
+                        continue
+                    self.received.append(cmd.decode())
+                    time.sleep(self.delay)
+                    body = b'+OK ' + cmd
+                    conn.sendall(b'Content-Type: api/response\nContent-Length: %d\n\n' % len(body) + body)
+
+    def close(self):
+        self.server.close()
+
+
+class EventSocketPipelineTestCase(SimpleTestCase):
+    commands = 50
+
+    def setUp(self):
+        self.fake = FakeEventSocketServer()
+        self.settings_override = override_settings(
+            PBX_USE_LOCAL_EVENT_SOCKET=True, EVSKT=(self.fake.address[0], self.fake.address[1], 'ClueCon')
+            )
+        self.settings_override.enable()
+        self.cmds = ['api vm_list %s@pipeline.test' % (200 + i) for i in range(self.commands)]
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.fake.close()
+
+    def connect(self):
+        es = FsCmdAbsLayer()
+        self.assertTrue(es.connect())
+        es.clear_responses()
+        return es
+
+    def test_pipelined_matches_serial_and_is_faster(self):
+        es = self.connect()
+        start = time.perf_counter()
+        for cmd in self.cmds:
+            es.send(cmd)
+        serial = time.perf_counter() - start
+        self.assertTrue(es.get_responses())
+        serial_responses = es.responses
+        es.disconnect()
+
+        es = self.connect()
+        start = time.perf_counter()
+        es.send_many(self.cmds)
+        pipelined = time.perf_counter() - start
+        self.assertTrue(es.get_responses())
+        es.disconnect()
+
+        self.assertEqual(es.responses, ['+OK %s' % c for c in self.cmds])
+        self.assertEqual(es.responses, serial_responses)
+        # Serial sends wait out the read timeout for every reply.
+        self.assertLess(pipelined * 2, serial)
+
+
+class FakeBroker():
+    def __init__(self, outputs):
+        self.responses = [json.dumps({'output': o}) for o in outputs]
+
+    def clear_responses(self):
+        self.responses = []
+
+
+@override_settings(PBX_USE_LOCAL_EVENT_SOCKET=True)
+class BrokerResponsesTestCase(SimpleTestCase):
+
+    def layer(self, outputs):
+        es = FsCmdAbsLayer()
+        es.loc_ev_skt = False
+        es.freeswitches = ['fs1', 'fs2']
+        es.responses = []
+        es.broker = FakeBroker(outputs)
+        return es
+
+    def test_no_reply_is_a_failure(self):
+        self.assertFalse(self.layer([]).get_responses())
+
+    def test_all_errors_is_a_failure(self):
+        self.assertFalse(self.layer(['-ERR no such gateway', '-ERR no such gateway']).get_responses())
+
+    def test_one_good_reply_is_success(self):
+        self.assertTrue(self.layer(['-ERR no such gateway', '+OK']).get_responses())
+        self.assertTrue(self.layer(['+OK']).get_responses())
+
+
+class VoicemailCountersLoadTestCase(TestCase):
+    mailboxes = 500
+    deposits = 10000
+    switches = ('fs1', 'fs2')
+
+    def setUp(self):
+        self.fake = FakeEventSocketServer(delay=0)
+        self.settings_override = override_settings(
+            PBX_USE_LOCAL_EVENT_SOCKET=True, EVSKT=(self.fake.address[0], self.fake.address[1], 'ClueCon')
+            )
+        self.settings_override.enable()
+        self.domain = Domain.objects.create(name='counters.test', enabled='true')
+        exts = Extension.objects.bulk_create([
+            Extension(domain_id=self.domain, extension=str(3000 + i), password='x', updated_by='test')
+            for i in range(self.mailboxes)
+            ])
+        self.vms = Voicemail.objects.bulk_create([Voicemail(extension_id=e, updated_by='test') for e in exts])
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.fake.close()
+
+    def stored(self):
+        return {
+            vm_id: (new_count, saved_count) for vm_id, new_count, saved_count in
+            VoicemailCounter.objects.values_list('voicemail_id_id', 'new_count', 'saved_count')
+            }
+
+    def assertCountersExact(self):
+        stored = self.stored()
+        actual = VoicemailCounters().actual()
+        self.assertEqual(set(stored) - set(actual), set())
+        self.assertEqual({vm_id: stored.get(vm_id, (0, 0)) for vm_id in actual}, actual)
+
+    def test_counters_stay_exact(self):
+        mwi = MwiCoalescer(window=60, chunk_size=self.mailboxes)
+        for i in range(self.deposits):
+            vm = self.vms[i % self.mailboxes]
+            VoicemailMessages.objects.create(
+                voicemail_id=vm, filename='msg_%s.wav' % i, name='msg_%s' % i, updated_by='test'
+                )
+            host = self.switches[i % len(self.switches)]
+            mwi.add(vm.extension_id.extension, self.domain.name, i // self.mailboxes + 1, 0, host)
+        self.assertCountersExact()
+        self.assertFalse(mwi.due())
+        self.assertEqual(mwi.flush(), len(self.switches))
+        batches = [c for c in self.fake.received if 'mwi_batch.lua' in c]
+        self.assertEqual(len(batches), len(self.switches))
+        self.assertEqual(sum(len(c.split()) - 3 for c in batches), self.mailboxes)
+        self.assertIn('3000@counters.test:%s:0' % (self.deposits // self.mailboxes), batches[0])
+
+        # Re-status, new -> saved -> deleted -> new, and back to the same status.
+        for n, m in enumerate(VoicemailMessages.objects.order_by('name')[:3000]):
+            m.status = ('saved', 'deleted', 'new', 'saved')[n % 4]
+            m.save()
+            if n % 7 == 0:
+                m.status = 'new' if m.status == 'saved' else 'saved'
+                m.save()
+                m.save()
+        self.assertCountersExact()
+
+        # Single deletes, a queryset delete and mailboxes deleted with their messages.
+        for m in VoicemailMessages.objects.order_by('-name')[:500]:
+            m.delete()
+        VoicemailMessages.objects.filter(voicemail_id__in=self.vms[:100], status='saved').delete()
+        Voicemail.objects.filter(pk__in=[vm.id for vm in self.vms[100:150]]).delete()
+        Extension.objects.filter(voicemail__in=self.vms[150:175]).delete()
+        self.assertCountersExact()
+        self.assertEqual(Voicemail.objects.count(), self.mailboxes - 75)
+        self.assertEqual(VoicemailCounter.objects.count(), self.mailboxes - 75)
+        vc = VoicemailCounters()
+        vc.recompute()
+        self.assertEqual(vc.corrected, 0)
@@ -28,6 +28,7 @@
 #
 
 import os
+import math
 from time import sleep
 from datetime import datetime
 from django.conf import settings
@@ -35,7 +36,6 @@ from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
-from django.http import FileResponse
 from rest_framework import viewsets
 from rest_framework import permissions
 from rest_framework.decorators import action
@@ -45,6 +45,7 @@ from pbx.fscmdabslayer import FsCmdAbsLayer
 from pbx.commonfunctions import audio_type
 from pbx.commonevents import MessageWaiting
 from pbx.restpbxhelpers import PassthroughRenderer
+from pbx.mediaserver import MediaServer
 from accounts.accountfunctions import AccountFunctions
 
 from pbx.restpermissions import (
@@ -59,6 +60,8 @@ from .serializers import (
     VoicemailOptionsSerializer, VoicemailDestinationsSerializer
 )
 
+VM_LIST_PAGE_SIZE = 100
+
 
 class VoicemailViewSet(viewsets.ModelViewSet):
     """
@@ -148,9 +151,7 @@ class VoicemailMessagesViewSet(viewsets.ModelViewSet):
     @action(methods=['get'], detail=True, renderer_classes=(PassthroughRenderer,))
     def download(self, request, pk=None):
         obj = self.get_object()
-        fh = obj.filename.open()
-        response = FileResponse(fh)
-        return response
+        return MediaServer().serve_field(request, obj.filename)
 
 
 class VoicemailOptionsViewSet(viewsets.ModelViewSet):
@@ -213,6 +214,11 @@ def listvoicemails(request, vmuuid=None, vmext=None, action=None):
         extension_list = AccountFunctions().list_superuser_extensions(request.session['domain_uuid'])
     th = [_('Extension'), _('Date Time'), _('From'), _('Duration'), _('Message'), _('Action')]
     info = {}
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    start = (page - 1) * VM_LIST_PAGE_SIZE
     if settings.PBX_USE_MOD_VOICEMAIL:
         es = FsCmdAbsLayer()
         if not es.connect():
@@ -224,30 +230,25 @@ def listvoicemails(request, vmuuid=None, vmext=None, action=None):
             es.process_events(0.25)
             es.get_responses()
             sleep(1)
-        for e in extension_list:
-            es.clear_responses()
-            es.send('api vm_list %s@%s' % (e, request.session['domain_name']))
-            es.process_events(2)
-            es.get_responses()
-            valid_resp_list = [x for x in es.responses if not '-ERR no reply' in x]
-            vmstr = '\n'.join(valid_resp_list)
-            if not len(vmstr) < 1:
-                # '1670780459:0:201:test1.djangopbx.com:inbox:/var/lib/freeswitch/storage/voicemail/default/test1.djangopbx.com/201/msg_2740d2b1-de55-4425-b71e-4215647642ea.wav:68d2c984-78da-4d13-a48e-2e800fc7506f:Test1:202:7'  # noqa: E501
-                vmlist = vmstr.split('\n')
-                for vm in vmlist:
-                    if ':' not in vm:
-                        continue
-                    v = vm.split(':')
-                    filename = os.path.basename(v[5])
-                    file_ext = os.path.splitext(filename)[1]
-                    atype = audio_type(file_ext)
-                    try:
-                        i = int(v[0])
-                    except ValueError:
-                        i = 0
-                    date_time = datetime.fromtimestamp(i)
-                    append_vm_info(info, request.session['domain_name'], v[6], v[2], v[8], v[9], e, filename, atype, date_time)
+        # All vm_list commands are sent together over the one connection
+        es.clear_responses()
+        es.send_many(['api vm_list %s@%s' % (e, request.session['domain_name']) for e in extension_list])
+        es.get_responses()
         es.disconnect()
+        valid_resp_list = [x for x in es.responses if x and not '-ERR no reply' in x]
+        # '1670780459:0:201:test1.djangopbx.com:inbox:/var/lib/freeswitch/storage/voicemail/default/test1.djangopbx.com/201/msg_2740d2b1-de55-4425-b71e-4215647642ea.wav:68d2c984-78da-4d13-a48e-2e800fc7506f:Test1:202:7'  # noqa: E501
+        vmlist = [v.split(':') for v in '\n'.join(valid_resp_list).split('\n') if ':' in v]
+        count = len(vmlist)
+        for v in vmlist[start:start + VM_LIST_PAGE_SIZE]:
+            filename = os.path.basename(v[5])
+            file_ext = os.path.splitext(filename)[1]
+            atype = audio_type(file_ext)
+            try:
+                i = int(v[0])
+            except ValueError:
+                i = 0
+            date_time = datetime.fromtimestamp(i)
+            append_vm_info(info, request.session['domain_name'], v[6], v[2], v[8], v[9], v[2], filename, atype, date_time)
     else:
         vm = None
         if action:
@@ -268,19 +269,30 @@ def listvoicemails(request, vmuuid=None, vmext=None, action=None):
                 mwi.send(vm.voicemail_id.extension_id, vm.voicemail_id.extension_id.domain_id, 0, 0, True)
                 mwi.disconnect()
 
-        vms = Voicemail.objects.filter(enabled='true', extension_id__extension__in=extension_list)
-        for vm in vms:
-            msgs = vm.voicemailmessages_set.filter(status__in=('new', 'saved'))
-            for msg in msgs:
-                try:
-                    file_ext = os.path.splitext(msg.name)[1]
-                except:
-                    file_ext = 'wav'
-                atype = audio_type(file_ext)
-                append_vm_info(info, request.session['domain_name'], str(msg.id),
-                            vm.extension_id.extension, msg.caller_id_number, msg.duration,
-                            vm.extension_id.extension, msg.name, atype, msg.created)
+        msgs = VoicemailMessages.objects.filter(
+            voicemail_id__enabled='true', status__in=('new', 'saved'),
+            voicemail_id__extension_id__domain_id_id=request.session['domain_uuid'],
+            voicemail_id__extension_id__extension__in=extension_list
+            ).select_related('voicemail_id__extension_id').order_by(
+            'voicemail_id__extension_id__extension', 'created')
+        count = msgs.count()
+        for msg in msgs[start:start + VM_LIST_PAGE_SIZE]:
+            try:
+                file_ext = os.path.splitext(msg.name)[1]
+            except:
+                file_ext = 'wav'
+            atype = audio_type(file_ext)
+            extension = msg.voicemail_id.extension_id.extension
+            append_vm_info(info, request.session['domain_name'], str(msg.id),
+                        extension, msg.caller_id_number, msg.duration,
+                        extension, msg.name, atype, msg.created)
+    pages = max(math.ceil(count / VM_LIST_PAGE_SIZE), 1)
     return render(
             request, 'infotablemulti.html',
-            {'refresher': '/voicemail/listvoicemails/', 'th': th, 'info': info, 'title': 'Voicemails'}
+            {
+                'refresher': '/voicemail/listvoicemails/', 'th': th, 'info': info, 'title': 'Voicemails',
+                'page': page, 'pages': pages,
+                'previous_page': page - 1 if page > 1 else None,
+                'next_page': page + 1 if page < pages else None
+            }
             )
@@ -0,0 +1,108 @@
+#
+#    DjangoPBX
+#
+#    MIT License
+#
+#    Copyright (c) 2016 - 2024 Adrian Fretwell <adrian@djangopbx.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+#
+#    Contributor(s):
+#    Adrian Fretwell <adrian@djangopbx.com>
+#
+
+from django.db.models import Count, F, Q
+from .models import Voicemail, VoicemailCounter
+
+
+class VoicemailCounters():
+    # Maintains the per mailbox new and saved message counts in VoicemailCounter
+    #  so that reading them does not need COUNT(*) queries on the messages table.
+    counted = ('new', 'saved')
+
+    def __init__(self):
+        self.corrected = 0
+
+    def adjust(self, voicemail_id, old_status=None, new_status=None, n=1, create=True):
+        if not voicemail_id or old_status == new_status:
+            return
+        changes = {}
+        if old_status in self.counted:
+            changes['%s_count' % old_status] = F('%s_count' % old_status) - n
+        if new_status in self.counted:
+            changes['%s_count' % new_status] = F('%s_count' % new_status) + n
+        if not changes:
+            return
+        if not VoicemailCounter.objects.filter(voicemail_id_id=voicemail_id).update(**changes) and create:
+            self.recompute([voicemail_id])
+
+    def get(self, voicemail_id):
+        counts = VoicemailCounter.objects.filter(voicemail_id_id=voicemail_id).values_list(
+            'new_count', 'saved_count').first()
+        if counts is None:
+            counts = self.recompute([voicemail_id]).get(voicemail_id, (0, 0))
+        return counts
+
+    def get_many(self, voicemail_ids):
+        counts = {
+            vm_id: (new_count, saved_count) for vm_id, new_count, saved_count in
+            VoicemailCounter.objects.filter(voicemail_id_id__in=voicemail_ids).values_list(
+                'voicemail_id_id', 'new_count', 'saved_count')
+            }
+        missing = [vm_id for vm_id in voicemail_ids if vm_id not in counts]
+        if missing:
+            counts.update(self.recompute(missing))
+        return counts
+
+    def actual(self, voicemail_ids=None):
+        # Counts from the messages table, returns {voicemail_id: (new, saved)}
+        qs = Voicemail.objects.all()
+        if voicemail_ids is not None:
+            qs = qs.filter(pk__in=voicemail_ids)
+        qs = qs.annotate(
+            new_count=Count('voicemailmessages', filter=Q(voicemailmessages__status='new')),
+            saved_count=Count('voicemailmessages', filter=Q(voicemailmessages__status='saved'))
+            ).values_list('id', 'new_count', 'saved_count')
+        return {vm_id: (new_count, saved_count) for vm_id, new_count, saved_count in qs}
+
+    def recompute(self, voicemail_ids=None):
+        # Sets counters from the messages table, returns the counts.
+        #  With no voicemail_ids every mailbox is reconciled and only rows that
+        #  differ are written.
+        counts = self.actual(voicemail_ids)
+        stored = {}
+        qs = VoicemailCounter.objects.all()
+        if voicemail_ids is not None:
+            qs = qs.filter(voicemail_id_id__in=voicemail_ids)
+        for c in qs:
+            stored[c.voicemail_id_id] = c
+        create = []
+        update = []
+        for vm_id, (new_count, saved_count) in counts.items():
+            c = stored.get(vm_id)
+            if not c:
+                create.append(VoicemailCounter(voicemail_id_id=vm_id, new_count=new_count, saved_count=saved_count))
+            elif not (c.new_count, c.saved_count) == (new_count, saved_count):
+                c.new_count = new_count
+                c.saved_count = saved_count
+                update.append(c)
+        VoicemailCounter.objects.bulk_create(create, batch_size=1000, ignore_conflicts=True)
+        VoicemailCounter.objects.bulk_update(update, ['new_count', 'saved_count'], batch_size=1000)
+        self.corrected = len(create) + len(update)
+        return counts
@@ -27,14 +27,27 @@
 #
 
 import os
+import shlex
+import hashlib
+import logging
+import smtplib
 from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max
+from tenants.models import Domain
 from pbx.sshconnect import SFTPConnection
+from pbx.pbxsendsmtp import PbxTemplateMessage
 from .models import Voicemail, VoicemailGreeting
+from .vmcounters import VoicemailCounters
+
+logger = logging.getLogger(__name__)
 
 
 class VoicemailFunctions():
     sftp = None
     voicemail_path = 'fs/voicemail/default'
+    manifest_timeout = 86400
 
     def create_vm_record(self, extobj, updated_by):
         try:
@@ -47,61 +60,159 @@ class VoicemailFunctions():
             return None
         return v
 
+    def create_vm_records(self, extensions, updated_by, values=None):
+        # As create_vm_record for a list of extensions in one insert, values is an
+        #  optional function returning further field values for an extension.
+        vms = []
+        for e in extensions:
+            fields = {'enabled': 'false'}
+            if values:
+                fields.update(values(e))
+            vms.append(Voicemail(extension_id=e, updated_by=updated_by, **fields))
+        Voicemail.objects.bulk_create(vms, batch_size=1000)
+        return len(vms)
+
+    def get_message_counts(self, vm):
+        return VoicemailCounters().get(vm.id)
+
+    def message_email(self, vm, msg, language='en-us'):
+        if not vm.mail_to:
+            return False
+        m = PbxTemplateMessage()
+        tp_subject, tp_body, tp_type = m.GetTemplate(vm.extension_id.domain_id_id, language, 'voicemail', 'default')
+        if not tp_subject:
+            return False
+        file_to_attach = None
+        if vm.attach_file == 'link':
+            download_link = '%s/portal/voicemail/%s_%s' % (settings.PBX_SERVER_URL, str(vm.id), str(msg.id))
+            body_message = 'Donwload Link: <a href=\"%s\">%s</a>' % (download_link, download_link)
+        elif vm.attach_file == 'true':
+            file_to_attach = msg.filename
+            body_message = 'Audio file attached'
+        else:
+            body_message = 'Voicemail details only.  No attachmant or download link specified.'
+
+        msg_caller_id_name = msg.caller_id_name if msg.caller_id_name else ''
+        subject = tp_subject.replace('$', '').format(
+                caller_id_name=msg_caller_id_name, caller_id_number=msg.caller_id_number,
+                message_duration=msg.duration)
+        body = tp_body.replace('$', '').format(
+                caller_id_name=msg_caller_id_name, caller_id_number=msg.caller_id_number,
+                voicemail_name_formatted=vm.mail_to, message_date=msg.created,
+                message_duration=msg.duration, message=body_message
+                )
+        try:
+            out = m.Send(vm.mail_to, subject, body, tp_type, file_to_attach)
+        except (smtplib.SMTPException, OSError) as e:
+            logger.warning('Voicemail email to %s failed: %s' % (vm.mail_to, e))
+            return False
+        return out[0]
 
     def init_sftp(self):
         if not self.sftp:
             self.sftp = SFTPConnection()
 
     def sync_greetings(self, domain_uuid):
-        qs = Voicemail.objects.filter(enabled='true', extension_id__domain_id_id=domain_uuid)
-        if qs:
-            q = qs[0]
-            home_switch = q.extension_id.domain_id.home_switch
-            domain_name = q.extension_id.domain_id.name
+        # Brings the VoicemailGreeting table into line with the greeting files on
+        #  disk using one listing of the domain voicemail directory (a single SSH
+        #  round trip for a remote switch) and bulk inserts and deletes.
+        #  A digest of the last listing is kept so an unchanged tree needs no
+        #  further database work.  Returns a dictionary of counts or False if the
+        #  switch could not be reached.
+        self.sync_stats = {'round_trips': 0, 'files': 0, 'added': 0, 'removed': 0, 'unchanged': False}
+        domain = Domain.objects.filter(pk=domain_uuid).values_list('name', 'home_switch').first()
+        if not domain:
+            return self.sync_stats
+        domain_name, home_switch = domain
+        path = os.path.join(settings.MEDIA_ROOT, self.voicemail_path, domain_name)
         if settings.PBX_FREESWITCH_LOCAL:
-            for q in qs:
-                self.sync_greetings_with_local_fs(q, domain_name)
+            manifest = self.greeting_manifest_local(path)
+            updated_by = 'Voicemail Directory Scan'
         else:
-            self.init_sftp()
-            try:
-                 self.sftp.exists(home_switch, settings.MEDIA_ROOT) # Tests if host is reachable, abort otherwise.
-            except:
-                return False
-            for q in qs:
-                self.sync_greetings_with_remote_fs(q, domain_name, home_switch)
-        return True
+            manifest = self.greeting_manifest_remote(home_switch, path)
+            updated_by = 'Voicemail Remote Directory Scan'
+        if manifest is None:
+            return False
+        self.sync_stats['files'] = len(manifest)
+        digest = self.greeting_digest(domain_uuid, manifest)
+        manifest_key = 'voicemail:greetings:manifest:%s' % domain_uuid
+        if cache.get(manifest_key) == digest:
+            self.sync_stats['unchanged'] = True
+            return self.sync_stats
 
-    def sync_greetings_with_local_fs(self, vm, domain_name):
-        grtg = vm.voicemailgreeting_set.all()
-        for q in grtg:
-            if not os.path.exists(os.path.join(settings.MEDIA_ROOT, q.filename.name.lstrip('/'))):
-                q.delete()
-        path = os.path.join(settings.MEDIA_ROOT, self.voicemail_path, domain_name, vm.extension_id.extension)
-        storage_path = os.path.join(self.voicemail_path, domain_name, vm.extension_id.extension)
-        if os.path.exists(path):
-            with os.scandir(path) as it:
-                for f in it:
-                    if f.is_file():
-                        if f.name.startswith('greeting_'):
-                            vmg, created = VoicemailGreeting.objects.get_or_create(
-                                voicemail_id=vm,
-                                filename=os.path.join(storage_path, f.name),
-                                defaults={'name': f.name, 'updated_by': 'Voicemail Directory Scan'}
-                                )
+        vms = {
+            extension: vm_id for vm_id, extension in Voicemail.objects.filter(
+                enabled='true', extension_id__domain_id_id=domain_uuid
+                ).values_list('id', 'extension_id__extension')
+            }
+        storage_path = os.path.join(self.voicemail_path, domain_name)
+        on_disk = {}
+        for rel_path in manifest:
+            extension, name = rel_path.split('/', 1)
+            if extension in vms:
+                on_disk[os.path.join(storage_path, rel_path)] = (vms[extension], name)
+        existing = {
+            filename.lstrip('/'): greeting_id for greeting_id, filename in VoicemailGreeting.objects.filter(
+                voicemail_id__in=vms.values()
+                ).values_list('id', 'filename')
+            }
+        removed = [greeting_id for filename, greeting_id in existing.items() if filename not in on_disk]
+        added = [
+            VoicemailGreeting(voicemail_id_id=vm_id, filename=filename, name=name, updated_by=updated_by)
+            for filename, (vm_id, name) in on_disk.items()
+            if filename not in existing and name.startswith('greeting_')
+            ]
+        with transaction.atomic():
+            if removed:
+                VoicemailGreeting.objects.filter(id__in=removed).delete()
+            VoicemailGreeting.objects.bulk_create(added, batch_size=1000)
+        cache.set(manifest_key, self.greeting_digest(domain_uuid, manifest), self.manifest_timeout)
+        self.sync_stats['added'] = len(added)
+        self.sync_stats['removed'] = len(removed)
+        return self.sync_stats
 
-    def sync_greetings_with_remote_fs(self, vm, domain_name, home_switch):
-        grtg = vm.voicemailgreeting_set.all()
-        for q in grtg:
-            if not self.sftp.exists(home_switch, os.path.join(settings.MEDIA_ROOT, q.filename.name.lstrip('/'))):
-                q.delete()
-        path = os.path.join(settings.MEDIA_ROOT, self.voicemail_path, domain_name, vm.extension_id.extension)
-        storage_path = os.path.join(self.voicemail_path, domain_name, vm.extension_id.extension)
-        if self.sftp.exists(home_switch, path):
-            dirs, files = self.sftp.listdir(home_switch, path)
-            for f in files:
-                if f.startswith('greeting_'):
-                    vmg, created = VoicemailGreeting.objects.get_or_create(
-                        voicemail_id=vm,
-                        filename=os.path.join(storage_path, f),
-                        defaults={'name': f, 'updated_by': 'Voicemail Remote Directory Scan'}
-                        )
+    def greeting_digest(self, domain_uuid, manifest):
+        # Includes a fingerprint of the table so that edits made through the admin are also picked up.
+        fingerprint = VoicemailGreeting.objects.filter(
+            voicemail_id__extension_id__domain_id_id=domain_uuid
+            ).aggregate(Count('id'), Max('updated'))
+        return hashlib.sha1(repr((sorted(manifest.items()), sorted(fingerprint.items()))).encode()).hexdigest()
+
+    def greeting_manifest_local(self, path):
+        # {'<extension>/<file name>': (size, mtime)} for the mailbox directories below path
+        manifest = {}
+        try:
+            with os.scandir(path) as boxes:
+                for box in boxes:
+                    if not box.is_dir():
+                        continue
+                    with os.scandir(box.path) as it:
+                        for f in it:
+                            if f.is_file():
+                                st = f.stat()
+                                manifest['%s/%s' % (box.name, f.name)] = (st.st_size, int(st.st_mtime))
+        except FileNotFoundError:
+            pass
+        return manifest
+
+    def greeting_manifest_remote(self, host, path):
+        # As greeting_manifest_local but listed on the remote host with find in one round trip.
+        self.init_sftp()
+        self.sync_stats['round_trips'] += 1
+        try:
+            stdin, stdout, stderr = self.sftp.command(
+                host,
+                "find %s -mindepth 2 -maxdepth 2 -type f -printf '%%P\\t%%s\\t%%T@\\n' 2>/dev/null" % shlex.quote(path)
+                )
+            output = stdout.read().decode()
+        except Exception:
+            return None
+        manifest = {}
+        for line in output.splitlines():
+            parts = line.split('\t')
+            if len(parts) == 3:
+                try:
+                    manifest[parts[0]] = (int(parts[1]), int(float(parts[2])))
+                except ValueError:
+                    continue
+        return manifest
@@ -0,0 +1,148 @@
+#
+#    DjangoPBX
+#
+#    MIT License
+#
+#    Copyright (c) 2016 - 2024 Adrian Fretwell <adrian@djangopbx.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+#
+#    Contributor(s):
+#    Adrian Fretwell <adrian@djangopbx.com>
+#
+
+from django.db import transaction
+from django.utils import timezone
+from pbx.commonevents import MwiCoalescer
+from .models import Voicemail, VoicemailMessages, VoicemailJob, VmJobStatusChoice
+from .voicemailfunctions import VoicemailFunctions
+from .vmcounters import VoicemailCounters
+
+
+class VoicemailJobQueue():
+    # Completes voicemail deposits queued by the HTTAPI voicemail handler:
+    #  copies the message to any forwarding destinations (sharing the stored file),
+    #  sends voicemail to email and updates message waiting indicators.
+
+    def __init__(self, batch_size=20, max_attempts=5, backoff=30, max_backoff=900):
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.vmf = VoicemailFunctions()
+        self.counters = VoicemailCounters()
+        self.mwi = MwiCoalescer()
+
+    def claim_batch(self):
+        with transaction.atomic():
+            qs = VoicemailJob.objects.select_for_update(skip_locked=True).filter(
+                status=VmJobStatusChoice.CQUEUED, next_attempt__lte=timezone.now()
+                ).order_by('next_attempt')[:self.batch_size]
+            batch = list(qs)
+            if batch:
+                VoicemailJob.objects.filter(id__in=[j.id for j in batch]).update(
+                    status=VmJobStatusChoice.CPROCESSING, updated=timezone.now()
+                    )
+        return batch
+
+    def deposit(self, job):
+        # Returns a list of the mailboxes that need an MWI update.
+        msg = VoicemailMessages.objects.select_related(
+            'voicemail_id__extension_id__domain_id'
+            ).get(pk=job.message_id_id)
+        vm = msg.voicemail_id
+        dest_vms = list(Voicemail.objects.select_related('extension_id__domain_id').filter(
+            pk__in=vm.voicemaildestinations_set.values_list('voicemail_dest', flat=True)
+            ))
+        copies = [
+            VoicemailMessages(
+                voicemail_id=q, filename=msg.filename.name, name=msg.name, filestore=msg.filestore,
+                caller_id_name=msg.caller_id_name, caller_id_number=msg.caller_id_number, duration=msg.duration,
+                status='new' if q.local_after_email == 'true' else 'deleted', updated_by=msg.updated_by
+                ) for q in dest_vms
+            ]
+        mwi_list = []
+        with transaction.atomic():
+            VoicemailMessages.objects.bulk_create(copies)
+            for q, m in [(vm, msg)] + list(zip(dest_vms, copies)):
+                self.vmf.message_email(q, m, job.language)
+                if q.local_after_email == 'true':
+                    mwi_list.append(q)
+                    if m is not msg:
+                        # bulk_create does not send post_save
+                        self.counters.adjust(q.id, None, 'new')
+            if not vm.local_after_email == 'true':
+                msg.status = 'deleted'
+                msg.save()
+        return mwi_list
+
+    def queue_mwi(self, mwi_list):
+        counts = self.counters.get_many([q.id for q in mwi_list])
+        for q in mwi_list:
+            new_count, saved_count = counts.get(q.id, (0, 0))
+            self.mwi.add(q.extension_id.extension, q.extension_id.domain_id.name, new_count, saved_count)
+
+    def process_now(self, job):
+        # Completes a single deposit in the calling process, used by the HTTAPI
+        #  voicemail handler when PBX_VOICEMAIL_USE_QUEUE is not set.
+        self.queue_mwi(self.deposit(job))
+        self.flush_mwi(True)
+
+    def process_batch(self):
+        batch = self.claim_batch()
+        if not batch:
+            return 0
+        mwi_list = []
+        now = timezone.now()
+        for job in batch:
+            job.attempts += 1
+            job.updated = now
+            try:
+                mwi_list.extend(self.deposit(job))
+            except VoicemailMessages.DoesNotExist:
+                job.status = VmJobStatusChoice.CFAILED
+                job.last_error = 'Message not found'
+                continue
+            except Exception as e:
+                job.last_error = str(e)[:254]
+                if job.attempts < self.max_attempts:
+                    job.status = VmJobStatusChoice.CQUEUED
+                    job.next_attempt = now + timezone.timedelta(
+                        seconds=min(self.backoff * 2 ** (job.attempts - 1), self.max_backoff)
+                        )
+                else:
+                    job.status = VmJobStatusChoice.CFAILED
+                continue
+            job.status = VmJobStatusChoice.CDONE
+            job.last_error = None
+        VoicemailJob.objects.bulk_update(batch, ['status', 'attempts', 'next_attempt', 'last_error', 'updated'])
+        self.queue_mwi(list({q.id: q for q in mwi_list}.values()))
+        return len(batch)
+
+    def flush_mwi(self, force=False):
+        if force or self.mwi.due():
+            return self.mwi.flush()
+        return 0
+
+    def requeue_stale(self, minutes=10):
+        # Jobs left in processing state by a worker that died mid batch.
+        stale_time = timezone.now() - timezone.timedelta(minutes=minutes)
+        return VoicemailJob.objects.filter(
+            status=VmJobStatusChoice.CPROCESSING, updated__lt=stale_time
+            ).update(status=VmJobStatusChoice.CQUEUED)
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-19 12:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_alter_gateway_auth_username_and_more'),
+        ('tenants', '0008_remove_portal_name_null'),
+        ('xmlcdr', '0009_calltimeline_other_leg_unique_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='calltimeline',
+            index=models.Index(fields=['event_epoch', 'event_sequence', 'domain_id', 'id'], name='pbx_call_timeline_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='xmlcdr',
+            index=models.Index(fields=['domain_id', 'extension_id', '-start_stamp', 'id'], name='pbx_xml_cdr_order_idx'),
+        ),
+    ]
@@ -111,6 +111,9 @@ class XmlCdr(models.Model):
     class Meta:
         verbose_name_plural = 'CDRs'
         db_table = 'pbx_xml_cdr'
+        indexes = [
+            models.Index(fields=['domain_id', 'extension_id', '-start_stamp', 'id'], name='pbx_xml_cdr_order_idx'),
+        ]
 
     def __str__(self):
         return str(self.extension_id)
@@ -235,6 +238,9 @@ class CallTimeline(models.Model):
     class Meta:
         verbose_name_plural = 'Call Timeline'
         db_table = 'pbx_call_timeline'
+        indexes = [
+            models.Index(fields=['event_epoch', 'event_sequence', 'domain_id', 'id'], name='pbx_call_timeline_order_idx'),
+        ]
 
     def __str__(self):
         return f"{self.context}->{self.caller_id_number}: {self.event_name}"
@@ -28,12 +28,13 @@
 #
 
 from rest_framework import serializers
+from pbx.restpbxhelpers import SparseFieldsMixin
 from .models import (
     XmlCdr, CallTimeline,
 )
 
 
-class XmlCdrSerializer(serializers.ModelSerializer):
+class XmlCdrSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = XmlCdr
@@ -110,7 +111,7 @@ class XmlCdrSerializer(serializers.ModelSerializer):
                 ]
 
 
-class CallTimelineSerializer(serializers.ModelSerializer):
+class CallTimelineSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = CallTimeline
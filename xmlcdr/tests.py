@@ -27,6 +27,107 @@
 #    Adrian Fretwell <adrian@djangopbx.com>
 #
 
-# from django.test import TestCase
+import base64
+import datetime
+import json
+from urllib.parse import parse_qs, urlsplit
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from accounts.models import Extension
+from callblock.serializers import CallBlockSerializer
+from pbx.restpbxhelpers import PbxPagination
+from tenants.models import Domain
+from .models import XmlCdr
 
-# Create your tests here.
+
+class PbxPaginationTestCase(TestCase):
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        domains = [Domain.objects.create(name='page%s.test' % i, enabled='true') for i in range(2)]
+        exts = [
+            Extension.objects.create(domain_id=d, extension=str(200 + i), password='x', updated_by='test')
+            for d in domains for i in range(2)
+            ]
+        start = timezone.now()
+        cdrs = []
+        for i in range(57):
+            # NULLs in every ordering column, and runs of equal values.
+            cdrs.append(XmlCdr(
+                domain_id=None if i % 11 == 0 else domains[i % 2],
+                extension_id=None if i % 5 == 0 else exts[i % 4],
+                start_stamp=None if i % 7 == 0 else start - datetime.timedelta(minutes=i % 9)
+                ))
+        XmlCdr.objects.bulk_create(cdrs)
+        self.qs = XmlCdr.objects.order_by('domain_id', 'extension_id', '-start_stamp')
+        self.expected = list(
+            self.qs.order_by('domain_id', 'extension_id', '-start_stamp', 'id').values_list('id', flat=True)
+            )
+
+    def page(self, query):
+        paginator = PbxPagination()
+        paginator.page_size = 10
+        request = Request(self.factory.get('/api/xmlcdr/', query))
+        rows = paginator.paginate_queryset(self.qs, request)
+        return [r.id for r in rows], paginator.get_paginated_response([]).data
+
+    def query(self, link):
+        return {k: v[0] for k, v in parse_qs(urlsplit(link).query).items()}
+
+    def test_cursor_walk_forward_and_back(self):
+        ids, data = self.page({'cursor': ''})
+        seen = list(ids)
+        self.assertIsNone(data['previous'])
+        while data['next']:
+            ids, data = self.page(self.query(data['next']))
+            self.assertLessEqual(len(ids), 10)
+            seen.extend(ids)
+        self.assertEqual(seen, self.expected)
+
+        back = list(ids)
+        while data['previous']:
+            ids, data = self.page(self.query(data['previous']))
+            self.assertEqual(len(ids), 10)
+            back = ids + back
+        self.assertEqual(back, self.expected)
+
+    def test_invalid_cursor(self):
+        cursors = [
+            'not base64!', base64.urlsafe_b64encode(b'[1]').decode(),
+            ]
+        for values in (['garbage', 'x', 'y', 'z'], [{'a': 1}, 'x', 'y', 'z'], ['x'], {'a': 1}, [1, 2, 3, 4]):
+            cursors.append(base64.urlsafe_b64encode(json.dumps({'v': values}).encode()).decode())
+        for cursor in cursors:
+            with self.assertRaises(NotFound, msg=cursor):
+                self.page({'cursor': cursor})
+
+    def test_count_false(self):
+        with self.assertNumQueries(1):
+            ids, data = self.page({'count': 'false'})
+        self.assertIsNone(data['count'])
+        self.assertIsNone(data['previous'])
+        seen = list(ids)
+        while data['next']:
+            ids, data = self.page(self.query(data['next']))
+            seen.extend(ids)
+        self.assertEqual(len(seen), 57)
+        self.assertEqual(set(seen), set(self.expected))
+        self.assertEqual(self.query(data['previous'])['page'], '5')
+
+
+class SparseFieldsTestCase(TestCase):
+
+    def serializer(self, request):
+        return CallBlockSerializer(context={'request': Request(request)})
+
+    def test_get_limits_fields(self):
+        factory = APIRequestFactory()
+        fields = self.serializer(factory.get('/api/callblock/', {'fields': 'id, name,unknown'})).fields
+        self.assertEqual(set(fields), {'id', 'name'})
+        all_fields = set(self.serializer(factory.get('/api/callblock/')).fields)
+        self.assertIn('name', all_fields)
+        self.assertGreater(len(all_fields), 2)
+        self.assertEqual(set(self.serializer(factory.post('/api/callblock/?fields=id')).fields), all_fields)
@@ -0,0 +1,212 @@
+#
+#    DjangoPBX
+#
+#    MIT License
+#
+#    Copyright (c) 2016 - 2024 Adrian Fretwell <adrian@djangopbx.com>
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+#
+#    Contributor(s):
+#    Adrian Fretwell <adrian@djangopbx.com>
+#
+
+import hashlib
+import re
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Prefetch, Q
+from lxml import etree
+from accounts.models import Gateway
+from switch.models import SipProfile, SipProfileDomain, SipProfileSetting
+
+
+class SofiaFragments():
+    # Builds sofia.conf from cached gateway and per (profile, hostname) XML fragments.
+    #  Fragment keys carry a digest of the rows they were rendered from, so when one
+    #  gateway changes only that gateway misses the cache and is rendered again.
+    #  Fragments are referenced by X-FRAGMENT placeholders which assemble() replaces.
+
+    fragment_re = re.compile(r'<X-FRAGMENT key="([^"]+)"/>')
+    gateway_fields = (
+        'id', 'username', 'distinct_to', 'auth_username', 'password', 'realm', 'from_user',
+        'from_domain', 'proxy', 'register_proxy', 'outbound_proxy', 'expire_seconds', 'register',
+        'register_transport', 'retry_seconds', 'extension', 'ping', 'context', 'caller_id_in_from',
+        'supress_cng', 'extension_in_contact', 'sip_cid_type'
+    )
+
+    def __init__(self, hostname=''):
+        self.hostname = hostname
+        self.timeout = settings.PBX_XMLH_SOFIA_FRAGMENT_TIMEOUT
+        self.profiles = []
+        self.gateways = {}
+        self.fragments = {}
+        self.rendered = {'profiles': 0, 'gateways': 0}
+
+    def digest(self, values):
+        return hashlib.sha1(repr(values).encode()).hexdigest()
+
+    def load(self):
+        self.profiles = list(SipProfile.objects.prefetch_related(
+            Prefetch(
+                'sipprofiledomain_set', queryset=SipProfileDomain.objects.order_by('name'), to_attr='domain_list'
+                ),
+            Prefetch(
+                'sipprofilesetting_set', queryset=SipProfileSetting.objects.filter(enabled='true').order_by('name'),
+                to_attr='setting_list'
+                )
+            ).filter(enabled='true').order_by('name'))
+        self.gateways = {p.name: [] for p in self.profiles}
+        gws = Gateway.objects.filter(
+            (Q(hostname=self.hostname) | Q(hostname__isnull=True)), enabled='true', profile__in=self.gateways.keys()
+            ).order_by('gateway', 'id').values_list('profile', *self.gateway_fields, named=True)
+        for gw in gws:
+            self.gateways[gw.profile].append(gw)
+
+        gateway_keys = {}
+        profile_keys = {}
+        for p in self.profiles:
+            gw_ids = []
+            for gw in self.gateways[p.name]:
+                gateway_keys[str(gw.id)] = 'configuration:sofia.conf:gateway:%s:%s' % (
+                    gw.id, self.digest(gw[1:])
+                    )
+                gw_ids.append(str(gw.id))
+            profile_keys[str(p.id)] = 'configuration:sofia.conf:profile:%s:%s:%s' % (
+                p.id, self.hostname, self.digest((
+                    p.name,
+                    [(d.name, d.alias, d.parse) for d in p.domain_list],
+                    [(s.name, s.value) for s in p.setting_list],
+                    gw_ids
+                    ))
+                )
+
+        keys = {**gateway_keys, **profile_keys}
+        cached = cache.get_many(keys.values())
+        missing = {}
+        for p in self.profiles:
+            for gw in self.gateways[p.name]:
+                self.fragments[str(gw.id)] = self.cached_or_render(
+                    cached, missing, gateway_keys[str(gw.id)], self.render_gateway, gw
+                    )
+            self.fragments[str(p.id)] = self.cached_or_render(
+                cached, missing, profile_keys[str(p.id)], self.render_profile, p
+                )
+        if missing:
+            cache.set_many(missing, self.timeout)
+        return self.profiles
+
+    def cached_or_render(self, cached, missing, key, render, obj):
+        fragment = cached.get(key)
+        if fragment is None:
+            fragment = render(obj)
+            missing[key] = fragment
+        return fragment
+
+    def placeholder(self, x_parent, obj):
+        etree.SubElement(x_parent, 'X-FRAGMENT', key=str(obj.id))
+
+    def assemble(self, xml):
+        parts = self.fragment_re.split(xml)
+        for i in range(1, len(parts), 2):
+            parts[i] = self.assemble(self.fragments[parts[i]])
+        return ''.join(parts)
+
+    def render_profile(self, p):
+        self.rendered['profiles'] += 1
+        x_profile = etree.Element('profile', name=p.name)
+        etree.SubElement(x_profile, 'aliases')
+        x_gateways = etree.SubElement(x_profile, 'gateways')
+        etree.SubElement(x_gateways, 'X-PRE-PROCESS', cmd='include', data='sip_profiles/%s/*.xml' % p.name)
+        for gw in self.gateways[p.name]:
+            self.placeholder(x_gateways, gw)
+
+        x_domains = etree.SubElement(x_profile, 'domains')
+        for d in p.domain_list:
+            etree.SubElement(x_domains, 'domain', name=d.name, alias=d.alias, parse=d.parse)
+
+        x_settings = etree.SubElement(x_profile, 'settings')
+        for s in p.setting_list:
+            if s.value is None:
+                s_value = ''
+            else:
+                s_value = s.value
+            etree.SubElement(x_settings, 'param', name=s.name, value=s_value)
+
+        etree.indent(x_profile, level=4)
+        return str(etree.tostring(x_profile), "utf-8")
+
+    def render_gateway(self, gw):
+        self.rendered['gateways'] += 1
+        x_gateway = etree.Element('gateway', name=str(gw.id))
+        if gw.username:
+            etree.SubElement(x_gateway, 'param', name='username', value=gw.username)
+        if gw.distinct_to:
+            etree.SubElement(x_gateway, 'param', name='distinct-to', value=gw.distinct_to)
+        if gw.auth_username:
+            etree.SubElement(x_gateway, 'param', name='auth-username', value=gw.auth_username)
+        if gw.password:
+            etree.SubElement(x_gateway, 'param', name='password', value=gw.password)
+        if gw.realm:
+            etree.SubElement(x_gateway, 'param', name='realm', value=gw.realm)
+        if gw.from_user:
+            etree.SubElement(x_gateway, 'param', name='from-user', value=gw.from_user)
+        if gw.from_domain:
+            etree.SubElement(x_gateway, 'param', name='from-domain', value=gw.from_domain)
+        if gw.proxy:
+            etree.SubElement(x_gateway, 'param', name='proxy', value=gw.proxy)
+        if gw.register_proxy:
+            etree.SubElement(x_gateway, 'param', name='register-proxy', value=gw.register_proxy)
+        if gw.outbound_proxy:
+            etree.SubElement(x_gateway, 'param', name='outbound-proxy', value=gw.outbound_proxy)
+        if gw.expire_seconds:
+            etree.SubElement(x_gateway, 'param', name='expire-seconds', value=str(gw.expire_seconds))
+        if gw.register:
+            etree.SubElement(x_gateway, 'param', name='register', value=gw.register)
+        if gw.register_transport:
+            if gw.register_transport == 'udp':
+                etree.SubElement(x_gateway, 'param', name='register-transport', value=gw.register_transport)
+            elif gw.register_transport == 'tcp':
+                etree.SubElement(x_gateway, 'param', name='register-transport', value=gw.register_transport)
+            elif gw.register_transport == 'tls':
+                etree.SubElement(x_gateway, 'param', name='register-transport', value=gw.register_transport)
+                etree.SubElement(x_gateway, 'param', name='contact-params', value='transport=tls')
+            else:
+                etree.SubElement(x_gateway, 'param', name='register-transport', value='udp')
+
+        if gw.retry_seconds:
+            etree.SubElement(x_gateway, 'param', name='retry-seconds', value=str(gw.retry_seconds))
+        if gw.extension:
+            etree.SubElement(x_gateway, 'param', name='extension', value=gw.extension)
+        if gw.ping:
+            etree.SubElement(x_gateway, 'param', name='ping', value=gw.ping)
+        if gw.context:
+            etree.SubElement(x_gateway, 'param', name='context', value=gw.context)
+        if gw.caller_id_in_from:
+            etree.SubElement(x_gateway, 'param', name='caller-id-in-from', value=gw.caller_id_in_from)
+        if gw.supress_cng:
+            etree.SubElement(x_gateway, 'param', name='supress-cng', value=gw.supress_cng)
+        if gw.extension_in_contact:
+            etree.SubElement(x_gateway, 'param', name='extension-in-contact', value=gw.extension_in_contact)
+        x_variables = etree.SubElement(x_gateway, 'variables')
+        if gw.sip_cid_type:
+            etree.SubElement(x_variables, 'variable', name='sip-cid-type', value=gw.sip_cid_type)
+
+        etree.indent(x_gateway, level=6)
+        return str(etree.tostring(x_gateway), "utf-8")
@@ -27,6 +27,216 @@
 #    Adrian Fretwell <adrian@djangopbx.com>
 #
 
-# from django.test import TestCase
+from lxml import etree
+from django.core.cache import cache
+from django.db.models import Q
+from django.test import TestCase
+from tenants.models import Domain
+from accounts.models import Gateway
+from switch.models import AccessControl, AccessControlNode, SipProfile, SipProfileDomain, SipProfileSetting
+from conferencesettings.models import (
+    ConferenceControls, ConferenceControlDetails, ConferenceProfiles, ConferenceProfileParams
+)
+from numbertranslations.models import NumberTranslations, NumberTranslationDetails
+from callcentres.models import CallCentreQueues, CallCentreAgents, CallCentreTiers
+from .sofiafragments import SofiaFragments
+from .xmlhandlerclasses import ConfigHandler
 
-# Create your tests here.
+
+class ConfigHandlerQueryCountTestCase(TestCase):
+    # Each configuration section must be rendered with a fixed number of queries
+    #  whatever the number of rows behind it.
+    row_counts = (5, 50)
+
+    def setUp(self):
+        self.domain = Domain.objects.create(name='cfg.test', enabled='true')
+        self.ch = ConfigHandler()
+
+    def render(self, method, queries):
+        cache.clear()
+        with self.assertNumQueries(queries):
+            return getattr(self.ch, method)()
+
+    def test_acl(self):
+        for n in self.row_counts:
+            AccessControl.objects.all().delete()
+            acls = AccessControl.objects.bulk_create([
+                AccessControl(name='acl%03d' % i, default='deny') for i in range(n)
+                ])
+            AccessControlNode.objects.bulk_create([
+                AccessControlNode(access_control_id=a, type=t, cidr='10.%s.%s.0/24' % (i, j))
+                for i, a in enumerate(acls) for j, t in enumerate(['allow', 'deny', 'allow'])
+                ])
+            xml = self.render('GetACL', 2)
+            self.assertEqual(xml.count('<list '), n)
+            self.assertEqual(xml.count('<node '), n * 3)
+
+    def test_conference(self):
+        for n in self.row_counts:
+            ConferenceControls.objects.all().delete()
+            ConferenceProfiles.objects.all().delete()
+            ccs = ConferenceControls.objects.bulk_create([ConferenceControls(name='cc%03d' % i) for i in range(n)])
+            ConferenceControlDetails.objects.bulk_create([
+                ConferenceControlDetails(conf_ctrl_id=c, digits=str(j), action='mute') for c in ccs for j in range(4)
+                ])
+            cps = ConferenceProfiles.objects.bulk_create([ConferenceProfiles(name='cp%03d' % i) for i in range(n)])
+            ConferenceProfileParams.objects.bulk_create([
+                ConferenceProfileParams(conf_profile_id=c, name='p%s' % j, value='v') for c in cps for j in range(4)
+                ])
+            xml = self.render('GetConference', 4)
+            self.assertEqual(xml.count('<control '), n * 4)
+            self.assertEqual(xml.count('<param '), n * 4)
+
+    def test_translate(self):
+        for n in self.row_counts:
+            NumberTranslations.objects.all().delete()
+            nts = NumberTranslations.objects.bulk_create([
+                NumberTranslations(name='nt%03d' % i, description='test') for i in range(n)
+                ])
+            NumberTranslationDetails.objects.bulk_create([
+                NumberTranslationDetails(number_translation_id=t, td_regex='^(\\d+)$', td_replace='44$1', td_order=j)
+                for t in nts for j in range(3)
+                ])
+            xml = self.render('GetTranslate', 2)
+            self.assertEqual(xml.count('<profile '), n)
+            self.assertEqual(xml.count('<rule '), n * 3)
+
+    def test_callcentre(self):
+        self.ch.get_callcentre_dsn()
+        for n in self.row_counts:
+            CallCentreQueues.objects.all().delete()
+            CallCentreAgents.objects.all().delete()
+            queues = CallCentreQueues.objects.bulk_create([
+                CallCentreQueues(domain_id=self.domain, name='q%03d' % i, extension=str(5000 + i),
+                                 moh_sound='local_stream://default')
+                for i in range(n)
+                ])
+            agents = CallCentreAgents.objects.bulk_create([
+                CallCentreAgents(domain_id=self.domain, name='a%03d' % i, contact='user/%s' % i) for i in range(n)
+                ])
+            CallCentreTiers.objects.bulk_create([
+                CallCentreTiers(queue_id=q, agent_id=a) for q, a in zip(queues, agents)
+                ])
+            xml = self.render('GetCallcentre', 3)
+            self.assertEqual(xml.count('<queue '), n)
+            self.assertEqual(xml.count('<agent '), n)
+            self.assertEqual(xml.count('<tier '), n)
+
+
+def old_sofia(ch, hostname=''):
+    # The sofia.conf renderer as it was before SofiaFragments, without the document cache.
+    gateway_params = (
+        ('username', 'username'), ('distinct_to', 'distinct-to'), ('auth_username', 'auth-username'),
+        ('password', 'password'), ('realm', 'realm'), ('from_user', 'from-user'), ('from_domain', 'from-domain'),
+        ('proxy', 'proxy'), ('register_proxy', 'register-proxy'), ('outbound_proxy', 'outbound-proxy'),
+        ('expire_seconds', 'expire-seconds'), ('register', 'register')
+    )
+    x_root = ch.XrootDynamic()
+    x_section = etree.SubElement(x_root, "section", name='configuration')
+    x_conf_name = etree.SubElement(x_section, 'configuration', name='sofia.conf', description='sofia Endpoint')
+    x_global_settings = etree.SubElement(x_conf_name, 'global_settings')
+    etree.SubElement(x_global_settings, 'param', name='log-level', value='0')
+    etree.SubElement(x_global_settings, 'param', name='debug-presense', value='0')
+    x_profiles = etree.SubElement(x_conf_name, 'profiles')
+    ps = SipProfile.objects.filter(enabled='true').order_by('name')
+    for p in ps:
+        ds = p.sipprofiledomain_set.all().order_by('name')
+        ss = p.sipprofilesetting_set.filter(enabled='true').order_by('name')
+        gws = Gateway.objects.filter((Q(hostname=hostname) | Q(hostname__isnull=True)), enabled='true', profile=p.name)
+        x_profile = etree.SubElement(x_profiles, 'profile', name=p.name)
+        etree.SubElement(x_profile, 'aliases')
+        x_gateways = etree.SubElement(x_profile, 'gateways')
+        etree.SubElement(x_gateways, 'X-PRE-PROCESS', cmd='include', data='sip_profiles/%s/*.xml' % p.name)
+        for gw in gws:
+            x_gateway = etree.SubElement(x_gateways, 'gateway', name=str(gw.id))
+            for field, name in gateway_params:
+                if getattr(gw, field):
+                    etree.SubElement(x_gateway, 'param', name=name, value=str(getattr(gw, field)))
+            if gw.register_transport:
+                if gw.register_transport in ('udp', 'tcp', 'tls'):
+                    etree.SubElement(x_gateway, 'param', name='register-transport', value=gw.register_transport)
+                    if gw.register_transport == 'tls':
+                        etree.SubElement(x_gateway, 'param', name='contact-params', value='transport=tls')
+                else:
+                    etree.SubElement(x_gateway, 'param', name='register-transport', value='udp')
+            for field, name in (
+                    ('retry_seconds', 'retry-seconds'), ('extension', 'extension'), ('ping', 'ping'),
+                    ('context', 'context'), ('caller_id_in_from', 'caller-id-in-from'),
+                    ('supress_cng', 'supress-cng'), ('extension_in_contact', 'extension-in-contact')):
+                if getattr(gw, field):
+                    etree.SubElement(x_gateway, 'param', name=name, value=str(getattr(gw, field)))
+            x_variables = etree.SubElement(x_gateway, 'variables')
+            if gw.sip_cid_type:
+                etree.SubElement(x_variables, 'variable', name='sip-cid-type', value=gw.sip_cid_type)
+
+        x_domains = etree.SubElement(x_profile, 'domains')
+        for d in ds:
+            etree.SubElement(x_domains, 'domain', name=d.name, alias=d.alias, parse=d.parse)
+
+        x_settings = etree.SubElement(x_profile, 'settings')
+        for s in ss:
+            etree.SubElement(x_settings, 'param', name=s.name, value=(s.value if s.value is not None else ''))
+
+    etree.indent(x_root)
+    return str(etree.tostring(x_root), "utf-8")
+
+
+class SofiaFragmentsTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.ch = ConfigHandler()
+        for name in ('external', 'internal', 'retired'):
+            p = SipProfile.objects.create(name=name, enabled=('false' if name == 'retired' else 'true'))
+            SipProfileDomain.objects.create(sip_profile_id=p, name='all', alias='false', parse='false')
+            SipProfileDomain.objects.create(sip_profile_id=p, name='%s.test' % name, alias='true', parse='true')
+            SipProfileSetting.objects.create(sip_profile_id=p, name='sip-port', value='5060')
+            SipProfileSetting.objects.create(sip_profile_id=p, name='ext-rtp-ip', value=None)
+            SipProfileSetting.objects.create(sip_profile_id=p, name='unused', value='x', enabled='false')
+        # Created in gateway name order, the old renderer did not order gateways.
+        transports = ['udp', 'tcp', 'tls', 'bogus', '']
+        hostnames = [None, 'sw1', 'sw2']
+        for i in range(30):
+            Gateway.objects.create(
+                gateway='gw%02d' % i, username='user%s' % i, password='pw%s' % i, proxy='proxy%s.test' % i,
+                realm=('realm.test' if i % 2 else None), from_user=('from%s' % i if i % 3 else None),
+                register=('true' if i % 2 else 'false'), register_transport=transports[i % 5],
+                ping=('30' if i % 4 else None), sip_cid_type=('rpid' if i % 5 else None),
+                caller_id_in_from=('true' if i % 6 == 0 else ''), profile=('external' if i % 3 else 'internal'),
+                hostname=hostnames[i % 3], enabled=('false' if i == 7 else 'true')
+                )
+
+    def test_matches_old_renderer(self):
+        for hostname in ('', 'sw1', 'sw2'):
+            expected = old_sofia(self.ch, hostname)
+            # Cold, then with every fragment cached but the document evicted.
+            self.assertEqual(self.ch.GetSofia(hostname), expected)
+            cache.delete('configuration:sofia.conf')
+            self.assertEqual(self.ch.GetSofia(hostname), expected)
+        # Each host keeps its own document.
+        self.assertEqual(self.ch.GetSofia('sw1'), old_sofia(self.ch, 'sw1'))
+        self.assertNotEqual(self.ch.GetSofia('sw1'), self.ch.GetSofia('sw2'))
+
+    def test_gateway_edit_renders_one_fragment(self):
+        sf = SofiaFragments('sw1')
+        sf.load()
+        self.assertEqual(sf.rendered, {'profiles': 2, 'gateways': 19})
+        sf = SofiaFragments('sw1')
+        sf.load()
+        self.assertEqual(sf.rendered, {'profiles': 0, 'gateways': 0})
+
+        gw = Gateway.objects.get(gateway='gw04')
+        gw.password = 'changed'
+        gw.save()
+        sf = SofiaFragments('sw1')
+        sf.load()
+        self.assertEqual(sf.rendered, {'profiles': 0, 'gateways': 1})
+        self.assertIn('value="changed"', sf.fragments[str(gw.id)])
+
+        # A new gateway changes its profile's gateway list, so that profile is rendered too.
+        Gateway.objects.create(gateway='gw99', proxy='proxy99.test', profile='internal')
+        sf = SofiaFragments('sw1')
+        sf.load()
+        self.assertEqual(sf.rendered, {'profiles': 1, 'gateways': 1})
+        cache.delete('configuration:sofia.conf')
+        self.assertEqual(self.ch.GetSofia('sw1'), old_sofia(self.ch, 'sw1'))